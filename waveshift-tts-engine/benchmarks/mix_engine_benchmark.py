@@ -0,0 +1,80 @@
+"""
+MixEngine 微基准：原实现（np.concatenate + 每次重算窗口 + 缓冲区拼接截断） vs MixEngine
+用法（在引擎根目录）：python benchmarks/mix_engine_benchmark.py [--sentences N] [--batches N]
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.audio_utils import apply_fade_effect, mix_background_segment, normalize_audio  # noqa: E402
+from utils.mix_engine import NUMBA_AVAILABLE, MixEngine  # noqa: E402
+
+
+def main():
+    # 微基准：原实现（np.concatenate + 每次重算窗口 + 缓冲区拼接截断） vs MixEngine
+    parser = argparse.ArgumentParser(description="MixEngine 微基准")
+    parser.add_argument("--sentences", type=int, default=40, help="每批次句子数")
+    parser.add_argument("--batches", type=int, default=20, help="批次数")
+    parser.add_argument("--sentence-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    sr, overlap, max_val = 24000, 500, 1.0
+    rng = np.random.default_rng(0)
+    batches = [
+        [rng.normal(0, 0.3, int(sr * args.sentence_seconds * rng.uniform(0.5, 1.5))).astype(np.float32)
+         for _ in range(args.sentences)]
+        for _ in range(args.batches)
+    ]
+    backgrounds = [rng.normal(0, 0.5, sum(map(len, b)) + sr).astype(np.float32) for b in batches]
+
+    def legacy():
+        buffer, outputs = np.array([], dtype=np.float32), []
+        for segments, bg in zip(batches, backgrounds):
+            full = np.array([], dtype=np.float32)
+            for seg in segments:
+                data = seg
+                if len(full) > 0:
+                    data = apply_fade_effect(data, buffer, overlap)
+                full = np.concatenate((full, data))
+            duration = (len(full) + sr // 2) / sr
+            mixed = normalize_audio(mix_background_segment(bg, duration, full, sr, 0.7, 0.3), max_val)
+            buffer = np.concatenate((buffer, mixed))[-10 * sr:]
+            outputs.append(mixed)
+        return outputs
+
+    def engine_run(use_numba):
+        engine, outputs = MixEngine(sr, overlap, use_numba=use_numba), []
+        for segments, bg in zip(batches, backgrounds):
+            full = engine.concat(segments)
+            duration = (len(full) + sr // 2) / sr
+            mixed = engine.mix(full, bg, duration, 0.7, 0.3, max_val)
+            engine.commit(mixed)
+            outputs.append(mixed)
+        return outputs
+
+    runs = [("legacy", legacy), ("engine/numpy", lambda: engine_run(False))]
+    if NUMBA_AVAILABLE:
+        engine_run(True)  # 预热 JIT
+        runs.append(("engine/numba", lambda: engine_run(True)))
+
+    reference = None
+    total_audio = sum(len(o) for o in legacy()) / sr
+    for name, fn in runs:
+        t0 = time.perf_counter()
+        outputs = fn()
+        elapsed = time.perf_counter() - t0
+        if reference is None:
+            reference = outputs
+        max_diff = max(float(np.max(np.abs(a - b))) for a, b in zip(reference, outputs))
+        print(f"{name:>14}: {elapsed * 1000:8.1f} ms  ({total_audio / elapsed:8.0f}x 实时)  与原实现最大误差 {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -33,6 +33,49 @@ class TTSConfig:
         self.batch_size = int(os.getenv("TTS_BATCH_SIZE", "3"))
         self.save_audio = os.getenv("TTS_SAVE_AUDIO", "true").lower() == "true"
         self.enable_audio_separation = os.getenv("TTS_ENABLE_AUDIO_SEPARATION", "true").lower() == "true"
+        self.separation_workers = int(os.getenv("TTS_SEPARATION_WORKERS", "0"))  # 常驻分离器实例数，0表示按设备自动确定
+        self.separation_queue_size = int(os.getenv("TTS_SEPARATION_QUEUE_SIZE", "64"))  # 分离作业队列上限
+        self.separation_preload = os.getenv("TTS_SEPARATION_PRELOAD", "true").lower() == "true"  # 启动时预加载分离模型
+        self.separation_scratch_dir = os.getenv("TTS_SEPARATION_SCRATCH_DIR", "/tmp/tts_temp/separator")  # 各实例的临时输出目录
+        self.separation_window_seconds = float(os.getenv("TTS_SEPARATION_WINDOW_SECONDS", "30"))  # 窗口化分离的窗口时长，0表示整文件分离
+        self.separation_window_overlap_seconds = float(os.getenv("TTS_SEPARATION_WINDOW_OVERLAP_SECONDS", "2"))  # 相邻窗口交叉淡化时长
+        self.separation_lookahead_seconds = float(os.getenv("TTS_SEPARATION_LOOKAHEAD_SECONDS", "90"))  # 播放位置之后优先分离的区间
+        self.separation_window_inflight = int(os.getenv("TTS_SEPARATION_WINDOW_INFLIGHT", "1"))  # 每个任务同时提交的窗口作业数
+        self.separation_window_wait_seconds = float(os.getenv("TTS_SEPARATION_WINDOW_WAIT_SECONDS", "15"))  # 混音等待窗口就绪的上限，超时以静音代替
+        self.music_detection = os.getenv("TTS_MUSIC_DETECTION", "true").lower() == "true"  # 分离前检测是否含背景音乐
+        self.music_detection_sample_rate = int(os.getenv("TTS_MUSIC_DETECTION_SAMPLE_RATE", "8000"))  # 检测用降采样率
+        self.music_region_seconds = float(os.getenv("TTS_MUSIC_REGION_SECONDS", "10"))  # 检测判定区间长度
+        self.music_threshold = float(os.getenv("TTS_MUSIC_THRESHOLD", "0.5"))  # 区间音乐置信度阈值
+        self.music_min_ratio = float(os.getenv("TTS_MUSIC_MIN_RATIO", "0.02"))  # 含音乐占比低于该值时跳过分离
+        self.music_region_margin_seconds = float(os.getenv("TTS_MUSIC_REGION_MARGIN_SECONDS", "2"))  # 音乐区间两端扩展
+        self.mix_use_numba = os.getenv("TTS_MIX_USE_NUMBA", "true").lower() == "true"  # 混音内核使用numba（未安装时回退numpy）
+        self.mix_snap_keyframes = os.getenv("TTS_MIX_SNAP_KEYFRAMES", "true").lower() == "true"  # 流式会话的片段终点对齐关键帧（整段流复制）
+        self.mix_snap_max_carry_seconds = float(os.getenv("TTS_MIX_SNAP_MAX_CARRY_SECONDS", "4"))  # 对齐时顺延到下一片段的最长时长
+        self.mix_render_workers = int(os.getenv("TTS_MIX_RENDER_WORKERS", "0"))  # 多批次并行渲染（整任务重新渲染）的片段并发数，0表示按CPU核数自动确定
+        self.time_stretch_engine = os.getenv("TTS_TIME_STRETCH_ENGINE", "wsola")  # 句子变速实现：wsola（进程内批量）/ ffmpeg（逐句atempo）
+        # 按负载类别划分的执行器线程池（替代默认执行器），torch 线程数按推理/分离并发统一设置
+        self.inference_workers = int(os.getenv("TTS_INFERENCE_WORKERS", "1"))  # 模型推理线程池大小
+        self.dsp_workers = int(os.getenv("TTS_DSP_WORKERS", os.getenv("TTS_TIME_STRETCH_WORKERS", "0")))  # CPU数值处理（对齐/变速/背景音/解码）线程池大小，0表示按CPU核数自动确定
+        self.io_workers = int(os.getenv("TTS_IO_WORKERS", "0"))  # 阻塞I/O线程池大小，0表示按CPU核数自动确定
+        self.torch_threads = int(os.getenv("TTS_TORCH_THREADS", "0"))  # torch intra-op线程数，0表示按核数与推理/分离并发自动确定
+        # 全局 FFmpeg 作业调度（所有 ffmpeg/ffprobe 子进程）
+        self.ffmpeg_cpu_budget = int(os.getenv("TTS_FFMPEG_CPU_BUDGET", "0"))  # 同时运行的ffmpeg作业线程数之和上限，0表示CPU核数
+        self.ffmpeg_encode_threads = int(os.getenv("TTS_FFMPEG_ENCODE_THREADS", "2"))  # 视频重编码作业的线程数
+        self.ffmpeg_threads = int(os.getenv("TTS_FFMPEG_THREADS", "1"))  # 其他ffmpeg作业（提取/流复制/音频编码）的线程数
+        self.time_stretch_frame_ms = float(os.getenv("TTS_TIME_STRETCH_FRAME_MS", "30"))  # WSOLA分析帧长（毫秒）
+        self.time_stretch_tolerance_ms = float(os.getenv("TTS_TIME_STRETCH_TOLERANCE_MS", "8"))  # WSOLA帧位置搜索容差（毫秒）
+        self.latent_duration_control = os.getenv("TTS_LATENT_DURATION_CONTROL", "false").lower() == "true"  # 保存GPT latent，时长对齐时插值latent重新声码代替波形变速
+        self.hls_low_latency = os.getenv("TTS_HLS_LOW_LATENCY", "false").lower() == "true"  # LL-HLS模式：部分片段(EXT-X-PART)+预加载提示，播放列表只追加写入
+        self.hls_part_seconds = float(os.getenv("TTS_HLS_PART_SECONDS", "1.0"))  # LL-HLS部分片段目标时长
+        self.hls_ll_segment_seconds = float(os.getenv("TTS_HLS_LL_SEGMENT_SECONDS", "4"))  # LL-HLS完整片段目标时长
+        self.hls_split_renditions = os.getenv("TTS_HLS_SPLIT_RENDITIONS", "false").lower() == "true"  # 主播放列表+独立配音音频演绎：视频在任务初始化时流复制切分一次，批次只编码音频
+        self.hls_rendition_segment_seconds = float(os.getenv("TTS_HLS_RENDITION_SEGMENT_SECONDS", "4"))  # 视频/音频演绎的片段目标时长
+        self.hls_audio_bitrate = os.getenv("TTS_HLS_AUDIO_BITRATE", "128k")  # 配音音频演绎的AAC码率
+        self.subtitle_track = os.getenv("TTS_SUBTITLE_TRACK", "true").lower() == "true"  # 按批次追加WebVTT字幕轨（外挂字幕；分离演绎模式同时输出HLS字幕演绎），不烧录
+        self.subtitle_segment_seconds = float(os.getenv("TTS_SUBTITLE_SEGMENT_SECONDS", "6"))  # HLS字幕片段时长
+        self.subtitle_burn_in_final = os.getenv("TTS_SUBTITLE_BURN_IN_FINAL", "false").lower() == "true"  # 成品导出时额外烧录字幕（整片重编码一次）
+        self.pipeline_queue_size = int(os.getenv("TTS_PIPELINE_QUEUE_SIZE", "2"))  # 任务流水线（合成/对齐/混合/HLS）阶段间队列容量，满时向上游背压
+        self.incremental_final_mp4 = os.getenv("TTS_INCREMENTAL_FINAL_MP4", "true").lower() == "true"  # 片段混合完成即追加到fMP4成品，任务结束时不再整体合并
         
         # IndexTTS模型配置
         model_name = os.getenv("TTS_MODEL_NAME", "indextts")
@@ -46,6 +89,51 @@ class TTSConfig:
         self.task_cleanup_timeout = int(os.getenv("TTS_TASK_CLEANUP_TIMEOUT", "3600"))  # 1小时后自动清理
         self.max_concurrent_downloads = int(os.getenv("TTS_MAX_CONCURRENT_DOWNLOADS", "3"))
         self.download_timeout = int(os.getenv("TTS_DOWNLOAD_TIMEOUT", "300"))  # 5分钟下载超时
+        self.artifact_wait_timeout = int(os.getenv("TTS_ARTIFACT_WAIT_TIMEOUT", "900"))  # 处理阶段等待媒体产物的最长时间，0表示不限
+        self.download_cache_dir = os.getenv("TTS_DOWNLOAD_CACHE_DIR", "/tmp/tts_temp/downloads")  # 部分下载（断点续传）目录
+        self.download_connections = int(os.getenv("TTS_DOWNLOAD_CONNECTIONS", "4"))  # 单文件并行Range连接数
+        self.download_max_connections = int(os.getenv("TTS_DOWNLOAD_MAX_CONNECTIONS", "16"))  # 共享连接池上限
+        self.download_buffer_kb = int(os.getenv("TTS_DOWNLOAD_BUFFER_KB", "1024"))  # 写盘缓冲大小
+        self.download_min_split_mb = int(os.getenv("TTS_DOWNLOAD_MIN_SPLIT_MB", "16"))  # 小于该大小不分片
+        
+        # 任务上下文持久化与空闲回收
+        self.task_store_path = os.getenv("TTS_TASK_STORE_PATH", "/tmp/tts_temp/task_contexts.db")
+        self.persist_task_context = os.getenv("TTS_PERSIST_TASK_CONTEXT", "true").lower() == "true"
+        self.task_reaper_interval = int(os.getenv("TTS_TASK_REAPER_INTERVAL", "60"))  # 回收器扫描间隔（秒）
+        self.task_disk_budget_mb = int(os.getenv("TTS_TASK_DISK_BUDGET_MB", "0"))  # 任务文件磁盘预算，0表示不限制
+        self.task_memory_budget_mb = int(os.getenv("TTS_TASK_MEMORY_BUDGET_MB", "0"))  # 进程内存预算，0表示不限制
+        self.task_min_idle_seconds = int(os.getenv("TTS_TASK_MIN_IDLE_SECONDS", "120"))  # 超预算回收时的最短空闲时间
+        
+        # R2（S3 兼容）对象存储：HLS 片段/播放列表、成品视频与句子音频共用一个连接池
+        self.r2_account_id = os.getenv("CLOUDFLARE_ACCOUNT_ID", "")
+        self.r2_endpoint = os.getenv("R2_ENDPOINT", "")  # 为空时按账户ID拼接 https://<account>.r2.cloudflarestorage.com
+        self.r2_bucket = os.getenv("R2_BUCKET_NAME", "")
+        self.r2_access_key_id = os.getenv("R2_ACCESS_KEY_ID", "")
+        self.r2_secret_access_key = os.getenv("R2_SECRET_ACCESS_KEY", "")
+        self.r2_region = os.getenv("R2_REGION", "auto")
+        self.r2_public_url = os.getenv("R2_PUBLIC_URL", "")  # 公共访问域名，为空时返回存储端点URL
+        self.r2_max_connections = int(os.getenv("TTS_R2_MAX_CONNECTIONS", "16"))  # 共享连接池上限
+        self.r2_upload_concurrency = int(os.getenv("TTS_R2_UPLOAD_CONCURRENCY", "8"))  # 小对象并行PUT/分段并行上传数
+        self.r2_multipart_threshold_mb = int(os.getenv("TTS_R2_MULTIPART_THRESHOLD_MB", "16"))  # 超过该大小使用分段上传
+        self.r2_part_size_mb = int(os.getenv("TTS_R2_PART_SIZE_MB", "8"))  # 分段大小（R2/S3要求除最后一段外不小于5MB）
+        self.r2_max_retries = int(os.getenv("TTS_R2_MAX_RETRIES", "3"))  # 请求失败（连接错误/5xx/429）重试次数
+        self.upload_tts_audio = os.getenv("TTS_UPLOAD_TTS_AUDIO", "true").lower() == "true"  # 存储已配置时句子音频上传到R2，audioKey返回对象key
+        
+        # 全局上传调度器：所有任务共享并发/带宽预算，播放列表与首批片段优先，任务间公平轮询
+        self.upload_max_concurrency = int(os.getenv("TTS_UPLOAD_MAX_CONCURRENCY", "6"))  # 同时进行的上传批次数
+        self.upload_bandwidth_mbps = float(os.getenv("TTS_UPLOAD_BANDWIDTH_MBPS", "0"))  # 上行带宽预算（Mbit/s），0表示不限
+        self.upload_priority_segments = int(os.getenv("TTS_UPLOAD_PRIORITY_SEGMENTS", "3"))  # 每个任务前N个片段按最高优先级上传
+        self.upload_batch_small_kb = int(os.getenv("TTS_UPLOAD_BATCH_SMALL_KB", "512"))  # 小于该大小的对象合批派发
+        self.upload_batch_max_items = int(os.getenv("TTS_UPLOAD_BATCH_MAX_ITEMS", "8"))  # 每批最多对象数
+        self.upload_fair_quantum_kb = int(os.getenv("TTS_UPLOAD_FAIR_QUANTUM_KB", "1024"))  # 任务间公平调度的每轮字节配额
+        self.upload_job_retries = int(os.getenv("TTS_UPLOAD_JOB_RETRIES", "2"))  # 客户端重试耗尽后重新排队次数
+        self.upload_backlog_warn_mb = int(os.getenv("TTS_UPLOAD_BACKLOG_WARN_MB", "256"))  # 排队字节超过该值时告警（提交不阻塞）
+        
+        # 参考音频样本缓存
+        self.audio_cache_dir = os.getenv("TTS_AUDIO_CACHE_DIR", "/tmp/tts_audio_cache")
+        self.audio_cache_max_mb = int(os.getenv("TTS_AUDIO_CACHE_MAX_MB", "1024"))  # 缓存字节预算，0表示不限制
+        self.audio_cache_revalidate_seconds = int(os.getenv("TTS_AUDIO_CACHE_REVALIDATE_SECONDS", "3600"))  # 超过该时间向源站条件请求验证
+        self.audio_cache_pcm_sidecar = os.getenv("TTS_AUDIO_CACHE_PCM_SIDECAR", "true").lower() == "true"  # 缓存解码后的24kHz PCM
         
         # 新增：缺失字段补齐
         self.cleanup_temp_files = os.getenv("CLEANUP_TEMP_FILES", "false").lower() == "true"
@@ -124,6 +212,11 @@ class SynthesisConfig:
                 'save_audio': self.tts.save_audio,
                 'cleanup_temp_files': self.tts.cleanup_temp_files,
                 'model_path': self.tts.model_path,
+                'task_cleanup_timeout': self.tts.task_cleanup_timeout,
+                'persist_task_context': self.tts.persist_task_context,
+                'task_disk_budget_mb': self.tts.task_disk_budget_mb,
+                'task_memory_budget_mb': self.tts.task_memory_budget_mb,
+                'audio_cache_max_mb': self.tts.audio_cache_max_mb,
             },
             'paths': {
                 'base_dir': str(self.paths.base_dir),
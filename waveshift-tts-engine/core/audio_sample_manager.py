@@ -2,78 +2,188 @@
 音频样本管理器 - 负责从URL下载音频到本地并提供缓存
 """
 import os
+import json
+import time
 import asyncio
 import hashlib
 import logging
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Set
 import aiohttp
 import aiofiles
+from utils.executors import POOL_DSP, POOL_IO, run_in_pool
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class CacheEntry:
+    """缓存索引条目"""
+    url: str
+    filename: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    last_access: float = 0.0
+    validated_at: float = 0.0
+    pcm_filename: Optional[str] = None
+    pcm_size: int = 0
+
+    @property
+    def total_size(self) -> int:
+        return self.size + self.pcm_size
+
+
 class AudioSampleManager:
     """
     音频样本管理器
-    - 支持从HTTP URL下载音频文件
-    - 提供本地缓存避免重复下载
-    - 自动管理临时文件生命周期
+    - 支持从HTTP URL下载音频文件（共享keep-alive连接池，流式写盘）
+    - 按字节预算的LRU磁盘缓存，索引持久化在缓存目录的 index.json
+    - 基于 ETag / Last-Modified 的条件请求重新验证
+    - 可选的解码PCM旁路文件（24kHz float32 .npy，可内存映射），热门参考音频无需重复解码
+    - 使用方（请求/批次/配音会话）按 owner 引用条目：被引用的条目不淘汰、不重新验证，
+      排队中的句子持有的路径在使用前不会被删除或替换；使用方结束时 release(owner)
     """
-    
-    def __init__(self, cache_dir: Optional[Path] = None):
+
+    INDEX_FILENAME = "index.json"
+    PCM_SAMPLE_RATE = 24000
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_cache_bytes: int = 1024 * 1024 * 1024,
+        revalidate_after: float = 3600.0,
+        enable_pcm_sidecar: bool = True,
+        max_connections: int = 16
+    ):
         """
         初始化音频样本管理器
-        
+
         Args:
             cache_dir: 缓存目录，如果为None则使用临时目录
+            max_cache_bytes: 缓存字节预算（含PCM旁路文件），0表示不限制
+            revalidate_after: 缓存条目经过多少秒后需要向源站重新验证
+            enable_pcm_sidecar: 是否生成解码后的PCM旁路文件
+            max_connections: 共享连接池的最大连接数
         """
         if cache_dir is None:
             # 使用/tmp下的缓存目录
             cache_dir = Path("/tmp/tts_audio_cache")
-        
+
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        
-        # URL到本地路径的映射缓存
-        self._download_cache: Dict[str, str] = {}
-        
-        # 下载锁，避免同一URL被并发下载多次
-        self._download_locks: Dict[str, asyncio.Lock] = {}
-        
-        logger.info(f"音频样本管理器初始化，缓存目录: {self.cache_dir}")
-    
+        self.max_cache_bytes = max_cache_bytes
+        self.revalidate_after = revalidate_after
+        self.enable_pcm_sidecar = enable_pcm_sidecar
+        self.max_connections = max_connections
+
+        # LRU索引：URL -> 缓存条目（按最近访问排序，最旧在前）
+        self._index: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._load_index()
+        self._index_dirty = False
+        self._index_save_task: Optional[asyncio.Task] = None
+
+        # 下载锁，避免同一URL被并发下载多次：URL -> [锁, 引用计数]，无人使用时移除
+        self._download_locks: Dict[str, list] = {}
+        # 使用中的条目：URL -> 引用它的 owner 集合
+        self._pins: Dict[str, Set[str]] = {}
+
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        logger.info(
+            f"音频样本管理器初始化，缓存目录: {self.cache_dir}, 条目: {len(self._index)}, "
+            f"预算: {self.max_cache_bytes // (1024 * 1024) or '不限'}MB"
+        )
+
+    # ================================
+    # 索引
+    # ================================
+
+    def _load_index(self):
+        """从磁盘加载缓存索引，丢弃文件已不存在的条目"""
+        index_path = self.cache_dir / self.INDEX_FILENAME
+        if not index_path.exists():
+            return
+        try:
+            entries = [CacheEntry(**item) for item in json.loads(index_path.read_text())]
+        except Exception as e:
+            logger.warning(f"缓存索引损坏，重建索引: {e}")
+            return
+        for entry in sorted(entries, key=lambda e: e.last_access):
+            if not (self.cache_dir / entry.filename).exists():
+                continue
+            if entry.pcm_filename and not (self.cache_dir / entry.pcm_filename).exists():
+                entry.pcm_filename, entry.pcm_size = None, 0
+            self._index[entry.url] = entry
+
+    def _write_index(self, entries: List[dict]):
+        """原子写入索引文件"""
+        index_path = self.cache_dir / self.INDEX_FILENAME
+        tmp_path = index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(entries))
+        os.replace(tmp_path, index_path)
+
+    def _schedule_index_save(self):
+        """合并短时间内的多次修改，后台写回索引"""
+        self._index_dirty = True
+        if self._index_save_task is None or self._index_save_task.done():
+            self._index_save_task = asyncio.create_task(self._save_index_later())
+
+    async def _save_index_later(self, delay: float = 1.0):
+        await asyncio.sleep(delay)
+        if not self._index_dirty:
+            return
+        self._index_dirty = False
+        snapshot = [asdict(entry) for entry in self._index.values()]
+        try:
+            await run_in_pool(POOL_IO, self._write_index, snapshot)
+        except Exception as e:
+            logger.error(f"写入缓存索引失败: {e}")
+
+    def _touch(self, entry: CacheEntry):
+        entry.last_access = time.time()
+        self._index.move_to_end(entry.url)
+        self._schedule_index_save()
+
+    # ================================
+    # 公共接口
+    # ================================
+
     def _get_cache_filename(self, url: str) -> str:
         """
         根据URL生成缓存文件名
-        
+
         Args:
             url: 音频URL
-            
+
         Returns:
             缓存文件名
         """
         # 使用URL的MD5作为文件名，保留扩展名
         url_hash = hashlib.md5(url.encode()).hexdigest()
-        
+
         # 尝试从URL中提取扩展名
         ext = ".wav"  # 默认扩展名
         if "." in url.split("/")[-1]:
             ext = "." + url.split(".")[-1].split("?")[0]  # 处理带参数的URL
             if ext not in [".wav", ".mp3", ".aac", ".m4a", ".flac"]:
                 ext = ".wav"  # 不识别的扩展名使用默认值
-        
+
         return f"{url_hash}{ext}"
-    
-    async def get_local_path(self, audio_source: str) -> str:
+
+    async def get_local_path(self, audio_source: str, owner: Optional[str] = None) -> str:
         """
         获取音频的本地路径（从URL下载或从缓存获取）
-        
+
         Args:
             audio_source: 音频源，可以是本地路径或HTTP URL
-            
+            owner: 使用方标识；指定时条目被该使用方引用，直到 release(owner)
+
         Returns:
             本地文件路径
-            
+
         Raises:
             Exception: 下载失败时抛出异常
         """
@@ -85,91 +195,244 @@ class AudioSampleManager:
             else:
                 logger.warning(f"本地音频文件不存在: {audio_source}")
                 raise FileNotFoundError(f"音频文件不存在: {audio_source}")
-        
-        # 检查内存缓存
-        if audio_source in self._download_cache:
-            cached_path = self._download_cache[audio_source]
-            if Path(cached_path).exists():
-                logger.debug(f"使用缓存的音频文件: {cached_path}")
-                return cached_path
-            else:
-                # 缓存文件已被删除，清理内存缓存
-                del self._download_cache[audio_source]
-        
-        # 获取或创建该URL的下载锁
-        if audio_source not in self._download_locks:
-            self._download_locks[audio_source] = asyncio.Lock()
-        
-        lock = self._download_locks[audio_source]
-        
-        async with lock:
-            # 再次检查（可能其他协程已经下载完成）
-            if audio_source in self._download_cache:
-                cached_path = self._download_cache[audio_source]
-                if Path(cached_path).exists():
-                    return cached_path
-            
-            # 下载音频文件
-            filename = self._get_cache_filename(audio_source)
-            local_path = self.cache_dir / filename
-            
-            # 如果文件已存在（之前下载过但不在内存缓存中）
+
+        if owner is not None:
+            # 先登记引用：下载/验证期间其他协程触发的淘汰也会跳过该条目
+            self.pin(audio_source, owner)
+
+        entry = self._index.get(audio_source)
+        if entry is not None and not self._needs_revalidation(entry):
+            local_path = self.cache_dir / entry.filename
             if local_path.exists():
-                logger.info(f"发现已下载的音频文件: {local_path}")
-                self._download_cache[audio_source] = str(local_path)
+                logger.debug(f"使用缓存的音频文件: {local_path}")
+                self._touch(entry)
                 return str(local_path)
-            
-            # 执行下载
-            logger.info(f"开始下载音频: {audio_source}")
+
+        async with self._url_lock(audio_source):
+            # 再次检查（可能其他协程已经下载或验证完成）
+            entry = self._index.get(audio_source)
+            if entry is not None and not (self.cache_dir / entry.filename).exists():
+                self._drop_entry(entry)
+                entry = None
+
+            if entry is not None and not self._needs_revalidation(entry):
+                self._touch(entry)
+                return str(self.cache_dir / entry.filename)
+
             try:
-                await self._download_file(audio_source, local_path)
-                self._download_cache[audio_source] = str(local_path)
-                logger.info(f"音频下载完成: {local_path} (大小: {local_path.stat().st_size} bytes)")
-                return str(local_path)
+                entry = await self._fetch(audio_source, entry)
             except Exception as e:
+                if entry is not None:
+                    # 源站不可达时继续使用已缓存的旧版本
+                    logger.warning(f"重新验证失败，使用缓存版本: {audio_source}, 错误: {e}")
+                    self._touch(entry)
+                    return str(self.cache_dir / entry.filename)
                 logger.error(f"下载音频失败: {audio_source}, 错误: {e}")
-                # 清理可能的部分下载文件
-                if local_path.exists():
-                    local_path.unlink()
                 raise
-    
-    async def _download_file(self, url: str, local_path: Path, 
-                            timeout: int = 30, 
-                            max_retries: int = 3) -> None:
+
+            self._touch(entry)
+            await self._evict_if_needed(keep=audio_source)
+            return str(self.cache_dir / entry.filename)
+
+    async def get_prompt_path(self, audio_source: str, owner: Optional[str] = None) -> str:
+        """
+        获取供TTS模型使用的参考音频路径
+        启用PCM旁路文件时返回已解码的 24kHz float32 .npy（可内存映射），否则返回原始音频路径
+        owner 指定时条目（含旁路文件）被该使用方引用，直到 release(owner)
+        """
+        local_path = await self.get_local_path(audio_source, owner)
+        if not self.enable_pcm_sidecar:
+            return local_path
+        try:
+            return await self.get_pcm_path(audio_source, local_path)
+        except Exception as e:
+            logger.warning(f"生成PCM旁路文件失败，使用原始音频: {local_path}, 错误: {e}")
+            return local_path
+
+    async def get_pcm_path(self, audio_source: str, local_path: Optional[str] = None) -> str:
+        """获取（必要时生成）解码后的PCM旁路文件路径"""
+        if local_path is None:
+            local_path = await self.get_local_path(audio_source)
+
+        entry = self._index.get(audio_source)
+        if entry is None:
+            # 本地路径来源：旁路文件放在缓存目录，按路径哈希命名，不计入索引
+            key = hashlib.md5(os.path.abspath(local_path).encode()).hexdigest()
+            pcm_path = self.cache_dir / f"{key}.{self.PCM_SAMPLE_RATE}.npy"
+            if not pcm_path.exists():
+                await run_in_pool(POOL_DSP, self._decode_to_npy, local_path, pcm_path)
+            return str(pcm_path)
+
+        if entry.pcm_filename and (self.cache_dir / entry.pcm_filename).exists():
+            return str(self.cache_dir / entry.pcm_filename)
+
+        async with self._url_lock(audio_source):
+            if entry.pcm_filename and (self.cache_dir / entry.pcm_filename).exists():
+                return str(self.cache_dir / entry.pcm_filename)
+            pcm_filename = f"{Path(entry.filename).stem}.{self.PCM_SAMPLE_RATE}.npy"
+            pcm_path = self.cache_dir / pcm_filename
+            await run_in_pool(POOL_DSP, self._decode_to_npy, str(self.cache_dir / entry.filename), pcm_path)
+            entry.pcm_filename = pcm_filename
+            entry.pcm_size = pcm_path.stat().st_size
+            self._schedule_index_save()
+            await self._evict_if_needed(keep=audio_source)
+            return str(pcm_path)
+
+    def _decode_to_npy(self, audio_path: str, pcm_path: Path):
+        """解码为 24kHz 单声道 float32 并保存为 .npy"""
+        import numpy as np
+        import librosa
+
+        audio, _ = librosa.load(audio_path, sr=self.PCM_SAMPLE_RATE, mono=True)
+        tmp_path = pcm_path.with_suffix(".tmp.npy")
+        np.save(tmp_path, np.ascontiguousarray(audio, dtype=np.float32))
+        os.replace(tmp_path, pcm_path)
+        logger.debug(f"PCM旁路文件已生成: {pcm_path} ({len(audio)} samples)")
+
+    # ================================
+    # 下载与重新验证
+    # ================================
+
+    def pin(self, audio_source: str, owner: str) -> None:
+        """登记 owner 对条目的引用（本地路径来源不受缓存管理，忽略）"""
+        if audio_source.startswith(("http://", "https://")):
+            self._pins.setdefault(audio_source, set()).add(owner)
+
+    async def release(self, owner: str) -> None:
+        """释放 owner 的全部引用；之前因被引用而未淘汰的条目在此补做淘汰"""
+        released = False
+        for url in list(self._pins):
+            owners = self._pins[url]
+            if owner in owners:
+                owners.discard(owner)
+                released = True
+                if not owners:
+                    del self._pins[url]
+        if released:
+            await self._evict_if_needed()
+
+    def _needs_revalidation(self, entry: CacheEntry) -> bool:
+        if self.revalidate_after <= 0:
+            return False
+        if entry.url in self._pins:
+            # 使用中的条目不替换内容（替换会删除使用方持有的PCM旁路文件）
+            return False
+        if not entry.etag and not entry.last_modified:
+            return False
+        return time.time() - entry.validated_at > self.revalidate_after
+
+    def _url_lock(self, url: str):
+        """按URL获取下载锁，引用计数归零时自动移除"""
+        manager = self
+
+        class _LockContext:
+            async def __aenter__(self_inner):
+                self_inner.slot = manager._download_locks.setdefault(url, [asyncio.Lock(), 0])
+                self_inner.slot[1] += 1
+                await self_inner.slot[0].acquire()
+
+            async def __aexit__(self_inner, exc_type, exc_val, exc_tb):
+                self_inner.slot[0].release()
+                self_inner.slot[1] -= 1
+                if self_inner.slot[1] == 0:
+                    manager._download_locks.pop(url, None)
+
+        return _LockContext()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """共享的keep-alive连接池"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _fetch(self, url: str, entry: Optional[CacheEntry]) -> CacheEntry:
+        """下载或条件请求重新验证，返回最新的缓存条目"""
+        filename = self._get_cache_filename(url)
+        local_path = self.cache_dir / filename
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        if entry is None:
+            logger.info(f"开始下载音频: {url}")
+
+        status, etag, last_modified = await self._download_file(url, local_path, headers=headers)
+        now = time.time()
+
+        if status == 304 and entry is not None:
+            logger.debug(f"缓存仍然有效(304): {url}")
+            entry.validated_at = now
+            return entry
+
+        if entry is not None:
+            # 源站内容已变化，旧的PCM旁路文件失效
+            self._remove_pcm(entry)
+            logger.info(f"源站音频已更新，替换缓存: {url}")
+
+        new_entry = CacheEntry(
+            url=url,
+            filename=filename,
+            size=local_path.stat().st_size,
+            etag=etag,
+            last_modified=last_modified,
+            last_access=now,
+            validated_at=now
+        )
+        self._index[url] = new_entry
+        logger.info(f"音频下载完成: {local_path} (大小: {new_entry.size} bytes)")
+        return new_entry
+
+    async def _download_file(self, url: str, local_path: Path,
+                            timeout: int = 30,
+                            max_retries: int = 3,
+                            headers: Optional[Dict[str, str]] = None):
         """
-        下载文件到本地
-        
+        下载文件到本地（流式写入临时文件后原子替换）
+
         Args:
             url: 文件URL
             local_path: 本地保存路径
             timeout: 超时时间（秒）
             max_retries: 最大重试次数
-            
+            headers: 额外请求头（条件请求）
+
+        Returns:
+            (HTTP状态码, ETag, Last-Modified)
+
         Raises:
             Exception: 下载失败时抛出异常
         """
         retry_count = 0
         last_error = None
-        
+        session = await self._get_session()
+        tmp_path = local_path.with_suffix(local_path.suffix + ".part")
+
         while retry_count < max_retries:
             try:
                 timeout_config = aiohttp.ClientTimeout(total=timeout)
-                async with aiohttp.ClientSession(timeout=timeout_config) as session:
-                    async with session.get(url) as response:
-                        response.raise_for_status()
-                        
-                        # 获取文件大小（如果有）
-                        content_length = response.headers.get('Content-Length')
-                        if content_length:
-                            logger.debug(f"下载文件大小: {int(content_length):,} bytes")
-                        
-                        # 异步写入文件
-                        content = await response.read()
-                        async with aiofiles.open(local_path, 'wb') as f:
-                            await f.write(content)
-                        
-                        return  # 下载成功
-                        
+                async with session.get(url, headers=headers or {}, timeout=timeout_config) as response:
+                    if response.status == 304:
+                        return 304, response.headers.get("ETag"), response.headers.get("Last-Modified")
+                    response.raise_for_status()
+
+                    # 获取文件大小（如果有）
+                    content_length = response.headers.get('Content-Length')
+                    if content_length:
+                        logger.debug(f"下载文件大小: {int(content_length):,} bytes")
+
+                    # 流式异步写入临时文件
+                    async with aiofiles.open(tmp_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(256 * 1024):
+                            await f.write(chunk)
+                    await run_in_pool(POOL_IO, os.replace, tmp_path, local_path)
+
+                    return response.status, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
             except asyncio.TimeoutError:
                 last_error = f"下载超时（{timeout}秒）"
                 logger.warning(f"下载超时，重试 {retry_count + 1}/{max_retries}: {url}")
@@ -179,27 +442,76 @@ class AudioSampleManager:
             except Exception as e:
                 last_error = f"未知错误: {e}"
                 logger.warning(f"下载失败，重试 {retry_count + 1}/{max_retries}: {e}")
-            
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
             retry_count += 1
             if retry_count < max_retries:
                 # 指数退避重试
                 await asyncio.sleep(2 ** retry_count)
-        
+
         # 所有重试都失败
         raise Exception(f"下载失败（重试{max_retries}次后）: {last_error}")
-    
+
+    # ================================
+    # 淘汰与清理
+    # ================================
+
+    def _remove_pcm(self, entry: CacheEntry):
+        if entry.pcm_filename:
+            (self.cache_dir / entry.pcm_filename).unlink(missing_ok=True)
+        entry.pcm_filename, entry.pcm_size = None, 0
+
+    def _remove_files(self, entry: CacheEntry):
+        """删除条目的缓存文件（只操作磁盘，可在线程池中执行）"""
+        (self.cache_dir / entry.filename).unlink(missing_ok=True)
+        self._remove_pcm(entry)
+
+    def _drop_entry(self, entry: CacheEntry):
+        """删除条目及其文件"""
+        self._index.pop(entry.url, None)
+        self._remove_files(entry)
+        self._schedule_index_save()
+
+    async def _evict_if_needed(self, keep: Optional[str] = None):
+        """超出字节预算时按LRU顺序淘汰条目"""
+        if self.max_cache_bytes <= 0:
+            return
+        total = sum(entry.total_size for entry in self._index.values())
+        if total <= self.max_cache_bytes:
+            return
+
+        evicted = 0
+        for url in list(self._index.keys()):
+            if total <= self.max_cache_bytes:
+                break
+            if url == keep or url in self._download_locks or url in self._pins:
+                continue
+            # 索引只在事件循环中修改，线程池中只删除文件
+            entry = self._index.pop(url, None)
+            if entry is None:
+                continue
+            total -= entry.total_size
+            self._schedule_index_save()
+            await run_in_pool(POOL_IO, self._remove_files, entry)
+            evicted += 1
+
+        if evicted:
+            logger.info(f"音频缓存超出预算，淘汰 {evicted} 个条目，当前占用 {total / (1024 * 1024):.1f}MB")
+
     def clear_cache(self, keep_recent: bool = False) -> int:
         """
         清理缓存目录
-        
+
         Args:
             keep_recent: 是否保留最近使用的文件
-            
+
         Returns:
             清理的文件数量
         """
         count = 0
-        
+
         if not keep_recent:
             # 清理所有缓存文件
             for file_path in self.cache_dir.glob("*"):
@@ -209,30 +521,29 @@ class AudioSampleManager:
                         count += 1
                     except Exception as e:
                         logger.error(f"删除缓存文件失败: {file_path}, 错误: {e}")
-            
-            # 清空内存缓存
-            self._download_cache.clear()
+
+            # 清空索引
+            self._index.clear()
         else:
-            # 基于时间的清理策略（保留最近使用的文件）
-            import time
+            # 基于访问时间的清理策略（删除1小时内未被访问的条目）
             current_time = time.time()
-            for file_path in self.cache_dir.glob("*"):
-                if file_path.is_file():
-                    # 删除1小时前的文件
-                    if current_time - file_path.stat().st_mtime > 3600:
-                        try:
-                            file_path.unlink()
-                            count += 1
-                        except Exception as e:
-                            logger.error(f"删除缓存文件失败: {file_path}, 错误: {e}")
-        
+            for entry in list(self._index.values()):
+                if current_time - entry.last_access > 3600 and entry.url not in self._pins:
+                    count += 1 + (1 if entry.pcm_filename else 0)
+                    self._drop_entry(entry)
+
+        try:
+            self._write_index([asdict(entry) for entry in self._index.values()])
+        except Exception as e:
+            logger.error(f"写入缓存索引失败: {e}")
+
         logger.info(f"清理了 {count} 个缓存文件")
         return count
-    
+
     def get_cache_size(self) -> int:
         """
         获取缓存目录的总大小（字节）
-        
+
         Returns:
             缓存大小（字节）
         """
@@ -241,25 +552,38 @@ class AudioSampleManager:
             if file_path.is_file():
                 total_size += file_path.stat().st_size
         return total_size
-    
+
     def get_cache_info(self) -> dict:
         """
         获取缓存信息
-        
+
         Returns:
             缓存信息字典
         """
         file_count = len(list(self.cache_dir.glob("*")))
         cache_size = self.get_cache_size()
-        
+
         return {
             "cache_dir": str(self.cache_dir),
             "file_count": file_count,
             "cache_size_bytes": cache_size,
             "cache_size_mb": round(cache_size / (1024 * 1024), 2),
-            "memory_cache_count": len(self._download_cache)
+            "budget_mb": round(self.max_cache_bytes / (1024 * 1024), 2),
+            "index_count": len(self._index),
+            "pcm_sidecar_count": sum(1 for e in self._index.values() if e.pcm_filename),
+            "active_downloads": len(self._download_locks),
+            "pinned_count": len(self._pins)
         }
 
+    async def close(self):
+        """关闭连接池并写回索引"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._index_dirty:
+            self._index_dirty = False
+            await run_in_pool(POOL_IO, self._write_index, [asdict(e) for e in self._index.values()])
+
 
 # 全局实例（可选）
 _global_manager: Optional[AudioSampleManager] = None
@@ -267,11 +591,18 @@ _global_manager: Optional[AudioSampleManager] = None
 def get_audio_sample_manager() -> AudioSampleManager:
     """
     获取全局音频样本管理器实例
-    
+
     Returns:
         AudioSampleManager实例
     """
     global _global_manager
     if _global_manager is None:
-        _global_manager = AudioSampleManager()
-    return _global_manager
\ No newline at end of file
+        from config import get_config
+        config = get_config()
+        _global_manager = AudioSampleManager(
+            cache_dir=Path(config.tts.audio_cache_dir),
+            max_cache_bytes=config.tts.audio_cache_max_mb * 1024 * 1024,
+            revalidate_after=config.tts.audio_cache_revalidate_seconds,
+            enable_pcm_sidecar=config.tts.audio_cache_pcm_sidecar
+        )
+    return _global_manager
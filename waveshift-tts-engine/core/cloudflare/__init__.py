@@ -0,0 +1,19 @@
+"""
+Cloudflare 存储与数据库客户端
+- R2Client: S3 兼容对象存储（共享连接池、分段上传）
+- UploadScheduler: 全局上传调度（跨任务公平、优先级、合批、带宽预算）
+- R2HLSStorageManager: HLS 片段/播放列表与成品文件的存储布局
+- D1Client: D1 HTTP 查询接口
+"""
+from core.cloudflare.r2_client import R2Client, get_r2_client
+from core.cloudflare.upload_scheduler import UploadPriority, UploadScheduler, get_upload_scheduler
+from core.cloudflare.r2_hls_storage_manager import (
+    R2HLSStorageManager, get_hls_storage_manager, publish_rendition_outputs
+)
+from core.cloudflare.d1_client import D1Client
+
+__all__ = [
+    "R2Client", "get_r2_client", "UploadPriority", "UploadScheduler", "get_upload_scheduler",
+    "R2HLSStorageManager", "get_hls_storage_manager", "publish_rendition_outputs",
+    "D1Client"
+]
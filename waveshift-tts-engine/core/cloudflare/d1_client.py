@@ -0,0 +1,57 @@
+"""
+D1 客户端 - Cloudflare D1 HTTP 查询接口
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+
+from core.exceptions import StorageError
+
+logger = logging.getLogger(__name__)
+
+_API_BASE = "https://api.cloudflare.com/client/v4"
+
+
+class D1Client:
+    """D1 数据库查询（未配置时 is_configured 为 False，查询抛出 StorageError）"""
+
+    def __init__(self, account_id: str = "", api_token: str = "", database_id: str = "", timeout: float = 30.0):
+        self.account_id = account_id
+        self.api_token = api_token
+        self.database_id = database_id
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.account_id and self.api_token and self.database_id)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def query(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """
+        执行 SQL
+
+        Returns:
+            结果行列表
+        """
+        if not self.is_configured:
+            raise StorageError("D1未配置")
+        session = await self._get_session()
+        url = f"{_API_BASE}/accounts/{self.account_id}/d1/database/{self.database_id}/query"
+        headers = {"Authorization": f"Bearer {self.api_token}"}
+        async with session.post(url, json={"sql": sql, "params": list(params)}, headers=headers) as response:
+            payload = await response.json(content_type=None)
+        if response.status != 200 or not payload.get("success"):
+            raise StorageError(f"D1查询失败: HTTP {response.status} {payload.get('errors')}")
+        results = payload.get("result") or []
+        return results[0].get("results", []) if results else []
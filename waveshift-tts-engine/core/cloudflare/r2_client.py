@@ -0,0 +1,395 @@
+"""
+R2 客户端 - S3 兼容 API 的异步实现（aiohttp + SigV4 签名）
+- 全局共享一个连接池（keep-alive），HLS 片段、播放列表、成品视频与句子音频共用
+- 小对象单次 PUT，可批量并行；大文件分段上传，分段并行、失败时中止上传
+- 连接错误、5xx 与 429 按指数退避重试
+- 只依赖 S3 协议本身，可对本地替身服务器（tests/local_s3_server.py）测试
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import quote, urlsplit
+
+import aiohttp
+from yarl import URL
+
+from core.exceptions import StorageError
+from utils.executors import POOL_IO, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+_UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".vtt": "text/vtt",
+    ".wav": "audio/wav",
+    ".aac": "audio/aac",
+}
+
+
+def guess_content_type(path: Union[str, Path]) -> str:
+    """按扩展名推断对象的 Content-Type"""
+    return _CONTENT_TYPES.get(Path(path).suffix.lower(), "application/octet-stream")
+
+
+def _sign(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+class R2Client:
+    """
+    S3 兼容对象存储客户端（路径风格寻址：<endpoint>/<bucket>/<key>）
+    实例在事件循环内懒创建连接池，可被多个任务共享
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        access_key_id: str,
+        secret_access_key: str,
+        region: str = "auto",
+        public_url: str = "",
+        max_connections: int = 16,
+        upload_concurrency: int = 8,
+        multipart_threshold: int = 16 * 1024 * 1024,
+        part_size: int = 8 * 1024 * 1024,
+        max_retries: int = 3,
+        timeout: float = 120.0
+    ):
+        """
+        Args:
+            endpoint: S3 兼容端点（如 https://<account>.r2.cloudflarestorage.com）
+            bucket: 存储桶
+            access_key_id / secret_access_key: 访问密钥
+            region: 签名区域（R2 为 auto）
+            public_url: 公共访问域名，为空时使用端点URL
+            max_connections: 共享连接池上限
+            upload_concurrency: 并行 PUT / 并行分段数
+            multipart_threshold: 超过该字节数的文件使用分段上传
+            part_size: 分段大小（字节）
+            max_retries: 可重试错误的重试次数
+            timeout: 单个请求超时（秒）
+        """
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+        self.public_url = public_url.rstrip("/")
+        self.max_connections = max_connections
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.multipart_threshold = multipart_threshold
+        self.part_size = max(5 * 1024 * 1024, part_size)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._host = urlsplit(self.endpoint).netloc
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.endpoint and self.bucket and self.access_key_id and self.secret_access_key)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的连接池会话（懒创建，需在事件循环内调用）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(total=self.timeout, connect=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def object_url(self, key: str) -> str:
+        return f"{self.endpoint}/{self.bucket}/{_quote(key, safe='/-_.~')}"
+
+    def public_url_for(self, key: str) -> str:
+        """对象的公共访问URL"""
+        if self.public_url:
+            return f"{self.public_url}/{_quote(key, safe='/-_.~')}"
+        return self.object_url(key)
+
+    # ================================
+    # 签名与请求
+    # ================================
+
+    def _signed_headers(
+        self,
+        method: str,
+        key: str,
+        query: Dict[str, str],
+        headers: Dict[str, str],
+        payload_hash: str
+    ) -> Dict[str, str]:
+        """AWS Signature Version 4 请求头"""
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+
+        all_headers = {k.lower(): str(v).strip() for k, v in headers.items()}
+        all_headers["host"] = self._host
+        all_headers["x-amz-date"] = amz_date
+        all_headers["x-amz-content-sha256"] = payload_hash
+        signed_names = sorted(all_headers)
+        canonical_headers = "".join(f"{name}:{all_headers[name]}\n" for name in signed_names)
+        canonical_query = "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items()))
+        canonical_uri = "/" + _quote(self.bucket) + ("/" + _quote(key, safe="/-_.~") if key else "")
+        canonical_request = "\n".join([
+            method, canonical_uri, canonical_query, canonical_headers, ";".join(signed_names), payload_hash
+        ])
+
+        scope = f"{date_stamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        signing_key = _sign(("AWS4" + self.secret_access_key).encode("utf-8"), date_stamp)
+        for part in (self.region, "s3", "aws4_request"):
+            signing_key = _sign(signing_key, part)
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        all_headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key_id}/{scope}, "
+            f"SignedHeaders={';'.join(signed_names)}, Signature={signature}"
+        )
+        all_headers.pop("host")
+        return all_headers
+
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        query: Optional[Dict[str, str]] = None,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        allow_statuses: Sequence[int] = ()
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        发送签名请求，可重试错误按指数退避重试
+
+        Returns:
+            (状态码, 响应头, 响应体)；2xx 与 allow_statuses 之外的状态抛出 StorageError
+        """
+        if not self.is_configured:
+            raise StorageError("R2存储未配置")
+        query = query or {}
+        session = await self._get_session()
+        url = self.object_url(key) if key else f"{self.endpoint}/{self.bucket}"
+        if query:
+            # 查询串按签名时的规范形式编码，避免客户端重新编码导致签名不一致
+            url += "?" + "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items()))
+        url = URL(url, encoded=True)
+        attempt = 0
+        while True:
+            signed = self._signed_headers(method, key, query, headers or {}, _UNSIGNED_PAYLOAD)
+            try:
+                async with session.request(method, url, data=data, headers=signed) as response:
+                    body = await response.read()
+                    status = response.status
+                    if 200 <= status < 300 or status in allow_statuses:
+                        return status, dict(response.headers), body
+                    error = f"{method} {key} 失败: HTTP {status} {body[:200].decode('utf-8', 'replace')}"
+                    if status not in _RETRY_STATUSES:
+                        raise StorageError(error)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                error = f"{method} {key} 连接失败: {e}"
+            attempt += 1
+            if attempt > self.max_retries:
+                raise StorageError(error)
+            delay = min(0.5 * 2 ** attempt, 10)
+            logger.warning(f"R2请求失败，{delay:.1f}s 后重试 {attempt}/{self.max_retries}: {error}")
+            await asyncio.sleep(delay)
+
+    # ================================
+    # 对象操作
+    # ================================
+
+    async def put_object(
+        self,
+        key: str,
+        data: bytes,
+        content_type: Optional[str] = None,
+        cache_control: Optional[str] = None
+    ) -> str:
+        """
+        单次 PUT 上传对象
+
+        Returns:
+            ETag
+        """
+        headers = {"Content-Type": content_type or guess_content_type(key)}
+        if cache_control:
+            headers["Cache-Control"] = cache_control
+        _, response_headers, _ = await self._request("PUT", key, data=data, headers=headers)
+        return response_headers.get("ETag", "")
+
+    async def get_object(self, key: str) -> Optional[bytes]:
+        """下载对象内容，不存在时返回 None"""
+        status, _, body = await self._request("GET", key, allow_statuses=(404,))
+        return None if status == 404 else body
+
+    async def head_object(self, key: str) -> Optional[Dict[str, str]]:
+        """对象元数据，不存在时返回 None"""
+        status, headers, _ = await self._request("HEAD", key, allow_statuses=(404,))
+        return None if status == 404 else headers
+
+    async def delete_object(self, key: str) -> None:
+        await self._request("DELETE", key, allow_statuses=(404,))
+
+    async def upload_file(
+        self,
+        key: str,
+        path: Union[str, Path],
+        content_type: Optional[str] = None,
+        cache_control: Optional[str] = None
+    ) -> str:
+        """
+        上传本地文件：小于分段阈值时单次 PUT，否则分段并行上传
+
+        Returns:
+            ETag
+        """
+        size = await run_in_pool(POOL_IO, os.path.getsize, path)
+        content_type = content_type or guess_content_type(path)
+        if size < self.multipart_threshold:
+            data = await run_in_pool(POOL_IO, Path(path).read_bytes)
+            return await self.put_object(key, data, content_type, cache_control)
+        return await self._multipart_upload(key, Path(path), size, content_type, cache_control)
+
+    async def upload_files(
+        self,
+        items: Sequence[Tuple[str, Union[str, Path]]],
+        cache_control: Optional[str] = None
+    ) -> List[Optional[BaseException]]:
+        """
+        并行上传多个文件（并发数 upload_concurrency）
+
+        Args:
+            items: [(key, 本地路径), ...]
+
+        Returns:
+            与 items 对应的结果：成功为 None，失败为异常
+        """
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+
+        async def _upload(key: str, path: Union[str, Path]) -> None:
+            async with semaphore:
+                await self.upload_file(key, path, cache_control=cache_control)
+
+        results = await asyncio.gather(*(_upload(key, path) for key, path in items), return_exceptions=True)
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    async def _multipart_upload(
+        self,
+        key: str,
+        path: Path,
+        size: int,
+        content_type: str,
+        cache_control: Optional[str]
+    ) -> str:
+        """分段上传：创建 -> 并行上传各分段 -> 完成；任一分段失败时中止"""
+        headers = {"Content-Type": content_type}
+        if cache_control:
+            headers["Cache-Control"] = cache_control
+        _, _, body = await self._request("POST", key, query={"uploads": ""}, headers=headers)
+        upload_id = _xml_text(body, "UploadId")
+        if not upload_id:
+            raise StorageError(f"创建分段上传失败: {key}")
+
+        part_count = (size + self.part_size - 1) // self.part_size
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+
+        async def _upload_part(number: int) -> Tuple[int, str]:
+            async with semaphore:
+                offset = (number - 1) * self.part_size
+                data = await run_in_pool(POOL_IO, _read_range, path, offset, min(self.part_size, size - offset))
+                _, response_headers, _ = await self._request(
+                    "PUT", key, query={"partNumber": str(number), "uploadId": upload_id}, data=data
+                )
+                return number, response_headers.get("ETag", "")
+
+        try:
+            parts = await asyncio.gather(*(_upload_part(n) for n in range(1, part_count + 1)))
+            complete = "<CompleteMultipartUpload>" + "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>" for number, etag in parts
+            ) + "</CompleteMultipartUpload>"
+            _, _, body = await self._request(
+                "POST", key, query={"uploadId": upload_id}, data=complete.encode("utf-8"),
+                headers={"Content-Type": "application/xml"}
+            )
+            if b"<Error>" in body:
+                raise StorageError(f"完成分段上传失败: {body[:200].decode('utf-8', 'replace')}")
+        except BaseException:
+            try:
+                await self._request("DELETE", key, query={"uploadId": upload_id}, allow_statuses=(404,))
+            except Exception as e:
+                logger.warning(f"中止分段上传失败: {key}, {e}")
+            raise
+        logger.info(f"分段上传完成: {key}, {size / 1024 / 1024:.1f}MB, {part_count} 段")
+        return _xml_text(body, "ETag") or ""
+
+
+def _read_range(path: Path, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _xml_text(body: bytes, tag: str) -> Optional[str]:
+    """读取 S3 XML 响应中首个指定标签的文本（忽略命名空间）"""
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return None
+    for element in root.iter():
+        if element.tag.rsplit("}", 1)[-1] == tag:
+            return element.text
+    return None
+
+
+# 全局单例
+_r2_client: Optional[R2Client] = None
+
+
+def get_r2_client() -> R2Client:
+    """获取全局 R2 客户端（未配置时 is_configured 为 False）"""
+    global _r2_client
+    if _r2_client is None:
+        from config import get_config
+        config = get_config().tts
+        endpoint = config.r2_endpoint
+        if not endpoint and config.r2_account_id:
+            endpoint = f"https://{config.r2_account_id}.r2.cloudflarestorage.com"
+        _r2_client = R2Client(
+            endpoint=endpoint,
+            bucket=config.r2_bucket,
+            access_key_id=config.r2_access_key_id,
+            secret_access_key=config.r2_secret_access_key,
+            region=config.r2_region,
+            public_url=config.r2_public_url,
+            max_connections=config.r2_max_connections,
+            upload_concurrency=config.r2_upload_concurrency,
+            multipart_threshold=config.r2_multipart_threshold_mb * 1024 * 1024,
+            part_size=config.r2_part_size_mb * 1024 * 1024,
+            max_retries=config.r2_max_retries
+        )
+    return _r2_client
+
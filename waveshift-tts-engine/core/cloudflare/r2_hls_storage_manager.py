@@ -0,0 +1,211 @@
+"""
+R2 HLS 存储管理 - HLS 片段、播放列表与成品文件在 R2 中的布局与上传
+- 片段与播放列表放在 hls/<task_id>/ 下；片段不可变（长缓存），播放列表禁止缓存
+- 分离演绎模式的全部输出（视频/音频/字幕片段与各级播放列表）保持相对路径，平铺在同一前缀下
+- 所有上传经全局上传调度器派发（共享并发/带宽预算）；成品等大文件走分段上传
+- 所有上传共用全局 R2Client 连接池
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from core.cloudflare.r2_client import R2Client, get_r2_client
+from core.cloudflare.upload_scheduler import UploadPriority, UploadScheduler, get_upload_scheduler
+from utils.path_manager import R2PathManager
+from utils.executors import POOL_IO, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PLAYLIST_CACHE_CONTROL = "no-cache"
+
+
+class R2HLSStorageManager:
+    """HLS 存储管理器（结果均为状态字典，不抛出异常）"""
+
+    def __init__(self, config=None, client: Optional[R2Client] = None, scheduler: Optional[UploadScheduler] = None):
+        """
+        Args:
+            config: 兼容参数（存储配置从全局配置读取）
+            client: R2 客户端，None 时使用全局单例
+            scheduler: 上传调度器，None 时使用全局单例（指定 client 时为其单独创建）
+        """
+        self.client = client or get_r2_client()
+        if scheduler is None:
+            scheduler = UploadScheduler(client=client) if client is not None else get_upload_scheduler()
+        self.scheduler = scheduler
+        if not self.client.is_configured:
+            logger.warning("R2存储未配置（R2_ENDPOINT/CLOUDFLARE_ACCOUNT_ID、R2_BUCKET_NAME、访问密钥），HLS文件只保存在本地")
+
+    @property
+    def is_available(self) -> bool:
+        return self.client.is_configured
+
+    def _unavailable(self) -> Dict:
+        return {"status": "error", "message": "R2存储未配置"}
+
+    def segment_key(self, task_id: str, segment_file: Union[str, Path]) -> str:
+        """片段/初始化片段的对象 key（与播放列表同目录）"""
+        return f"{R2PathManager(task_id).hls_prefix}/{Path(segment_file).name}"
+
+    def submit_segments(
+        self,
+        task_id: str,
+        segment_files: Sequence[Union[str, Path]],
+        priority: UploadPriority = UploadPriority.NORMAL
+    ) -> List[asyncio.Future]:
+        """提交片段上传（不等待），返回与 segment_files 对应的 Future"""
+        return [
+            self.scheduler.submit_file(
+                task_id, self.segment_key(task_id, f), f, priority, cache_control=SEGMENT_CACHE_CONTROL
+            )
+            for f in segment_files
+        ]
+
+    async def batch_upload_segments(
+        self,
+        task_id: str,
+        segment_files: Sequence[Union[str, Path]],
+        priority: UploadPriority = UploadPriority.NORMAL
+    ) -> Dict:
+        """
+        上传片段文件并等待完成
+
+        Returns:
+            Dict: status 为 success / partial / error，uploaded_count 与 failed_files
+        """
+        if not self.is_available:
+            return self._unavailable()
+        if not segment_files:
+            return {"status": "success", "uploaded_count": 0, "failed_files": []}
+        results = await asyncio.gather(*self.submit_segments(task_id, segment_files, priority), return_exceptions=True)
+        failed = [str(f) for f, result in zip(segment_files, results) if isinstance(result, BaseException)]
+        uploaded = len(segment_files) - len(failed)
+        status = "success" if not failed else ("partial" if uploaded else "error")
+        return {
+            "status": status,
+            "uploaded_count": uploaded,
+            "failed_files": failed,
+            "message": f"{uploaded}/{len(segment_files)} 个片段已上传"
+        }
+
+    def submit_playlist(self, task_id: str, content: str, key: Optional[str] = None) -> asyncio.Future:
+        """
+        提交播放列表上传（不等待）：在此前提交的片段全部上传成功后派发，未派发的旧版本被合并
+
+        Returns:
+            asyncio.Future: 结果为对象 key
+        """
+        key = key or R2PathManager(task_id).get_playlist_key()
+        return self.scheduler.submit_content(
+            task_id, key, content, UploadPriority.CRITICAL,
+            content_type="application/vnd.apple.mpegurl", cache_control=PLAYLIST_CACHE_CONTROL
+        )
+
+    async def upload_playlist(self, task_id: str, content: str, key: Optional[str] = None) -> Dict:
+        """
+        上传播放列表并等待完成（在此前提交的片段上传成功之后）
+
+        Returns:
+            Dict: status、storage_path、public_url
+        """
+        if not self.is_available:
+            return self._unavailable()
+        try:
+            key = await self.submit_playlist(task_id, content, key)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        return {"status": "success", "storage_path": key, "public_url": self.client.public_url_for(key)}
+
+    def rendition_url(self, task_id: str, file_name: Union[str, Path]) -> str:
+        """分离演绎输出文件（如主播放列表）的公共访问URL"""
+        return self.client.public_url_for(self.segment_key(task_id, file_name))
+
+    async def submit_rendition_outputs(
+        self,
+        task_id: str,
+        files: Sequence[Union[str, Path]],
+        playlists: Sequence[Union[str, Path]] = ()
+    ) -> None:
+        """
+        提交分离演绎输出的上传（不等待）：片段按不可变对象上传，
+        播放列表读取当前内容后提交，在此前提交的片段全部上传成功后派发（未派发的旧版本被合并）
+
+        Args:
+            files: 新生成的片段/初始化片段
+            playlists: 内容有变化的播放列表（主播放列表、媒体播放列表、字幕播放列表）
+        """
+        if not self.is_available:
+            return
+        if files:
+            self.submit_segments(task_id, files)
+
+        def _read(paths: List[Path]) -> List[str]:
+            return [path.read_text(encoding="utf-8") for path in paths]
+
+        paths = [Path(p) for p in playlists]
+        for path, content in zip(paths, await run_in_pool(POOL_IO, _read, paths)):
+            self.submit_playlist(task_id, content, self.segment_key(task_id, path))
+
+    async def get_existing_playlist_content(self, task_id: str) -> Optional[str]:
+        """读取已上传的播放列表（任务恢复），不存在时返回 None"""
+        if not self.is_available:
+            return None
+        data = await self.client.get_object(R2PathManager(task_id).get_playlist_key())
+        return data.decode("utf-8") if data is not None else None
+
+    async def upload_output(self, task_id: str, file_path: Union[str, Path]) -> Dict:
+        """上传成品文件（大文件自动分段上传）"""
+        if not self.is_available:
+            return self._unavailable()
+        key = R2PathManager(task_id).get_output_key(Path(file_path).name)
+        try:
+            await self.scheduler.upload_file(task_id, key, file_path, priority=UploadPriority.BULK)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        return {"status": "success", "storage_path": key, "public_url": self.client.public_url_for(key)}
+
+    async def cleanup_local_files(self, task_id: str, file_paths: List[str]) -> Dict:
+        """删除已上传的本地文件"""
+        def _remove(paths: List[str]) -> int:
+            count = 0
+            for path in paths:
+                try:
+                    os.remove(path)
+                    count += 1
+                except OSError:
+                    pass
+            return count
+
+        cleaned = await run_in_pool(POOL_IO, _remove, list(file_paths))
+        logger.info(f"[{task_id}] 已删除 {cleaned} 个本地HLS文件")
+        return {"status": "success", "cleaned_count": cleaned}
+
+
+# 全局单例
+_hls_storage_manager: Optional[R2HLSStorageManager] = None
+
+
+def get_hls_storage_manager() -> R2HLSStorageManager:
+    """获取全局 HLS 存储管理器（使用全局 R2 客户端与上传调度器）"""
+    global _hls_storage_manager
+    if _hls_storage_manager is None:
+        _hls_storage_manager = R2HLSStorageManager()
+    return _hls_storage_manager
+
+
+async def publish_rendition_outputs(
+    task_id: str,
+    files: Sequence[Union[str, Path]],
+    playlists: Sequence[Union[str, Path]] = ()
+) -> None:
+    """分离演绎输出提交上传（启用 HLS 存储且 R2 已配置时；不等待，失败只记录日志）"""
+    from config import get_config
+    if not get_config().ENABLE_HLS_STORAGE:
+        return
+    try:
+        await get_hls_storage_manager().submit_rendition_outputs(task_id, files, playlists)
+    except Exception as e:
+        logger.warning(f"[{task_id}] 分离演绎输出提交上传失败: {e}")
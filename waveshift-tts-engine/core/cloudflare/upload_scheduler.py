@@ -0,0 +1,536 @@
+"""
+全局上传调度器 - 所有任务共享一个上传预算
+- 全局并发上限（同时进行的上传批次数）与可选的上行带宽预算（令牌桶，欠账模式）
+- 优先级：CRITICAL（播放列表、任务首批片段）> NORMAL（后续片段）> BULK（成品视频、句子音频）
+  有播放列表在等待的任务，其普通片段按 CRITICAL 调度（优先级继承）
+- 同一优先级内按任务做赤字轮询（DRR，按字节计配额），大任务不会饿死小任务
+- 同一任务队首连续的小对象合成一批，占用一个并发槽位，在共享连接池上并行发送
+- 提交接口为同步方法，只入队不等待；排队积压只告警，从不阻塞混音路径
+- 依赖：内容对象（播放列表）可依赖同任务此前提交的文件，依赖全部成功后才派发；
+  同一 key 尚未派发的内容对象合并为最新版本
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Union
+
+from core.cloudflare.r2_client import R2Client, get_r2_client
+from core.exceptions import StorageError
+
+logger = logging.getLogger(__name__)
+
+
+class UploadPriority(IntEnum):
+    """上传优先级（数值越小越优先）"""
+    CRITICAL = 0  # 播放列表、任务首批片段
+    NORMAL = 1  # 后续片段
+    BULK = 2  # 成品视频、句子音频等
+
+
+@dataclass(eq=False)
+class UploadJob:
+    """单个上传对象"""
+    task_id: str
+    key: str
+    priority: UploadPriority
+    future: asyncio.Future
+    path: Optional[Path] = None  # 文件上传
+    data: Optional[bytes] = None  # 内容上传（提交时的快照）
+    size: int = 0
+    content_type: Optional[str] = None
+    cache_control: Optional[str] = None
+    depends_on: List[asyncio.Future] = field(default_factory=list)
+    after: List[asyncio.Future] = field(default_factory=list)  # 仅排序（不要求成功）
+    state: str = "waiting"  # waiting / queued / running / done
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class _TaskUploads:
+    """单个任务的上传队列"""
+
+    def __init__(self):
+        self.queues: List[Deque[UploadJob]] = [deque() for _ in UploadPriority]
+        self.waiting: List[UploadJob] = []  # 依赖未完成的内容对象
+        self.contents: Dict[str, UploadJob] = {}  # 尚未派发的内容对象（按 key 合并）
+        self.unfinished: set = set()  # 未完成的文件上传
+        self.deficit = 0
+        self.uploaded_count = 0
+        self.uploaded_bytes = 0
+        self.failed_count = 0
+
+    @property
+    def has_queued(self) -> bool:
+        return any(self.queues)
+
+    @property
+    def is_idle(self) -> bool:
+        return not self.unfinished and not self.contents
+
+
+def _consume_exception(future: asyncio.Future):
+    # 调用方可能不等待结果（即发即弃），失败已记录日志，避免未读取异常的告警
+    if not future.cancelled():
+        future.exception()
+
+
+class UploadScheduler:
+    """全局上传调度器（单个派发协程 + 全局并发槽位）"""
+
+    def __init__(
+        self,
+        client: Optional[R2Client] = None,
+        max_concurrency: int = 6,
+        bandwidth_mbps: float = 0.0,
+        small_object_bytes: int = 512 * 1024,
+        batch_max_items: int = 8,
+        fair_quantum_bytes: int = 1024 * 1024,
+        job_retries: int = 2,
+        backlog_warn_bytes: int = 256 * 1024 * 1024
+    ):
+        """
+        Args:
+            client: R2 客户端，None 时使用全局单例
+            max_concurrency: 同时进行的上传批次数
+            bandwidth_mbps: 上行带宽预算（Mbit/s），0 表示不限
+            small_object_bytes: 小于该大小的对象可合批派发
+            batch_max_items: 每批最多对象数
+            fair_quantum_bytes: 任务间赤字轮询的每轮字节配额
+            job_retries: 客户端重试耗尽后，调度器重新排队的次数
+            backlog_warn_bytes: 排队字节超过该值时告警
+        """
+        self.client = client or get_r2_client()
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate = bandwidth_mbps * 125000  # 字节/秒
+        self.small_object_bytes = small_object_bytes
+        self.batch_max_items = max(1, batch_max_items)
+        self.quantum = max(1, fair_quantum_bytes)
+        self.job_retries = job_retries
+        self.backlog_warn_bytes = backlog_warn_bytes
+
+        self._tasks: Dict[str, _TaskUploads] = {}
+        self._order: List[str] = []  # 轮询顺序
+        self._rr = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self._tokens = 0.0
+        self._token_time = time.monotonic()
+        self._queued_bytes = 0
+        self._backlogged = False
+
+        # 统计
+        self.uploaded_count = 0
+        self.uploaded_bytes = 0
+        self.failed_count = 0
+        self.batch_count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    # ------------------------------------------------------------------
+    # 提交（同步，只入队）
+    # ------------------------------------------------------------------
+
+    def submit_file(
+        self,
+        task_id: str,
+        key: str,
+        path: Union[str, Path],
+        priority: UploadPriority = UploadPriority.NORMAL,
+        content_type: Optional[str] = None,
+        cache_control: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        提交文件上传
+
+        Returns:
+            asyncio.Future: 成功时结果为对象 key，失败时为 StorageError
+        """
+        self._ensure_started()
+        path = Path(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        job = UploadJob(
+            task_id=task_id, key=key, priority=UploadPriority(priority),
+            future=self._new_future(), path=path, size=size,
+            content_type=content_type, cache_control=cache_control
+        )
+        state = self._task(task_id)
+        state.unfinished.add(job.future)
+        self._enqueue(job)
+        return job.future
+
+    def submit_content(
+        self,
+        task_id: str,
+        key: str,
+        data: Union[str, bytes],
+        priority: UploadPriority = UploadPriority.CRITICAL,
+        content_type: Optional[str] = None,
+        cache_control: Optional[str] = None,
+        after_pending: bool = True
+    ) -> asyncio.Future:
+        """
+        提交内容上传（播放列表等）；同一 key 尚未派发的提交合并为最新内容
+
+        Args:
+            after_pending: 依赖同任务此前提交且未完成的全部文件上传（播放列表只引用已上传的片段）
+
+        Returns:
+            asyncio.Future: 成功时结果为对象 key；依赖失败或上传失败时为 StorageError
+        """
+        self._ensure_started()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        state = self._task(task_id)
+        depends_on = [f for f in state.unfinished if not f.done()] if after_pending else []
+
+        job = state.contents.get(key)
+        if job is not None and job.state in ("waiting", "queued"):
+            # 合并：替换为最新内容，依赖取并集
+            if job.state == "queued":
+                state.queues[job.priority].remove(job)
+                self._queued_bytes -= job.size
+            elif job in state.waiting:
+                state.waiting.remove(job)
+            job.data = data
+            job.size = len(data)
+            job.priority = min(job.priority, UploadPriority(priority))
+            job.depends_on = list({*job.depends_on, *depends_on})
+            job.state = "waiting"
+            self._enqueue(job)
+            return job.future
+
+        # 同一 key 的上一版本正在上传：等其结束再派发，避免旧内容覆盖新内容
+        after = [job.future] if job is not None and not job.future.done() else []
+        job = UploadJob(
+            task_id=task_id, key=key, priority=UploadPriority(priority),
+            future=self._new_future(), data=data, size=len(data),
+            content_type=content_type, cache_control=cache_control, depends_on=depends_on, after=after
+        )
+        state.contents[key] = job
+        self._enqueue(job)
+        return job.future
+
+    async def upload_file(self, task_id: str, key: str, path: Union[str, Path], **kwargs) -> str:
+        """提交文件上传并等待完成"""
+        return await self.submit_file(task_id, key, path, **kwargs)
+
+    async def wait_task(self, task_id: str, timeout: Optional[float] = None) -> bool:
+        """
+        等待任务已提交的上传全部结束（成功或失败）
+
+        Returns:
+            bool: 是否在超时前结束
+        """
+        state = self._tasks.get(task_id)
+        if state is None:
+            return True
+        pending = set(state.unfinished) | {job.future for job in state.contents.values()}
+        if not pending:
+            return True
+        done, not_done = await asyncio.wait(pending, timeout=timeout)
+        return not not_done
+
+    def cancel_task(self, task_id: str) -> int:
+        """
+        取消任务尚未派发的上传（进行中的上传会完成）
+
+        Returns:
+            int: 取消的对象数
+        """
+        state = self._tasks.get(task_id)
+        if state is None:
+            return 0
+        jobs = [job for queue in state.queues for job in queue] + state.waiting
+        for queue in state.queues:
+            queue.clear()
+        state.waiting.clear()
+        for job in jobs:
+            if job.state == "queued":
+                self._queued_bytes -= job.size
+            self._finish(job)
+            job.future.cancel()
+        self._forget_if_idle(task_id)
+        if jobs:
+            logger.info(f"[{task_id}] 已取消 {len(jobs)} 个未派发的上传")
+        return len(jobs)
+
+    def pending_count(self, task_id: str) -> int:
+        state = self._tasks.get(task_id)
+        return len(state.unfinished) + len(state.contents) if state else 0
+
+    def get_stats(self) -> Dict:
+        """调度器统计"""
+        queued = [0] * len(UploadPriority)
+        for state in self._tasks.values():
+            for level, queue in enumerate(state.queues):
+                queued[level] += len(queue)
+        return {
+            "tasks": len(self._tasks),
+            "queued": {p.name.lower(): queued[p] for p in UploadPriority},
+            "waiting": sum(len(s.waiting) for s in self._tasks.values()),
+            "queued_mb": round(self._queued_bytes / 1024 / 1024, 2),
+            "running_batches": len(self._running),
+            "uploaded_count": self.uploaded_count,
+            "uploaded_mb": round(self.uploaded_bytes / 1024 / 1024, 2),
+            "failed_count": self.failed_count,
+            "batch_count": self.batch_count,
+            "avg_wait_ms": round(self.total_wait / self.uploaded_count * 1000, 1) if self.uploaded_count else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+    async def close(self):
+        """停止派发并等待进行中的上传"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._dispatcher = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    # 队列维护
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch_loop(), name="upload_scheduler")
+
+    def _new_future(self) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        return future
+
+    def _task(self, task_id: str) -> _TaskUploads:
+        state = self._tasks.get(task_id)
+        if state is None:
+            state = self._tasks[task_id] = _TaskUploads()
+            self._order.append(task_id)
+        return state
+
+    def _forget_if_idle(self, task_id: str):
+        state = self._tasks.get(task_id)
+        if state is not None and state.is_idle and not state.has_queued and not state.waiting:
+            del self._tasks[task_id]
+            index = self._order.index(task_id)
+            self._order.pop(index)
+            if index < self._rr:
+                self._rr -= 1
+
+    def _enqueue(self, job: UploadJob):
+        """依赖已满足的对象进入优先级队列，否则挂起等待依赖"""
+        state = self._task(job.task_id)
+        pending = [f for f in job.depends_on + job.after if not f.done()]
+        if pending:
+            job.state = "waiting"
+            state.waiting.append(job)
+            for f in pending:
+                f.add_done_callback(lambda _, j=job: self._on_dependency_done(j))
+            self._wake()
+            return
+
+        failed = [f for f in job.depends_on if f.cancelled() or f.exception() is not None]
+        if failed:
+            self._finish(job)
+            job.future.set_exception(StorageError(f"{job.key} 依赖的 {len(failed)} 个上传未成功"))
+            self._forget_if_idle(job.task_id)
+            return
+
+        job.state = "queued"
+        job.depends_on = []
+        job.after = []
+        state.queues[job.priority].append(job)
+        self._queued_bytes += job.size
+        if not self._backlogged and self._queued_bytes > self.backlog_warn_bytes:
+            self._backlogged = True
+            logger.warning(f"上传积压 {self._queued_bytes / 1024 / 1024:.1f}MB，超过告警阈值（提交不阻塞）")
+        self._wake()
+
+    def _on_dependency_done(self, job: UploadJob):
+        state = self._tasks.get(job.task_id)
+        if state is None or job.state != "waiting" or job not in state.waiting:
+            return
+        if all(f.done() for f in job.depends_on + job.after):
+            state.waiting.remove(job)
+            self._enqueue(job)
+
+    def _finish(self, job: UploadJob):
+        job.state = "done"
+        state = self._tasks.get(job.task_id)
+        if state is not None:
+            state.unfinished.discard(job.future)
+            if state.contents.get(job.key) is job:
+                del state.contents[job.key]
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # 派发
+    # ------------------------------------------------------------------
+
+    def _effective_level(self, state: _TaskUploads, level: int) -> int:
+        # 优先级继承：有播放列表等待时，该任务的普通片段按 CRITICAL 调度
+        if level == UploadPriority.NORMAL and state.waiting:
+            return UploadPriority.CRITICAL
+        return level
+
+    def _pick(self) -> List[UploadJob]:
+        """按优先级 + 任务间赤字轮询选出下一批对象"""
+        if not self._order:
+            return []
+        for level in UploadPriority:
+            candidates = [
+                task_id for task_id in self._order
+                if any(
+                    self._effective_level(self._tasks[task_id], q) == level and self._tasks[task_id].queues[q]
+                    for q in UploadPriority
+                )
+            ]
+            if not candidates:
+                continue
+            # 从轮询位置开始，每轮给候选任务追加配额，直到某个任务的队首对象放得下
+            start = self._rr % len(self._order)
+            rotated = self._order[start:] + self._order[:start]
+            candidates = [t for t in rotated if t in candidates]
+            while True:
+                for task_id in candidates:
+                    state = self._tasks[task_id]
+                    queue = next(
+                        state.queues[q] for q in UploadPriority
+                        if state.queues[q] and self._effective_level(state, q) == level
+                    )
+                    state.deficit += self.quantum
+                    if queue[0].size > state.deficit:
+                        continue
+                    batch = self._take_batch(state, queue)
+                    if not state.has_queued:
+                        state.deficit = 0
+                    self._rr = self._order.index(task_id) + 1
+                    return batch
+
+    def _take_batch(self, state: _TaskUploads, queue: Deque[UploadJob]) -> List[UploadJob]:
+        batch = [queue.popleft()]
+        state.deficit -= batch[0].size
+        if batch[0].size <= self.small_object_bytes:
+            while (
+                queue and len(batch) < self.batch_max_items
+                and queue[0].size <= self.small_object_bytes and queue[0].size <= state.deficit
+            ):
+                job = queue.popleft()
+                state.deficit -= job.size
+                batch.append(job)
+        for job in batch:
+            job.state = "running"
+            self._queued_bytes -= job.size
+        if self._backlogged and self._queued_bytes <= self.backlog_warn_bytes / 2:
+            self._backlogged = False
+            logger.info("上传积压已缓解")
+        return batch
+
+    async def _throttle(self, size: int):
+        """令牌桶（欠账模式）：带宽预算不足时推迟下一次派发"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._token_time) * self.rate)
+        self._token_time = now
+        self._tokens -= size
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._slots.acquire()
+            batch = self._pick()
+            while not batch:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                batch = self._pick()
+            await self._throttle(sum(job.size for job in batch))
+            runner = asyncio.create_task(self._run_batch(batch))
+            self._running.add(runner)
+            runner.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: List[UploadJob]):
+        try:
+            self.batch_count += 1
+            results = await asyncio.gather(*(self._upload(job) for job in batch), return_exceptions=True)
+        finally:
+            self._slots.release()
+        for job, result in zip(batch, results):
+            self._complete(job, result)
+
+    async def _upload(self, job: UploadJob):
+        wait = time.time() - job.enqueued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if job.path is not None:
+            await self.client.upload_file(job.key, job.path, job.content_type, job.cache_control)
+        else:
+            await self.client.put_object(job.key, job.data, job.content_type, job.cache_control)
+
+    def _complete(self, job: UploadJob, result):
+        state = self._tasks.get(job.task_id)
+        if isinstance(result, BaseException):
+            job.attempts += 1
+            if job.attempts <= self.job_retries and state is not None and not isinstance(result, asyncio.CancelledError):
+                logger.warning(f"[{job.task_id}] 上传失败，重新排队 {job.attempts}/{self.job_retries}: {job.key}, {result}")
+                self._enqueue(job)
+                return
+            self._finish(job)
+            self.failed_count += 1
+            if state is not None:
+                state.failed_count += 1
+            logger.error(f"[{job.task_id}] 上传失败: {job.key}, {result}")
+            if not job.future.done():
+                job.future.set_exception(result if isinstance(result, StorageError) else StorageError(str(result)))
+        else:
+            self._finish(job)
+            self.uploaded_count += 1
+            self.uploaded_bytes += job.size
+            if state is not None:
+                state.uploaded_count += 1
+                state.uploaded_bytes += job.size
+            if not job.future.done():
+                job.future.set_result(job.key)
+        self._forget_if_idle(job.task_id)
+
+
+# 全局单例
+_upload_scheduler: Optional[UploadScheduler] = None
+
+
+def get_upload_scheduler() -> UploadScheduler:
+    """获取全局上传调度器"""
+    global _upload_scheduler
+    if _upload_scheduler is None:
+        from config import get_config
+        config = get_config().tts
+        _upload_scheduler = UploadScheduler(
+            max_concurrency=config.upload_max_concurrency,
+            bandwidth_mbps=config.upload_bandwidth_mbps,
+            small_object_bytes=config.upload_batch_small_kb * 1024,
+            batch_max_items=config.upload_batch_max_items,
+            fair_quantum_bytes=config.upload_fair_quantum_kb * 1024,
+            job_retries=config.upload_job_retries,
+            backlog_warn_bytes=config.upload_backlog_warn_mb * 1024 * 1024
+        )
+    return _upload_scheduler
+
@@ -0,0 +1,293 @@
+"""
+实时配音会话 - 基于WebSocket的全双工句子流式合成
+客户端持续推送已转录/翻译的句子，服务端按句推回合成（可选对齐）后的音频帧。
+会话在整个生命周期内复用任务的 PathManager、说话人样本缓存和混音状态。
+批次按阶段流水线处理（合成 -> 对齐 -> 混合），批次 N 混合时批次 N+1 已在合成。
+"""
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from core.sentence_tools import Sentence
+from core.task_pipeline import TaskPipeline
+from core.audio_sample_manager import get_audio_sample_manager
+from core.task_context_manager import (
+    TaskMediaContext, ArtifactNotReadyError,
+    ARTIFACT_AUDIO, ARTIFACT_VIDEO, ARTIFACT_SEPARATION
+)
+from utils.path_manager import PathManager
+
+logger = logging.getLogger(__name__)
+
+
+class DubbingSession:
+    """
+    绑定到已初始化任务上下文的配音会话
+
+    消息协议（JSON文本帧）：
+    - 客户端 -> 服务端
+        {"type": "sentences", "sentences": [{sequence, text, audioSample?, speaker, startMs, endMs}, ...]}
+        {"type": "flush"}   等待已提交的句子全部处理完成
+        {"type": "close"}   处理完剩余句子后关闭会话
+    - 服务端 -> 客户端
+        {"type": "audio", "sequence", "sampleRate", "format", "durationMs", "aligned", "bytes"}
+            紧跟一个二进制帧（PCM s16le 单声道）
+        {"type": "segment", "batch", "path", "sequences"}   媒体混合片段就绪
+        {"type": "error", "sequence"?, "error"}
+        {"type": "flushed"} / {"type": "closed", "stats"}
+    """
+
+    AUDIO_FORMAT = "pcm_s16le"
+
+    def __init__(
+        self,
+        task_id: str,
+        context: TaskMediaContext,
+        path_manager: PathManager,
+        voice_synthesizer,
+        sample_rate: int,
+        duration_aligner=None,
+        timestamp_adjuster=None,
+        media_mixer=None,
+        mixer_session=None,
+        max_pending_batches: int = 8,
+        artifact_wait_timeout: Optional[float] = None,
+        stage_queue_size: int = 2
+    ):
+        self.task_id = task_id
+        self.context = context
+        self.path_manager = path_manager
+        self.voice_synthesizer = voice_synthesizer
+        self.sample_rate = sample_rate
+        self.duration_aligner = duration_aligner
+        self.timestamp_adjuster = timestamp_adjuster
+        self.media_mixer = media_mixer
+        self.mixer_session = mixer_session
+        self.artifact_wait_timeout = artifact_wait_timeout
+        self.max_pending_batches = max_pending_batches
+        self.stage_queue_size = stage_queue_size
+
+        # 说话人缓存：speaker -> 本地音频样本路径；audioSample URL -> 本地路径
+        self.speaker_samples: Dict[str, str] = {}
+        self.sample_paths: Dict[str, Optional[str]] = {}
+        # 会话对缓存样本的引用标识：会话期间 sample_paths 中的文件不会被缓存淘汰
+        self.sample_owner = f"session:{task_id}:{id(self):x}"
+
+        # 批次处理流水线（run 时创建；各阶段队列有界，背压传递到接收循环和客户端）
+        self.pipeline: Optional[TaskPipeline] = None
+        self._send_lock = asyncio.Lock()
+
+        self.stats = {
+            "sentences_received": 0,
+            "sentences_sent": 0,
+            "sentences_failed": 0,
+            "segments_mixed": 0,
+            "started_at": time.time(),
+        }
+
+    async def run(self, websocket) -> None:
+        """运行会话：接收循环与处理流水线并行，直到客户端关闭或断开"""
+        self.pipeline = self._create_pipeline(websocket)
+        try:
+            while True:
+                message = await websocket.receive_json()
+                msg_type = message.get("type")
+
+                if msg_type == "sentences":
+                    batch = message.get("sentences") or []
+                    if batch:
+                        self.stats["sentences_received"] += len(batch)
+                        await self.pipeline.submit(batch)
+                elif msg_type == "flush":
+                    await self.pipeline.join()
+                    await self._flush_mix(websocket)
+                    await self._send_json(websocket, {"type": "flushed"})
+                elif msg_type == "close":
+                    await self.pipeline.join()
+                    await self._flush_mix(websocket, end_stream=True)
+                    await self._send_json(websocket, {"type": "closed", "stats": self.get_stats()})
+                    break
+                else:
+                    await self._send_json(websocket, {"type": "error", "error": f"未知消息类型: {msg_type}"})
+        finally:
+            await self.pipeline.close()
+            await get_audio_sample_manager().release(self.sample_owner)
+            logger.info(f"[{self.task_id}] 配音会话结束: {self.get_stats()}")
+
+    def _create_pipeline(self, websocket) -> TaskPipeline:
+        """按会话启用的服务组装阶段：合成（必选）-> 对齐 -> 混合"""
+        stages = [("tts", partial(self._stage_synthesize, websocket))]
+        if self.duration_aligner is not None or self.timestamp_adjuster is not None:
+            stages.append(("align", partial(self._stage_align, websocket)))
+        if self.media_mixer is not None and self.mixer_session is not None:
+            stages.append(("mix", partial(self._stage_mix, websocket)))
+
+        async def on_error(batch, error: Exception) -> None:
+            await self._send_json(websocket, {"type": "error", "error": str(error)})
+
+        return TaskPipeline(
+            self.task_id, stages,
+            queue_size=self.stage_queue_size,
+            input_queue_size=self.max_pending_batches,
+            on_error=on_error
+        )
+
+    async def _stage_synthesize(self, websocket, batch: List[Dict[str, Any]]) -> List[Sentence]:
+        """合成一批句子；不对齐时合成即逐句推送，避免等待整批"""
+        self.context.touch()
+        sentences = [await self._build_sentence(item) for item in batch]
+        sentences.sort(key=lambda s: s.sequence)
+
+        align = self.duration_aligner is not None or self.timestamp_adjuster is not None
+        synthesized: List[Sentence] = []
+        for sentence in sentences:
+            result = await self.voice_synthesizer.synthesizeBatch([sentence])
+            sentence = result[0] if result else sentence
+            synthesized.append(sentence)
+            if not align:
+                await self._send_sentence_audio(websocket, sentence, aligned=False)
+        return synthesized
+
+    async def _stage_align(self, websocket, synthesized: List[Sentence]) -> List[Sentence]:
+        """时长对齐与时间戳校准，完成后推送对齐后的音频"""
+        if self.duration_aligner is not None:
+            synthesized = await self.duration_aligner(synthesized)
+        if self.timestamp_adjuster is not None:
+            synthesized = await self.timestamp_adjuster(synthesized, self.sample_rate)
+        for sentence in synthesized:
+            await self._send_sentence_audio(websocket, sentence, aligned=True)
+        return synthesized
+
+    async def _stage_mix(self, websocket, synthesized: List[Sentence]) -> None:
+        """混合本批次媒体片段（阶段单工作者，片段按批次提交顺序输出）"""
+        valid = [s for s in synthesized if s.generated_audio is not None]
+        if valid and await self._wait_for_mix_inputs(websocket):
+            # 片段序号由任务混音会话分配，跨连接/请求单调递增
+            # 片段终点对齐关键帧（可整段流复制），剩余人声在 flush/close 时输出
+            batch_index = self.mixer_session.reserve_segment_index()
+            segment_path = await self.media_mixer.mix_media(
+                valid, self.path_manager, self.mixer_session, batch_index, snap_to_keyframes=True
+            )
+            if segment_path:
+                self.stats["segments_mixed"] += 1
+                await self._send_json(websocket, {
+                    "type": "segment",
+                    "batch": batch_index,
+                    "path": segment_path,
+                    "sequences": [s.sequence for s in valid],
+                })
+
+    async def _flush_mix(self, websocket, end_stream: bool = False) -> None:
+        """输出因关键帧对齐而顺延的剩余人声片段（分离演绎模式下输出音频演绎尾部，end_stream 时结束音频播放列表）"""
+        if self.media_mixer is None or self.mixer_session is None:
+            return
+        if not self.mixer_session.has_carry and self.path_manager.hls_renditions is None:
+            if end_stream and (self.path_manager.final_assembler is not None
+                               or self.path_manager.subtitle_track is not None):
+                # 无剩余人声，只完成增量组装的成品文件与字幕轨
+                await self.media_mixer.flush(self.path_manager, self.mixer_session, end_stream=True)
+            return
+        batch_index = self.mixer_session.reserve_segment_index()
+        segment_path = await self.media_mixer.flush(
+            self.path_manager, self.mixer_session, batch_index, end_stream=end_stream
+        )
+        if segment_path:
+            self.stats["segments_mixed"] += 1
+            await self._send_json(websocket, {
+                "type": "segment",
+                "batch": batch_index,
+                "path": segment_path,
+                "sequences": [],
+            })
+
+    async def _wait_for_mix_inputs(self, websocket) -> bool:
+        """等待混合所需的媒体产物（音频已推送，不阻塞合成）"""
+        try:
+            await self.context.wait_for(ARTIFACT_AUDIO, ARTIFACT_VIDEO, timeout=self.artifact_wait_timeout)
+            await self.context.wait_for(ARTIFACT_SEPARATION, timeout=self.artifact_wait_timeout, required=False)
+            return True
+        except ArtifactNotReadyError as e:
+            logger.error(f"[{self.task_id}] 媒体产物不可用，跳过混合: {e}")
+            await self._send_json(websocket, {"type": "error", "error": str(e)})
+            return False
+
+    async def _build_sentence(self, item: Dict[str, Any]) -> Sentence:
+        """从消息构建Sentence，复用会话内的说话人样本缓存"""
+        speaker = item.get("speaker", "")
+        audio_sample = (item.get("audioSample") or "").strip()
+
+        local_path = None
+        if audio_sample:
+            if audio_sample not in self.sample_paths:
+                try:
+                    self.sample_paths[audio_sample] = await get_audio_sample_manager().get_prompt_path(
+                        audio_sample, owner=self.sample_owner
+                    )
+                except Exception as e:
+                    logger.error(f"[{self.task_id}] 下载音频样本失败: {audio_sample}, 错误: {e}")
+                    self.sample_paths[audio_sample] = None
+            local_path = self.sample_paths[audio_sample]
+            if local_path:
+                self.speaker_samples[speaker] = local_path
+        if not local_path:
+            # 后续句子可省略audioSample，沿用该说话人上一次的样本
+            local_path = self.speaker_samples.get(speaker)
+
+        start_ms = item["startMs"]
+        end_ms = item["endMs"]
+        return Sentence(
+            original_text=item["text"],
+            translated_text=item["text"],
+            sequence=item["sequence"],
+            audio=local_path,
+            speaker=speaker,
+            start_ms=start_ms,
+            end_ms=end_ms,
+            target_duration=end_ms - start_ms,
+            task_id=self.task_id
+        )
+
+    async def _send_sentence_audio(self, websocket, sentence: Sentence, aligned: bool) -> None:
+        """推送单句音频：JSON头 + 二进制PCM帧"""
+        if sentence.generated_audio is None or len(sentence.generated_audio) == 0:
+            self.stats["sentences_failed"] += 1
+            await self._send_json(websocket, {
+                "type": "error",
+                "sequence": sentence.sequence,
+                "error": "语音合成失败"
+            })
+            return
+
+        audio = np.asarray(sentence.generated_audio, dtype=np.float32)
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+        header = {
+            "type": "audio",
+            "sequence": sentence.sequence,
+            "sampleRate": self.sample_rate,
+            "format": self.AUDIO_FORMAT,
+            "durationMs": int(round(len(audio) / self.sample_rate * 1000)),
+            "aligned": aligned,
+            "bytes": len(pcm),
+        }
+        # 头和数据帧必须成对发送，避免并发交错
+        async with self._send_lock:
+            await websocket.send_json(header)
+            await websocket.send_bytes(pcm)
+        self.stats["sentences_sent"] += 1
+
+    async def _send_json(self, websocket, payload: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await websocket.send_json(payload)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """会话统计信息"""
+        stats = dict(self.stats)
+        stats["elapsed_s"] = round(time.time() - stats.pop("started_at"), 2)
+        stats["batches_pending"] = self.pipeline.pending if self.pipeline is not None else 0
+        if self.pipeline is not None:
+            stats["pipeline"] = self.pipeline.get_stats()
+        return stats
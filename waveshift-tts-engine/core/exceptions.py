@@ -50,6 +50,11 @@ class TranslationError(TTSError):
     pass
 
 
+class StorageError(TTSError):
+    """对象存储（R2/S3）请求错误"""
+    pass
+
+
 class ResourceError(TTSError):
     """资源管理错误"""
     pass
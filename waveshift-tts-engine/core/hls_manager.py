@@ -9,29 +9,20 @@ from pathlib import Path
 from typing import Union, Optional, Dict, List
 
 import aiofiles
-from utils.ffmpeg_utils import hls_segment, concat_videos
+from utils.ffmpeg_utils import hls_segment, hls_split_parts, concat_videos, burn_subtitles, get_duration, probe_keyframes
+from utils.hls_playlist import LLHLSPlaylistWriter, HLSPart, HLSSegment, plan_part_cuts, group_parts, concat_part_files
 from utils.path_manager import PathManager
-from config import Config
-
-# 注意：Cloudflare模块已移除，HLS功能需要重新实现
-# from core.cloudflare.d1_client import D1Client
-# from core.cloudflare.r2_hls_storage_manager import R2HLSStorageManager
+from config import Config, get_config
+from core.cloudflare.d1_client import D1Client
+from core.cloudflare.r2_hls_storage_manager import R2HLSStorageManager
+from core.cloudflare.upload_scheduler import UploadPriority
+from utils.executors import POOL_IO, run_in_pool
+from utils.ffmpeg_scheduler import PRIORITY_CRITICAL, ffmpeg_job_context
 
 logger = logging.getLogger(__name__)
 
-# 空的stub类，避免导入错误
-class D1Client:
-    """D1Client stub - 需要重新实现"""
-    def __init__(self, **kwargs):
-        logger.warning("D1Client未实现，HLS功能可能不可用")
-
-class R2HLSStorageManager:
-    """R2HLSStorageManager stub - 需要重新实现"""
-    def __init__(self, **kwargs):
-        logger.warning("R2HLSStorageManager未实现，HLS功能可能不可用")
-
 class HLSManager:
-    """HLS流媒体管理器 - 支持多任务管理和并行上传优化"""
+    """HLS流媒体管理器 - 支持多任务管理，上传经全局上传调度器派发"""
     def __init__(self, d1_client: D1Client = None):
         self.config = Config()
         
@@ -48,6 +39,14 @@ class HLSManager:
         # 初始化R2 HLS存储管理器
         self.hls_storage_manager = R2HLSStorageManager(config=self.config)
         self.logger = logging.getLogger(__name__)
+        # 启用存储且 R2 已配置时才上传
+        self.storage_enabled = self.config.ENABLE_HLS_STORAGE and self.hls_storage_manager.is_available
+        
+        # LL-HLS 模式：部分片段 + 预加载提示，播放列表只追加写入
+        tts_config = get_config().tts
+        self.low_latency = tts_config.hls_low_latency
+        self.part_seconds = tts_config.hls_part_seconds
+        self.ll_segment_seconds = max(tts_config.hls_ll_segment_seconds, tts_config.hls_part_seconds)
         
         # 存储每个任务的HLS管理信息
         self.task_managers = {}
@@ -55,12 +54,12 @@ class HLSManager:
         # 并发锁，每个任务一个锁
         self.locks = {}
         
-        # 并行上传优化
-        self.upload_queues = {}  # 每个任务的上传队列
-        self.upload_workers = {}  # 每个任务的上传工作器
-        self.upload_semaphore = asyncio.Semaphore(3)  # 限制并发上传数
+        # 上传由全局调度器派发（跨任务共享预算）；每个任务前几个片段优先上传
+        self.priority_segments = tts_config.upload_priority_segments
+        # 字幕以 WebVTT 外挂/字幕演绎发布，烧录只作为可选的成品导出步骤
+        self.subtitle_burn_in_final = tts_config.subtitle_burn_in_final
         
-        self.logger.info("HLS管理器已初始化（支持并行上传优化）")
+        self.logger.info("HLS管理器已初始化（上传由全局调度器派发）")
 
     async def generate_hls(self, media_output: str, task_id: Optional[str] = None) -> str:
         """最小实现：包装已有create_manager/add_segment/finalize逻辑，返回本地m3u8路径。
@@ -77,13 +76,17 @@ class HLSManager:
             if add_res.get("status") != "success":
                 raise RuntimeError(f"添加片段失败: {add_res}")
             await self.finalize_playlist(task_id)
-            manager = self.task_managers.get(task_id)
-            playlist_path = manager["playlist_path"] if manager else None
-            return str(playlist_path) if playlist_path else ""
+            return self.get_playlist_path(task_id)
         except Exception as e:
             self.logger.error(f"generate_hls 失败: {e}")
             return ""
 
+    def get_playlist_path(self, task_id: str) -> str:
+        """任务的本地播放列表路径（管理器不存在时返回空字符串）"""
+        manager = self.task_managers.get(task_id)
+        playlist_path = manager["playlist_path"] if manager else None
+        return str(playlist_path) if playlist_path else ""
+
     async def create_manager(self, task_id: str, path_manager: PathManager) -> Dict:
         """
         为特定任务创建HLS管理器
@@ -123,8 +126,12 @@ class HLSManager:
                 sequence_number = 0
                 has_segments = False
                 
-                # 尝试从Storage恢复现有播放列表
-                if self.config.ENABLE_HLS_STORAGE:
+                ll_writer = None
+                if self.low_latency:
+                    ll_writer = LLHLSPlaylistWriter(playlist_path, self.ll_segment_seconds, self.part_seconds)
+                
+                # 尝试从Storage恢复现有播放列表（LL-HLS 模式从头开始）
+                if self.storage_enabled and ll_writer is None:
                     try:
                         existing_content = await self.hls_storage_manager.get_existing_playlist_content(task_id)
                         if existing_content:
@@ -149,14 +156,18 @@ class HLSManager:
                     "sequence_number": sequence_number,
                     "has_segments": has_segments,
                     "segment_time": 10,  # 默认分段时间为10秒
+                    "ll_writer": ll_writer,
+                    # 上传失败的片段：重新上传成功之前不上传引用它们的播放列表
+                    "failed_uploads": [],
+                    "submitted_segments": 0,
                     "created_at": time.time()
                 }
                 
-                # 初始化并行上传支持
-                await self._init_parallel_upload(task_id)
-                
                 # 保存初始播放列表
-                await self._save_playlist(task_id)
+                if ll_writer is not None:
+                    await run_in_pool(POOL_IO, ll_writer.open)
+                else:
+                    await self._save_playlist(task_id)
                 
                 self.logger.info(f"已为任务 {task_id} 创建HLS管理器")
                 return {"status": "success", "message": "HLS管理器创建成功"}
@@ -169,307 +180,130 @@ class HLSManager:
                     del self.task_managers[task_id]
                 if task_id in self.locks:
                     del self.locks[task_id]
-                    
-                # 清理可能已创建的上传工作器和队列
-                if task_id in self.upload_workers:
-                    worker = self.upload_workers[task_id]
-                    worker.cancel()  # 取消未完成的工作器
-                    del self.upload_workers[task_id]
-                    
-                if task_id in self.upload_queues:
-                    del self.upload_queues[task_id]
                 return {"status": "error", "message": f"创建HLS管理器失败: {str(e)}"}
 
-    async def _init_parallel_upload(self, task_id: str) -> None:
-        """
-        初始化任务的并行上传支持
-        
-        Args:
-            task_id: 任务ID
-        """
-        try:
-            # 创建上传队列
-            self.upload_queues[task_id] = asyncio.Queue(maxsize=10)
-            
-            # 启动上传工作器
-            self.upload_workers[task_id] = asyncio.create_task(
-                self._upload_worker(task_id),
-                name=f"hls_upload_worker_{task_id}"
-            )
-            
-            self.logger.info(f"[{task_id}] 并行上传支持已初始化")
-            
-        except Exception as e:
-            self.logger.error(f"[{task_id}] 初始化并行上传失败: {e}")
-            # 不抛出异常，降级到串行模式
+    def _on_segment_uploaded(self, task_id: str, segment_file: str, future: asyncio.Future) -> None:
+        """片段上传结束回调：记录失败的片段，供下次上传播放列表前重新提交"""
+        manager = self.task_managers.get(task_id)
+        if manager is None or future.cancelled() or future.exception() is None:
+            return
+        if segment_file not in manager["failed_uploads"]:
+            manager["failed_uploads"].append(segment_file)
     
-    async def _upload_worker(self, task_id: str) -> None:
+    def _submit_segment_uploads(self, task_id: str, segment_files: List[str], priority: Optional[UploadPriority] = None) -> None:
         """
-        并行上传工作器 - 后台处理上传任务
+        提交片段上传到全局调度器（不等待）；每个任务的前几个片段按最高优先级上传
         
         Args:
             task_id: 任务ID
+            segment_files: 段文件路径列表
+            priority: 指定优先级（None 时按已提交片段数决定）
         """
-        self.logger.info(f"[{task_id}] 上传工作器启动")
-        
-        upload_count = 0
-        failed_count = 0
-        
-        try:
-            while True:
-                try:
-                    # 从队列获取上传任务（设置超时避免无限等待）
-                    upload_item = await asyncio.wait_for(
-                        self.upload_queues[task_id].get(), timeout=30.0
-                    )
-                    
-                    # 检查停止信号
-                    if upload_item is None:
-                        self.logger.info(f"[{task_id}] 上传工作器收到停止信号")
-                        break
-                    
-                    # 处理上传任务
-                    async with self.upload_semaphore:
-                        success = await self._process_upload_item(task_id, upload_item)
-                        
-                        if success:
-                            upload_count += 1
-                            self.logger.debug(f"[{task_id}] 上传任务完成: {upload_item['type']}")
-                        else:
-                            failed_count += 1
-                            self.logger.warning(f"[{task_id}] 上传任务失败: {upload_item['type']}")
-                    
-                    # 标记队列任务完成
-                    self.upload_queues[task_id].task_done()
-                    
-                except asyncio.TimeoutError:
-                    # 队列空闲超时，继续等待
-                    self.logger.debug(f"[{task_id}] 上传工作器空闲等待")
-                    continue
-                    
-                except Exception as e:
-                    failed_count += 1
-                    self.logger.error(f"[{task_id}] 上传工作器处理异常: {e}")
-                    continue
-        
-        except Exception as e:
-            self.logger.error(f"[{task_id}] 上传工作器严重异常: {e}")
-        finally:
-            self.logger.info(
-                f"[{task_id}] 上传工作器关闭 - "
-                f"成功: {upload_count}, 失败: {failed_count}"
+        manager = self.task_managers[task_id]
+        if priority is None:
+            critical = max(0, self.priority_segments - manager["submitted_segments"])
+            futures = (
+                self.hls_storage_manager.submit_segments(task_id, segment_files[:critical], UploadPriority.CRITICAL)
+                + self.hls_storage_manager.submit_segments(task_id, segment_files[critical:], UploadPriority.NORMAL)
+            )
+        else:
+            futures = self.hls_storage_manager.submit_segments(task_id, segment_files, priority)
+        manager["submitted_segments"] += len(segment_files)
+        for segment_file, future in zip(segment_files, futures):
+            future.add_done_callback(
+                lambda f, path=str(segment_file): self._on_segment_uploaded(task_id, path, f)
             )
-    
-    async def _process_upload_item(self, task_id: str, upload_item: Dict) -> bool:
-        """
-        处理单个上传任务
-        
-        Args:
-            task_id: 任务ID
-            upload_item: 上传任务项
-            
-        Returns:
-            bool: 上传是否成功
-        """
-        try:
-            upload_type = upload_item['type']
-            start_time = time.time()
-            
-            if upload_type == 'segments':
-                # 上传段文件
-                segment_files = upload_item['files']
-                upload_result = await self.hls_storage_manager.batch_upload_segments(
-                    task_id, segment_files
-                )
-                
-                success = upload_result.get("status") in ["success", "partial"]
-                if success:
-                    uploaded_count = upload_result.get('uploaded_count', 0)
-                    self.logger.info(
-                        f"[{task_id}] 段文件批量上传完成: {uploaded_count}/{len(segment_files)}, "
-                        f"耗时: {time.time() - start_time:.2f}s"
-                    )
-                else:
-                    self.logger.warning(f"[{task_id}] 段文件上传失败: {upload_result.get('message')}")
-                
-                return success
-                
-            elif upload_type == 'playlist':
-                # 上传播放列表
-                await self._upload_playlist_to_storage(task_id)
-                self.logger.info(
-                    f"[{task_id}] 播放列表上传完成, "
-                    f"耗时: {time.time() - start_time:.2f}s"
-                )
-                return True
-                
-            else:
-                self.logger.warning(f"[{task_id}] 未知的上传任务类型: {upload_type}")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"[{task_id}] 处理上传任务异常: {e}")
-            return False
     
     async def _queue_segment_upload(self, task_id: str, segment_files: List[str]) -> None:
         """
-        将段文件上传任务加入队列
+        将段文件上传交给全局上传调度器（只入队，不阻塞调用方）
         
         Args:
             task_id: 任务ID
             segment_files: 段文件路径列表
         """
         try:
-            if task_id in self.upload_queues:
-                upload_item = {
-                    'type': 'segments',
-                    'files': segment_files,
-                    'timestamp': time.time()
-                }
-                
-                # 非阻塞方式加入队列
-                try:
-                    self.upload_queues[task_id].put_nowait(upload_item)
-                    self.logger.debug(
-                        f"[{task_id}] 段文件上传任务已入队: {len(segment_files)} 个文件, "
-                        f"队列大小: {self.upload_queues[task_id].qsize()}"
-                    )
-                except asyncio.QueueFull:
-                    # 队列满时降级到同步上传
-                    self.logger.warning(f"[{task_id}] 上传队列已满，降级到同步上传")
-                    await self._fallback_upload_segments(task_id, segment_files)
-            else:
-                # 没有队列时降级到同步上传
-                await self._fallback_upload_segments(task_id, segment_files)
-                
+            self._submit_segment_uploads(task_id, segment_files)
+            self.logger.debug(
+                f"[{task_id}] 段文件上传已提交: {len(segment_files)} 个文件, "
+                f"调度器: {self.hls_storage_manager.scheduler.get_stats()['queued']}"
+            )
         except Exception as e:
-            self.logger.error(f"[{task_id}] 队列段文件上传失败: {e}")
-            # 降级到同步上传
-            await self._fallback_upload_segments(task_id, segment_files)
+            self.logger.error(f"[{task_id}] 提交段文件上传失败: {e}")
     
     async def _queue_playlist_upload(self, task_id: str) -> None:
         """
-        将播放列表上传任务加入队列
+        提交播放列表上传（只入队）：调度器在此前提交的片段全部上传成功后才派发，
+        尚未派发的旧版本与新版本合并
         
         Args:
             task_id: 任务ID
         """
         try:
-            if task_id in self.upload_queues:
-                upload_item = {
-                    'type': 'playlist',
-                    'timestamp': time.time()
-                }
+            manager = self.task_managers[task_id]
+            # 失败的片段重新提交（播放列表依赖它们）
+            if manager["failed_uploads"]:
+                retry_files = manager["failed_uploads"]
+                manager["failed_uploads"] = []
+                self.logger.info(f"[{task_id}] 重新提交 {len(retry_files)} 个上传失败的片段")
+                self._submit_segment_uploads(task_id, retry_files, UploadPriority.CRITICAL)
+            
+            content, segment_count = self._playlist_content(task_id)
+            future = self.hls_storage_manager.submit_playlist(task_id, content)
+            if future is not manager.get("playlist_future"):
+                manager["playlist_future"] = future
+                submitted_at = time.time()
                 
-                # 非阻塞方式加入队列
-                try:
-                    self.upload_queues[task_id].put_nowait(upload_item)
-                    self.logger.debug(
-                        f"[{task_id}] 播放列表上传任务已入队, "
-                        f"队列大小: {self.upload_queues[task_id].qsize()}"
-                    )
-                except asyncio.QueueFull:
-                    # 队列满时降级到同步上传
-                    self.logger.warning(f"[{task_id}] 上传队列已满，降级到同步播放列表上传")
-                    await self._upload_playlist_to_storage(task_id)
-            else:
-                # 没有队列时降级到同步上传
-                await self._upload_playlist_to_storage(task_id)
+                def _log_result(f: asyncio.Future):
+                    if f.cancelled():
+                        return
+                    if f.exception() is not None:
+                        self.logger.warning(f"[{task_id}] 播放列表未上传（等待下次更新）: {f.exception()}")
+                    else:
+                        self.logger.info(f"[{task_id}] 播放列表上传完成, 提交后 {time.time() - submitted_at:.2f}s")
                 
+                future.add_done_callback(_log_result)
+            self.logger.debug(f"[{task_id}] 播放列表上传已提交 (包含 {segment_count} 个片段)")
         except Exception as e:
-            self.logger.error(f"[{task_id}] 队列播放列表上传失败: {e}")
-            # 降级到同步上传
-            await self._upload_playlist_to_storage(task_id)
+            self.logger.error(f"[{task_id}] 提交播放列表上传失败: {e}")
     
-    async def _fallback_upload_segments(self, task_id: str, segment_files: List[str]) -> None:
+    async def _retry_failed_uploads(self, task_id: str) -> bool:
         """
-        降级的段文件上传
+        重试此前上传失败的片段并等待结果
         
-        Args:
-            task_id: 任务ID
-            segment_files: 段文件路径列表
+        Returns:
+            bool: 所有片段均已上传
         """
-        try:
-            upload_result = await self.hls_storage_manager.batch_upload_segments(task_id, segment_files)
-            if upload_result["status"] in ["success", "partial"]:
-                self.logger.info(f"[{task_id}] 同步段文件上传完成: {upload_result['uploaded_count']}/{len(segment_files)}")
-            else:
-                self.logger.warning(f"[{task_id}] 同步段文件上传失败")
-        except Exception as e:
-            self.logger.error(f"[{task_id}] 同步段文件上传异常: {e}")
+        manager = self.task_managers.get(task_id)
+        if manager is None or not manager["failed_uploads"]:
+            return True
+        pending = list(manager["failed_uploads"])
+        upload_result = await self.hls_storage_manager.batch_upload_segments(task_id, pending, UploadPriority.CRITICAL)
+        manager["failed_uploads"] = list(upload_result.get("failed_files", pending))
+        if not manager["failed_uploads"]:
+            self.logger.info(f"[{task_id}] 重试上传 {len(pending)} 个片段成功")
+        return not manager["failed_uploads"]
     
     async def _wait_for_uploads_completion(self, task_id: str, timeout: float = 60.0) -> None:
         """
-        等待任务的所有并行上传完成
+        等待任务已提交的上传全部结束
         
         Args:
             task_id: 任务ID
             timeout: 超时时间（秒）
         """
-        try:
-            if task_id not in self.upload_queues or task_id not in self.upload_workers:
-                self.logger.info(f"[{task_id}] 没有并行上传队列，无需等待")
-                return
-            
-            self.logger.info(f"[{task_id}] 等待所有上传任务完成...")
-            start_time = time.time()
-            
-            # 等待队列中的所有任务完成
-            try:
-                await asyncio.wait_for(
-                    self.upload_queues[task_id].join(), timeout=timeout
-                )
-                wait_duration = time.time() - start_time
-                self.logger.info(f"[{task_id}] 上传队列任务全部完成，耗时: {wait_duration:.2f}s")
-                
-            except asyncio.TimeoutError:
-                queue_size = self.upload_queues[task_id].qsize()
-                self.logger.warning(
-                    f"[{task_id}] 等待上传完成超时，剩余任务: {queue_size}, "
-                    f"超时时间: {timeout}s"
-                )
-            
-            # 停止上传工作器
-            await self._stop_upload_worker(task_id)
-            
-        except Exception as e:
-            self.logger.error(f"[{task_id}] 等待上传完成异常: {e}")
-    
-    async def _stop_upload_worker(self, task_id: str) -> None:
-        """
-        停止任务的上传工作器
-        
-        Args:
-            task_id: 任务ID
-        """
-        try:
-            if task_id in self.upload_queues:
-                # 发送停止信号
-                await self.upload_queues[task_id].put(None)
-                self.logger.debug(f"[{task_id}] 上传工作器停止信号已发送")
-            
-            if task_id in self.upload_workers:
-                worker = self.upload_workers[task_id]
-                try:
-                    await asyncio.wait_for(worker, timeout=5.0)
-                    self.logger.info(f"[{task_id}] 上传工作器已正常关闭")
-                except asyncio.TimeoutError:
-                    worker.cancel()
-                    self.logger.warning(f"[{task_id}] 上传工作器强制取消")
-                except Exception as e:
-                    self.logger.error(f"[{task_id}] 上传工作器关闭异常: {e}")
-                
-                # 清理工作器引用
-                del self.upload_workers[task_id]
-            
-            # 清理队列引用
-            if task_id in self.upload_queues:
-                del self.upload_queues[task_id]
-                
-            self.logger.info(f"[{task_id}] 并行上传资源已清理")
-            
-        except Exception as e:
-            self.logger.error(f"[{task_id}] 停止上传工作器异常: {e}")
+        scheduler = self.hls_storage_manager.scheduler
+        pending = scheduler.pending_count(task_id)
+        if not pending:
+            return
+        self.logger.info(f"[{task_id}] 等待 {pending} 个上传完成...")
+        start_time = time.time()
+        if await scheduler.wait_task(task_id, timeout=timeout):
+            self.logger.info(f"[{task_id}] 上传全部完成，耗时: {time.time() - start_time:.2f}s")
+        else:
+            self.logger.warning(
+                f"[{task_id}] 等待上传完成超时，剩余: {scheduler.pending_count(task_id)}, 超时时间: {timeout}s"
+            )
 
     async def _save_playlist(self, task_id: str) -> None:
         """
@@ -496,7 +330,7 @@ class HLSManager:
             playlist_path.parent.mkdir(parents=True, exist_ok=True)
             
             # 使用asyncio.to_thread避免阻塞
-            await asyncio.to_thread(self._write_playlist, playlist, playlist_path)
+            await run_in_pool(POOL_IO, self._write_playlist, playlist, playlist_path)
                 
             self.logger.info(f"播放列表已更新，总计{len(playlist.segments)}个分段, 任务ID={task_id}")
         except Exception as e:
@@ -509,6 +343,14 @@ class HLSManager:
             content = playlist.dumps()
             f.write(content)
     
+    def _playlist_content(self, task_id: str) -> tuple:
+        """当前播放列表内容与片段数"""
+        manager = self.task_managers[task_id]
+        ll_writer = manager.get("ll_writer")
+        if ll_writer is not None:
+            return ll_writer.dumps(), ll_writer.segment_count
+        return manager["playlist"].dumps(), len(manager["playlist"].segments)
+    
     async def _upload_playlist_to_storage(self, task_id: str) -> None:
         """
         将播放列表上传到R2存储（支持增量更新）
@@ -520,17 +362,13 @@ class HLSManager:
             raise ValueError(f"任务 {task_id} 的HLS管理器不存在")
             
         try:
-            manager = self.task_managers[task_id]
-            playlist = manager["playlist"]
+            playlist_content, segment_count = self._playlist_content(task_id)
             
-            # 获取播放列表内容
-            playlist_content = playlist.dumps()
-            
-            # 上传到R2存储
+            # 上传到R2存储（经调度器，在已提交的片段之后）
             upload_result = await self.hls_storage_manager.upload_playlist(task_id, playlist_content)
             
             if upload_result["status"] == "success":
-                self.logger.info(f"[{task_id}] 播放列表已上传到R2: {upload_result['storage_path']} (包含 {len(playlist.segments)} 个片段)")
+                self.logger.info(f"[{task_id}] 播放列表已上传到R2: {upload_result['storage_path']} (包含 {segment_count} 个片段)")
                 
                 # 更新数据库中的HLS播放列表URL为R2的公共URL
                 storage_url = upload_result["public_url"]
@@ -577,21 +415,37 @@ class HLSManager:
                 self.logger.info(f"开始处理HLS片段 {part_index}, 任务ID={task_id}")
                 segments_dir.mkdir(parents=True, exist_ok=True)
 
+                # 首个片段的切分优先执行（首帧延迟），其余沿用调用方的优先级
+                priority = PRIORITY_CRITICAL if was_first_segment else None
+                if manager.get("ll_writer") is not None:
+                    with ffmpeg_job_context(task_id=task_id, priority=priority):
+                        new_segment_files = await self._add_ll_segment(task_id, manager, video_path, part_index)
+                    manager["has_segments"] = True
+                    
+                    if self.storage_enabled and new_segment_files:
+                        await self._queue_segment_upload(task_id, new_segment_files)
+                        await self._queue_playlist_upload(task_id)
+                    
+                    elapsed = time.time() - start_time
+                    self.logger.info(f"已添加片段 {part_index} 到LL-HLS流，耗时 {elapsed:.2f}s, 任务ID={task_id}")
+                    return {"status": "success", "part_index": part_index}
+
                 segment_filename = f'segment_{sequence_number:04d}_%03d.ts'
                 segment_pattern = str(segments_dir / segment_filename)
                 temp_playlist_path = path_manager.temp.processing_dir / f'temp_{part_index}.m3u8'
 
                 # 使用异步函数
-                await hls_segment(
-                    input_path=str(video_path),
-                    segment_pattern=segment_pattern,
-                    playlist_path=str(temp_playlist_path),
-                    hls_time=segment_time
-                )
+                with ffmpeg_job_context(task_id=task_id, priority=priority):
+                    await hls_segment(
+                        input_path=str(video_path),
+                        segment_pattern=segment_pattern,
+                        playlist_path=str(temp_playlist_path),
+                        hls_time=segment_time
+                    )
 
                 # 加入分段
                 # 使用asyncio.to_thread避免阻塞
-                temp_m3u8 = await asyncio.to_thread(m3u8.load, str(temp_playlist_path))
+                temp_m3u8 = await run_in_pool(POOL_IO, m3u8.load, str(temp_playlist_path))
                 
                 discontinuity_segment = m3u8.Segment(discontinuity=True)
                 playlist.add_segment(discontinuity_segment)
@@ -606,7 +460,7 @@ class HLSManager:
                     playlist.segments.append(segment)
 
                 # 使用并行上传队列（如果启用且可用）
-                if self.config.ENABLE_HLS_STORAGE and new_segment_files:
+                if self.storage_enabled and new_segment_files:
                     await self._queue_segment_upload(task_id, new_segment_files)
 
                 # 更新序列号
@@ -620,14 +474,14 @@ class HLSManager:
                 await self._save_playlist(task_id)
                 
                 # 使用并行上传队列上传播放列表（如果启用）
-                if self.config.ENABLE_HLS_STORAGE:
+                if self.storage_enabled:
                     await self._queue_playlist_upload(task_id)
 
                 # HLS播放列表URL现在在_upload_playlist_to_storage方法中更新为Storage URL
                 
                 # 删除临时播放列表
                 if temp_playlist_path.exists():
-                    await asyncio.to_thread(temp_playlist_path.unlink)
+                    await run_in_pool(POOL_IO, temp_playlist_path.unlink)
                 
                 elapsed = time.time() - start_time
                 self.logger.info(f"已添加片段 {part_index} 到HLS流，耗时 {elapsed:.2f}s, 任务ID={task_id}")
@@ -637,6 +491,76 @@ class HLSManager:
                 self.logger.error(f"添加HLS片段失败: {e}，耗时 {elapsed:.2f}s, 任务ID={task_id}")
                 return {"status": "error", "message": f"添加HLS片段失败: {str(e)}"}
 
+    async def _add_ll_segment(self, task_id: str, manager: Dict, video_path: Union[str, Path], part_index: int) -> List[str]:
+        """
+        LL-HLS：将视频切分为部分片段，拼接为完整片段文件，并把增量追加到播放列表
+        
+        Args:
+            task_id: 任务ID
+            manager: 任务HLS管理信息
+            video_path: 视频片段路径
+            part_index: 部分索引
+            
+        Returns:
+            List[str]: 新生成的完整片段文件路径
+        """
+        writer: LLHLSPlaylistWriter = manager["ll_writer"]
+        segments_dir = manager["segments_dir"]
+        path_manager = manager["path_manager"]
+        sequence_number = manager["sequence_number"]
+        
+        duration, keyframes = await asyncio.gather(get_duration(str(video_path)), probe_keyframes(str(video_path)))
+        cuts, independent = plan_part_cuts([k[0] for k in keyframes], duration, writer.part_target)
+        
+        list_path = path_manager.temp.processing_dir / f'parts_{part_index}.csv'
+        parts = await hls_split_parts(
+            input_path=str(video_path),
+            part_pattern=str(segments_dir / f'part_{sequence_number:04d}_%03d.ts'),
+            list_path=str(list_path),
+            cut_times=cuts
+        )
+        if not parts:
+            raise RuntimeError("未生成部分片段")
+        
+        # 部分片段时长按计划切分点计算（切分点超出实际长度时 ffmpeg 会少生成片段）
+        bounds = [0.0] + cuts[:len(parts) - 1] + [duration]
+        durations = [bounds[i + 1] - bounds[i] for i in range(len(parts))]
+        independent = (independent + [False] * len(parts))[:len(parts)]
+        
+        new_segments = []
+        new_segment_files = []
+        for offset, group in enumerate(group_parts(durations, writer.segment_target)):
+            segment_name = f"segment_{sequence_number + offset:04d}.ts"
+            segment_path = segments_dir / segment_name
+            ranges = await run_in_pool(
+                POOL_IO,
+                concat_part_files, [segments_dir / parts[i][0] for i in group], segment_path
+            )
+            # 与 _save_playlist 一致，URI 带有斜杠
+            uri = '/' + segment_name
+            new_segments.append(HLSSegment(
+                uri=uri,
+                duration=sum(durations[i] for i in group),
+                parts=[HLSPart(durations[i], uri, byterange, independent[i]) for i, byterange in zip(group, ranges)],
+                # 每个批次视频的时间戳从0开始，批次之间需要不连续标记
+                discontinuity=(offset == 0 and writer.segment_count > 0)
+            ))
+            new_segment_files.append(str(segment_path))
+        
+        manager["sequence_number"] += len(new_segments)
+        # 不写预加载提示：部分片段在整个批次完成后才一次性生成，下一个片段文件此时尚不存在，
+        # 提示它会让阻塞预加载的播放器请求到不存在的文件
+        await run_in_pool(POOL_IO, writer.append, new_segments)
+        
+        if list_path.exists():
+            await run_in_pool(POOL_IO, list_path.unlink)
+        
+        self.logger.info(
+            f"[{task_id}] LL-HLS: 片段 {part_index} 切分为 {len(parts)} 个部分片段 / {len(new_segments)} 个完整片段，"
+            f"时长 {duration:.2f}s"
+        )
+        return new_segment_files
+
     async def finalize_playlist(self, task_id: str) -> Dict:
         """
         标记播放列表为完成状态
@@ -661,11 +585,17 @@ class HLSManager:
                 has_segments = manager["has_segments"]
                 
                 if has_segments:
-                    playlist.is_endlist = True
-                    await self._save_playlist(task_id)
+                    if manager.get("ll_writer") is not None:
+                        await run_in_pool(POOL_IO, manager["ll_writer"].end)
+                    else:
+                        playlist.is_endlist = True
+                        await self._save_playlist(task_id)
                     
-                    # 上传最终的播放列表到Storage（如果启用）
-                    if self.config.ENABLE_HLS_STORAGE:
+                    # 上传最终的播放列表到Storage（如果启用）：先等待已入队的片段上传完成
+                    if self.storage_enabled:
+                        await self._wait_for_uploads_completion(task_id)
+                        if not await self._retry_failed_uploads(task_id):
+                            self.logger.error(f"[{task_id}] 存在未能上传的片段，最终播放列表可能引用缺失的片段")
                         await self._upload_playlist_to_storage(task_id)
                         self.logger.info(f"播放列表已保存并上传到Storage，标记为完成状态, 任务ID={task_id}")
                         return {"status": "success", "message": "播放列表已标记为完成并上传到Storage"}
@@ -754,23 +684,32 @@ class HLSManager:
             output_dir.mkdir(parents=True, exist_ok=True)
             self.logger.info(f"[{task_id}] HLSManager: 确保输出目录存在: {output_dir}")
             
-            # 创建合并列表文件
-            list_txt_path = path_manager.temp.processing_dir / "concat_list.txt"
-            async with aiofiles.open(list_txt_path, "w", encoding='utf-8') as f:
-                for seg_mp4 in all_processed_segment_paths:
-                    # 确保路径是绝对的并且格式正确
-                    formatted_path = str(Path(seg_mp4).resolve()).replace("\\", "/")
-                    await f.write(f"file '{formatted_path}'\n")
-            self.logger.info(f"[{task_id}] HLSManager: 合并列表文件已创建: {list_txt_path}")
-
-            # 执行视频合并
             final_output_path = output_dir / f"final_{task_id}.mp4"
             merge_start_time = time.time()
-            self.logger.info(f"[{task_id}] HLSManager: 开始调用 concat_videos, 输出到 {final_output_path}")
-            
-            # concat_videos 应该是异步的，如果不是，需要用 asyncio.to_thread 包装
-            # 假设 concat_videos 是异步的
-            final_video_path_obj = await concat_videos(str(list_txt_path), str(final_output_path))
+            assembler = path_manager.final_assembler
+            if (assembler is not None and not assembler.failed
+                    and assembler.segment_count == len(all_processed_segment_paths)):
+                # 片段已在混合完成时逐个追加到成品文件，这里只写入总时长与随机访问索引
+                self.logger.info(f"[{task_id}] HLSManager: 使用增量组装的成品文件 {assembler.path}")
+                final_video_path_obj = await assembler.finalize()
+            else:
+                if assembler is not None:
+                    self.logger.warning(
+                        f"[{task_id}] HLSManager: 增量成品不可用（失效={assembler.failed}, "
+                        f"已追加 {assembler.segment_count}/{len(all_processed_segment_paths)} 个片段），回退为整体合并"
+                    )
+                # 创建合并列表文件
+                list_txt_path = path_manager.temp.processing_dir / "concat_list.txt"
+                async with aiofiles.open(list_txt_path, "w", encoding='utf-8') as f:
+                    for seg_mp4 in all_processed_segment_paths:
+                        # 确保路径是绝对的并且格式正确
+                        formatted_path = str(Path(seg_mp4).resolve()).replace("\\", "/")
+                        await f.write(f"file '{formatted_path}'\n")
+                self.logger.info(f"[{task_id}] HLSManager: 合并列表文件已创建: {list_txt_path}")
+
+                # 执行视频合并
+                self.logger.info(f"[{task_id}] HLSManager: 开始调用 concat_videos, 输出到 {final_output_path}")
+                final_video_path_obj = await concat_videos(str(list_txt_path), str(final_output_path))
 
             # 处理合并结果
             if not final_video_path_obj or not final_video_path_obj.exists():
@@ -782,9 +721,43 @@ class HLSManager:
             final_video_path_str = str(final_video_path_obj)
             merge_duration = time.time() - merge_start_time
             
+            # 外挂字幕（批次混合时已增量写出），可选烧录为单独的成品
+            subtitles_path = None
+            subtitled_output_path = None
+            subtitle_track = path_manager.subtitle_track
+            if subtitle_track is not None:
+                await subtitle_track.finalize()
+                subtitles_path = str(subtitle_track.sidecar_path)
+                if self.subtitle_burn_in_final and subtitle_track.cue_count:
+                    burned = await burn_subtitles(
+                        final_video_path_str, subtitles_path, str(output_dir / f"final_{task_id}_subtitled.mp4")
+                    )
+                    subtitled_output_path = str(burned) if burned else None
+            
+            # 上传成品视频（大文件分段并行上传）与字幕
+            output_url = None
+            subtitles_url = None
+            subtitled_output_url = None
+            if self.storage_enabled:
+                upload_result = await self.hls_storage_manager.upload_output(task_id, final_video_path_str)
+                if upload_result["status"] == "success":
+                    output_url = upload_result["public_url"]
+                    self.logger.info(f"[{task_id}] HLSManager: 成品视频已上传: {upload_result['storage_path']}")
+                else:
+                    self.logger.error(f"[{task_id}] HLSManager: 成品视频上传失败: {upload_result.get('message')}")
+                for path, label in ((subtitles_path, "字幕"), (subtitled_output_path, "烧录字幕的成品视频")):
+                    if not path:
+                        continue
+                    extra_result = await self.hls_storage_manager.upload_output(task_id, path)
+                    if extra_result["status"] != "success":
+                        self.logger.error(f"[{task_id}] HLSManager: {label}上传失败: {extra_result.get('message')}")
+                    elif path == subtitles_path:
+                        subtitles_url = extra_result["public_url"]
+                    else:
+                        subtitled_output_url = extra_result["public_url"]
 
             # 3. 清理本地HLS文件（如果启用Storage且配置了清理）
-            if self.config.ENABLE_HLS_STORAGE and self.config.CLEANUP_LOCAL_HLS_FILES:
+            if self.storage_enabled and self.config.CLEANUP_LOCAL_HLS_FILES:
                 try:
                     if task_id in self.task_managers:
                         manager = self.task_managers[task_id]
@@ -805,7 +778,12 @@ class HLSManager:
                     self.logger.warning(f"[{task_id}] HLS本地文件清理失败: {cleanup_e}")
 
             self.logger.info(f"[{task_id}] HLSManager: 视频合并成功，耗时: {merge_duration:.2f}s")
-            return {"status": "success", "message": "视频处理成功", "output_path": final_video_path_str}
+            return {
+                "status": "success", "message": "视频处理成功",
+                "output_path": final_video_path_str, "output_url": output_url,
+                "subtitles_path": subtitles_path, "subtitles_url": subtitles_url,
+                "subtitled_output_path": subtitled_output_path, "subtitled_output_url": subtitled_output_url
+            }
             
         except Exception as e:
             msg = f"HLSManager: 视频合并过程中出错: {e}"
@@ -3,26 +3,82 @@
 # ---------------------------------------------------
 import numpy as np
 import logging
-from typing import List, Optional, Tuple
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
 import asyncio
 import gc
 import psutil
 import os
+import re
+from pathlib import Path
 
 # 工具函数导入
-from utils.audio_utils import apply_fade_effect, mix_with_background, normalize_audio
-from utils.video_utils import add_video_segment 
-from config import Config
+from utils.audio_utils import get_background_track
+from utils.mix_engine import MixEngine
+from utils.video_utils import add_video_segment, KEYFRAME_TOLERANCE
+from utils.fmp4_assembler import IncrementalMP4Assembler
+from utils.webvtt_track import WebVTTSubtitleTrack
+from utils.ffmpeg_scheduler import PRIORITY_CRITICAL, ffmpeg_job_context
+from config import Config, get_config
 from core.sentence_tools import Sentence
+from core.cloudflare.r2_hls_storage_manager import publish_rendition_outputs
 from utils.path_manager import PathManager
 from utils.async_utils import BackgroundTaskManager
 
 # 使用全局日志配置，直接获取 logger
 logger = logging.getLogger(__name__)
 
+_SEGMENT_NAME = re.compile(r"segment_(\d+)\.mp4$")
+
+
+class MixerSession:
+    """
+    单个任务的混音状态：跨批次衔接状态 + 单调递增的片段序号
+    与共享的 MediaMixer 分离，多个任务可以并行混音；同一任务的批次按提交顺序串行处理
+    跨批次只保留两样由对齐时间线决定的状态：人声末尾（句子交叉淡化长度）与
+    片段终点对齐到关键帧时顺延到下一片段的人声（carry），不依赖已渲染的混音输出
+    """
+    def __init__(self, task_id: str, mix_engine: MixEngine, first_segment_index: int = 0):
+        self.task_id = task_id
+        self.mix_engine = mix_engine
+        self.next_segment_index = first_segment_index
+        self.segments_mixed = 0
+        self.lock = asyncio.Lock()
+        # 顺延到下一片段的人声及其时间轴起点（秒）
+        self.carry: Optional[np.ndarray] = None
+        self.carry_start = 0.0
+
+    @property
+    def has_carry(self) -> bool:
+        return self.carry is not None and len(self.carry) > 0
+
+    def carry_end(self, sample_rate: int) -> float:
+        return self.carry_start + (len(self.carry) / sample_rate if self.has_carry else 0.0)
+
+    def set_carry(self, start: float, audio: Optional[np.ndarray]):
+        self.carry_start = start
+        self.carry = audio if audio is not None and len(audio) > 0 else None
+
+    def overlap_tail(self) -> np.ndarray:
+        """上一批次人声末尾（供本批次句子交叉淡化）"""
+        return self.mix_engine.history.tail(self.mix_engine.overlap)
+
+    def commit_plan(self, plan: "SegmentPlan"):
+        """片段计划生效：衔接状态前进到该片段之后"""
+        self.mix_engine.commit(plan.tail)
+        self.set_carry(plan.carry_start, plan.carry)
+
+    def reserve_segment_index(self, requested: Optional[int] = None) -> int:
+        """分配片段序号；指定序号时后续自动分配从其之后继续"""
+        index = self.next_segment_index if requested is None else requested
+        self.next_segment_index = max(self.next_segment_index, index + 1)
+        return index
+
+
 class MediaMixer:
     """
     媒体混合，负责混合音频和视频
+    实例本身无任务状态，可在任务间共享；任务状态保存在 MixerSession 中
     """
     def __init__(self):
         self.config = Config()
@@ -30,20 +86,30 @@ class MediaMixer:
         self.max_val = 0.8  # 音频最大值
         self.logger = logging.getLogger(__name__)
         
-        # 音频缓冲区设置
-        self.full_audio_buffer = np.array([], dtype=np.float32)
-        # 滑动窗口优化：固定最大缓冲区大小
-        self.max_buffer_samples = int(10.0 * self.sample_rate)  # 最多保留10秒音频
-        
         # 内存管理配置
         self.max_buffer_duration = getattr(self.config, 'MAX_BUFFER_DURATION', 10.0)  # 最大缓冲时长（秒）
         self.memory_threshold_mb = getattr(self.config, 'MEMORY_THRESHOLD_MB', 500)  # 内存阈值（MB）
         self.cleanup_interval = getattr(self.config, 'CLEANUP_INTERVAL', 5)  # 清理间隔（批次）
-        self.batch_counter = 0  # 批次计数器
+        self.use_numba = get_config().tts.mix_use_numba
         
         # 任务管理器
         self.task_manager = BackgroundTaskManager()
         
+        # 批次终点对齐关键帧（片段可整段流复制），终点之后的人声顺延到下一片段
+        self.snap_keyframes = get_config().tts.mix_snap_keyframes
+        self.snap_max_carry_seconds = get_config().tts.mix_snap_max_carry_seconds
+        
+        # 片段混合完成即追加到任务的 fMP4 成品文件（分离演绎模式不产出视频片段，不适用）
+        self.incremental_final_mp4 = get_config().tts.incremental_final_mp4
+        
+        # 字幕按批次追加到 WebVTT 字幕轨（外挂字幕 / HLS 字幕演绎），不在片段中烧录
+        self.subtitle_track_enabled = get_config().tts.subtitle_track
+        self.subtitle_segment_seconds = get_config().tts.subtitle_segment_seconds
+        
+        # 多批次渲染（render_batches）时同时进行的片段渲染数
+        render_workers = get_config().tts.mix_render_workers
+        self.render_workers = render_workers if render_workers > 0 else max(1, min(4, (os.cpu_count() or 2) // 2))
+        
         # 内存监控
         self.process = psutil.Process(os.getpid())
         
@@ -59,46 +125,31 @@ class MediaMixer:
         except Exception:
             return 0.0
     
-    def _should_cleanup_buffer(self) -> bool:
-        """检查是否需要清理缓冲区"""
-        # 检查缓冲区大小
-        buffer_duration = len(self.full_audio_buffer) / self.sample_rate
-        if buffer_duration > self.max_buffer_duration:
-            return True
-        
-        # 检查内存使用量
-        memory_usage = self._get_memory_usage()
-        if memory_usage > self.memory_threshold_mb:
-            return True
-        
-        # 检查批次间隔
-        if self.batch_counter % self.cleanup_interval == 0:
-            return True
-        
-        return False
-    
-    def _cleanup_buffer(self):
-        """清理音频缓冲区"""
-        if len(self.full_audio_buffer) == 0:
-            return
-        
-        # 保留最后几秒的音频用于平滑过渡
-        preserve_duration = min(5.0, self.max_buffer_duration * 0.5)
-        preserve_samples = int(preserve_duration * self.sample_rate)
-        
-        if len(self.full_audio_buffer) > preserve_samples:
-            old_size = len(self.full_audio_buffer)
-            self.full_audio_buffer = self.full_audio_buffer[-preserve_samples:]
-            
-            # 手动触发垃圾回收
-            gc.collect()
-            
-            memory_usage = self._get_memory_usage()
-            self.logger.info(
-                f"缓冲区清理完成 - 保留样本: {preserve_samples}, "
-                f"释放样本: {old_size - preserve_samples}, "
-                f"当前内存: {memory_usage:.2f}MB"
-            )
+    def create_session(self, task_id: str, segments_dir: Optional[Path] = None) -> MixerSession:
+        """
+        创建任务混音会话
+
+        Args:
+            task_id: 任务ID
+            segments_dir: 片段输出目录；已有片段时（任务恢复）序号从其之后继续，避免覆盖
+        """
+        first_index = 0
+        if segments_dir is not None and Path(segments_dir).is_dir():
+            indices = [int(m.group(1)) for m in map(_SEGMENT_NAME.match, os.listdir(segments_dir)) if m]
+            first_index = max(indices) + 1 if indices else 0
+        engine = MixEngine(
+            sample_rate=self.sample_rate,
+            overlap=self.config.AUDIO_OVERLAP,
+            history_seconds=0.0,  # 只保留交叉淡化所需的人声末尾
+            use_numba=self.use_numba
+        )
+        return MixerSession(task_id, engine, first_segment_index=first_index)
+
+    def session_for_context(self, context, path_manager: PathManager) -> MixerSession:
+        """获取（必要时创建）保存在任务上下文中的混音会话"""
+        if context.mixer_session is None:
+            context.mixer_session = self.create_session(context.task_id, path_manager.temp.segments_dir)
+        return context.mixer_session
     
     def _create_status_update_task(self, task_id: str, status: str):
         """创建状态更新后台任务"""
@@ -110,17 +161,290 @@ class MediaMixer:
             self,
             sentences_batch: List[Sentence],
             path_manager: PathManager,
+            session: MixerSession,
+            batch_counter: Optional[int] = None,
+            snap_to_keyframes: bool = False
+    ) -> Optional[str]:
+        """
+        处理一批句子并返回处理后的视频片段路径
+
+        Args:
+            sentences_batch: 本批次句子
+            path_manager: 任务路径管理器
+            session: 任务混音会话
+            batch_counter: 片段序号，None 表示由会话自动递增分配
+            snap_to_keyframes: 片段终点对齐到关键帧，终点后的人声顺延到下一批次；
+                调用方需在流结束时调用 flush 输出剩余部分
+        """
+        task_id = session.task_id
+        if not sentences_batch:
+            logger.warning(f"[{task_id}] mix_media: 收到空的句子列表")
+            return None
+
+        async with session.lock:
+            batch_counter = session.reserve_segment_index(batch_counter)
+            # 分离演绎模式不切视频，无需对齐关键帧
+            snap = snap_to_keyframes and self.snap_keyframes and path_manager.hls_renditions is None
+            return await self._mix_batch(sentences_batch, path_manager, session, batch_counter, snap)
+
+    async def flush(
+            self,
+            path_manager: PathManager,
+            session: MixerSession,
+            batch_counter: Optional[int] = None,
+            end_stream: bool = False
+    ) -> Optional[str]:
+        """
+        输出因关键帧对齐而顺延的剩余人声（无剩余时返回 None）
+        分离演绎模式下输出音频演绎中不足一帧的尾部，end_stream 时同时结束音频播放列表，返回主播放列表路径
+        end_stream 时完成增量组装的成品文件与字幕轨
+        """
+        async with session.lock:
+            renditions = path_manager.hls_renditions
+            if renditions is not None and not session.has_carry:
+                files = await (renditions.finalize() if end_stream else renditions.flush())
+                if files or end_stream:
+                    await publish_rendition_outputs(session.task_id, files, [renditions.audio_playlist_path])
+                if end_stream:
+                    await self._finalize_subtitles(path_manager, session.task_id)
+                return str(renditions.master_path) if files else None
+            segment_path = None
+            if session.has_carry:
+                batch_counter = session.reserve_segment_index(batch_counter)
+                segment_path = await self._mix_batch([], path_manager, session, batch_counter, False)
+            if end_stream:
+                await self._finalize_assembler(path_manager, session.task_id)
+                await self._finalize_subtitles(path_manager, session.task_id)
+            return segment_path
+
+    async def render_batches(
+            self,
+            batches: List[List[Sentence]],
+            path_manager: PathManager,
+            session: MixerSession,
+            snap_to_keyframes: bool = False,
+            on_segment: Optional[Callable[[int, str], Awaitable[None]]] = None
+    ) -> List[Optional[str]]:
+        """
+        并行渲染多个批次（如编辑后整任务重新渲染），按批次顺序发布
+
+        先按对齐后的时间线依次计算各片段的时间范围、人声及衔接状态（只涉及人声拼接，开销很小），
+        再在渲染池中并发读取背景音、混音并切片视频；已完成的片段按序号顺序追加到成品文件/字幕轨/音频演绎，
+        并回调 on_segment(片段序号, 输出路径) 发布到 HLS
+
+        Args:
+            batches: 按时间线顺序排列的批次句子
+            path_manager: 任务路径管理器
+            session: 任务混音会话（从其当前衔接状态开始，完成后状态前进到最后一个批次之后）
+            snap_to_keyframes: 片段终点对齐到关键帧（同 mix_media）
+            on_segment: 片段按序发布的回调
+
+        Returns:
+            与 batches 等长的输出路径列表，失败的批次为 None
+        """
+        task_id = session.task_id
+        async with session.lock:
+            renditions = path_manager.hls_renditions
+            snap = snap_to_keyframes and self.snap_keyframes and renditions is None
+            media_files = self._media_files(path_manager, task_id)
+            if media_files is None:
+                return [None] * len(batches)
+
+            plans: List[Optional[SegmentPlan]] = []
+            tail, carry_start, carry = session.overlap_tail(), session.carry_start, session.carry
+            for sentences in batches:
+                plan = plan_segment(
+                    session.reserve_segment_index(), sentences, session.mix_engine, tail, carry_start, carry,
+                    media_files['media_probe'], snap, self.snap_max_carry_seconds, task_id
+                )
+                plans.append(plan)
+                if plan is not None:
+                    tail, carry_start, carry = plan.tail, plan.carry_start, plan.carry
+            self.logger.info(
+                f"[{task_id}] 并行渲染 {len(batches)} 个批次（有效 {sum(p is not None for p in plans)}），"
+                f"渲染并发 {self.render_workers}"
+            )
+
+            semaphore = asyncio.Semaphore(self.render_workers)
+
+            async def _render(plan: SegmentPlan) -> Optional[np.ndarray]:
+                async with semaphore:
+                    return await render_segment(
+                        plan, media_files, str(self._segment_path(path_manager, plan.index)),
+                        self.config, self.sample_rate, 1.0, session.mix_engine, task_id
+                    )
+
+            renders = [asyncio.create_task(_render(plan)) if plan is not None else None for plan in plans]
+            results: List[Optional[str]] = []
+            try:
+                for plan, render in zip(plans, renders):
+                    if plan is None:
+                        results.append(None)
+                        continue
+                    try:
+                        mixed = await render
+                        if mixed is not None and renditions is not None:
+                            with ffmpeg_job_context(priority=_segment_priority(plan.index)):
+                                files = await renditions.append_audio(mixed, plan.start)
+                            if files:
+                                await publish_rendition_outputs(task_id, files, [renditions.audio_playlist_path])
+                    except Exception as e:
+                        self.logger.exception(f"[{task_id}] 批次 {plan.index} 渲染失败: {e}")
+                        mixed = None
+                    if mixed is None:
+                        results.append(None)
+                        continue
+                    output = await self._publish_segment(
+                        path_manager, session, plan.index, self._segment_path(path_manager, plan.index),
+                        plan.sentences, plan.end
+                    )
+                    results.append(output)
+                    if on_segment is not None:
+                        await on_segment(plan.index, output)
+            finally:
+                for render in renders:
+                    if render is not None and not render.done():
+                        render.cancel()
+                await asyncio.gather(*(r for r in renders if r is not None), return_exceptions=True)
+            # 后续批次（流式追加）从最后一个计划的衔接状态继续
+            last = next((plan for plan in reversed(plans) if plan is not None), None)
+            if last is not None:
+                session.commit_plan(last)
+            self.logger.info(f"[{task_id}] 并行渲染完成: {sum(r is not None for r in results)}/{len(batches)}")
+            return results
+
+    async def _append_subtitles(
+            self,
+            path_manager: PathManager,
+            task_id: str,
+            sentences: List[Sentence],
+            end_time: float,
+            target_language: str
+    ):
+        """把批次句子追加到任务字幕轨；分离演绎模式下字幕演绎写入演绎目录并加入主播放列表"""
+        track = path_manager.subtitle_track
+        try:
+            if track is None:
+                renditions = path_manager.hls_renditions
+                if renditions is not None:
+                    track = WebVTTSubtitleTrack(
+                        task_id, renditions.output_dir, target_language, self.subtitle_segment_seconds, hls=True
+                    )
+                else:
+                    track = WebVTTSubtitleTrack(task_id, path_manager.temp.get_subdir("subtitles"), target_language)
+                path_manager.set_subtitle_track(track)
+                if renditions is not None:
+                    await track.open()
+                    await renditions.set_subtitles(track.playlist_path.name, target_language)
+                    await publish_rendition_outputs(task_id, [], [track.playlist_path, renditions.master_path])
+            start_time, _ = _calculate_time_params(sentences)
+            files = await track.append(sentences, start_time, end_time)
+            await _publish_subtitle_outputs(path_manager, task_id, track, files)
+        except Exception as e:
+            self.logger.warning(f"[{task_id}] 字幕轨追加失败: {e}")
+
+    async def _finalize_subtitles(self, path_manager: PathManager, task_id: str):
+        track = path_manager.subtitle_track
+        if track is None:
+            return
+        try:
+            files = await track.finalize()
+            await _publish_subtitle_outputs(path_manager, task_id, track, files)
+        except Exception as e:
+            self.logger.warning(f"[{task_id}] 字幕轨完成失败: {e}")
+
+    async def _append_to_final(self, path_manager: PathManager, task_id: str, segment_path: Path):
+        """把刚完成的片段追加到增量成品文件；失败后成品失效，任务结束时回退为整体合并"""
+        assembler = path_manager.final_assembler
+        if assembler is None:
+            output_path = path_manager.temp.get_subdir("output") / f"final_{task_id}.mp4"
+            assembler = IncrementalMP4Assembler(output_path, task_id)
+            path_manager.set_final_assembler(assembler)
+        if assembler.failed or assembler.finalized:
+            return
+        try:
+            await assembler.append(segment_path)
+        except Exception as e:
+            self.logger.warning(f"[{task_id}] 片段追加到成品文件失败，任务结束时回退为整体合并: {e}")
+
+    async def _finalize_assembler(self, path_manager: PathManager, task_id: str):
+        assembler = path_manager.final_assembler
+        if assembler is None or assembler.failed or assembler.segment_count == 0:
+            return
+        try:
+            await assembler.finalize()
+        except Exception as e:
+            assembler.failed = True
+            self.logger.warning(f"[{task_id}] 成品文件完成失败: {e}")
+
+    def _media_files(self, path_manager: PathManager, task_id: str) -> Optional[dict]:
+        """从路径管理器收集混合所需的媒体信息，缺少视频或音频时返回 None"""
+        media_files = {}
+        media_files['silent_video_path'] = path_manager.video_file_path
+        media_files['vocals_audio_path'] = path_manager.audio_file_path
+        media_files['background_audio_path'] = path_manager.instrumental_file_path  # 使用分离的背景音
+        media_files['background_source'] = path_manager.background_source  # 按区间读取的背景音（优先）
+        # 任务初始化时的视频探测结果（分辨率、关键帧索引），缺失时使用默认尺寸
+        probe = path_manager.media_probe
+        media_files['media_probe'] = probe
+        media_files['video_width'] = probe.width if probe and probe.width else 1920
+        media_files['video_height'] = probe.height if probe and probe.height else 1080
+        # 分离演绎：视频已在任务初始化时切分，本批次只编码音频
+        media_files['hls_renditions'] = path_manager.hls_renditions
+        
+        if not media_files.get('silent_video_path') or not media_files.get('vocals_audio_path'):
+            self.logger.error(f"[{task_id}] MediaMixer: 缺少视频或音频文件路径")
+            return None
+        return media_files
+
+    def _segment_path(self, path_manager: PathManager, batch_counter: int) -> Path:
+        output_path = path_manager.temp.segments_dir / f"segment_{batch_counter}.mp4"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        return output_path
+
+    async def _publish_segment(
+            self,
+            path_manager: PathManager,
+            session: MixerSession,
             batch_counter: int,
-            task_id: str
+            output_path: Path,
+            sentences: List[Sentence],
+            segment_end: float
+    ) -> str:
+        """片段完成后按批次顺序追加到成品文件与字幕轨，返回片段（或主播放列表）路径"""
+        task_id = session.task_id
+        renditions = path_manager.hls_renditions
+        session.segments_mixed += 1
+        logger.info(f"[{task_id}] 批次 {batch_counter} 处理完成")
+        
+        if renditions is None and self.incremental_final_mp4:
+            await self._append_to_final(path_manager, task_id, output_path)
+        if self.subtitle_track_enabled and sentences:
+            # 字幕语言暂固定为中文（与片段混合一致）
+            await self._append_subtitles(path_manager, task_id, sentences, segment_end, 'zh')
+        
+        # 定期强制垃圾回收（保留这个机制以提高内存效率）
+        if batch_counter % self.cleanup_interval == 0:
+            gc.collect()
+        
+        if renditions is not None:
+            return str(renditions.master_path)
+        return str(output_path)
+
+    async def _mix_batch(
+            self,
+            sentences_batch: List[Sentence],
+            path_manager: PathManager,
+            session: MixerSession,
+            batch_counter: int,
+            snap_to_keyframes: bool = False
     ) -> Optional[str]:
-        """处理一批句子并返回处理后的视频片段路径"""
+        """在会话锁内混合一个批次，输出 segment_{batch_counter}.mp4"""
+        task_id = session.task_id
         try:
-            # 更新批次计数器
-            self.batch_counter = batch_counter
-            
             # 记录内存使用情况
             memory_usage = self._get_memory_usage()
-            buffer_duration = len(self.full_audio_buffer) / self.sample_rate
+            buffer_duration = session.mix_engine.history_seconds
             
             self.logger.info(
                 f"[{task_id}] 开始处理批次 {batch_counter} - "
@@ -134,32 +458,17 @@ class MediaMixer:
                 self.logger.info(f"[{task_id}] 第一批次，更新状态为 'mixing'")
                 self._create_status_update_task(task_id, 'mixing')
 
-            if not sentences_batch:
-                logger.warning(f"[{task_id}] mix_media: 收到空的句子列表")
-                return None
-
-            # 使用传递的path_manager获取媒体文件路径
-            media_files = {}
             target_language = 'zh'  # 默认中文
-            generate_subtitle = False  # 默认不生成字幕
-            
-            # 从path_manager获取媒体文件路径
-            media_files['silent_video_path'] = path_manager.video_file_path
-            media_files['vocals_audio_path'] = path_manager.audio_file_path
-            media_files['background_audio_path'] = path_manager.instrumental_file_path  # 使用分离的背景音
-            media_files['video_width'] = 1920  # 默认视频尺寸
-            media_files['video_height'] = 1080
-            
-            if not media_files.get('silent_video_path') or not media_files.get('vocals_audio_path'):
-                self.logger.error(f"[{task_id}] MediaMixer: 缺少视频或音频文件路径")
+            generate_subtitle = False  # 不在片段中烧录字幕（字幕轨按批次单独追加）
+            media_files = self._media_files(path_manager, task_id)
+            if media_files is None:
                 return None
             
-            output_path = path_manager.temp.segments_dir / f"segment_{batch_counter}.mp4"
-            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path = self._segment_path(path_manager, batch_counter)
             
             max_val = 1.0
             
-            success, updated_buffer = await create_mixed_segment(
+            success = await create_mixed_segment(
                 sentences=sentences_batch,
                 media_files=media_files,
                 output_path=str(output_path),
@@ -167,30 +476,22 @@ class MediaMixer:
                 config=self.config,
                 sample_rate=self.sample_rate,
                 max_val=max_val,
-                full_audio_buffer=self.full_audio_buffer,
+                session=session,
                 task_id=task_id,
                 target_language=target_language,
-                max_buffer_samples=self.max_buffer_samples  # 传递滑动窗口参数
+                snap_end=snap_to_keyframes,
+                max_carry_seconds=self.snap_max_carry_seconds,
+                segment_index=batch_counter
             )
             
             if not success:
                 logger.error(f"[{task_id}] 批次 {batch_counter} 处理失败")
                 return None
             
-            # 更新缓冲区
-            self.full_audio_buffer = updated_buffer
-            
-            logger.info(f"[{task_id}] 批次 {batch_counter} 处理完成")
-            
-            # 清理临时变量
-            if 'updated_buffer' in locals() and updated_buffer is not self.full_audio_buffer:
-                del updated_buffer
-            
-            # 定期强制垃圾回收（保留这个机制以提高内存效率）
-            if batch_counter % self.cleanup_interval == 0:
-                gc.collect()
-            
-            return str(output_path)
+            # 本批次成功后会话的顺延起点即片段终点
+            return await self._publish_segment(
+                path_manager, session, batch_counter, output_path, sentences_batch, session.carry_start
+            )
         except Exception as e:
             self.logger.error(f"[{task_id}] 音视频混合处理失败: {e}")
             return None
@@ -202,16 +503,29 @@ class MediaMixer:
                 await self.task_manager.close()
                 self.logger.info("MediaMixer任务管理器已关闭")
                 
-            # 清理缓冲区
-            if hasattr(self, 'full_audio_buffer'):
-                del self.full_audio_buffer
-                
             # 强制垃圾回收
             gc.collect()
             
         except Exception as e:
             self.logger.error(f"MediaMixer清理失败: {e}")
 
+
+@dataclass(eq=False)
+class SegmentPlan:
+    """
+    单个片段的渲染计划：时间范围、人声与衔接状态在渲染前由对齐后的时间线确定，
+    渲染时不再依赖其他批次，可并发进行
+    """
+    index: int
+    sentences: List[Sentence]
+    start: float  # 片段在时间轴上的起点（秒）
+    end: float  # 片段终点（秒，对齐关键帧时早于自然终点）
+    vocals: np.ndarray  # 片段范围内的人声（含上一批次顺延部分）
+    tail: np.ndarray  # 时间线在自然终点处的人声末尾（下一批次句子交叉淡化用）
+    carry_start: float  # 顺延人声的时间轴起点（即片段终点）
+    carry: Optional[np.ndarray]  # 顺延到下一片段的人声
+
+
 async def create_mixed_segment(
     sentences: List[Sentence],
     media_files: dict,
@@ -220,109 +534,257 @@ async def create_mixed_segment(
     config: Config,
     sample_rate: int,
     max_val: float,
-    full_audio_buffer: np.ndarray,
+    session: MixerSession,
     task_id: str,
     target_language: str,
-    max_buffer_samples: int
-) -> Tuple[bool, np.ndarray]:
+    snap_end: bool = False,
+    max_carry_seconds: float = 0.0,
+    segment_index: int = 0
+) -> bool:
     """
     将一批句子的合成音频与原视频片段混合，并可生成带字幕的视频。
-    返回(成功标志, 更新后的音频缓冲区)
+    media_files 含 hls_renditions 时不处理视频，混合后的音频直接追加到配音音频演绎。
+    上一批次顺延的人声接在本批次之前；snap_end 时片段终点对齐到关键帧，其后的人声顺延。
+    sentences 为空时只输出顺延的人声（flush）。
+    成功后会话的衔接状态前进到本片段之后。
     """
-    full_audio = None
-    updated_audio_buffer = None
-    audio_data = None
-    
     try:
-        if not sentences:
-            logger.warning(f"[{task_id}] create_mixed_segment: 收到空的句子列表")
-            return False, full_audio_buffer
+        if not media_files:
+            logger.error(f"[{task_id}] create_mixed_segment: 找不到媒体文件信息")
+            return False
+        plan = plan_segment(
+            segment_index, sentences, session.mix_engine, session.overlap_tail(),
+            session.carry_start, session.carry, media_files.get('media_probe'),
+            snap_end, max_carry_seconds, task_id
+        )
+        if plan is None:
+            return False
+        mixed = await render_segment(
+            plan, media_files, output_path, config, sample_rate, max_val, session.mix_engine, task_id,
+            generate_subtitle=generate_subtitle, target_language=target_language
+        )
+        if mixed is None:
+            return False
+        renditions = media_files.get('hls_renditions')
+        if renditions is not None:
+            with ffmpeg_job_context(priority=_segment_priority(plan.index)):
+                files = await renditions.append_audio(mixed, plan.start)
+            if files:
+                await publish_rendition_outputs(task_id, files, [renditions.audio_playlist_path])
+        session.commit_plan(plan)
+        return True
+        
+    except Exception as e:
+        logger.exception(f"[{task_id}] create_mixed_segment 执行出错，错误: {e}")
+        session.set_carry(0.0, None)
+        return False
 
-        full_audio = _concat_audio_segments(sentences, full_audio_buffer, config.AUDIO_OVERLAP)
-        if len(full_audio) == 0:
-            logger.error(f"[{task_id}] create_mixed_segment: 没有有效的合成音频数据")
-            return False, full_audio_buffer
+async def _publish_subtitle_outputs(
+    path_manager: PathManager, task_id: str, track: WebVTTSubtitleTrack, files: List[str]
+):
+    """分离演绎模式下提交字幕片段与字幕播放列表上传（外挂字幕仍在追加，不作为片段上传）"""
+    if path_manager.hls_renditions is None or track.playlist_path is None:
+        return
+    segments = [f for f in files if Path(f) != track.sidecar_path]
+    if segments or track.finalized:
+        await publish_rendition_outputs(task_id, segments, [track.playlist_path])
 
-        start_time_param, duration = _calculate_time_params(sentences)
 
-        if not media_files:
-            logger.error(f"[{task_id}] create_mixed_segment: 找不到媒体文件信息")
-            return False, full_audio_buffer
-
-        background_audio_path = media_files.get('background_audio_path')
-        if background_audio_path:
-            audio_data = await _process_background_audio(
-                background_audio_path, 
-                start_time_param, 
-                duration, 
-                full_audio,
-                sample_rate, 
-                config.VOCALS_VOLUME, 
-                config.BACKGROUND_VOLUME, 
-                max_val
-            )
-            if audio_data is not None:
-                full_audio = audio_data
-                del audio_data
-                audio_data = None
-
-        video_path = media_files.get('silent_video_path')
-        if not video_path:
-            logger.warning(f"[{task_id}] create_mixed_segment: 本片段无video_path可用")
-            return False, full_audio_buffer
-            
-        # Extract video_width and video_height from media_files
-        video_width = media_files.get('video_width', -1)
-        video_height = media_files.get('video_height', -1)
-        if video_width == -1 or video_height == -1:
-            logger.warning(f"[{task_id}] create_mixed_segment: video_width or video_height not found or invalid in media_files. Defaulting or skipping scaling.")
-            # Potentially set to a default or handle error, for now, it will pass -1
-
-        updated_audio_buffer = np.concatenate((full_audio_buffer, full_audio))
+def plan_segment(
+    index: int,
+    sentences: List[Sentence],
+    mix_engine: MixEngine,
+    tail: np.ndarray,
+    carry_start: float,
+    carry: Optional[np.ndarray],
+    probe=None,
+    snap_end: bool = False,
+    max_carry_seconds: float = 0.0,
+    task_id: str = ""
+) -> Optional[SegmentPlan]:
+    """
+    按对齐后的时间线计算片段计划（只拼接人声，不读取背景音、不调用 ffmpeg）
+
+    Args:
+        index: 片段序号
+        sentences: 本批次句子（为空时只输出顺延的人声）
+        mix_engine: 混音引擎（交叉淡化长度与采样率）
+        tail: 上一批次的人声末尾
+        carry_start / carry: 上一批次顺延的人声及其起点
+        probe: 视频探测结果（关键帧索引）
+        snap_end: 片段终点对齐到关键帧
+        max_carry_seconds: 对齐时允许顺延的最长时长
+
+    Returns:
+        片段计划；没有有效人声或片段时长无效时返回 None
+    """
+    sample_rate = mix_engine.sample_rate
+    has_carry = carry is not None and len(carry) > 0
+    if sentences:
+        batch_audio = _concat_audio_segments(sentences, mix_engine, tail)
+        start_time, duration = _calculate_time_params(sentences)
+    else:
+        batch_audio = np.zeros(0, dtype=np.float32)
+        start_time, duration = carry_start + (len(carry) / sample_rate if has_carry else 0.0), 0.0
+    natural_end = start_time + duration
+
+    segment_start, vocals = _prepend_carry(carry_start, carry, start_time, batch_audio, sample_rate)
+    if len(vocals) == 0:
+        logger.error(f"[{task_id}] plan_segment: 没有有效的合成音频数据")
+        return None
+
+    segment_end = natural_end
+    if snap_end and probe is not None:
+        segment_end = _snap_segment_end(probe, segment_start, natural_end, max_carry_seconds)
+    if segment_end - segment_start <= 0:
+        logger.error(f"[{task_id}] plan_segment: 无效的片段时长 {segment_end - segment_start:.3f}s")
+        return None
+    split = int(round((segment_end - segment_start) * sample_rate))
+    timeline_length = int(round((natural_end - segment_start) * sample_rate))
+    timeline = vocals[:timeline_length]
+    next_tail = timeline[-mix_engine.overlap:].copy() if mix_engine.overlap > 0 else timeline[:0].copy()
+    carry_out = vocals[split:timeline_length]
+    return SegmentPlan(
+        index=index,
+        sentences=sentences,
+        start=segment_start,
+        end=segment_end,
+        vocals=vocals[:split],
+        tail=next_tail,
+        carry_start=segment_end,
+        carry=carry_out.copy() if len(carry_out) else None
+    )
+
+async def render_segment(
+    plan: SegmentPlan,
+    media_files: dict,
+    output_path: str,
+    config: Config,
+    sample_rate: int,
+    max_val: float,
+    mix_engine: MixEngine,
+    task_id: str,
+    generate_subtitle: bool = False,
+    target_language: str = 'zh'
+) -> Optional[np.ndarray]:
+    """
+    渲染片段：读取片段区间的背景音并混音，非分离演绎模式下截取视频并合并输出
+    只依赖片段计划本身，可与其他片段并发执行；分离演绎的音频追加由调用方按顺序完成
+
+    Returns:
+        混合后的音频，失败时返回 None
+    """
+    full_audio = plan.vocals
+    start_time_param, duration = plan.start, plan.end - plan.start
+
+    background_source = media_files.get('background_source')
+    background_audio_path = media_files.get('background_audio_path')
+    if background_source is not None:
+        audio_data = await _process_background_source(
+            background_source,
+            start_time_param,
+            duration,
+            full_audio,
+            mix_engine,
+            config.VOCALS_VOLUME,
+            config.BACKGROUND_VOLUME,
+            max_val
+        )
+        if audio_data is not None:
+            full_audio = audio_data
+    elif background_audio_path:
+        audio_data = await _process_background_audio(
+            background_audio_path, 
+            start_time_param, 
+            duration, 
+            full_audio,
+            mix_engine, 
+            config.VOCALS_VOLUME, 
+            config.BACKGROUND_VOLUME, 
+            max_val
+        )
+        if audio_data is not None:
+            full_audio = audio_data
+
+    if media_files.get('hls_renditions') is not None:
+        return full_audio
+
+    video_path = media_files.get('silent_video_path')
+    if not video_path:
+        logger.warning(f"[{task_id}] render_segment: 本片段无video_path可用")
+        return None
         
-        # 滑动窗口优化：只保留最后N秒的音频
-        if len(updated_audio_buffer) > max_buffer_samples:
-            updated_audio_buffer = updated_audio_buffer[-max_buffer_samples:]
+    # Extract video_width and video_height from media_files
+    video_width = media_files.get('video_width', -1)
+    video_height = media_files.get('video_height', -1)
+    if video_width == -1 or video_height == -1:
+        logger.warning(f"[{task_id}] render_segment: video_width or video_height not found or invalid in media_files. Defaulting or skipping scaling.")
+        # Potentially set to a default or handle error, for now, it will pass -1
 
+    probe = media_files.get('media_probe')
+    with ffmpeg_job_context(priority=_segment_priority(plan.index)):
         await add_video_segment(
             video_path=video_path,
             start_time=start_time_param,
             duration=duration,
             audio_data=full_audio,
             output_path=output_path,
-            sentences=sentences,
+            sentences=plan.sentences,
             generate_subtitle=generate_subtitle,
             target_language=target_language,
             sample_rate=sample_rate,
             video_width=video_width,      # Pass video_width
-            video_height=video_height    # Pass video_height
+            video_height=video_height,    # Pass video_height
+            probe=probe
         )
-        
-        return True, updated_audio_buffer
-        
-    except Exception as e:
-        logger.exception(f"[{task_id}] create_mixed_segment 执行出错，错误: {e}")
-        return False, full_audio_buffer
-    finally:
-        if 'full_audio' in locals() and full_audio is not None and full_audio is not updated_audio_buffer: 
-            del full_audio
-
-def _concat_audio_segments(sentences: List[Sentence], full_audio_buffer: np.ndarray, overlap: float) -> np.ndarray:
-    """拼接所有句子的合成音频"""
-    full_audio = np.array([], dtype=np.float32)
+    return full_audio
+
+def _segment_priority(index: int) -> Optional[int]:
+    """首个片段决定首帧延迟，其 ffmpeg 作业优先于其他任务的普通片段"""
+    return PRIORITY_CRITICAL if index == 0 else None
+
+def _prepend_carry(
+    carry_start: float, carry: Optional[np.ndarray], start_time: float, audio: np.ndarray, sample_rate: int
+) -> Tuple[float, np.ndarray]:
+    """
+    把顺延的人声接到本批次音频之前
+
+    Returns:
+        (时间轴起点, 人声)；两者之间的空隙补静音，重叠部分以本批次为准
+    """
+    if carry is None or len(carry) == 0:
+        return start_time, audio
+    gap = int(round((start_time - carry_start) * sample_rate)) - len(carry)
+    head = carry if gap >= 0 else carry[:max(0, len(carry) + gap)]
+    parts = [head, np.zeros(max(0, gap), dtype=np.float32), audio]
+    return carry_start, np.concatenate(parts)
+
+def _concat_audio_segments(sentences: List[Sentence], mix_engine: MixEngine, tail: Optional[np.ndarray] = None) -> np.ndarray:
+    """拼接所有句子的合成音频（输出缓冲区按总长度一次性分配；tail 为上一批次人声末尾）"""
+    segments = []
     for sentence in sentences:
         if sentence.generated_audio is not None and len(sentence.generated_audio) > 0:
-            audio_data = np.asarray(sentence.generated_audio, dtype=np.float32)
-            if len(full_audio) > 0:
-                audio_data = apply_fade_effect(audio_data, full_audio_buffer, overlap)
-            full_audio = np.concatenate((full_audio, audio_data))
+            segments.append(sentence.generated_audio)
         else:
             logger.warning(
                 "句子音频生成失败或为空: text=%r, UUID=%s",
                 sentence.original_text,
                 sentence.model_input.get("uuid", "unknown")
             )
-    return full_audio
+    return mix_engine.concat(segments, tail)
+
+def _snap_segment_end(probe, segment_start: float, natural_end: float, max_carry_seconds: float) -> float:
+    """
+    把片段终点提前到不晚于自然终点的最后一个关键帧（使片段可整段流复制）
+    关键帧不在片段内、或需要顺延的时长超过 max_carry_seconds 时保持原终点
+    """
+    keyframe = probe.keyframe_at_or_before(natural_end + KEYFRAME_TOLERANCE)
+    if keyframe is None:
+        return natural_end
+    snapped = keyframe[0]
+    if snapped <= segment_start + KEYFRAME_TOLERANCE or natural_end - snapped > max_carry_seconds:
+        return natural_end
+    return min(snapped, natural_end)
 
 def _calculate_time_params(sentences: List[Sentence]) -> tuple:
     """计算时间参数"""
@@ -333,22 +795,27 @@ def _calculate_time_params(sentences: List[Sentence]) -> tuple:
     duration = sum(s.adjusted_duration for s in sentences) / 1000.0
     return start_time, duration
 
+async def _process_background_source(
+    source, start_time: float, duration: float, audio_data: np.ndarray,
+    mix_engine: MixEngine, vocals_volume: float, background_volume: float, max_val: float
+) -> np.ndarray:
+    """
+    处理按区间读取的背景音（BackgroundTrack 内存映射 / WindowedSeparation 窗口拼接）
+    只读取本批次区间；窗口化分离时未就绪的窗口以静音代替
+    """
+    wait_timeout = get_config().tts.separation_window_wait_seconds
+    bg_segment = await source.read(start_time, duration, wait_timeout=wait_timeout or None)
+    return mix_engine.mix(audio_data, bg_segment, duration, vocals_volume, background_volume, max_val)
+
 async def _process_background_audio(
     bg_path: str, start_time: float, duration: float, audio_data: np.ndarray,
-    sample_rate: int, vocals_volume: float, background_volume: float, max_val: float
+    mix_engine: MixEngine, vocals_volume: float, background_volume: float, max_val: float
 ) -> np.ndarray:
-    """处理背景音频 - 异步版本"""
+    """处理背景音频 - 异步版本（读取失败时只输出人声）"""
+    bg_segment = None
     try:
-        mixed_audio = await mix_with_background(
-            bg_path=bg_path,
-            start_time=start_time,
-            duration=duration,
-            audio_data=audio_data,
-            sample_rate=sample_rate,
-            vocals_volume=vocals_volume,
-            background_volume=background_volume
-        )
-        return normalize_audio(mixed_audio, max_val)
-    finally:
-        if 'mixed_audio' in locals():
-            del mixed_audio
+        track = get_background_track(bg_path, mix_engine.sample_rate)
+        bg_segment = await track.read(start_time, duration)
+    except Exception as e:
+        logger.error(f"读取背景音频失败: {bg_path}, 错误: {e}", exc_info=True)
+    return mix_engine.mix(audio_data, bg_segment, duration, vocals_volume, background_volume, max_val)
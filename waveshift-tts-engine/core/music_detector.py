@@ -0,0 +1,184 @@
+"""
+背景音乐检测 - 在分离之前对降采样音频做廉价的频谱/谐波特征分析
+判断整段音频或各区间是否含有背景音乐，纯语音内容（讲座、播客）可跳过分离
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+from utils.executors import POOL_DSP, run_in_pool
+from utils.ffmpeg_scheduler import JOB_EXTRACT, get_ffmpeg_scheduler
+
+logger = logging.getLogger(__name__)
+
+_N_FFT = 512
+_HOP = 256
+_EPS = 1e-10
+
+
+def _frame_features(x: np.ndarray, sample_rate: int) -> Optional[Dict[str, float]]:
+    """
+    计算一个区间的特征
+    - low_energy_ratio: 能量低于均值一半的帧占比（语音停顿多，音乐持续）
+    - quiet_level_db: 最安静20%帧相对响亮帧（80分位）的电平（停顿处是否仍有声音）
+    - quiet_flatness: 安静帧的频谱平坦度（噪声接近1，音乐的谐波成分较低）
+    - stability: 相邻帧对数频谱（去均值）的相关系数中位数（音乐的持续音更稳定）
+    """
+    if len(x) < _N_FFT * 4:
+        return None
+    num_frames = 1 + (len(x) - _N_FFT) // _HOP
+    frames = np.lib.stride_tricks.as_strided(
+        x, shape=(num_frames, _N_FFT), strides=(x.strides[0] * _HOP, x.strides[0])
+    )
+    rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+    mean_rms = float(np.mean(rms))
+    if mean_rms < 1e-4:
+        # 几乎无声
+        return {"silent": 1.0}
+
+    window = np.hanning(_N_FFT).astype(np.float32)
+    mag = np.abs(np.fft.rfft(frames * window, axis=1))
+    freqs = np.fft.rfftfreq(_N_FFT, 1.0 / sample_rate)
+    band = (freqs >= 100) & (freqs <= 3500)
+    mag = mag[:, band] + _EPS
+
+    flatness = np.exp(np.mean(np.log(mag), axis=1)) / np.mean(mag, axis=1)
+
+    log_mag = np.log(mag)
+    log_mag -= log_mag.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(log_mag, axis=1) + _EPS
+    cosine = np.sum(log_mag[1:] * log_mag[:-1], axis=1) / (norms[1:] * norms[:-1])
+
+    loud_rms = float(np.percentile(rms, 80)) + _EPS
+    quiet = rms <= np.percentile(rms, 20)
+
+    return {
+        "silent": 0.0,
+        "low_energy_ratio": float(np.mean(rms < 0.5 * mean_rms)),
+        "quiet_level_db": float(20 * np.log10((np.median(rms[quiet]) + _EPS) / loud_rms)),
+        "quiet_flatness": float(np.median(flatness[quiet])),
+        "stability": float(np.median(cosine)) if len(cosine) else 0.0,
+    }
+
+
+def _music_score(features: Optional[Dict[str, float]]) -> float:
+    """把特征组合成 0~1 的音乐置信度"""
+    if not features or features.get("silent"):
+        return 0.0
+    continuous = np.clip((0.35 - features["low_energy_ratio"]) / 0.25, 0.0, 1.0)
+    filled_pauses = np.clip((features["quiet_level_db"] + 30.0) / 15.0, 0.0, 1.0)
+    tonal_pauses = np.clip((0.5 - features["quiet_flatness"]) / 0.3, 0.0, 1.0)
+    stable = np.clip((features["stability"] - 0.6) / 0.3, 0.0, 1.0)
+    return float(0.4 * continuous + 0.3 * filled_pauses * tonal_pauses + 0.3 * stable)
+
+
+class MusicDetector:
+    """
+    背景音乐检测器
+    通过 ffmpeg 将音频解码为低采样率单声道流，逐区间计算特征，不在内存中保留整段音频
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 8000,
+        region_seconds: float = 10.0,
+        threshold: float = 0.5
+    ):
+        """
+        Args:
+            sample_rate: 分析用采样率（降采样）
+            region_seconds: 判定区间长度
+            threshold: 区间音乐置信度阈值
+        """
+        self.sample_rate = sample_rate
+        self.region_seconds = region_seconds
+        self.threshold = threshold
+
+    async def analyze(self, audio_path: str) -> Dict[str, Any]:
+        """
+        分析音频
+
+        Returns:
+            {
+                'has_music': bool,
+                'music_ratio': 含音乐区间时长占比,
+                'duration_s': 分析时长,
+                'regions': [{'start', 'end', 'music', 'score'}, ...],
+                'elapsed_s': 分析耗时
+            }
+        """
+        t0 = time.monotonic()
+        region_samples = int(self.region_seconds * self.sample_rate)
+        region_bytes = region_samples * 4
+
+        cmd = [
+            "ffmpeg", "-v", "error", "-i", audio_path,
+            "-vn", "-ac", "1", "-ar", str(self.sample_rate), "-f", "f32le", "pipe:1"
+        ]
+
+        regions: List[Dict[str, Any]] = []
+        offset = 0.0
+        # 流式解码同样经 FFmpeg 作业调度器（CPU 预算与按任务取消）
+        async with get_ffmpeg_scheduler().job(cmd, JOB_EXTRACT) as process:
+            try:
+                while True:
+                    try:
+                        data = await process.stdout.readexactly(region_bytes)
+                    except asyncio.IncompleteReadError as e:
+                        data = e.partial
+                    if not data:
+                        break
+                    block = np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+                    features = await run_in_pool(POOL_DSP, _frame_features, block, self.sample_rate)
+                    score = _music_score(features)
+                    duration = len(block) / self.sample_rate
+                    regions.append({
+                        "start": round(offset, 3),
+                        "end": round(offset + duration, 3),
+                        "music": score >= self.threshold,
+                        "score": round(score, 3),
+                    })
+                    offset += duration
+                    if len(data) < region_bytes:
+                        break
+            finally:
+                if process.returncode is None:
+                    try:
+                        process.kill()
+                    except ProcessLookupError:
+                        pass
+                _, stderr = await process.communicate()
+
+        if process.returncode not in (0, -9) and not regions:
+            raise RuntimeError(f"音乐检测解码失败: {stderr.decode(errors='ignore')}")
+
+        music_duration = sum(r["end"] - r["start"] for r in regions if r["music"])
+        result = {
+            "has_music": music_duration > 0,
+            "music_ratio": round(music_duration / offset, 4) if offset else 0.0,
+            "duration_s": round(offset, 3),
+            "regions": regions,
+            "elapsed_s": round(time.monotonic() - t0, 3),
+        }
+        logger.info(
+            f"音乐检测完成: 时长 {offset:.1f}s, 含音乐占比 {result['music_ratio']:.1%}, "
+            f"耗时 {result['elapsed_s']:.2f}s"
+        )
+        return result
+
+
+def music_spans(regions: List[Dict[str, Any]], margin: float = 0.0) -> List[tuple]:
+    """把区间判定合并为含音乐的时间段列表 [(start, end), ...]，两端各扩展 margin 秒"""
+    spans: List[list] = []
+    for region in regions:
+        if not region["music"]:
+            continue
+        start, end = max(0.0, region["start"] - margin), region["end"] + margin
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return [tuple(span) for span in spans]
+
@@ -1,5 +1,5 @@
 import numpy as np
-from typing import Dict
+from typing import Dict, Optional
 from dataclasses import dataclass, field
 
 @dataclass
@@ -30,6 +30,8 @@ class Sentence:
     ending_silence: float = field(default=0.0)
     # TTS输出音频路径（可选）
     tts_audio_path: str = field(default="")
+    # GPT latent 与参考 mel（开启 latent 时长控制时保存），重新定时只需重跑声码器
+    tts_latent: Optional[Dict] = None
     
     def __post_init__(self):
         """初始化后自动计算缺失字段"""
@@ -0,0 +1,297 @@
+"""
+音频分离服务 - 常驻的 VocalSeparator 实例池 + 作业队列
+模型只在服务启动时加载一次，任务初始化只需提交作业并等待结果
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+import torch
+
+from core.vocal_separator import VocalSeparator, AUDIO_SEPARATOR_AVAILABLE
+from config import get_config
+from utils.executors import POOL_SEPARATION, run_in_pool, separation_worker_count
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SeparationJob:
+    """分离作业"""
+    task_id: str
+    audio_path: str
+    output_dir: str
+    future: asyncio.Future
+    kind: str = "file"  # file: 完整文件分离落盘；stem: 返回单音轨数组
+    sample_rate: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class SeparationService:
+    """
+    音频分离服务
+    - 启动时在后台线程中预加载 N 个分离器实例（每个实例独占一个临时输出目录）
+    - 每个实例对应一个工作协程，从有界队列中取作业，阻塞推理放到线程中执行
+    - 提供队列深度、等待/执行耗时等指标
+    """
+
+    def __init__(
+        self,
+        num_workers: int = 0,
+        max_queue_size: int = 64,
+        scratch_dir: Optional[Path] = None,
+        job_timeout: float = 300.0
+    ):
+        """
+        Args:
+            num_workers: 常驻实例数，0表示按设备自动确定
+            max_queue_size: 作业队列上限，满时提交方等待
+            scratch_dir: 各实例临时输出目录的父目录
+            job_timeout: 单个作业开始执行后的最长等待时间（秒）
+        """
+        # 与执行器分离线程池大小同源，每个常驻实例对应一个线程
+        self.num_workers = separation_worker_count(num_workers)
+        self.scratch_dir = Path(scratch_dir or "/tmp/tts_temp/separator")
+        self.job_timeout = job_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+
+        self.separators: List[VocalSeparator] = []
+        self.workers: List[asyncio.Task] = []
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        self._closed = False
+
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "running": 0,
+            "total_wait_s": 0.0,
+            "total_run_s": 0.0,
+            "max_wait_s": 0.0,
+            "stem_run_s": 0.0,
+            "stem_audio_s": 0.0,
+            "last_error": None,
+        }
+
+        logger.info(f"SeparationService 初始化: 实例数={self.num_workers}, 队列上限={max_queue_size}")
+
+    async def start(self):
+        """加载分离器实例并启动工作协程（幂等）"""
+        async with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+
+            if not AUDIO_SEPARATOR_AVAILABLE:
+                logger.warning("audio-separator库未安装，分离服务不可用")
+                return
+
+            load_start = time.time()
+            for index in range(self.num_workers):
+                output_dir = self.scratch_dir / f"worker_{index}"
+                output_dir.mkdir(parents=True, exist_ok=True)
+                separator = await run_in_pool(POOL_SEPARATION, VocalSeparator, str(output_dir))
+                if not separator.is_available():
+                    logger.error(f"分离器实例 {index} 加载失败")
+                    continue
+                self.separators.append(separator)
+                self.workers.append(asyncio.create_task(
+                    self._worker_loop(index, separator), name=f"separation_worker_{index}"
+                ))
+
+            logger.info(
+                f"SeparationService 启动完成: {len(self.separators)}/{self.num_workers} 个实例就绪，"
+                f"加载耗时 {time.time() - load_start:.1f}s"
+            )
+
+    def is_available(self) -> bool:
+        """服务是否有可用的分离器实例"""
+        return bool(self.separators)
+
+    async def separate(self, audio_path: str, output_dir: str, task_id: str = "") -> Dict:
+        """
+        提交分离作业并等待结果
+
+        Args:
+            audio_path: 原始音频文件路径
+            output_dir: 输出目录（vocals.wav / instrumental.wav）
+            task_id: 任务ID（用于日志）
+
+        Returns:
+            Dict: {'success', 'vocals_path', 'instrumental_path', 'error'}
+        """
+        return await self._submit(task_id, audio_path, output_dir=output_dir)
+
+    async def separate_stem(self, audio_path: str, sample_rate: int, task_id: str = "") -> Dict:
+        """
+        提交单音轨分离作业（窗口化分离），结果为目标采样率的单声道背景音数组
+
+        Returns:
+            Dict: {'success', 'audio', 'error'}
+        """
+        return await self._submit(task_id, audio_path, kind="stem", sample_rate=sample_rate)
+
+    async def _submit(
+        self,
+        task_id: str,
+        audio_path: str,
+        output_dir: str = "",
+        kind: str = "file",
+        sample_rate: int = 0
+    ) -> Dict:
+        """入队并等待作业结果"""
+        if self._closed:
+            return _failure("分离服务已关闭")
+        if not self._started:
+            await self.start()
+        if not self.is_available():
+            return _failure("audio-separator库不可用或初始化失败")
+
+        loop = asyncio.get_running_loop()
+        job = SeparationJob(
+            task_id=task_id,
+            audio_path=audio_path,
+            output_dir=output_dir,
+            future=loop.create_future(),
+            kind=kind,
+            sample_rate=sample_rate
+        )
+        self.metrics["submitted"] += 1
+
+        try:
+            await self.queue.put(job)
+            logger.debug(f"[{task_id}] 分离作业已入队，队列深度: {self.queue.qsize()}")
+            # 排队时间不计入超时，开始执行后才计时
+            await job.started.wait()
+            return await asyncio.wait_for(asyncio.shield(job.future), timeout=self.job_timeout)
+        except asyncio.TimeoutError:
+            job.future.cancel()
+            error_msg = f"音频分离超时 (>{self.job_timeout}秒)"
+            logger.error(f"[{task_id}] {error_msg}")
+            return _failure(error_msg)
+        except asyncio.CancelledError:
+            # 调用方取消（如任务被清理），排队中的作业将被跳过
+            job.future.cancel()
+            raise
+
+    async def _worker_loop(self, index: int, separator: VocalSeparator):
+        """工作协程：独占一个分离器实例，串行执行作业"""
+        while True:
+            job: SeparationJob = await self.queue.get()
+            try:
+                if job.future.cancelled():
+                    self.metrics["cancelled"] += 1
+                    continue
+
+                wait_s = time.monotonic() - job.enqueued_at
+                self.metrics["total_wait_s"] += wait_s
+                self.metrics["max_wait_s"] = max(self.metrics["max_wait_s"], wait_s)
+                self.metrics["running"] += 1
+                job.started.set()
+
+                run_start = time.monotonic()
+                logger.info(f"[{job.task_id}] 分离实例 {index} 开始处理（排队 {wait_s:.1f}s）: {job.audio_path}")
+                try:
+                    if job.kind == "stem":
+                        result = await run_in_pool(POOL_SEPARATION, separator.separate_stem, job.audio_path, job.sample_rate)
+                    else:
+                        result = await run_in_pool(POOL_SEPARATION, separator.separate_file, job.audio_path, job.output_dir)
+                except Exception as e:
+                    result = _failure(f"音频分离异常: {e}")
+                finally:
+                    self.metrics["running"] -= 1
+                run_s = time.monotonic() - run_start
+                self.metrics["total_run_s"] += run_s
+
+                if result.get("success"):
+                    self.metrics["completed"] += 1
+                    if job.kind == "stem" and job.sample_rate:
+                        # 记录实时率（处理耗时 / 音频时长）
+                        self.metrics["stem_run_s"] += run_s
+                        self.metrics["stem_audio_s"] += len(result["audio"]) / job.sample_rate
+                    logger.info(f"[{job.task_id}] 分离实例 {index} 完成，耗时 {run_s:.1f}s")
+                else:
+                    self.metrics["failed"] += 1
+                    self.metrics["last_error"] = result.get("error")
+                    logger.error(f"[{job.task_id}] 分离失败: {result.get('error')}")
+
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self.queue.task_done()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """队列与执行指标"""
+        finished = self.metrics["completed"] + self.metrics["failed"]
+        return {
+            "pool_size": len(self.separators),
+            "configured_workers": self.num_workers,
+            "device": "cuda" if torch.cuda.is_available() else "cpu",
+            "queue_depth": self.queue.qsize(),
+            "running": self.metrics["running"],
+            "submitted": self.metrics["submitted"],
+            "completed": self.metrics["completed"],
+            "failed": self.metrics["failed"],
+            "cancelled": self.metrics["cancelled"],
+            "avg_wait_s": round(self.metrics["total_wait_s"] / finished, 2) if finished else 0.0,
+            "max_wait_s": round(self.metrics["max_wait_s"], 2),
+            "avg_run_s": round(self.metrics["total_run_s"] / finished, 2) if finished else 0.0,
+            "realtime_factor": (
+                round(self.metrics["stem_run_s"] / self.metrics["stem_audio_s"], 4)
+                if self.metrics["stem_audio_s"] else None
+            ),
+            "last_error": self.metrics["last_error"],
+        }
+
+    async def close(self):
+        """停止工作协程并释放分离器"""
+        self._closed = True
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+        # 唤醒仍在排队的提交方
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if not job.future.done():
+                job.future.set_result(_failure("分离服务已关闭"))
+            job.started.set()
+            self.queue.task_done()
+
+        for separator in self.separators:
+            await separator.cleanup()
+        self.separators.clear()
+        logger.info("SeparationService 已关闭")
+
+
+def _failure(error: str) -> Dict:
+    return {
+        'success': False,
+        'vocals_path': None,
+        'instrumental_path': None,
+        'error': error
+    }
+
+
+# 全局单例
+_separation_service: Optional[SeparationService] = None
+
+def get_separation_service() -> SeparationService:
+    """获取全局音频分离服务单例"""
+    global _separation_service
+    if _separation_service is None:
+        config = get_config()
+        _separation_service = SeparationService(
+            num_workers=config.tts.separation_workers,
+            max_queue_size=config.tts.separation_queue_size,
+            scratch_dir=Path(config.tts.separation_scratch_dir),
+            job_timeout=getattr(config, 'VOCAL_SEPARATION_TIMEOUT', 300)
+        )
+    return _separation_service
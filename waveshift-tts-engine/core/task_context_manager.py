@@ -4,19 +4,51 @@
 """
 import asyncio
 import logging
-import aiohttp
-from typing import Dict, Optional, Any
-from dataclasses import dataclass
+import os
+from typing import Dict, Optional, Any, List
+from dataclasses import dataclass, field
 from pathlib import Path
 import time
 
+import psutil
+
 from utils.path_manager import PathManager
 from utils.async_utils import BackgroundTaskManager
-from core.vocal_separator import VocalSeparator
+from utils.media_downloader import get_media_downloader
+from utils.audio_utils import BackgroundTrack
+from utils.media_probe import MediaProbe, probe_media
+from utils.hls_renditions import DubbedHLSRenditions
+from utils.webvtt_track import WebVTTSubtitleTrack
+from core.separation_service import get_separation_service
+from core.windowed_separation import WindowedSeparation
+from core.music_detector import MusicDetector, music_spans
+from core.task_context_store import TaskContextStore
 from config import get_config
+from utils.executors import POOL_DSP, POOL_IO, run_in_pool
+from utils.ffmpeg_scheduler import ffmpeg_job_context, get_ffmpeg_scheduler
+from core.cloudflare.upload_scheduler import get_upload_scheduler
+from core.cloudflare.r2_hls_storage_manager import publish_rendition_outputs
 
 logger = logging.getLogger(__name__)
 
+# 媒体产物及其状态
+ARTIFACT_AUDIO = "audio"
+ARTIFACT_VIDEO = "video"
+ARTIFACT_SEPARATION = "separation"
+ARTIFACTS = (ARTIFACT_AUDIO, ARTIFACT_VIDEO, ARTIFACT_SEPARATION)
+
+STATUS_PENDING = "pending"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+_DONE_STATUSES = (STATUS_READY, STATUS_FAILED, STATUS_SKIPPED)
+
+
+class ArtifactNotReadyError(Exception):
+    """等待的媒体产物失败或超时"""
+    pass
+
+
 @dataclass
 class TaskMediaContext:
     """任务媒体上下文数据结构"""
@@ -33,8 +65,96 @@ class TaskMediaContext:
     
     # 状态和元数据
     created_at: float = 0.0
+    last_accessed: float = 0.0
     initialized: bool = False
     error: Optional[str] = None
+    
+    # 各媒体产物的准备状态（后台逐步完成）
+    artifacts: Dict[str, str] = field(default_factory=lambda: {name: STATUS_PENDING for name in ARTIFACTS})
+    artifact_errors: Dict[str, str] = field(default_factory=dict)
+    artifact_ready_at: Dict[str, float] = field(default_factory=dict)
+    # 窗口化分离的背景音来源（就绪即可按区间读取，分离在后台持续进行）
+    background_source: Optional[Any] = field(default=None, repr=False, compare=False)
+    # 背景音乐检测结果与分离决策（skip / regions / full）
+    separation_decision: Optional[Dict[str, Any]] = None
+    # 视频探测结果（时长/帧率/分辨率/关键帧索引），视频就绪后探测一次
+    media_probe: Optional[MediaProbe] = field(default=None, repr=False, compare=False)
+    # 分离演绎的 HLS 输出（视频演绎在视频就绪前切分一次，不持久化；恢复的任务退化为逐批次混合视频）
+    hls_renditions: Optional[DubbedHLSRenditions] = field(default=None, repr=False, compare=False)
+    # 任务混音会话（衔接历史与片段序号，不持久化）
+    mixer_session: Optional[Any] = field(default=None, repr=False, compare=False)
+    # 任务阶段流水线（合成/对齐/混合/HLS，不持久化）
+    pipeline: Optional[Any] = field(default=None, repr=False, compare=False)
+    _events: Dict[str, asyncio.Event] = field(
+        default_factory=lambda: {name: asyncio.Event() for name in ARTIFACTS}, repr=False, compare=False
+    )
+    
+    def touch(self):
+        """刷新最近访问时间（用于空闲回收）"""
+        self.last_accessed = time.time()
+    
+    def mark_artifact(self, name: str, status: str, error: Optional[str] = None):
+        """更新产物状态，完成（含失败/跳过）时唤醒等待者"""
+        self.artifacts[name] = status
+        if error:
+            self.artifact_errors[name] = error
+        if status in _DONE_STATUSES:
+            self.artifact_ready_at[name] = time.time()
+            self._events[name].set()
+    
+    def is_preparing(self) -> bool:
+        """是否仍有产物在后台准备中"""
+        return any(status == STATUS_PENDING for status in self.artifacts.values())
+    
+    async def wait_for(self, *names: str, timeout: Optional[float] = None, required: bool = True) -> Dict[str, str]:
+        """
+        等待指定产物准备完成
+        
+        Args:
+            names: 产物名称（audio/video/separation）
+            timeout: 超时时间（秒），None表示不限
+            required: 为True时产物失败或超时会抛出 ArtifactNotReadyError；跳过的产物视为可用
+            
+        Returns:
+            产物名称 -> 状态
+        """
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self._events[name].wait() for name in names)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            pending = [name for name in names if self.artifacts[name] == STATUS_PENDING]
+            if required:
+                raise ArtifactNotReadyError(f"等待媒体产物超时: {pending}")
+            logger.warning(f"[{self.task_id}] 等待可选媒体产物超时，继续处理: {pending}")
+        
+        if required:
+            failed = {name: self.artifact_errors.get(name, "未知错误")
+                      for name in names if self.artifacts[name] == STATUS_FAILED}
+            if failed:
+                raise ArtifactNotReadyError(f"媒体产物不可用: {failed}")
+        return {name: self.artifacts[name] for name in names}
+    
+    def artifact_status(self) -> Dict[str, Any]:
+        """产物就绪情况（用于状态接口）"""
+        status = {
+            name: {
+                "status": self.artifacts[name],
+                "ready_at": self.artifact_ready_at.get(name),
+                "error": self.artifact_errors.get(name),
+            }
+            for name in ARTIFACTS
+        }
+        if self.background_source is not None:
+            status[ARTIFACT_SEPARATION]["progress"] = self.background_source.progress()
+        if self.separation_decision is not None:
+            status[ARTIFACT_SEPARATION]["decision"] = self.separation_decision
+        if self.media_probe is not None:
+            status[ARTIFACT_VIDEO]["probe"] = self.media_probe.summary()
+        if self.hls_renditions is not None:
+            status[ARTIFACT_VIDEO]["hls_master"] = str(self.hls_renditions.master_path)
+        return status
 
 class TaskContextManager:
     """
@@ -48,29 +168,198 @@ class TaskContextManager:
         self.path_managers: Dict[str, PathManager] = {}
         self.locks: Dict[str, asyncio.Lock] = {}
         self.task_manager = BackgroundTaskManager()
+        # 每个任务的后台准备任务（下载/分离），清理时取消
+        self.prepare_tasks: Dict[str, List[asyncio.Task]] = {}
         
         # 资源下载配置
-        self.download_timeout = 300  # 5分钟超时
-        self.max_concurrent_downloads = 3
+        self.download_timeout = self.config.tts.download_timeout
+        self.max_concurrent_downloads = self.config.tts.max_concurrent_downloads
         self.download_semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
         
+        # 持久化存储与空闲回收配置
+        self.idle_timeout = self.config.tts.task_cleanup_timeout
+        self.reaper_interval = self.config.tts.task_reaper_interval
+        self.disk_budget_bytes = self.config.tts.task_disk_budget_mb * 1024 * 1024
+        self.memory_budget_bytes = self.config.tts.task_memory_budget_mb * 1024 * 1024
+        self.min_idle_seconds = self.config.tts.task_min_idle_seconds
+        self.artifact_wait_timeout = self.config.tts.artifact_wait_timeout
+        
+        # 背景音乐检测（决定是否/哪些区间需要分离）及其节省统计
+        self.music_detector: Optional[MusicDetector] = None
+        if self.config.tts.music_detection:
+            self.music_detector = MusicDetector(
+                sample_rate=self.config.tts.music_detection_sample_rate,
+                region_seconds=self.config.tts.music_region_seconds,
+                threshold=self.config.tts.music_threshold
+            )
+        self.separation_savings = {
+            "tasks_analyzed": 0,
+            "tasks_skipped": 0,
+            "tasks_partial": 0,
+            "analyzed_audio_s": 0.0,
+            "skipped_audio_s": 0.0,
+            "detection_s": 0.0,
+        }
+        self.store: Optional[TaskContextStore] = None
+        if self.config.tts.persist_task_context:
+            try:
+                self.store = TaskContextStore(Path(self.config.tts.task_store_path))
+            except Exception as e:
+                logger.error(f"任务上下文存储初始化失败，退化为纯内存模式: {e}")
+        self._started = False
+        
         logger.info("TaskContextManager 初始化完成")
     
+    async def start(self):
+        """启动：从持久化存储恢复任务上下文，并启动空闲回收器"""
+        if self._started:
+            return
+        self._started = True
+        
+        if self.store is not None:
+            restored = await self._restore_contexts()
+            logger.info(f"从持久化存储恢复了 {restored} 个任务上下文")
+        
+        if self.reaper_interval > 0:
+            self.task_manager.create_task(self._reaper_loop(), name="task_context_reaper")
+            logger.info(
+                f"任务空闲回收器已启动: 空闲超时={self.idle_timeout}s, 扫描间隔={self.reaper_interval}s, "
+                f"磁盘预算={self.disk_budget_bytes // (1024 * 1024) or '不限'}MB, "
+                f"内存预算={self.memory_budget_bytes // (1024 * 1024) or '不限'}MB"
+            )
+    
+    async def _restore_contexts(self) -> int:
+        """重建本地文件仍然存在的任务上下文，清理失效记录"""
+        try:
+            records = await run_in_pool(POOL_IO, self.store.load_all)
+        except Exception as e:
+            logger.error(f"读取任务上下文存储失败: {e}")
+            return 0
+        
+        restored = 0
+        for record in records:
+            task_id = record["task_id"]
+            temp_dir = record.get("temp_dir")
+            audio_path = record.get("local_audio_path")
+            video_path = record.get("local_video_path")
+            
+            files_ok = (
+                record["initialized"]
+                and temp_dir and os.path.isdir(temp_dir)
+                and audio_path and os.path.exists(audio_path)
+                and video_path and os.path.exists(video_path)
+            )
+            if not files_ok:
+                logger.info(f"[{task_id}] 本地文件已失效，丢弃持久化上下文")
+                await run_in_pool(POOL_IO, self.store.delete, task_id)
+                continue
+            
+            context = TaskMediaContext(
+                task_id=task_id,
+                user_id=record["user_id"],
+                audio_url=record["audio_url"],
+                video_url=record["video_url"],
+                local_audio_path=audio_path,
+                local_video_path=video_path,
+                created_at=record["created_at"],
+                last_accessed=record["last_accessed"],
+                initialized=True,
+                error=record.get("error")
+            )
+            
+            path_manager = PathManager(task_id)
+            path_manager.temp.attach_temp_dir(Path(temp_dir))
+            path_manager.set_media_paths(audio_path, video_path)
+            
+            probe_data = (record.get("extra") or {}).get("media_probe")
+            if probe_data:
+                try:
+                    context.media_probe = MediaProbe.from_dict(probe_data)
+                    path_manager.set_media_probe(context.media_probe)
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"[{task_id}] 持久化的媒体探测结果无效，已忽略: {e}")
+            
+            vocals_path = record.get("vocals_path")
+            instrumental_path = record.get("instrumental_path")
+            if vocals_path and instrumental_path and os.path.exists(vocals_path) and os.path.exists(instrumental_path):
+                context.vocals_path = vocals_path
+                context.instrumental_path = instrumental_path
+                path_manager.set_separated_paths(vocals_path, instrumental_path)
+                self._attach_background_track(context, path_manager)
+            
+            await self._restore_outputs(task_id, context, path_manager)
+            
+            context.mark_artifact(ARTIFACT_AUDIO, STATUS_READY)
+            context.mark_artifact(ARTIFACT_VIDEO, STATUS_READY)
+            
+            self.contexts[task_id] = context
+            self.path_managers[task_id] = path_manager
+            
+            if context.vocals_path:
+                context.mark_artifact(ARTIFACT_SEPARATION, STATUS_READY)
+            elif self.config.tts.enable_audio_separation:
+                # 分离结果未保存（如重启时仍在分离），后台重新执行
+                self._start_prepare_task(task_id, self._prepare_separation(task_id), "separation")
+            else:
+                context.mark_artifact(ARTIFACT_SEPARATION, STATUS_SKIPPED)
+            restored += 1
+            logger.info(f"[{task_id}] 任务上下文已恢复: {temp_dir}")
+        
+        return restored
+    
+    async def _restore_outputs(self, task_id: str, context: TaskMediaContext, path_manager: PathManager):
+        """恢复增量输出（分离演绎、字幕轨）的续写状态，之后的批次继续追加而不是重写已有文件"""
+        try:
+            renditions = None
+            if self.config.tts.hls_split_renditions:
+                renditions = await run_in_pool(
+                    POOL_IO, DubbedHLSRenditions.restore, task_id, path_manager.temp.segments_dir / "hls"
+                )
+                if renditions is not None:
+                    context.hls_renditions = renditions
+                    path_manager.set_hls_renditions(renditions)
+            # 与 MediaMixer._append_subtitles 创建字幕轨的目录一致
+            track_dir = renditions.output_dir if renditions is not None else path_manager.temp.get_subdir("subtitles")
+            track = await run_in_pool(POOL_IO, WebVTTSubtitleTrack.restore, task_id, track_dir)
+            if track is not None:
+                path_manager.set_subtitle_track(track)
+        except Exception as e:
+            logger.warning(f"[{task_id}] 恢复增量输出状态失败，后续批次将重新开始输出: {e}")
+    
+    async def _persist_context(self, task_id: str):
+        """将任务上下文写入持久化存储"""
+        if self.store is None or task_id not in self.contexts:
+            return
+        path_manager = self.path_managers.get(task_id)
+        temp_dir = str(path_manager.temp.temp_dir) if path_manager and path_manager.temp.temp_dir else None
+        context = self.contexts[task_id]
+        extra = {"media_probe": context.media_probe.to_dict()} if context.media_probe else None
+        try:
+            await run_in_pool(POOL_IO, self.store.save, context, temp_dir, extra)
+        except Exception as e:
+            logger.error(f"[{task_id}] 持久化任务上下文失败: {e}")
+    
     async def initialize_task(
         self, 
         task_id: str, 
         user_id: str, 
         audio_url: str, 
-        video_url: str
+        video_url: str,
+        audio_checksum: Optional[str] = None,
+        video_checksum: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        初始化任务上下文
+        初始化任务上下文（渐进式）
+        注册上下文后立即返回，音视频下载和音频分离在后台进行，
+        各处理阶段通过 TaskMediaContext.wait_for 只等待自己需要的产物
         
         Args:
             task_id: 任务ID
             user_id: 用户ID  
             audio_url: 音频文件URL
             video_url: 视频文件URL
+            audio_checksum: 音频文件期望校验和（可选）
+            video_checksum: 视频文件期望校验和（可选）
             
         Returns:
             初始化结果
@@ -81,9 +370,22 @@ class TaskContextManager:
         
         async with self.locks[task_id]:
             # 检查是否已初始化
-            if task_id in self.contexts and self.contexts[task_id].initialized:
+            existing = self.contexts.get(task_id)
+            if existing is not None and existing.initialized and not existing.error:
                 logger.info(f"[{task_id}] 任务上下文已存在，跳过初始化")
-                return {"success": True, "message": "任务上下文已存在"}
+                return {
+                    "success": True,
+                    "message": "任务上下文已存在",
+                    "local_audio_path": existing.local_audio_path,
+                    "local_video_path": existing.local_video_path,
+                    "has_separated_audio": bool(existing.vocals_path),
+                    "artifacts": existing.artifact_status()
+                }
+            if existing is not None:
+                # 上一次初始化失败，清理后重新开始
+                await self._cleanup_task_resources(task_id, keep_lock=True)
+            # 允许重新初始化的任务再次提交 ffmpeg 作业
+            get_ffmpeg_scheduler().reset_task(task_id)
             
             logger.info(f"[{task_id}] 开始初始化任务上下文")
             logger.info(f"  - 用户ID: {user_id}")
@@ -92,91 +394,316 @@ class TaskContextManager:
             
             try:
                 # 创建任务上下文
+                now = time.time()
                 context = TaskMediaContext(
                     task_id=task_id,
                     user_id=user_id,
                     audio_url=audio_url,
                     video_url=video_url,
-                    created_at=time.time()
+                    created_at=now,
+                    last_accessed=now,
+                    initialized=True
                 )
                 
                 # 创建路径管理器
                 path_manager = PathManager(task_id)
                 
-                # 并行下载音视频文件
-                download_tasks = [
-                    self._download_media_file(audio_url, "audio", path_manager.temp.audio_dir),
-                    self._download_media_file(video_url, "video", path_manager.temp.video_dir)
-                ]
-                
-                results = await asyncio.gather(*download_tasks, return_exceptions=True)
-                
-                # 检查下载结果
-                audio_result, video_result = results
-                if isinstance(audio_result, Exception):
-                    raise audio_result
-                if isinstance(video_result, Exception):
-                    raise video_result
-                
-                # 更新上下文
-                context.local_audio_path = audio_result
-                context.local_video_path = video_result
-                
-                # 设置PathManager的媒体路径
-                path_manager.set_media_paths(audio_result, video_result)
-                
-                # 可选：音频分离（如果需要背景音乐混合）
-                if self.config.tts.enable_audio_separation:
-                    logger.info(f"[{task_id}] 开始音频分离")
-                    separator = VocalSeparator()
-                    if separator.is_available():
-                        separation_result = await separator.separate_complete_audio(
-                            audio_result, path_manager
-                        )
-                        if separation_result['success']:
-                            context.vocals_path = separation_result['vocals_path']
-                            context.instrumental_path = separation_result['instrumental_path']
-                            path_manager.set_separated_paths(
-                                context.vocals_path,
-                                context.instrumental_path
-                            )
-                            logger.info(f"[{task_id}] 音频分离完成")
-                        else:
-                            logger.warning(f"[{task_id}] 音频分离失败: {separation_result.get('error')}")
-                
-                # 标记为已初始化
-                context.initialized = True
-                
-                # 存储上下文
+                # 先注册上下文，TTS合成无需等待媒体资源
                 self.contexts[task_id] = context
                 self.path_managers[task_id] = path_manager
                 
-                logger.info(f"[{task_id}] 任务上下文初始化完成")
+                # 后台准备：音频下载 -> 音频分离；视频下载独立进行
+                self._start_prepare_task(
+                    task_id, self._prepare_audio(task_id, audio_checksum), "audio"
+                )
+                self._start_prepare_task(
+                    task_id, self._prepare_video(task_id, video_checksum), "video"
+                )
+                
+                logger.info(f"[{task_id}] 任务上下文已注册，媒体资源后台准备中")
                 return {
                     "success": True,
-                    "message": "任务上下文初始化完成",
-                    "local_audio_path": context.local_audio_path,
-                    "local_video_path": context.local_video_path,
-                    "has_separated_audio": bool(context.vocals_path)
+                    "message": "任务上下文已注册，媒体资源后台准备中",
+                    "local_audio_path": None,
+                    "local_video_path": None,
+                    "has_separated_audio": False,
+                    "artifacts": context.artifact_status()
                 }
                 
             except Exception as e:
                 error_msg = f"任务上下文初始化失败: {str(e)}"
                 logger.error(f"[{task_id}] {error_msg}")
                 
-                # 记录错误到上下文
-                if task_id in self.contexts:
-                    self.contexts[task_id].error = error_msg
-                
                 # 清理部分资源
-                await self._cleanup_task_resources(task_id)
+                await self._cleanup_task_resources(task_id, keep_lock=True)
                 
                 return {
                     "success": False,
                     "error": error_msg
                 }
     
-    async def _download_media_file(self, url: str, media_type: str, target_dir: Path) -> str:
+    def _start_prepare_task(self, task_id: str, coro, artifact: str) -> asyncio.Task:
+        """启动后台准备任务，并登记以便清理时取消"""
+        # 后台任务继承所属任务ID，其中的 ffmpeg 作业随任务删除一并取消
+        with ffmpeg_job_context(task_id=task_id):
+            task = self.task_manager.create_task(coro, name=f"prepare_{artifact}_{task_id}")
+        tasks = self.prepare_tasks.setdefault(task_id, [])
+        tasks.append(task)
+        
+        def _done(t: asyncio.Task):
+            remaining = self.prepare_tasks.get(task_id)
+            if remaining is not None and t in remaining:
+                remaining.remove(t)
+                if not remaining:
+                    self.prepare_tasks.pop(task_id, None)
+        
+        task.add_done_callback(_done)
+        return task
+    
+    def _fail_artifact(self, task_id: str, context: TaskMediaContext, name: str, error: Exception):
+        """记录产物失败；音视频失败视为任务初始化失败"""
+        error_msg = f"{name} 准备失败: {error}"
+        logger.error(f"[{task_id}] {error_msg}")
+        context.mark_artifact(name, STATUS_FAILED, str(error))
+        if name in (ARTIFACT_AUDIO, ARTIFACT_VIDEO):
+            context.error = f"任务上下文初始化失败: {error_msg}"
+    
+    async def _prepare_audio(self, task_id: str, checksum: Optional[str]):
+        """后台下载音频，完成后继续音频分离"""
+        context = self.contexts[task_id]
+        path_manager = self.path_managers[task_id]
+        try:
+            context.local_audio_path = await self._download_media_file(
+                context.audio_url, "audio", path_manager.temp.audio_dir, checksum
+            )
+            path_manager.audio_file_path = context.local_audio_path
+            context.mark_artifact(ARTIFACT_AUDIO, STATUS_READY)
+            logger.info(f"[{task_id}] 音频已就绪，耗时 {time.time() - context.created_at:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail_artifact(task_id, context, ARTIFACT_AUDIO, e)
+            context.mark_artifact(ARTIFACT_SEPARATION, STATUS_SKIPPED, "音频不可用")
+            return
+        
+        await self._persist_if_ready(task_id)
+        await self._prepare_separation(task_id)
+    
+    async def _prepare_video(self, task_id: str, checksum: Optional[str]):
+        """后台下载视频"""
+        context = self.contexts[task_id]
+        path_manager = self.path_managers[task_id]
+        try:
+            context.local_video_path = await self._download_media_file(
+                context.video_url, "video", path_manager.temp.video_dir, checksum
+            )
+            path_manager.video_file_path = context.local_video_path
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail_artifact(task_id, context, ARTIFACT_VIDEO, e)
+            return
+        
+        # 探测一次并缓存（分辨率、关键帧索引），失败时混音退化为按文件探测
+        try:
+            context.media_probe = await probe_media(context.local_video_path)
+            path_manager.set_media_probe(context.media_probe)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[{task_id}] 视频探测失败: {e}")
+        
+        # 分离演绎：视频只在此处流复制切分一次，之后每个批次只编码音频；失败时退化为逐批次混合视频
+        if self.config.tts.hls_split_renditions:
+            renditions = DubbedHLSRenditions(
+                task_id,
+                path_manager.temp.segments_dir / "hls",
+                self.config.tts.target_sample_rate,
+                segment_seconds=self.config.tts.hls_rendition_segment_seconds,
+                audio_bitrate=self.config.tts.hls_audio_bitrate
+            )
+            try:
+                files = await renditions.prepare_video(context.local_video_path)
+                context.hls_renditions = renditions
+                path_manager.set_hls_renditions(renditions)
+                await publish_rendition_outputs(task_id, files, [
+                    renditions.video_playlist_path, renditions.audio_playlist_path, renditions.master_path
+                ])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[{task_id}] 视频演绎切分失败，退化为逐批次混合视频: {e}")
+        
+        context.mark_artifact(ARTIFACT_VIDEO, STATUS_READY)
+        logger.info(f"[{task_id}] 视频已就绪，耗时 {time.time() - context.created_at:.1f}s")
+        await self._persist_if_ready(task_id)
+    
+    async def _prepare_separation(self, task_id: str):
+        """后台音频分离（需要音频已就绪）"""
+        context = self.contexts[task_id]
+        path_manager = self.path_managers[task_id]
+        
+        if not self.config.tts.enable_audio_separation:
+            context.mark_artifact(ARTIFACT_SEPARATION, STATUS_SKIPPED)
+            return
+        
+        try:
+            # 先做廉价的背景音乐检测，纯语音内容直接跳过分离
+            spans = await self._detect_music(task_id)
+            if spans is not None and not spans:
+                context.mark_artifact(ARTIFACT_SEPARATION, STATUS_SKIPPED, "未检测到背景音乐")
+                return
+            
+            # 提交到常驻分离服务，不在任务内加载模型
+            separation_service = get_separation_service()
+            await separation_service.start()
+            if not separation_service.is_available():
+                context.mark_artifact(ARTIFACT_SEPARATION, STATUS_SKIPPED, "分离模型不可用")
+                return
+            
+            if self.config.tts.separation_window_seconds > 0:
+                await self._run_windowed_separation(task_id, separation_service, spans)
+                return
+            
+            logger.info(f"[{task_id}] 提交音频分离作业")
+            separation_result = await separation_service.separate(
+                context.local_audio_path, str(path_manager.temp.separated_dir), task_id
+            )
+            if separation_result['success']:
+                context.vocals_path = separation_result['vocals_path']
+                context.instrumental_path = separation_result['instrumental_path']
+                path_manager.set_separated_paths(
+                    context.vocals_path,
+                    context.instrumental_path
+                )
+                # 一次性转换为目标采样率的原始文件并内存映射，混音按区间切片
+                track = self._attach_background_track(context, path_manager)
+                await run_in_pool(POOL_DSP, track.prepare)
+                context.mark_artifact(ARTIFACT_SEPARATION, STATUS_READY)
+                logger.info(f"[{task_id}] 音频分离完成，耗时 {time.time() - context.created_at:.1f}s")
+            else:
+                error = separation_result.get('error')
+                logger.warning(f"[{task_id}] 音频分离失败: {error}")
+                context.mark_artifact(ARTIFACT_SEPARATION, STATUS_FAILED, str(error))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail_artifact(task_id, context, ARTIFACT_SEPARATION, e)
+        
+        await self._persist_if_ready(task_id)
+    
+    def _attach_background_track(self, context: TaskMediaContext, path_manager: PathManager) -> BackgroundTrack:
+        """为整文件分离的背景音建立可按区间读取的音轨"""
+        track = BackgroundTrack(context.instrumental_path, self.config.tts.target_sample_rate)
+        context.background_source = track
+        path_manager.set_background_source(track)
+        return track
+    
+    async def _detect_music(self, task_id: str) -> Optional[List[tuple]]:
+        """
+        检测背景音乐并记录决策
+        
+        Returns:
+            None 表示未检测（全量分离）；空列表表示无需分离；否则为含音乐的时间段
+        """
+        if self.music_detector is None:
+            return None
+        context = self.contexts[task_id]
+        try:
+            analysis = await self.music_detector.analyze(context.local_audio_path)
+        except Exception as e:
+            logger.warning(f"[{task_id}] 背景音乐检测失败，执行全量分离: {e}")
+            context.separation_decision = {"decision": "full", "error": str(e)}
+            return None
+        
+        duration = analysis["duration_s"]
+        spans = music_spans(analysis["regions"], margin=self.config.tts.music_region_margin_seconds)
+        covered = sum(min(end, duration) - start for start, end in spans)
+        if analysis["music_ratio"] < self.config.tts.music_min_ratio:
+            decision, spans, covered = "skip", [], 0.0
+        elif covered >= duration * 0.95 or self.config.tts.separation_window_seconds <= 0:
+            # 整文件分离模式无法只处理部分区间
+            decision, covered = "full", duration
+        else:
+            decision = "regions"
+        
+        skipped_audio_s = max(0.0, duration - covered)
+        context.separation_decision = {
+            "decision": decision,
+            "music_ratio": analysis["music_ratio"],
+            "duration_s": duration,
+            "music_spans": [(round(a, 2), round(b, 2)) for a, b in spans],
+            "skipped_audio_s": round(skipped_audio_s, 2),
+            "detection_s": analysis["elapsed_s"],
+        }
+        
+        savings = self.separation_savings
+        savings["tasks_analyzed"] += 1
+        savings["tasks_skipped"] += decision == "skip"
+        savings["tasks_partial"] += decision == "regions"
+        savings["analyzed_audio_s"] += duration
+        savings["skipped_audio_s"] += skipped_audio_s
+        savings["detection_s"] += analysis["elapsed_s"]
+        
+        logger.info(
+            f"[{task_id}] 背景音乐检测: 决策={decision}, 含音乐占比={analysis['music_ratio']:.1%}, "
+            f"免分离 {skipped_audio_s:.0f}s/{duration:.0f}s, 检测耗时 {analysis['elapsed_s']:.2f}s"
+        )
+        return spans if decision != "full" else None
+    
+    def get_separation_savings(self) -> Dict[str, Any]:
+        """背景音乐检测带来的分离节省统计（按当前分离实时率估算节省的设备时间）"""
+        savings = dict(self.separation_savings)
+        rtf = get_separation_service().get_metrics().get("realtime_factor")
+        savings["separation_realtime_factor"] = rtf
+        savings["estimated_saved_s"] = round(savings["skipped_audio_s"] * rtf, 1) if rtf else None
+        return savings
+    
+    async def _run_windowed_separation(self, task_id: str, separation_service, spans: Optional[List[tuple]] = None):
+        """
+        窗口化分离：探测完成即标记背景音可用，混音按区间读取已就绪的窗口，
+        其余窗口在后台按播放位置优先级持续分离
+        """
+        context = self.contexts[task_id]
+        path_manager = self.path_managers[task_id]
+        tts = self.config.tts
+        source = WindowedSeparation(
+            task_id=task_id,
+            audio_path=context.local_audio_path,
+            cache_dir=path_manager.temp.separated_dir / "windows",
+            separation_service=separation_service,
+            sample_rate=tts.target_sample_rate,
+            window_seconds=tts.separation_window_seconds,
+            overlap_seconds=tts.separation_window_overlap_seconds,
+            lookahead_seconds=tts.separation_lookahead_seconds,
+            max_in_flight=tts.separation_window_inflight
+        )
+        await source.start()
+        if spans:
+            # 只分离含音乐区间覆盖的窗口
+            source.restrict_to(spans)
+        context.background_source = source
+        path_manager.set_background_source(source)
+        context.mark_artifact(ARTIFACT_SEPARATION, STATUS_READY)
+        logger.info(f"[{task_id}] 背景音窗口化分离已启动，耗时 {time.time() - context.created_at:.1f}s")
+        
+        await source.run()
+    
+    async def _persist_if_ready(self, task_id: str):
+        """音视频都已就绪时写入持久化存储（恢复逻辑依赖本地文件）"""
+        context = self.contexts.get(task_id)
+        if context is None:
+            return
+        if context.artifacts[ARTIFACT_AUDIO] == STATUS_READY and context.artifacts[ARTIFACT_VIDEO] == STATUS_READY:
+            await self._persist_context(task_id)
+    
+    async def _download_media_file(
+        self,
+        url: str,
+        media_type: str,
+        target_dir: Path,
+        checksum: Optional[str] = None
+    ) -> str:
         """
         下载媒体文件到本地
         
@@ -184,6 +711,7 @@ class TaskContextManager:
             url: 文件URL
             media_type: 媒体类型 (audio/video)
             target_dir: 目标目录
+            checksum: 可选的期望校验和（"sha256:<hex>" / "md5:<hex>"）
             
         Returns:
             本地文件路径
@@ -192,32 +720,48 @@ class TaskContextManager:
             target_dir.mkdir(parents=True, exist_ok=True)
             
             # 生成本地文件名
-            file_extension = url.split('.')[-1] if '.' in url else ('aac' if media_type == 'audio' else 'mp4')
+            url_path = url.split('?')[0]
+            file_extension = url_path.split('.')[-1] if '.' in url_path.split('/')[-1] else ('aac' if media_type == 'audio' else 'mp4')
             local_filename = f"{media_type}.{file_extension}"
             local_path = target_dir / local_filename
             
             logger.info(f"开始下载 {media_type}: {url} -> {local_path}")
             
-            timeout = aiohttp.ClientTimeout(total=self.download_timeout)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    response.raise_for_status()
-                    
-                    with open(local_path, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            f.write(chunk)
+            # 共享连接池 + Range并行分片 + 断点续传
+            await get_media_downloader().download(url, local_path, checksum=checksum)
             
             logger.info(f"{media_type} 下载完成: {local_path} ({local_path.stat().st_size} bytes)")
             return str(local_path)
     
     def get_context(self, task_id: str) -> Optional[TaskMediaContext]:
-        """获取任务上下文"""
-        return self.contexts.get(task_id)
+        """获取任务上下文（同时刷新访问时间）"""
+        context = self.contexts.get(task_id)
+        if context is not None:
+            context.touch()
+        return context
     
     def get_path_manager(self, task_id: str) -> Optional[PathManager]:
         """获取任务的路径管理器"""
         return self.path_managers.get(task_id)
     
+    async def wait_for_artifacts(self, task_id: str, *names: str, required: bool = True) -> Dict[str, str]:
+        """
+        等待任务的指定媒体产物就绪
+        
+        Args:
+            task_id: 任务ID
+            names: 产物名称（audio/video/separation）
+            required: 产物失败时是否抛出异常
+            
+        Returns:
+            产物名称 -> 状态
+        """
+        context = self.contexts.get(task_id)
+        if context is None:
+            raise ArtifactNotReadyError(f"任务 {task_id} 不存在")
+        timeout = self.artifact_wait_timeout if self.artifact_wait_timeout > 0 else None
+        return await context.wait_for(*names, timeout=timeout, required=required)
+    
     async def cleanup_task(self, task_id: str) -> Dict[str, Any]:
         """
         清理任务资源
@@ -240,39 +784,182 @@ class TaskContextManager:
             logger.error(f"[{task_id}] {error_msg}")
             return {"success": False, "error": error_msg}
     
-    async def _cleanup_task_resources(self, task_id: str):
+    async def _cleanup_task_resources(self, task_id: str, keep_lock: bool = False):
         """内部资源清理方法"""
         try:
+            # 终止任务排队与运行中的 ffmpeg 作业，取消尚未派发的上传（本地文件随后被删除）
+            get_ffmpeg_scheduler().cancel_task(task_id)
+            get_upload_scheduler().cancel_task(task_id)
+            # 取消仍在进行的后台准备任务
+            pending = self.prepare_tasks.pop(task_id, [])
+            current = asyncio.current_task()
+            for task in pending:
+                if task is not current:
+                    task.cancel()
+            await asyncio.gather(*(t for t in pending if t is not current), return_exceptions=True)
+            
             # 清理PathManager
             if task_id in self.path_managers:
                 self.path_managers[task_id].cleanup(force=True)
                 del self.path_managers[task_id]
             
-            # 清理上下文
+            # 停止任务流水线并清理上下文
             if task_id in self.contexts:
-                del self.contexts[task_id]
+                context = self.contexts.pop(task_id)
+                if context.pipeline is not None:
+                    await context.pipeline.close()
             
             # 清理锁
-            if task_id in self.locks:
+            if task_id in self.locks and not keep_lock:
                 del self.locks[task_id]
             
+            # 删除持久化记录
+            if self.store is not None:
+                await run_in_pool(POOL_IO, self.store.delete, task_id)
+            
         except Exception as e:
             logger.error(f"[{task_id}] 资源清理异常: {e}")
+        finally:
+            # 后台准备与流水线已停止，不再有该任务的作业提交：移除调度器中的取消标记，
+            # 否则每个删除过的任务ID都会常驻调度器
+            get_ffmpeg_scheduler().reset_task(task_id)
+    
+    # ================================
+    # 空闲回收
+    # ================================
+    
+    async def _reaper_loop(self):
+        """后台回收循环：写回访问时间，清理空闲任务，执行磁盘/内存预算"""
+        while True:
+            await asyncio.sleep(self.reaper_interval)
+            try:
+                await self.reap_idle_tasks()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"任务空闲回收异常: {e}")
+    
+    def _is_busy(self, task_id: str) -> bool:
+        """任务是否正在初始化、后台准备中或被占用"""
+        if self.prepare_tasks.get(task_id):
+            return True
+        context = self.contexts.get(task_id)
+        if context is not None and context.pipeline is not None and context.pipeline.pending:
+            return True
+        lock = self.locks.get(task_id)
+        return lock is not None and lock.locked()
+    
+    async def reap_idle_tasks(self) -> List[str]:
+        """
+        执行一次回收扫描
+        
+        Returns:
+            被回收的任务ID列表
+        """
+        now = time.time()
+        
+        # 写回访问时间，保证重启后空闲判断正确
+        if self.store is not None:
+            access_times = {tid: ctx.last_accessed for tid, ctx in self.contexts.items()}
+            await run_in_pool(POOL_IO, self.store.touch_many, access_times)
+        
+        reaped: List[str] = []
+        
+        # 1. 超过空闲超时的任务
+        if self.idle_timeout > 0:
+            for task_id, context in list(self.contexts.items()):
+                if now - context.last_accessed > self.idle_timeout and not self._is_busy(task_id):
+                    logger.info(f"[{task_id}] 任务空闲 {now - context.last_accessed:.0f}s，超过 {self.idle_timeout}s，执行回收")
+                    await self._cleanup_task_resources(task_id)
+                    reaped.append(task_id)
+        
+        # 2. 超出磁盘/内存预算时，按最近最少使用顺序回收空闲任务
+        if self.disk_budget_bytes > 0 or self.memory_budget_bytes > 0:
+            reaped.extend(await self._enforce_budgets(now))
+        
+        if reaped:
+            logger.info(f"空闲回收完成，回收任务数: {len(reaped)}，剩余任务数: {len(self.contexts)}")
+        return reaped
+    
+    async def _enforce_budgets(self, now: float) -> List[str]:
+        """按LRU顺序回收任务直至满足预算"""
+        usage = {}
+        if self.disk_budget_bytes > 0:
+            for task_id, path_manager in list(self.path_managers.items()):
+                usage[task_id] = await run_in_pool(POOL_IO, _dir_size, path_manager.temp.temp_dir)
+        
+        candidates = sorted(
+            (ctx for tid, ctx in self.contexts.items()
+             if now - ctx.last_accessed >= self.min_idle_seconds and not self._is_busy(tid)),
+            key=lambda ctx: ctx.last_accessed
+        )
+        
+        reaped = []
+        memory_evicted = False
+        for context in candidates:
+            disk_over = self.disk_budget_bytes > 0 and sum(usage.values()) > self.disk_budget_bytes
+            # 进程内存主要由模型占用，每轮最多因内存回收一个任务，避免误清空
+            memory_over = (
+                not memory_evicted
+                and self.memory_budget_bytes > 0
+                and _process_rss() > self.memory_budget_bytes
+            )
+            if not disk_over and not memory_over:
+                break
+            memory_evicted = memory_evicted or not disk_over
+            task_id = context.task_id
+            reason = "磁盘" if disk_over else "内存"
+            logger.info(f"[{task_id}] 超出{reason}预算，回收最久未使用的任务")
+            await self._cleanup_task_resources(task_id)
+            usage.pop(task_id, None)
+            reaped.append(task_id)
+        
+        return reaped
     
     async def cleanup_all(self):
         """清理所有资源"""
         logger.info("开始清理所有任务上下文管理器资源")
         
-        # 清理所有任务
-        task_ids = list(self.contexts.keys())
-        cleanup_tasks = [self._cleanup_task_resources(task_id) for task_id in task_ids]
-        await asyncio.gather(*cleanup_tasks, return_exceptions=True)
-        
-        # 关闭后台任务管理器
+        # 关闭后台任务管理器（停止回收器）
         await self.task_manager.close()
+        await get_media_downloader().close()
+        
+        if self.store is not None:
+            # 持久化模式：保留任务文件供重启恢复，仅写回访问时间
+            access_times = {tid: ctx.last_accessed for tid, ctx in self.contexts.items()}
+            await run_in_pool(POOL_IO, self.store.touch_many, access_times)
+            self.store.close()
+            logger.info(f"已保留 {len(self.contexts)} 个任务上下文供重启后恢复")
+        else:
+            # 清理所有任务
+            task_ids = list(self.contexts.keys())
+            cleanup_tasks = [self._cleanup_task_resources(task_id) for task_id in task_ids]
+            await asyncio.gather(*cleanup_tasks, return_exceptions=True)
         
         logger.info("任务上下文管理器资源清理完成")
 
+
+def _dir_size(path: Optional[Path]) -> int:
+    """统计目录占用字节数"""
+    if not path:
+        return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _process_rss() -> int:
+    """当前进程常驻内存（字节）"""
+    try:
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        return 0
+
 # 全局单例
 _task_context_manager = None
 
@@ -0,0 +1,114 @@
+"""
+任务上下文持久化存储 - 基于本地SQLite保存任务媒体上下文元数据
+引擎重启后可据此恢复仍有本地文件的任务，避免重新下载和分离
+"""
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_contexts (
+    task_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    audio_url TEXT NOT NULL,
+    video_url TEXT NOT NULL,
+    local_audio_path TEXT,
+    local_video_path TEXT,
+    vocals_path TEXT,
+    instrumental_path TEXT,
+    temp_dir TEXT,
+    created_at REAL NOT NULL,
+    last_accessed REAL NOT NULL,
+    initialized INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    extra TEXT
+)
+"""
+
+# 与 TaskMediaContext 同名的可持久化字段
+_CONTEXT_FIELDS = (
+    "task_id", "user_id", "audio_url", "video_url",
+    "local_audio_path", "local_video_path", "vocals_path", "instrumental_path",
+    "created_at", "last_accessed", "initialized", "error",
+)
+
+
+class TaskContextStore:
+    """
+    任务上下文存储
+    - 所有方法均为同步阻塞调用，调用方应通过 run_in_pool(POOL_IO, ...) 使用
+    - 单连接 + 线程锁，WAL模式保证写入不阻塞读取
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+        logger.info(f"任务上下文存储已打开: {self.db_path}")
+
+    def save(self, context: Any, temp_dir: Optional[str] = None, extra: Optional[Dict] = None) -> None:
+        """插入或更新任务上下文"""
+        row = {name: getattr(context, name) for name in _CONTEXT_FIELDS}
+        row["initialized"] = int(bool(row["initialized"]))
+        row["temp_dir"] = temp_dir
+        row["extra"] = json.dumps(extra) if extra else None
+
+        columns = ", ".join(row.keys())
+        placeholders = ", ".join(f":{k}" for k in row.keys())
+        updates = ", ".join(f"{k}=excluded.{k}" for k in row.keys() if k != "task_id")
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO task_contexts ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(task_id) DO UPDATE SET {updates}",
+                row
+            )
+            self._conn.commit()
+
+    def touch_many(self, access_times: Dict[str, float]) -> None:
+        """批量刷新最近访问时间（由回收器周期性写回）"""
+        if not access_times:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE task_contexts SET last_accessed=? WHERE task_id=?",
+                [(ts, task_id) for task_id, ts in access_times.items()]
+            )
+            self._conn.commit()
+
+    def delete(self, task_id: str) -> None:
+        """删除任务上下文记录"""
+        with self._lock:
+            self._conn.execute("DELETE FROM task_contexts WHERE task_id=?", (task_id,))
+            self._conn.commit()
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """读取全部任务上下文记录"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM task_contexts ORDER BY last_accessed").fetchall()
+        records = []
+        for row in rows:
+            record = dict(row)
+            record["initialized"] = bool(record["initialized"])
+            record["extra"] = json.loads(record["extra"]) if record["extra"] else {}
+            records.append(record)
+        return records
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                logger.error(f"关闭任务上下文存储失败: {e}")
@@ -0,0 +1,203 @@
+"""
+任务级流水线 - 各处理阶段作为独立的异步工作者，经有界队列串联
+- 每个阶段一个工作者，批次按提交顺序流经各阶段（混合/HLS 的片段顺序不变）
+- 批次 N 在混合时批次 N+1 已在合成：GPU 与 ffmpeg 不再互相等待
+- 队列有界：下游处理不过来时上游阻塞在入队处，背压一直传递到提交方
+- 统计每个阶段的忙碌/等待输入/等待下游时间与利用率
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+StageHandler = Callable[[Any], Awaitable[Any]]
+
+
+@dataclass(eq=False)
+class PipelineJob:
+    """流经各阶段的单个批次"""
+    value: Any
+    future: asyncio.Future
+    submitted_at: float = field(default_factory=time.time)
+
+
+class StageStats:
+    """单个阶段的运行统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0  # 处理批次的时间
+        self.starved_seconds = 0.0  # 等待上游输入的时间
+        self.blocked_seconds = 0.0  # 下游队列已满、等待入队的时间（背压）
+
+    def to_dict(self, elapsed: float, queued: int) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "queued": queued,
+            "busy_s": round(self.busy_seconds, 2),
+            "starved_s": round(self.starved_seconds, 2),
+            "blocked_s": round(self.blocked_seconds, 2),
+            "utilization": round(self.busy_seconds / elapsed, 3) if elapsed > 0 else 0.0,
+            "avg_ms": round(self.busy_seconds / self.processed * 1000, 1) if self.processed else 0.0,
+        }
+
+
+class TaskPipeline:
+    """
+    单个任务的阶段流水线
+
+    阶段处理函数接收上一阶段的返回值并返回交给下一阶段的值；
+    某阶段抛出异常时该批次不再进入后续阶段，异常交给 on_error（未设置时由 submit 返回的 Future 抛出）
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        stages: Sequence[Tuple[str, StageHandler]],
+        queue_size: int = 2,
+        input_queue_size: Optional[int] = None,
+        on_error: Optional[Callable[[Any, Exception], Awaitable[None]]] = None
+    ):
+        """
+        Args:
+            task_id: 任务ID
+            stages: [(阶段名, 处理函数), ...]，按执行顺序
+            queue_size: 阶段之间的队列容量
+            input_queue_size: 第一阶段的输入队列容量，None 时与 queue_size 相同
+            on_error: 批次失败时的回调 (批次初始值, 异常)，设置后 Future 以 None 完成
+        """
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.task_id = task_id
+        self.stages = list(stages)
+        self.on_error = on_error
+        sizes = [input_queue_size or queue_size] + [queue_size] * (len(self.stages) - 1)
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=max(1, size)) for size in sizes]
+        self.stats = [StageStats(name) for name, _ in self.stages]
+        self.submitted = 0
+        self.completed = 0
+        self.total_latency = 0.0
+        self._inflight: set = set()
+        self._workers: List[asyncio.Task] = []
+        self._started_at: Optional[float] = None
+        self._closed = False
+
+    def start(self) -> None:
+        """启动各阶段工作者（首次提交时自动调用）"""
+        if self._workers:
+            return
+        self._started_at = time.time()
+        self._workers = [
+            asyncio.create_task(self._stage_loop(index), name=f"pipeline_{self.task_id}_{name}")
+            for index, (name, _) in enumerate(self.stages)
+        ]
+
+    async def submit(self, value: Any) -> asyncio.Future:
+        """
+        提交一个批次；第一阶段队列已满时等待（背压）
+
+        Returns:
+            批次完成（最后一个阶段返回）时完成的 Future
+        """
+        if self._closed:
+            raise RuntimeError(f"任务 {self.task_id} 的流水线已关闭")
+        self.start()
+        job = PipelineJob(value=value, future=asyncio.get_running_loop().create_future())
+        self._inflight.add(job.future)
+        job.future.add_done_callback(self._inflight.discard)
+        self.submitted += 1
+        await self.queues[0].put(job)
+        return job.future
+
+    async def process(self, value: Any) -> Any:
+        """提交批次并等待其流经全部阶段，返回最后一个阶段的结果"""
+        return await (await self.submit(value))
+
+    async def join(self) -> None:
+        """等待已提交的批次全部完成"""
+        while self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
+
+    @property
+    def pending(self) -> int:
+        """尚未完成的批次数"""
+        return len(self._inflight)
+
+    async def close(self) -> None:
+        """停止各阶段工作者，未完成的批次被取消"""
+        self._closed = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for future in list(self._inflight):
+            future.cancel()
+        if self.submitted:
+            logger.info(f"[{self.task_id}] 流水线关闭: {self.get_stats()}")
+
+    async def _stage_loop(self, index: int) -> None:
+        name, handler = self.stages[index]
+        stats = self.stats[index]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.queues) else None
+        while True:
+            waited = time.time()
+            job = await inbox.get()
+            started = time.time()
+            stats.starved_seconds += started - waited
+            try:
+                if job.future.done():
+                    continue
+                try:
+                    job.value = await handler(job.value)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    stats.failed += 1
+                    await self._fail(job, name, e)
+                    continue
+                finally:
+                    stats.busy_seconds += time.time() - started
+                stats.processed += 1
+                if outbox is not None:
+                    queued = time.time()
+                    await outbox.put(job)
+                    stats.blocked_seconds += time.time() - queued
+                else:
+                    self.completed += 1
+                    self.total_latency += time.time() - job.submitted_at
+                    job.future.set_result(job.value)
+            finally:
+                inbox.task_done()
+
+    async def _fail(self, job: PipelineJob, stage: str, error: Exception) -> None:
+        logger.error(f"[{self.task_id}] 流水线阶段 {stage} 处理失败: {error}")
+        if self.on_error is None:
+            job.future.set_exception(error)
+            return
+        try:
+            await self.on_error(job.value, error)
+        except Exception as e:
+            logger.error(f"[{self.task_id}] 流水线错误回调失败: {e}")
+        job.future.set_result(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """流水线统计：各阶段利用率与队列深度、批次端到端延迟"""
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "pending": self.pending,
+            "elapsed_s": round(elapsed, 2),
+            "avg_latency_ms": round(self.total_latency / self.completed * 1000, 1) if self.completed else 0.0,
+            "stages": {
+                stats.name: stats.to_dict(elapsed, queue.qsize())
+                for stats, queue in zip(self.stats, self.queues)
+            },
+        }
@@ -1,9 +1,9 @@
 import logging
-import asyncio
 from config import get_config
 from core.sentence_tools import Sentence
 from typing import List
 from utils.duration_utils import apply_speed_and_silence, align_batch
+from utils.executors import POOL_DSP, run_in_pool
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +30,11 @@ class DurationAligner:
         if self.index_tts is None:
             logger.warning("DurationAligner: 未提供voice_synthesizer，某些功能可能不可用")
         
+        # latent 时长控制：变速句子由合成器插值 latent 重新声码，而不是对波形做变速
+        self.latent_vocoder = None
+        if self.config.tts.latent_duration_control and self.index_tts is not None:
+            self.latent_vocoder = self.index_tts
+        
         logger.info("时长对齐器初始化完成（依赖注入模式）")
 
     async def __call__(self, sentences: List[Sentence], max_speed: float = 1.1, path_manager=None) -> List[Sentence]:
@@ -49,7 +54,7 @@ class DurationAligner:
 
         try:
             # 初始对齐
-            aligned_sentences = await asyncio.to_thread(align_batch, sentences)
+            aligned_sentences = await run_in_pool(POOL_DSP, align_batch, sentences)
             if not aligned_sentences:
                 logger.error(f"[{task_id}] 初始对齐失败")
                 return sentences
@@ -62,7 +67,7 @@ class DurationAligner:
                 return await self._process_fast_sentences(task_id, aligned_sentences, fast_indices, max_speed, path_manager)
             else:
                 logger.info(f"[{task_id}] 所有句子速度正常，应用速度调整")
-                await apply_speed_and_silence(aligned_sentences, self.sample_rate)
+                await apply_speed_and_silence(aligned_sentences, self.sample_rate, self.latent_vocoder)
                 return aligned_sentences
 
         except Exception as e:
@@ -70,7 +75,7 @@ class DurationAligner:
             # 尝试应用基本的速度调整作为后备方案
             try:
                 if 'aligned_sentences' in locals() and aligned_sentences:
-                    await apply_speed_and_silence(aligned_sentences, self.sample_rate)
+                    await apply_speed_and_silence(aligned_sentences, self.sample_rate, self.latent_vocoder)
                     return aligned_sentences
             except Exception:
                 pass
@@ -95,14 +100,14 @@ class DurationAligner:
             simplified_results = await self._simplify_sentences(task_id, fast_sentences, max_speed)
             if not simplified_results:
                 logger.warning(f"[{task_id}] 简化失败，使用原始对齐结果")
-                await apply_speed_and_silence(aligned_sentences, self.sample_rate)
+                await apply_speed_and_silence(aligned_sentences, self.sample_rate, self.latent_vocoder)
                 return aligned_sentences
             
             # 重新生成音频 - 传递path_manager
             refined_sentences = await self._regenerate_audio(task_id, simplified_results, path_manager)
             if not refined_sentences or len(refined_sentences) != len(fast_indices):
                 logger.warning(f"[{task_id}] 音频重新生成失败，使用原始对齐结果")
-                await apply_speed_and_silence(aligned_sentences, self.sample_rate)
+                await apply_speed_and_silence(aligned_sentences, self.sample_rate, self.latent_vocoder)
                 return aligned_sentences
             
             # 替换简化后的句子
@@ -113,15 +118,15 @@ class DurationAligner:
                     logger.info(f"[{task_id}] 句子 {refined_sentences[i].sequence} 简化成功")
             
             # 最终对齐
-            final_aligned = await asyncio.to_thread(align_batch, result_sentences)
-            await apply_speed_and_silence(final_aligned, self.sample_rate)
+            final_aligned = await run_in_pool(POOL_DSP, align_batch, result_sentences)
+            await apply_speed_and_silence(final_aligned, self.sample_rate, self.latent_vocoder)
             
             logger.info(f"[{task_id}] 超速句子处理完成")
             return final_aligned
             
         except Exception as e:
             logger.exception(f"[{task_id}] 处理超速句子失败: {e}")
-            await apply_speed_and_silence(aligned_sentences, self.sample_rate)
+            await apply_speed_and_silence(aligned_sentences, self.sample_rate, self.latent_vocoder)
             return aligned_sentences
 
     async def _simplify_sentences(self, task_id: str, fast_sentences: List[Sentence], max_speed: float) -> List[Sentence]:
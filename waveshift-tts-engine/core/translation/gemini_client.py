@@ -1,8 +1,8 @@
-import asyncio
 from typing import Dict
 from google import genai
 from google.genai import types
 from .base_client import BaseTranslationClient, TranslationClientFactory
+from utils.executors import POOL_IO, run_in_pool
 
 
 class GeminiClient(BaseTranslationClient):
@@ -19,7 +19,8 @@ class GeminiClient(BaseTranslationClient):
         实现Gemini API调用
         """
         try:
-            response = await asyncio.to_thread(
+            response = await run_in_pool(
+                POOL_IO,
                 self.client.models.generate_content,
                 model=self.model_name,
                 contents=user_prompt,
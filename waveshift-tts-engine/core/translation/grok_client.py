@@ -1,7 +1,7 @@
-import asyncio
 from openai import OpenAI
 from typing import Dict
 from .base_client import BaseTranslationClient, TranslationClientFactory
+from utils.executors import POOL_IO, run_in_pool
 
 
 class GrokClient(BaseTranslationClient):
@@ -24,7 +24,8 @@ class GrokClient(BaseTranslationClient):
         """
         try:
             # 调用 OpenAI SDK（同步接口）放到线程池
-            response = await asyncio.to_thread(
+            response = await run_in_pool(
+                POOL_IO,
                 self.client.chat.completions.create,
                 model=self.model_name,
                 messages=[
@@ -4,8 +4,9 @@
 import logging
 import asyncio
 import os
+import shutil
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 import gc
 import torch
 
@@ -18,6 +19,7 @@ except ImportError:
 
 from config import get_config
 from utils.path_manager import PathManager
+from utils.executors import POOL_SEPARATION, run_in_pool
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +29,11 @@ class VocalSeparator:
     音频分离服务 - 使用Kim_Vocal模型进行人声和背景音分离
     """
     
-    def __init__(self):
+    def __init__(self, output_dir: Optional[str] = None):
+        """
+        Args:
+            output_dir: 分离器的临时输出目录；池化的多个实例应各自独立，避免同名输出互相覆盖
+        """
         self.config = get_config()
         self.logger = logging.getLogger(__name__)
         
@@ -73,7 +79,8 @@ class VocalSeparator:
                 sample_rate=self.sample_rate,
                 normalization_threshold=0.9,
                 use_autocast=False,  # 暂时禁用autocast避免PyTorch版本兼容性问题
-                model_file_dir=str(model_dir) if model_dir else None  # 指定本地模型目录
+                model_file_dir=str(model_dir) if model_dir else None,  # 指定本地模型目录
+                **({"output_dir": output_dir} if output_dir else {})
             )
             
             # 预加载模型
@@ -128,7 +135,7 @@ class VocalSeparator:
             
             # 异步执行分离
             separation_result = await asyncio.wait_for(
-                asyncio.to_thread(self._separate_audio, audio_path, str(output_dir)),
+                run_in_pool(POOL_SEPARATION, self._separate_audio, audio_path, str(output_dir)),
                 timeout=self.timeout
             )
             
@@ -165,11 +172,99 @@ class VocalSeparator:
             # 清理内存
             self._cleanup_memory()
     
+    def separate_file(self, audio_path: str, output_dir: str) -> Dict:
+        """
+        同步分离接口（供分离服务在工作线程中调用）
+        
+        Args:
+            audio_path: 原始音频文件路径
+            output_dir: 最终输出目录（vocals.wav / instrumental.wav）
+            
+        Returns:
+            与 separate_complete_audio 相同结构的结果字典
+        """
+        if not self.is_available():
+            return {
+                'success': False,
+                'vocals_path': None,
+                'instrumental_path': None,
+                'error': 'audio-separator库不可用或初始化失败'
+            }
+        if not os.path.exists(audio_path):
+            return {
+                'success': False,
+                'vocals_path': None,
+                'instrumental_path': None,
+                'error': f'音频文件不存在: {audio_path}'
+            }
+        try:
+            return self._separate_audio(audio_path, output_dir)
+        finally:
+            self._cleanup_memory()
+    
+    def separate_stem(self, audio_path: str, sample_rate: int, stem: str = 'instrumental') -> Dict:
+        """
+        分离并直接返回单个音轨的单声道数组（窗口化分离使用）
+        不落盘中间结果，输出即为目标采样率的单声道，无需二次转换
+        
+        Args:
+            audio_path: 输入音频（通常为一个窗口片段）
+            sample_rate: 目标采样率
+            stem: 'instrumental' 或 'vocals'
+            
+        Returns:
+            Dict: {'success': bool, 'audio': np.ndarray or None, 'error': str or None}
+        """
+        import soundfile as sf
+        import numpy as np
+        
+        if not self.is_available():
+            return {'success': False, 'audio': None, 'error': 'audio-separator库不可用或初始化失败'}
+        
+        output_files = []
+        try:
+            output_files = self.separator.separate(audio_path)
+            separator_output_dir = getattr(self.separator, 'output_dir', None) or os.getcwd()
+            output_files = [
+                f if os.path.isabs(f) else os.path.join(separator_output_dir, f)
+                for f in (output_files or [])
+            ]
+            
+            keywords = ('vocals',) if stem == 'vocals' else ('instrumental', 'no_vocal')
+            stem_path = next(
+                (f for f in output_files if any(k in os.path.basename(f).lower() for k in keywords)),
+                None
+            )
+            if stem_path is None:
+                return {'success': False, 'audio': None, 'error': f'无法识别分离后的{stem}文件'}
+            
+            data, sr = sf.read(stem_path, dtype='float32', always_2d=True)
+            audio = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+            if sr != sample_rate:
+                import librosa
+                audio = librosa.resample(audio, orig_sr=sr, target_sr=sample_rate)
+            return {'success': True, 'audio': np.ascontiguousarray(audio, dtype=np.float32), 'error': None}
+        except Exception as e:
+            return {'success': False, 'audio': None, 'error': str(e)}
+        finally:
+            for file_path in output_files:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            self._cleanup_memory()
+    
     def _separate_audio(self, audio_path: str, output_dir: str) -> Dict:
         """执行音频分离"""
         try:
             # 执行分离
             output_files = self.separator.separate(audio_path)
+            # 部分版本只返回文件名（相对于分离器输出目录）
+            separator_output_dir = getattr(self.separator, 'output_dir', None) or os.getcwd()
+            output_files = [
+                f if os.path.isabs(f) else os.path.join(separator_output_dir, f)
+                for f in (output_files or [])
+            ]
             
             if not output_files or len(output_files) < 2:
                 return {
@@ -205,9 +300,9 @@ class VocalSeparator:
             final_vocals_path = output_dir_path / "vocals.wav"
             final_instrumental_path = output_dir_path / "instrumental.wav"
             
-            # 移动文件
-            os.rename(vocals_path, final_vocals_path)
-            os.rename(instrumental_path, final_instrumental_path)
+            # 移动文件（分离器输出目录可能与任务目录不在同一文件系统）
+            shutil.move(vocals_path, final_vocals_path)
+            shutil.move(instrumental_path, final_instrumental_path)
             
             # 清理临时文件
             for file_path in output_files:
@@ -4,12 +4,13 @@ import sys
 import logging
 import asyncio
 import gc
-from typing import List, AsyncGenerator
+from typing import Dict, List, Optional, Tuple, AsyncGenerator
 
 import torch
 import numpy as np
 import soundfile as sf
 from pathlib import Path
+from utils.executors import POOL_INFERENCE, POOL_IO, run_in_pool
 
 # 全局 logger
 logger = logging.getLogger(__name__)
@@ -39,6 +40,8 @@ class VoiceSynthesizer:
         # 从配置获取参数 - 统一方式
         self.sampling_rate = self.config.tts.target_sample_rate
         self.batch_size = self.config.tts.batch_size
+        # 保存GPT latent，供时长对齐时按目标时长重新声码
+        self.latent_duration_control = self.config.tts.latent_duration_control
         
         self._lock = asyncio.Lock()
         
@@ -175,22 +178,26 @@ class VoiceSynthesizer:
                     
                     # 使用默认语音合成（不使用语音克隆）
                     async with self._lock:
-                        tts_result = await asyncio.to_thread(
+                        tts_result = await run_in_pool(
+                            POOL_INFERENCE,
                             self.tts_model.infer,
                             None,  # 不提供参考音频，使用默认语音
                             sentence.translated_text,
                             None,
-                            False
+                            False,
+                            return_latent=self.latent_duration_control
                         )
                 else:
                     logger.debug(f"TTS 处理句子 {sentence.sequence}，使用音频样本: {sentence.audio}")
                     async with self._lock:
-                        tts_result = await asyncio.to_thread(
+                        tts_result = await run_in_pool(
+                            POOL_INFERENCE,
                             self.tts_model.infer,
                             sentence.audio,
                             sentence.translated_text,
                             None,
-                            False
+                            False,
+                            return_latent=self.latent_duration_control
                         )
             except Exception as e:
                 logger.error(f"TTS 错误：句子 {sentence.sequence}，{e}")
@@ -199,8 +206,10 @@ class VoiceSynthesizer:
             if tts_result is None:
                 sentence.generated_audio = None
                 sentence.duration = 0.0
+                sentence.tts_latent = None
             else:
-                sr, wav_np = tts_result
+                sr, wav_np = tts_result[:2]
+                sentence.tts_latent = tts_result[2] if len(tts_result) > 2 else None
                 wav_flat = wav_np.flatten().astype(np.float32) / 32767.0
                 sentence.generated_audio = wav_flat
                 sentence.duration = len(wav_flat) / sr * 1000
@@ -214,7 +223,8 @@ class VoiceSynthesizer:
                         audio_path = tts_output_dir / filename
                         
                         # 异步保存音频文件
-                        await asyncio.to_thread(
+                        await run_in_pool(
+                            POOL_IO,
                             sf.write, 
                             str(audio_path), 
                             wav_flat, 
@@ -240,6 +250,34 @@ class VoiceSynthesizer:
         # 清理内存
         self._cleanupMemory()
 
+    async def revocode(self, items: List[Tuple[Dict, int]]) -> List[Optional[np.ndarray]]:
+        """
+        按目标长度重新声码（只运行 BigVGAN，不重跑 GPT）
+        
+        Args:
+            items: [(sentence.tts_latent, 目标采样点数), ...]
+            
+        Returns:
+            List: 与 items 等长，元素为 float32 音频，失败时为 None
+        """
+        def _run() -> List[Optional[np.ndarray]]:
+            results = []
+            for latent_info, target_length in items:
+                try:
+                    _, wav_np = self.tts_model.vocode_latents(
+                        latent_info["latents"], latent_info["cond_mel"], target_length
+                    )
+                    results.append(wav_np.flatten().astype(np.float32) / 32767.0)
+                except Exception as e:
+                    logger.error(f"TTS: 重新声码失败: {e}")
+                    results.append(None)
+            return results
+        
+        if not items:
+            return []
+        async with self._lock:
+            return await run_in_pool(POOL_INFERENCE, _run)
+
     async def synthesizeBatch(self, sentences: List) -> List:
         """
         批量合成接口的便捷包装
@@ -0,0 +1,368 @@
+"""
+窗口化按需音频分离 - 将源音频切成重叠窗口逐个分离，窗口结果缓存在磁盘
+混音只读取当前批次 [start_time, start_time + duration] 覆盖的窗口，
+后续批次所需的区间优先分离，其余窗口在空闲时顺序补齐。
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Any
+
+import numpy as np
+
+from utils.ffmpeg_utils import extract_audio_window, get_duration
+from utils.executors import POOL_DSP, POOL_IO, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+WINDOW_PENDING = 0
+WINDOW_READY = 1
+WINDOW_FAILED = 2
+WINDOW_SKIPPED = 3  # 不含背景音乐，无需分离（背景音视为静音）
+
+
+class WindowedSeparation:
+    """
+    单个任务的窗口化背景音来源
+
+    窗口 k 覆盖样本区间 [k * hop, k * hop + window)，hop = window - overlap。
+    相邻窗口在重叠区做线性交叉淡化；读取时按权重累加后归一化，
+    缺失（未就绪/失败）的窗口不参与加权，对应区域保持静音。
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        audio_path: str,
+        cache_dir: Path,
+        separation_service,
+        sample_rate: int,
+        window_seconds: float = 30.0,
+        overlap_seconds: float = 2.0,
+        lookahead_seconds: float = 90.0,
+        max_in_flight: int = 1,
+        max_retries: int = 2
+    ):
+        """
+        Args:
+            task_id: 任务ID
+            audio_path: 源音频路径
+            cache_dir: 窗口缓存目录
+            separation_service: 常驻分离服务（SeparationService）
+            sample_rate: 输出采样率（单声道）
+            window_seconds: 窗口时长
+            overlap_seconds: 相邻窗口重叠时长（交叉淡化区）
+            lookahead_seconds: 播放位置之后优先分离的时长
+            max_in_flight: 本任务同时提交的窗口作业数
+            max_retries: 单个窗口失败后的重试次数
+        """
+        if overlap_seconds >= window_seconds:
+            raise ValueError("overlap_seconds 必须小于 window_seconds")
+
+        self.task_id = task_id
+        self.audio_path = audio_path
+        self.cache_dir = Path(cache_dir)
+        self.service = separation_service
+        self.sample_rate = sample_rate
+        self.window_samples = int(window_seconds * sample_rate)
+        self.overlap_samples = int(overlap_seconds * sample_rate)
+        self.hop_samples = self.window_samples - self.overlap_samples
+        self.lookahead_samples = int(lookahead_seconds * sample_rate)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+
+        self.total_samples = 0
+        self.num_windows = 0
+        self.states: List[int] = []
+        self.events: List[asyncio.Event] = []
+        self._attempts: Dict[int, int] = {}
+        self._in_flight: Set[int] = set()
+        # 正在等待中的读取所需窗口（引用计数）与最近读取位置
+        self._demanded: Dict[int, int] = {}
+        self._playhead = 0
+        self._wakeup = asyncio.Event()
+        self._started = False
+
+        # 交叉淡化权重（上升沿；下降沿为 1 - 上升沿），使相邻窗口权重和为1
+        ramp = (np.arange(self.overlap_samples, dtype=np.float32) + 0.5) / max(1, self.overlap_samples)
+        self._ramp_up = ramp
+        self._ramp_down = 1.0 - ramp
+
+        self.stats = {"separated": 0, "cache_hits": 0, "failed": 0, "skipped": 0, "separation_s": 0.0}
+
+    # ================================
+    # 生命周期
+    # ================================
+
+    async def start(self):
+        """探测时长、划分窗口，并加载磁盘上已有的窗口缓存"""
+        if self._started:
+            return
+        self._started = True
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        duration = await get_duration(self.audio_path)
+        self.total_samples = int(duration * self.sample_rate)
+        self.num_windows = max(1, math.ceil(max(self.total_samples - self.overlap_samples, 1) / self.hop_samples))
+        self.states = [WINDOW_PENDING] * self.num_windows
+        self.events = [asyncio.Event() for _ in range(self.num_windows)]
+
+        for k in range(self.num_windows):
+            if self._window_path(k).exists():
+                self.states[k] = WINDOW_READY
+                self.events[k].set()
+                self.stats["cache_hits"] += 1
+
+        logger.info(
+            f"[{self.task_id}] 窗口化分离: 时长 {duration:.1f}s, 窗口数 {self.num_windows}, "
+            f"窗口 {self.window_samples / self.sample_rate:.0f}s/重叠 {self.overlap_samples / self.sample_rate:.1f}s, "
+            f"已缓存 {self.stats['cache_hits']}"
+        )
+
+    def restrict_to(self, spans: List[tuple]) -> int:
+        """
+        只分离与给定时间段（含音乐区间）重叠的窗口，其余窗口标记为跳过
+
+        Args:
+            spans: [(start_s, end_s), ...]
+
+        Returns:
+            跳过的窗口数
+        """
+        sample_spans = [(int(a * self.sample_rate), int(b * self.sample_rate)) for a, b in spans]
+        skipped = 0
+        for k in range(self.num_windows):
+            if self.states[k] != WINDOW_PENDING:
+                continue
+            win_start = k * self.hop_samples
+            win_end = win_start + self.window_samples
+            if not any(a < win_end and b > win_start for a, b in sample_spans):
+                self.states[k] = WINDOW_SKIPPED
+                self.events[k].set()
+                skipped += 1
+        self.stats["skipped"] = skipped
+        logger.info(f"[{self.task_id}] 按音乐区间跳过 {skipped}/{self.num_windows} 个窗口")
+        return skipped
+
+    async def run(self):
+        """调度循环：按优先级提交窗口，直到全部完成"""
+        await self.start()
+        running: Set[asyncio.Task] = set()
+        try:
+            while True:
+                while len(running) < self.max_in_flight:
+                    k = self._next_window()
+                    if k is None:
+                        break
+                    self._in_flight.add(k)
+                    running.add(asyncio.create_task(self._separate_window(k)))
+
+                if not running:
+                    break
+
+                self._wakeup.clear()
+                wakeup = asyncio.create_task(self._wakeup.wait())
+                done, _ = await asyncio.wait(running | {wakeup}, return_when=asyncio.FIRST_COMPLETED)
+                wakeup.cancel()
+                running -= done
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        logger.info(f"[{self.task_id}] 窗口化分离完成: {self.progress()}")
+
+    def _next_window(self) -> Optional[int]:
+        """
+        选择下一个要分离的窗口
+        1. 读取方正在等待的窗口（按时间先后）
+        2. 播放位置之后 lookahead 区间内的窗口
+        3. 播放位置之后的其余窗口
+        4. 播放位置之前遗漏的窗口
+        """
+        pending = [k for k in range(self.num_windows)
+                   if self.states[k] == WINDOW_PENDING and k not in self._in_flight]
+        if not pending:
+            return None
+
+        demanded = [k for k in pending if k in self._demanded]
+        if demanded:
+            return min(demanded)
+
+        head_window = self._playhead // self.hop_samples
+        lookahead_end = (self._playhead + self.lookahead_samples) // self.hop_samples
+        ahead = [k for k in pending if head_window <= k <= lookahead_end]
+        if ahead:
+            return min(ahead)
+        after = [k for k in pending if k > lookahead_end]
+        if after:
+            return min(after)
+        return min(pending)
+
+    async def _separate_window(self, k: int):
+        """截取并分离单个窗口，结果写入磁盘缓存"""
+        start_sample = k * self.hop_samples
+        length = min(self.window_samples, self.total_samples - start_sample)
+        chunk_path = self.cache_dir / f"chunk_{k:05d}.wav"
+        try:
+            t0 = time.monotonic()
+            await extract_audio_window(
+                self.audio_path, str(chunk_path),
+                start=start_sample / self.sample_rate,
+                duration=length / self.sample_rate,
+                sample_rate=self.sample_rate
+            )
+            result = await self.service.separate_stem(str(chunk_path), self.sample_rate, self.task_id)
+            if not result.get("success"):
+                raise RuntimeError(result.get("error"))
+
+            await run_in_pool(POOL_IO, self._save_window, k, result["audio"])
+            self.states[k] = WINDOW_READY
+            self.stats["separated"] += 1
+            self.stats["separation_s"] += time.monotonic() - t0
+            logger.debug(f"[{self.task_id}] 窗口 {k}/{self.num_windows} 分离完成")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            attempts = self._attempts.get(k, 0) + 1
+            self._attempts[k] = attempts
+            if attempts <= self.max_retries:
+                logger.warning(f"[{self.task_id}] 窗口 {k} 分离失败，稍后重试 ({attempts}/{self.max_retries}): {e}")
+                return
+            logger.error(f"[{self.task_id}] 窗口 {k} 分离失败，放弃: {e}")
+            self.states[k] = WINDOW_FAILED
+            self.stats["failed"] += 1
+        finally:
+            self._in_flight.discard(k)
+            chunk_path.unlink(missing_ok=True)
+            if self.states[k] != WINDOW_PENDING:
+                self.events[k].set()
+
+    def _window_path(self, k: int) -> Path:
+        return self.cache_dir / (
+            f"w{self.window_samples}_o{self.overlap_samples}_sr{self.sample_rate}_{k:05d}.npy"
+        )
+
+    def _save_window(self, k: int, audio: np.ndarray):
+        path = self._window_path(k)
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, np.ascontiguousarray(audio, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    # ================================
+    # 读取
+    # ================================
+
+    def _windows_for(self, start_sample: int, end_sample: int) -> List[int]:
+        """覆盖样本区间的窗口索引"""
+        if self.num_windows == 0 or end_sample <= start_sample:
+            return []
+        first = max(0, (start_sample - self.window_samples) // self.hop_samples + 1)
+        last = min(self.num_windows - 1, (end_sample - 1) // self.hop_samples)
+        return [k for k in range(first, last + 1)
+                if k * self.hop_samples < end_sample and k * self.hop_samples + self.window_samples > start_sample]
+
+    async def read(self, start_time: float, duration: float, wait_timeout: Optional[float] = None) -> np.ndarray:
+        """
+        读取 [start_time, start_time + duration] 的背景音
+
+        Args:
+            start_time: 开始时间（秒）
+            duration: 时长（秒）
+            wait_timeout: 等待所需窗口的最长时间，超时后用已就绪的窗口拼接
+
+        Returns:
+            单声道 float32 数组，长度为 int(duration * sample_rate)
+        """
+        await self.start()
+        start_sample = int(start_time * self.sample_rate)
+        length = int(duration * self.sample_rate)
+        end_sample = start_sample + length
+        windows = self._windows_for(start_sample, end_sample)
+
+        self._playhead = max(self._playhead, end_sample)
+        missing = [k for k in windows if not self.events[k].is_set()]
+        if missing:
+            for k in missing:
+                self._demanded[k] = self._demanded.get(k, 0) + 1
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(self.events[k].wait() for k in missing)),
+                    timeout=wait_timeout
+                )
+            except asyncio.TimeoutError:
+                not_ready = [k for k in missing if not self.events[k].is_set()]
+                logger.warning(f"[{self.task_id}] 背景音窗口未就绪，以静音代替: {not_ready}")
+            finally:
+                for k in missing:
+                    self._demanded[k] -= 1
+                    if self._demanded[k] <= 0:
+                        del self._demanded[k]
+        else:
+            # 播放位置前移，让调度器重新评估优先级
+            self._wakeup.set()
+
+        return await run_in_pool(POOL_DSP, self._assemble, windows, start_sample, length)
+
+    def _assemble(self, windows: List[int], start_sample: int, length: int) -> np.ndarray:
+        """按交叉淡化权重拼接就绪窗口"""
+        output = np.zeros(length, dtype=np.float32)
+        weights = np.zeros(length, dtype=np.float32)
+        end_sample = start_sample + length
+
+        for k in windows:
+            if self.states[k] != WINDOW_READY:
+                continue
+            try:
+                audio = np.load(self._window_path(k), mmap_mode="r")
+            except Exception as e:
+                logger.error(f"[{self.task_id}] 读取窗口缓存失败 {k}: {e}")
+                continue
+
+            win_start = k * self.hop_samples
+            lo = max(start_sample, win_start)
+            hi = min(end_sample, win_start + len(audio))
+            if hi <= lo:
+                continue
+
+            w = np.ones(hi - lo, dtype=np.float32)
+            offset = lo - win_start
+            ov = self.overlap_samples
+            if ov > 0 and k > 0 and offset < ov:
+                # 与前一窗口的重叠区：上升沿
+                n = min(ov - offset, hi - lo)
+                w[:n] = self._ramp_up[offset:offset + n]
+            tail_start = self.hop_samples
+            if ov > 0 and k < self.num_windows - 1 and offset + (hi - lo) > tail_start:
+                # 与后一窗口的重叠区：下降沿
+                a = max(offset, tail_start)
+                b = offset + (hi - lo)
+                w[a - offset:b - offset] *= self._ramp_down[a - tail_start:b - tail_start]
+
+            output[lo - start_sample:hi - start_sample] += audio[offset:offset + (hi - lo)] * w
+            weights[lo - start_sample:hi - start_sample] += w
+
+        covered = weights > 1e-6
+        output[covered] /= weights[covered]
+        return output
+
+    def progress(self) -> Dict[str, Any]:
+        """分离进度"""
+        ready = sum(1 for state in self.states if state == WINDOW_READY)
+        failed = sum(1 for state in self.states if state == WINDOW_FAILED)
+        skipped = sum(1 for state in self.states if state == WINDOW_SKIPPED)
+        return {
+            "windows_total": self.num_windows,
+            "windows_ready": ready,
+            "windows_failed": failed,
+            "windows_skipped": skipped,
+            "in_flight": sorted(self._in_flight),
+            "playhead_s": round(self._playhead / self.sample_rate, 2) if self.sample_rate else 0.0,
+            "separated": self.stats["separated"],
+            "cache_hits": self.stats["cache_hits"],
+            "separation_s": round(self.stats["separation_s"], 2),
+        }
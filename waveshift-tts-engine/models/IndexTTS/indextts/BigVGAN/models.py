@@ -198,7 +198,11 @@ class BigVGAN(torch.nn.Module):
 
         # self.logit_scale = nn.Parameter(torch.ones([]) * np.log(1 / 0.07))
 
-    def forward(self, x, mel_ref, lens=None):
+    def forward(self, x, mel_ref, lens=None, target_frames=None):
+        """
+        target_frames: 可选，将 latent 线性插值到指定帧数（上采样前的帧率）后再声码，
+        输出长度约为 target_frames * prod(upsample_rates) 个采样点
+        """
         speaker_embedding = self.speaker_encoder(mel_ref, lens)
         n_batch = x.size(0)
         contrastive_loss = None
@@ -210,7 +214,13 @@ class BigVGAN(torch.nn.Module):
         speaker_embedding = speaker_embedding.transpose(1, 2)
 
         # upsample feat
-        if self.feat_upsample:
+        if target_frames is not None:
+            x = torch.nn.functional.interpolate(
+                x.transpose(1, 2),
+                size=[int(target_frames)],
+                mode="linear",
+            ).squeeze(1)
+        elif self.feat_upsample:
             x = torch.nn.functional.interpolate(
                 x.transpose(1, 2),
                 scale_factor=[4],
@@ -271,6 +271,21 @@ class IndexTTS:
         except Exception as e:
             pass
 
+    def _load_audio_prompt(self, audio_prompt):
+        """加载参考音频为 24kHz 单声道张量 [1, T]"""
+        if isinstance(audio_prompt, str) and audio_prompt.endswith(".npy"):
+            # 预解码的24kHz float32 PCM旁路文件（内存映射），跳过解码和重采样
+            import numpy as np
+            pcm = np.load(audio_prompt, mmap_mode="r")
+            return torch.from_numpy(np.array(pcm, dtype=np.float32)).reshape(1, -1)
+        audio, sr = torchaudio.load(audio_prompt)
+        # 只有多声道才转换为单声道（修复原逻辑bug并优化性能）
+        if audio.shape[0] > 1:
+            audio = torch.mean(audio, dim=0, keepdim=True)
+        if sr != 24000:
+            audio = torchaudio.transforms.Resample(sr, 24000)(audio)
+        return audio
+
     def _set_gr_progress(self, value, desc):
         if self.gr_progress is not None:
             self.gr_progress(value, desc=desc)
@@ -295,11 +310,7 @@ class IndexTTS:
 
         # 如果参考音频改变了，才需要重新生成 cond_mel, 提升速度
         if self.cache_cond_mel is None or self.cache_audio_prompt != audio_prompt:
-            audio, sr = torchaudio.load(audio_prompt)
-            # 只有多声道才转换为单声道（修复原逻辑bug并优化性能）
-            if audio.shape[0] > 1:
-                audio = torch.mean(audio, dim=0, keepdim=True)
-            audio = torchaudio.transforms.Resample(sr, 24000)(audio)
+            audio = self._load_audio_prompt(audio_prompt)
             cond_mel = MelSpectrogramFeatures()(audio).to(self.device)
             cond_mel_frame = cond_mel.shape[-1]
             if verbose:
@@ -498,7 +509,7 @@ class IndexTTS:
             return (sampling_rate, wav_data)
 
     # 原始推理模式
-    def infer(self, audio_prompt, text, output_path, verbose=False, max_text_tokens_per_sentence=120, **generation_kwargs):
+    def infer(self, audio_prompt, text, output_path, verbose=False, max_text_tokens_per_sentence=120, return_latent=False, **generation_kwargs):
         print(">> start inference...")
         self._set_gr_progress(0, "start inference...")
         if verbose:
@@ -507,11 +518,7 @@ class IndexTTS:
 
         # 如果参考音频改变了，才需要重新生成 cond_mel, 提升速度
         if self.cache_cond_mel is None or self.cache_audio_prompt != audio_prompt:
-            audio, sr = torchaudio.load(audio_prompt)
-            # 只有多声道才转换为单声道（修复原逻辑bug并优化性能）
-            if audio.shape[0] > 1:
-                audio = torch.mean(audio, dim=0, keepdim=True)
-            audio = torchaudio.transforms.Resample(sr, 24000)(audio)
+            audio = self._load_audio_prompt(audio_prompt)
             cond_mel = MelSpectrogramFeatures()(audio).to(self.device)
             cond_mel_frame = cond_mel.shape[-1]
             if verbose:
@@ -546,6 +553,7 @@ class IndexTTS:
         # lang = "EN"
         # lang = "ZH"
         wavs = []
+        latents = []
         gpt_gen_time = 0
         gpt_forward_time = 0
         bigvgan_time = 0
@@ -630,6 +638,8 @@ class IndexTTS:
                     print(f"wav shape: {wav.shape}", "min:", wav.min(), "max:", wav.max())
                 # wavs.append(wav[:, :-512])
                 wavs.append(wav.cpu())  # to cpu before saving
+                if return_latent:
+                    latents.append(latent.detach().cpu())
         end_time = time.perf_counter()
         self._set_gr_progress(0.9, "save audio...")
         wav = torch.cat(wavs, dim=1)
@@ -658,8 +668,58 @@ class IndexTTS:
             # 返回以符合Gradio的格式要求
             wav_data = wav.type(torch.int16)
             wav_data = wav_data.numpy().T
+            if return_latent:
+                # GPT latent（按分句）与参考 mel，供 vocode_latents 按目标时长重新声码
+                return (sampling_rate, wav_data, {"latents": latents, "cond_mel": auto_conditioning.detach().cpu()})
             return (sampling_rate, wav_data)
 
+    @property
+    def samples_per_latent_frame(self) -> int:
+        """每个 GPT latent 帧对应的输出采样点数"""
+        hop = 1
+        for rate in self.cfg.bigvgan.upsample_rates:
+            hop *= rate
+        return hop * (4 if self.cfg.bigvgan.feat_upsample else 1)
+
+    def vocode_latents(self, latents: List[torch.Tensor], cond_mel: torch.Tensor, target_length: int = None):
+        """
+        只重新运行声码器：将 GPT latent 线性插值到目标时长后一次声码，替代对波形做变速
+
+        Args:
+            latents: infer(return_latent=True) 返回的分句 latent 列表，每个形状为 (1, T, C)
+            cond_mel: 参考音频 mel
+            target_length: 目标采样点数，None 表示原始时长
+
+        Returns:
+            (sampling_rate, wav_data)，与 infer 的返回格式一致，指定 target_length 时长度精确相等
+        """
+        sampling_rate = 24000
+        upsample_hop = self.samples_per_latent_frame // (4 if self.cfg.bigvgan.feat_upsample else 1)
+        total_frames = sum(latent.shape[1] for latent in latents)
+        ratio = target_length / (total_frames * self.samples_per_latent_frame) if target_length else 1.0
+
+        cond_mel = cond_mel.to(self.device)
+        wavs = []
+        with torch.no_grad():
+            for latent in latents:
+                latent = latent.to(self.device)
+                # 插值后的帧数（上采样卷积前的帧率），ratio=1 时等价于原 feat_upsample 的 4 倍插值
+                frames = max(1, round(latent.shape[1] * self.samples_per_latent_frame * ratio / upsample_hop))
+                with torch.amp.autocast(latent.device.type, enabled=self.dtype is not None, dtype=self.dtype):
+                    wav, _ = self.bigvgan(latent, cond_mel.transpose(1, 2), target_frames=frames)
+                    wav = wav.squeeze(1)
+                wavs.append(torch.clamp(32767 * wav, -32767.0, 32767.0).cpu())
+        wav = torch.cat(wavs, dim=1)
+
+        if target_length:
+            # 帧粒度取整造成的不足一帧的误差，截断或补零到精确长度
+            if wav.shape[-1] >= target_length:
+                wav = wav[:, :target_length]
+            else:
+                wav = torch.nn.functional.pad(wav, (0, target_length - wav.shape[-1]))
+        wav_data = wav.type(torch.int16).numpy().T
+        return (sampling_rate, wav_data)
+
 
 if __name__ == "__main__":
     prompt_wav="test_data/input.wav"
@@ -7,9 +7,9 @@ import asyncio
 import tempfile
 import os
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -17,8 +17,18 @@ from pydantic import BaseModel
 from core.voice_synthesizer import VoiceSynthesizer
 from core.sentence_tools import Sentence
 from core.audio_sample_manager import get_audio_sample_manager
-from core.task_context_manager import get_task_context_manager, TaskMediaContext
-from utils.path_manager import PathManager
+from core.task_context_manager import (
+    get_task_context_manager, TaskMediaContext, ArtifactNotReadyError,
+    ARTIFACT_AUDIO, ARTIFACT_VIDEO, ARTIFACT_SEPARATION
+)
+from core.dubbing_session import DubbingSession
+from core.task_pipeline import TaskPipeline
+from core.separation_service import get_separation_service
+from utils.path_manager import PathManager, R2PathManager
+from core.cloudflare.r2_client import get_r2_client
+from core.cloudflare.upload_scheduler import UploadPriority, get_upload_scheduler
+from utils.executors import get_executors
+from utils.ffmpeg_scheduler import ffmpeg_job_context, get_ffmpeg_scheduler
 from config import get_config
 
 # 配置日志
@@ -37,6 +47,9 @@ class TaskInitRequest(BaseModel):
     video_url: str
     enable_audio_separation: bool = True
     processing_options: Dict[str, Any] = {}
+    # 可选校验和，格式 "sha256:<hex>" 或 "md5:<hex>"
+    audio_checksum: Optional[str] = None
+    video_checksum: Optional[str] = None
 
 class TaskInitResponse(BaseModel):
     """任务初始化响应"""
@@ -46,6 +59,7 @@ class TaskInitResponse(BaseModel):
     local_audio_path: Optional[str] = None
     local_video_path: Optional[str] = None
     has_separated_audio: bool = False
+    artifacts: Dict[str, Any] = {}  # 各媒体产物的后台准备状态
     error: Optional[str] = None
 
 class SentenceRequest(BaseModel):
@@ -125,8 +139,8 @@ task_context_manager = get_task_context_manager()
 @app.post("/tasks/{task_id}/initialize", response_model=TaskInitResponse)
 async def initialize_task(task_id: str, request: TaskInitRequest):
     """
-    初始化任务上下文 - 下载和准备媒体资源
-    这是任务开始时的一次性操作
+    初始化任务上下文 - 注册任务并在后台下载和准备媒体资源
+    这是任务开始时的一次性操作，立即返回；产物就绪情况见 /tasks/{task_id}/status
     """
     logger.info(f"[{task_id}] 收到任务初始化请求")
     logger.info(f"  - 用户ID: {request.user_id}")
@@ -139,7 +153,9 @@ async def initialize_task(task_id: str, request: TaskInitRequest):
             task_id=task_id,
             user_id=request.user_id,
             audio_url=request.audio_url,
-            video_url=request.video_url
+            video_url=request.video_url,
+            audio_checksum=request.audio_checksum,
+            video_checksum=request.video_checksum
         )
         
         if result["success"]:
@@ -149,7 +165,8 @@ async def initialize_task(task_id: str, request: TaskInitRequest):
                 task_id=task_id,
                 local_audio_path=result.get("local_audio_path"),
                 local_video_path=result.get("local_video_path"),
-                has_separated_audio=result.get("has_separated_audio", False)
+                has_separated_audio=result.get("has_separated_audio", False),
+                artifacts=result.get("artifacts", {})
             )
         else:
             raise HTTPException(
@@ -182,13 +199,18 @@ async def synthesize_task_batch(task_id: str, request: SynthesisRequest):
                 status_code=404,
                 detail=f"任务 {task_id} 未初始化或不存在，请先调用初始化接口"
             )
+        if context.error:
+            raise HTTPException(
+                status_code=409,
+                detail=f"任务 {task_id} 媒体资源准备失败: {context.error}"
+            )
         
         # 设置请求参数以使用任务上下文
         enhanced_request = request.copy()
         enhanced_request.task_id = task_id
         
-        # 如果任务有媒体上下文，自动启用完整处理模式
-        if context.local_audio_path and context.local_video_path:
+        # 如果任务有媒体上下文，自动启用完整处理模式（媒体可能仍在后台准备，混合阶段再等待）
+        if context.audio_url and context.video_url:
             enhanced_request.mode = "full"
             enhanced_request.enable_media_mix = True
             enhanced_request.audio_path = context.local_audio_path
@@ -198,14 +220,21 @@ async def synthesize_task_batch(task_id: str, request: SynthesisRequest):
             enhanced_request.mode = "simple"
             logger.info(f"[{task_id}] 使用简单处理模式")
         
-        # 调用现有的合成处理逻辑
-        if enhanced_request.mode == "simple":
-            return await simple_tts_pipeline(enhanced_request)
-        else:
-            return await full_processing_pipeline_with_context(enhanced_request, path_manager)
+        # 调用现有的合成处理逻辑（其中的 ffmpeg 作业归属本任务，删除任务时一并取消）
+        with ffmpeg_job_context(task_id=task_id):
+            if enhanced_request.mode == "simple":
+                return await simple_tts_pipeline(enhanced_request)
+            else:
+                return await full_processing_pipeline_with_context(enhanced_request, path_manager)
             
     except HTTPException:
         raise
+    except ArtifactNotReadyError as e:
+        logger.error(f"[{task_id}] 批次合成等待媒体产物失败: {e}")
+        raise HTTPException(
+            status_code=409,
+            detail=f"批次合成失败: {str(e)}"
+        )
     except Exception as e:
         logger.error(f"[{task_id}] 批次合成异常: {e}")
         raise HTTPException(
@@ -217,6 +246,7 @@ async def synthesize_task_batch(task_id: str, request: SynthesisRequest):
 async def cleanup_task(task_id: str):
     """
     清理任务资源 - 任务完成后的资源清理
+    任务排队与运行中的 ffmpeg 作业随之取消/终止
     """
     logger.info(f"[{task_id}] 收到任务清理请求")
     
@@ -230,6 +260,70 @@ async def cleanup_task(task_id: str):
             detail=f"任务清理失败: {str(e)}"
         )
 
+@app.websocket("/tasks/{task_id}/stream")
+async def dubbing_stream(
+    websocket: WebSocket,
+    task_id: str,
+    enable_duration_align: bool = False,
+    enable_timestamp_adjust: bool = False,
+    enable_media_mix: bool = False
+):
+    """
+    全双工配音会话 - 句子增量推入，逐句推回合成音频
+    会话期间复用任务上下文的路径管理器、说话人缓存和混音状态
+    """
+    await websocket.accept()
+
+    context = task_context_manager.get_context(task_id)
+    path_manager = task_context_manager.get_path_manager(task_id)
+    if not context or not context.initialized or not voice_synthesizer:
+        await websocket.send_json({
+            "type": "error",
+            "error": f"任务 {task_id} 未初始化或语音合成引擎未就绪"
+        })
+        await websocket.close(code=1008)
+        return
+
+    # 复用按需加载的共享服务（对齐/时间戳/混音），混音状态保存在任务上下文的混音会话中
+    enable_media_mix = enable_media_mix and bool(context.video_url)
+    services = await load_required_services(SynthesisRequest(
+        sentences=[],
+        mode="full",
+        enable_duration_align=enable_duration_align,
+        enable_timestamp_adjust=enable_timestamp_adjust,
+        enable_media_mix=enable_media_mix
+    ))
+    media_mixer = services.get('media_mixer') if enable_media_mix else None
+    mixer_session = media_mixer.session_for_context(context, path_manager) if media_mixer else None
+
+    session = DubbingSession(
+        task_id=task_id,
+        context=context,
+        path_manager=path_manager,
+        voice_synthesizer=voice_synthesizer,
+        sample_rate=config.tts.target_sample_rate,
+        duration_aligner=services.get('duration_aligner'),
+        timestamp_adjuster=services.get('timestamp_adjuster'),
+        media_mixer=media_mixer,
+        mixer_session=mixer_session,
+        artifact_wait_timeout=config.tts.artifact_wait_timeout or None,
+        stage_queue_size=config.tts.pipeline_queue_size
+    )
+    logger.info(f"[{task_id}] 配音会话建立: 对齐={enable_duration_align}, 混合={media_mixer is not None}")
+
+    try:
+        with ffmpeg_job_context(task_id=task_id):
+            await session.run(websocket)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"[{task_id}] 配音会话客户端断开")
+    except Exception as e:
+        logger.error(f"[{task_id}] 配音会话异常: {e}")
+        try:
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+
 @app.get("/tasks/{task_id}/status")
 async def get_task_status(task_id: str):
     """获取任务状态"""
@@ -249,6 +343,10 @@ async def get_task_status(task_id: str):
         "has_local_audio": bool(context.local_audio_path),
         "has_local_video": bool(context.local_video_path),
         "has_separated_audio": bool(context.vocals_path),
+        "preparing": context.is_preparing(),
+        "artifacts": context.artifact_status(),
+        "pipeline": context.pipeline.get_stats() if context.pipeline is not None else None,
+        "ffmpeg_jobs": get_ffmpeg_scheduler().get_task_stats(task_id),
         "error": context.error
     }
 
@@ -261,8 +359,15 @@ async def startup_event():
     """应用启动初始化"""
     global voice_synthesizer
     try:
+        # 模型加载前按执行器线程池的并发设置 torch 线程数，避免推理/分离/DSP 线程超订
+        get_executors().configure_torch_threads()
         voice_synthesizer = VoiceSynthesizer(config)
         logger.info(f"语音合成引擎初始化完成，batch_size={config.tts.batch_size}")
+        # 预加载常驻分离模型，任务初始化时只需提交作业
+        if config.tts.enable_audio_separation and config.tts.separation_preload:
+            await get_separation_service().start()
+        # 恢复持久化的任务上下文并启动空闲回收器
+        await task_context_manager.start()
         logger.info("任务上下文管理架构就绪：支持任务级媒体资源管理")
     except Exception as e:
         logger.error(f"语音合成引擎初始化失败: {e}")
@@ -274,6 +379,13 @@ async def shutdown_event():
     try:
         # 清理任务上下文管理器
         await task_context_manager.cleanup_all()
+        await get_separation_service().close()
+        # 关闭音频样本缓存的连接池并写回索引
+        await get_audio_sample_manager().close()
+        # 停止上传调度并关闭对象存储连接池
+        await get_upload_scheduler().close()
+        await get_r2_client().close()
+        get_executors().shutdown()
         logger.info("应用关闭清理完成")
     except Exception as e:
         logger.error(f"应用关闭清理异常: {e}")
@@ -301,7 +413,8 @@ async def synthesize_voices(request: SynthesisRequest):
             return await simple_tts_pipeline(request)
         else:
             # 完整模式：包含所有处理阶段
-            return await full_processing_pipeline(request)
+            with ffmpeg_job_context(task_id=request.task_id):
+                return await full_processing_pipeline(request)
             
     except Exception as e:
         logger.error(f"处理失败: {e}")
@@ -314,11 +427,15 @@ async def simple_tts_pipeline(request: SynthesisRequest) -> SynthesisResponse:
     """
     简单TTS管线 - 兼容TTS-Worker
     """
+    # 请求处理期间引用的音频样本不被缓存淘汰
+    sample_owner = f"request:{id(request):x}"
     try:
         # 转换为内部Sentence对象（异步下载音频样本）
         sentences = []
         for req in request.sentences:
-            sentence = await create_sentence_from_request(req)
+            sentence = await create_sentence_from_request(req, sample_owner)
+            if request.task_id:
+                sentence.task_id = request.task_id
             sentences.append(sentence)
         
         # 批量合成
@@ -360,12 +477,15 @@ async def simple_tts_pipeline(request: SynthesisRequest) -> SynthesisResponse:
     except Exception as e:
         logger.error(f"简单模式处理失败: {e}")
         raise
+    finally:
+        await get_audio_sample_manager().release(sample_owner)
 
 async def full_processing_pipeline(request: SynthesisRequest) -> SynthesisResponse:
     """
     完整处理管线 - 包含所有处理阶段
     """
     processing_stages = ["tts"]
+    sample_owner = f"request:{id(request):x}"
     
     try:
         # 按需加载服务
@@ -374,7 +494,7 @@ async def full_processing_pipeline(request: SynthesisRequest) -> SynthesisRespon
         # 转换为内部Sentence对象（异步下载音频样本）
         sentences = []
         for req in request.sentences:
-            sentence = await create_sentence_from_request(req)
+            sentence = await create_sentence_from_request(req, sample_owner)
             if request.task_id:
                 sentence.task_id = request.task_id
             sentences.append(sentence)
@@ -397,30 +517,39 @@ async def full_processing_pipeline(request: SynthesisRequest) -> SynthesisRespon
             tts_sentences = await services['timestamp_adjuster'](tts_sentences, config.tts.target_sample_rate)
             processing_stages.append("timestamp_adjust")
         
-        # 阶段4: 媒体合成（如需要）
-        media_output = None
+        # 阶段4/5: 媒体合成与HLS生成（如需要）
+        # 整个请求从头渲染：按批次拆分后并行渲染片段，完成的片段按顺序发布到HLS
+        hls_url = None
         if request.enable_media_mix and request.video_path and 'media_mixer' in services:
             logger.info("完整模式 - 阶段4: 媒体合成")
+            task_id = request.task_id or "default"
             # 为非任务上下文模式构造临时 PathManager
-            temp_pm = PathManager(request.task_id or "default")
+            temp_pm = PathManager(task_id)
             temp_pm.set_media_paths(request.audio_path, request.video_path)
-            media_output = await services['media_mixer'].mix_media(
-                sentences_batch=tts_sentences,
-                path_manager=temp_pm,
-                batch_counter=0,
-                task_id=request.task_id or "default"
-            )
-            processing_stages.append("media_mix")
-        
-        # 阶段5: HLS生成（如需要）
-        hls_url = None
-        if request.enable_hls and media_output and 'hls_manager' in services:
-            logger.info("完整模式 - 阶段5: HLS生成")
-            hls_url = await services['hls_manager'].generate_hls(
-                media_output,
-                request.task_id
+            media_mixer = services['media_mixer']
+            hls_manager = services.get('hls_manager') if request.enable_hls else None
+            if hls_manager is not None:
+                await hls_manager.create_manager(task_id, temp_pm)
+            
+            async def publish_segment(index: int, segment_path: str) -> None:
+                await hls_manager.add_segment(task_id, segment_path, index)
+            
+            batch_size = max(1, config.tts.batch_size)
+            batches = [tts_sentences[i:i + batch_size] for i in range(0, len(tts_sentences), batch_size)]
+            session = media_mixer.create_session(task_id, temp_pm.temp.segments_dir)
+            outputs = await media_mixer.render_batches(
+                batches, temp_pm, session,
+                on_segment=publish_segment if hls_manager is not None else None
             )
-            processing_stages.append("hls_generation")
+            # 完成增量组装的成品文件与字幕轨
+            await media_mixer.flush(temp_pm, session, end_stream=True)
+            if any(outputs):
+                processing_stages.append("media_mix")
+                if hls_manager is not None:
+                    logger.info("完整模式 - 阶段5: HLS生成")
+                    await hls_manager.finalize_playlist(task_id)
+                    hls_url = hls_manager.get_playlist_path(task_id)
+                    processing_stages.append("hls_generation")
         
         # 构建结果
         results = []
@@ -446,91 +575,168 @@ async def full_processing_pipeline(request: SynthesisRequest) -> SynthesisRespon
     except Exception as e:
         logger.error(f"完整模式处理失败: {e}")
         raise
+    finally:
+        await get_audio_sample_manager().release(sample_owner)
+
+@dataclass(eq=False)
+class ContextBatch:
+    """任务流水线中流转的单个批次合成请求"""
+    request: SynthesisRequest
+    path_manager: PathManager
+    services: Dict[str, Any]
+    sentences: List[Sentence] = field(default_factory=list)
+    processing_stages: List[str] = field(default_factory=list)
+    media_output: Optional[str] = None
+    hls_url: Optional[str] = None
+
+    @property
+    def sample_owner(self) -> str:
+        """批次对音频样本的引用标识（批次流经全部阶段后释放）"""
+        return f"batch:{id(self):x}"
+
+
+async def _stage_prepare(batch: ContextBatch) -> ContextBatch:
+    """转换请求为内部句子对象（下载音频样本，与上一批次的合成重叠）"""
+    batch.sentences = [
+        await create_sentence_from_request(req, batch.sample_owner) for req in batch.request.sentences
+    ]
+    return batch
+
+
+async def _stage_tts(batch: ContextBatch) -> ContextBatch:
+    """阶段1: TTS合成"""
+    if not voice_synthesizer:
+        raise RuntimeError("语音合成器未初始化")
+    batch.sentences = await voice_synthesizer.synthesizeBatch(batch.sentences)
+    batch.processing_stages.append("tts_synthesis")
+    return batch
+
+
+async def _stage_align(batch: ContextBatch) -> ContextBatch:
+    """阶段2/3: 时长对齐与时间戳调整（如需要）"""
+    request, services = batch.request, batch.services
+    if request.enable_duration_align and 'duration_aligner' in services:
+        logger.info("任务上下文完整模式 - 阶段2: 时长对齐")
+        batch.sentences = await services['duration_aligner'](batch.sentences)
+        batch.processing_stages.append("duration_alignment")
+    if request.enable_timestamp_adjust and 'timestamp_adjuster' in services:
+        logger.info("任务上下文完整模式 - 阶段3: 时间戳调整")
+        batch.sentences = await services['timestamp_adjuster'](batch.sentences, config.tts.target_sample_rate)
+        batch.processing_stages.append("timestamp_adjustment")
+    return batch
+
+
+async def _stage_mix(batch: ContextBatch) -> ContextBatch:
+    """阶段4: 媒体合成（使用预初始化的路径管理器）"""
+    request, path_manager = batch.request, batch.path_manager
+    if not (request.enable_media_mix and 'media_mixer' in batch.services):
+        return batch
+    logger.info("任务上下文完整模式 - 阶段4: 媒体合成")
+    if request.task_id:
+        # 仅在此处等待混合所需的产物；分离失败时退化为无背景音
+        await task_context_manager.wait_for_artifacts(request.task_id, ARTIFACT_AUDIO, ARTIFACT_VIDEO)
+        await task_context_manager.wait_for_artifacts(request.task_id, ARTIFACT_SEPARATION, required=False)
+    media_mixer = batch.services['media_mixer']
+    context = task_context_manager.get_context(request.task_id) if request.task_id else None
+    if context is not None:
+        # 任务混音会话：衔接历史与片段序号跨请求延续
+        mixer_session = media_mixer.session_for_context(context, path_manager)
+    else:
+        mixer_session = media_mixer.create_session(request.task_id or "default", path_manager.temp.segments_dir)
+    batch.media_output = await media_mixer.mix_media(
+        batch.sentences,
+        path_manager,  # 使用任务上下文的路径管理器
+        mixer_session
+    )
+    batch.processing_stages.append("media_mix")
+    return batch
+
+
+async def _stage_hls(batch: ContextBatch) -> ContextBatch:
+    """阶段5: HLS生成（如需要）"""
+    request, media_output = batch.request, batch.media_output
+    if request.enable_hls and media_output and batch.path_manager.hls_renditions is not None:
+        # 分离演绎模式：混合阶段已追加音频演绎并提交片段与播放列表上传，直接返回主播放列表
+        batch.hls_url = media_output
+        batch.processing_stages.append("hls_generation")
+    elif request.enable_hls and media_output and 'hls_manager' in batch.services:
+        logger.info("任务上下文完整模式 - 阶段5: HLS生成")
+        batch.hls_url = await batch.services['hls_manager'].generate_hls(
+            media_output,
+            request.task_id or "default"
+        )
+        batch.processing_stages.append("hls_generation")
+    return batch
+
+
+# 任务流水线阶段：每个阶段一个工作者，同一任务的批次按提交顺序依次流经
+CONTEXT_PIPELINE_STAGES = [
+    ("prepare", _stage_prepare),
+    ("tts", _stage_tts),
+    ("align", _stage_align),
+    ("mix", _stage_mix),
+    ("hls", _stage_hls),
+]
+
+
+def get_task_pipeline(context: TaskMediaContext) -> TaskPipeline:
+    """获取（必要时创建）保存在任务上下文中的阶段流水线"""
+    if context.pipeline is None:
+        context.pipeline = TaskPipeline(
+            context.task_id, CONTEXT_PIPELINE_STAGES, queue_size=config.tts.pipeline_queue_size
+        )
+    return context.pipeline
+
 
 async def full_processing_pipeline_with_context(request: SynthesisRequest, path_manager: PathManager) -> SynthesisResponse:
     """
     完整处理管道 - 使用任务上下文
-    这是新的优化版本，使用预初始化的媒体资源
+    批次提交到任务流水线：本批次合成时上一批次可能仍在混合，阶段队列满时在此等待（背压）
     """
+    batch: Optional[ContextBatch] = None
     try:
         logger.info(f"任务上下文完整模式 - 开始处理 {len(request.sentences)} 个句子")
         
-        # 转换请求为内部句子对象
-        tts_sentences = []
-        for req_sentence in request.sentences:
-            sentence = await create_sentence_from_request(req_sentence)
-            tts_sentences.append(sentence)
-        
         # 延迟加载扩展服务
         services = await load_required_services(request)
+        batch = ContextBatch(request=request, path_manager=path_manager, services=services)
         
-        # 阶段1: TTS合成
-        if voice_synthesizer:
-            # 使用 VoiceSynthesizer 的正确方法名（camelCase）
-            tts_sentences = await voice_synthesizer.synthesizeBatch(tts_sentences)
+        context = task_context_manager.get_context(request.task_id) if request.task_id else None
+        if context is not None:
+            batch = await get_task_pipeline(context).process(batch)
         else:
-            raise RuntimeError("语音合成器未初始化")
-        
-        processing_stages = ["tts_synthesis"]
-        
-        # 阶段2: 时长对齐（如需要）
-        if request.enable_duration_align and 'duration_aligner' in services:
-            logger.info("任务上下文完整模式 - 阶段2: 时长对齐")
-            tts_sentences = await services['duration_aligner'].align_batch(tts_sentences)
-            processing_stages.append("duration_alignment")
-        
-        # 阶段3: 时间戳调整（如需要）
-        if request.enable_timestamp_adjust and 'timestamp_adjuster' in services:
-            logger.info("任务上下文完整模式 - 阶段3: 时间戳调整")
-            tts_sentences = await services['timestamp_adjuster'].adjust_batch(tts_sentences)
-            processing_stages.append("timestamp_adjustment")
-        
-        # 阶段4: 媒体合成（使用预初始化的路径管理器）
-        media_output = None
-        if request.enable_media_mix and 'media_mixer' in services:
-            logger.info("任务上下文完整模式 - 阶段4: 媒体合成")
-            media_output = await services['media_mixer'].mix_media(
-                tts_sentences, 
-                path_manager,  # 使用任务上下文的路径管理器
-                0,  # batch_counter
-                request.task_id or "default"
-            )
-            processing_stages.append("media_mix")
-        
-        # 阶段5: HLS生成（如需要）
-        hls_url = None
-        if request.enable_hls and media_output and 'hls_manager' in services:
-            logger.info("任务上下文完整模式 - 阶段5: HLS生成")
-            hls_url = await services['hls_manager'].generate_hls(
-                media_output,
-                request.task_id or "default"
-            )
-            processing_stages.append("hls_generation")
+            for _, handler in CONTEXT_PIPELINE_STAGES:
+                batch = await handler(batch)
         
         # 构建结果
         results = []
-        for sentence in tts_sentences:
+        for sentence in batch.sentences:
+            generated_audio = getattr(sentence, 'generated_audio', None)
             result = SynthesisResult(
                 sequence=sentence.sequence,
                 audioKey=getattr(sentence, 'tts_audio_path', ''),
-                durationMs=int(getattr(sentence, 'duration', 0) * 1000),
+                durationMs=int(round(len(generated_audio) / config.tts.target_sample_rate * 1000)) if generated_audio is not None else int(getattr(sentence, 'duration', 0)),
                 success=True
             )
             results.append(result)
         
-        logger.info(f"任务上下文完整模式完成，处理阶段: {processing_stages}")
+        logger.info(f"任务上下文完整模式完成，处理阶段: {batch.processing_stages}")
         
         return SynthesisResponse(
             success=True,
             results=results,
-            processing_stages=processing_stages,
-            output_url=hls_url,
+            processing_stages=batch.processing_stages,
+            output_url=batch.hls_url,
             task_id=request.task_id
         )
         
     except Exception as e:
         logger.error(f"任务上下文完整模式处理失败: {e}")
         raise
+    finally:
+        if batch is not None:
+            # 批次已流经全部阶段（或失败/被取消），释放其引用的音频样本
+            await get_audio_sample_manager().release(batch.sample_owner)
 
 async def load_required_services(request: SynthesisRequest) -> Dict:
     """
@@ -581,7 +787,11 @@ async def health_check():
         "version": "4.0.0",
         "mode": "dual",  # 双模式
         "batch_size": config.tts.batch_size if config else 3,
-        "loaded_services": list(extended_services.keys())  # 已加载的扩展服务
+        "loaded_services": list(extended_services.keys()),  # 已加载的扩展服务
+        "separation": get_separation_service().get_metrics(),
+        "separation_savings": task_context_manager.get_separation_savings(),
+        "executors": get_executors().get_stats(),
+        "ffmpeg": get_ffmpeg_scheduler().get_stats()
     }
 
 @app.get("/task/{task_id}/status")
@@ -600,17 +810,21 @@ async def get_task_status(task_id: str):
 # 辅助函数
 # ================================
 
-async def create_sentence_from_request(req: SentenceRequest) -> Sentence:
+async def create_sentence_from_request(req: SentenceRequest, sample_owner: Optional[str] = None) -> Sentence:
     """
     从请求创建Sentence对象
     自动处理音频样本的下载（从URL到本地路径）
+
+    Args:
+        req: 句子请求
+        sample_owner: 音频样本的引用方；句子合成完成前样本文件不会被缓存淘汰，用完需 release
     """
     # 下载音频样本到本地（如果是URL）
     local_audio_path = req.audioSample
     if req.audioSample and req.audioSample.strip():
         try:
             audio_manager = get_audio_sample_manager()
-            local_audio_path = await audio_manager.get_local_path(req.audioSample)
+            local_audio_path = await audio_manager.get_prompt_path(req.audioSample, owner=sample_owner)
             logger.info(f"音频样本下载成功: {req.audioSample} -> {local_audio_path}")
         except Exception as e:
             logger.error(f"下载音频样本失败: {req.audioSample}, 错误: {e}")
@@ -629,7 +843,7 @@ async def create_sentence_from_request(req: SentenceRequest) -> Sentence:
     )
 
 async def save_generated_audio(sentence: Sentence) -> str:
-    """保存生成的音频并返回文件路径"""
+    """保存生成的音频；R2 已配置时提交上传（低优先级，不等待）并返回对象 key，否则返回本地文件路径"""
     try:
         # 创建临时文件
         with tempfile.NamedTemporaryFile(
@@ -652,8 +866,18 @@ async def save_generated_audio(sentence: Sentence) -> str:
             # 记录路径到sentence对象
             sentence.tts_audio_path = tmp_file.name
             
-            logger.info(f"音频已保存: {tmp_file.name}")
-            return tmp_file.name
+        logger.info(f"音频已保存: {tmp_file.name}")
+        
+        # 与 HLS 上传共用全局上传调度器（BULK 优先级，不占用播放列表/片段的带宽）
+        if config.tts.upload_tts_audio and get_r2_client().is_configured:
+            task_id = sentence.task_id or "default"
+            key = R2PathManager(task_id).get_tts_audio_key(sentence.sequence)
+            get_upload_scheduler().submit_file(
+                task_id, key, tmp_file.name, UploadPriority.BULK, content_type="audio/wav"
+            )
+            logger.info(f"音频已提交上传: {key}")
+            return key
+        return tmp_file.name
             
     except Exception as e:
         logger.error(f"保存音频失败: {e}")
@@ -0,0 +1,30 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# 测试以引擎根目录为导入根（与 synthesizer.py 运行方式一致），本目录提供测试替身
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, Path(__file__).resolve().parent):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+requires_ffmpeg = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+    reason="需要 ffmpeg/ffprobe"
+)
+
+
+@pytest.fixture(scope="session")
+def lavfi_video(tmp_path_factory):
+    """lavfi 生成的 16 秒 H.264 测试视频（无音频，每 2 秒一个关键帧，含 B 帧）"""
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("需要 ffmpeg")
+    path = tmp_path_factory.mktemp("media") / "testsrc.mp4"
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=320x240:rate=25", "-t", "16",
+        "-c:v", "libx264", "-preset", "ultrafast", "-bf", "2", "-g", "50", "-pix_fmt", "yuv420p", str(path)
+    ], check=True)
+    return str(path)
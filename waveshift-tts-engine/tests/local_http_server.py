@@ -0,0 +1,218 @@
+"""
+本地HTTP替身服务器 - 测试媒体下载用，不依赖R2/CDN
+支持 HEAD、单段 Range 请求、ETag/Last-Modified/If-Range、Content-MD5，以及可选的故障注入（中途断开连接）
+"""
+import base64
+import hashlib
+import logging
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from email.utils import formatdate
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _RangeRequestHandler(SimpleHTTPRequestHandler):
+    """支持Range请求的静态文件处理器"""
+
+    server_version = "WaveShiftLocalHTTP/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("local-http: " + format % args)
+
+    def _resolve(self) -> Optional[Path]:
+        path = Path(self.translate_path(self.path))
+        return path if path.is_file() else None
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool):
+        path = self._resolve()
+        if path is None:
+            self.send_error(404, "File not found")
+            return
+
+        owner = self.server.owner
+        size = path.stat().st_size
+        etag = owner.etag_for(path)
+        last_modified = formatdate(path.stat().st_mtime, usegmt=True) if owner.last_modified else None
+        start, end = 0, size - 1
+        status = 200
+
+        range_header = self.headers.get("Range")
+        if range_header and owner.support_ranges and range_header.startswith("bytes="):
+            if_range = self.headers.get("If-Range")
+            # 弱 ETag 永远不匹配 If-Range（RFC 9110 13.1.5）
+            strong_etag = etag if etag and not etag.startswith("W/") else None
+            if not if_range or if_range in (strong_etag, last_modified):
+                spec = range_header[len("bytes="):].split(",")[0].strip()
+                first, _, last = spec.partition("-")
+                if first:
+                    start = int(first)
+                    end = int(last) if last else size - 1
+                else:
+                    start = max(0, size - int(last))
+                if start >= size or start > end:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.end_headers()
+                    return
+                end = min(end, size - 1)
+                status = 206
+                if send_body:
+                    owner.count_ranged()
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("Content-Length", str(length))
+        if etag:
+            self.send_header("ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", last_modified)
+        if status == 200 and owner.declared_md5:
+            self.send_header("Content-MD5", base64.b64encode(bytes.fromhex(owner.declared_md5)).decode())
+        if owner.support_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        if not send_body:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                if owner.should_drop(len(chunk)):
+                    # 故障注入：模拟连接中断
+                    self.close_connection = True
+                    return
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+class LocalHTTPServer:
+    """
+    本地HTTP替身服务器（后台线程运行）
+
+    用法:
+        with LocalHTTPServer(directory) as server:
+            url = server.url_for("video.mp4")
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        support_ranges: bool = True,
+        drop_after_bytes: Optional[int] = None,
+        on_drop: Optional[Callable[[], None]] = None,
+        etag_mode: Optional[str] = "md5",
+        last_modified: bool = False,
+        declared_md5: Optional[str] = None
+    ):
+        """
+        Args:
+            directory: 对外提供的文件目录
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            support_ranges: 是否支持Range请求
+            drop_after_bytes: 累计发送该字节数后断开一次连接（用于测试断点续传）
+            on_drop: 断开连接时的回调（例如修改文件，模拟下载过程中远端文件变化）
+            etag_mode: "md5" 内容MD5 / "weak" 弱 ETag / "opaque" 非内容MD5的32位十六进制（如 SSE-KMS）/ None 不发送
+            last_modified: 是否发送 Last-Modified（可用于 If-Range）
+            declared_md5: 完整响应中以 Content-MD5 声明的MD5（十六进制），None 表示不声明
+        """
+        self.directory = Path(directory)
+        self.support_ranges = support_ranges
+        self.drop_after_bytes = drop_after_bytes
+        self.on_drop = on_drop
+        self.etag_mode = etag_mode
+        self.last_modified = last_modified
+        self.declared_md5 = declared_md5
+        self.bytes_sent = 0  # 累计发送的响应体字节数
+        self.ranged_requests = 0  # 返回 206 的请求数
+        self._dropped = False
+        self._lock = threading.Lock()
+        self._etags = {}
+
+        handler = partial(_RangeRequestHandler, directory=str(self.directory))
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.owner = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, relative_path: str) -> str:
+        """文件的访问URL"""
+        return f"{self.base_url}/{relative_path.lstrip('/')}"
+
+    def etag_for(self, path: Path) -> Optional[str]:
+        """文件的ETag（默认为内容MD5，与R2单段上传一致）"""
+        if self.etag_mode is None:
+            return None
+        if self.etag_mode == "opaque":
+            # 稳定但与内容无关的32位十六进制值
+            return f'"{hashlib.md5(str(path).encode()).hexdigest()}"'
+        stat = path.stat()
+        key = (str(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key not in self._etags:
+                digest = hashlib.md5()
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(block)
+                self._etags[key] = f'"{digest.hexdigest()}"'
+            etag = self._etags[key]
+        return f"W/{etag}" if self.etag_mode == "weak" else etag
+
+    def should_drop(self, chunk_size: int) -> bool:
+        """记录发送字节数并判定是否注入故障"""
+        with self._lock:
+            if self.drop_after_bytes is None or self._dropped or self.bytes_sent + chunk_size < self.drop_after_bytes:
+                self.bytes_sent += chunk_size
+                return False
+            self._dropped = True
+        if self.on_drop is not None:
+            self.on_drop()
+        return True
+
+    def count_ranged(self) -> None:
+        with self._lock:
+            self.ranged_requests += 1
+
+    def start(self) -> "LocalHTTPServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="local-http-server", daemon=True)
+        self._thread.start()
+        logger.info(f"本地HTTP替身服务器已启动: {self.base_url} -> {self.directory}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        logger.info("本地HTTP替身服务器已停止")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
@@ -0,0 +1,267 @@
+"""
+本地S3替身服务器 - 测试对象存储上传用，不依赖R2
+支持路径风格的 PUT / GET / HEAD / DELETE 与分段上传（创建/上传分段/完成/中止），
+可选校验 SigV4 签名，可注入失败（前 N 个请求返回 503）
+"""
+import hashlib
+import hmac
+import logging
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+def _quote(value: str) -> str:
+    return quote(value, safe="-_.~")
+
+
+class _S3RequestHandler(BaseHTTPRequestHandler):
+    """S3 协议子集处理器"""
+
+    server_version = "WaveShiftLocalS3/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("local-s3: " + format % args)
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_HEAD(self):
+        self._handle("HEAD")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _reply(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None, send_body: bool = True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str):
+        body = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code></Error>".encode()
+        self._reply(status, body, {"Content-Type": "application/xml"}, send_body=self.command != "HEAD")
+
+    def _handle(self, method: str):
+        owner = self.server.owner
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        if owner.consume_failure():
+            self._error(503, "SlowDown")
+            return
+
+        split = urlsplit(self.path)
+        query = dict(parse_qsl(split.query, keep_blank_values=True))
+        if owner.credentials and not owner.verify_signature(method, split.path, split.query, self.headers):
+            self._error(403, "SignatureDoesNotMatch")
+            return
+
+        parts = unquote(split.path).lstrip("/").split("/", 1)
+        if len(parts) != 2 or parts[0] != owner.bucket or not parts[1]:
+            self._error(404, "NoSuchBucket")
+            return
+        key = parts[1]
+
+        if method == "POST" and "uploads" in query:
+            upload_id = owner.create_upload(key)
+            xml = f"<InitiateMultipartUploadResult><Bucket>{owner.bucket}</Bucket><Key>{key}</Key>" \
+                  f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            self._reply(200, xml.encode(), {"Content-Type": "application/xml"})
+        elif method == "PUT" and "uploadId" in query:
+            etag = owner.put_part(query["uploadId"], int(query["partNumber"]), body)
+            if etag is None:
+                self._error(404, "NoSuchUpload")
+            else:
+                self._reply(200, headers={"ETag": etag})
+        elif method == "POST" and "uploadId" in query:
+            etag = owner.complete_upload(query["uploadId"], key)
+            if etag is None:
+                self._error(404, "NoSuchUpload")
+            else:
+                xml = f"<CompleteMultipartUploadResult><Key>{key}</Key><ETag>{etag}</ETag></CompleteMultipartUploadResult>"
+                self._reply(200, xml.encode(), {"Content-Type": "application/xml"})
+        elif method == "DELETE" and "uploadId" in query:
+            owner.abort_upload(query["uploadId"])
+            self._reply(204)
+        elif method == "PUT":
+            etag = owner.put_object(key, body, self.headers.get("Content-Type", "application/octet-stream"))
+            self._reply(200, headers={"ETag": etag})
+        elif method in ("GET", "HEAD"):
+            entry = owner.get_object(key)
+            if entry is None:
+                self._error(404, "NoSuchKey")
+                return
+            data, content_type, etag = entry
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            if method == "GET":
+                self.wfile.write(data)
+        elif method == "DELETE":
+            owner.delete_object(key)
+            self._reply(204)
+        else:
+            self._error(405, "MethodNotAllowed")
+
+
+class LocalS3Server:
+    """
+    本地S3替身服务器（后台线程运行，对象保存在内存中）
+
+    用法:
+        with LocalS3Server(bucket="test", credentials=("ak", "sk")) as server:
+            client = R2Client(server.endpoint, "test", "ak", "sk")
+    """
+
+    def __init__(
+        self,
+        bucket: str = "test-bucket",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        credentials: Optional[tuple] = None,
+        fail_first: int = 0
+    ):
+        """
+        Args:
+            bucket: 存储桶名称
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            credentials: (access_key_id, secret_access_key)，提供时校验 SigV4 签名
+            fail_first: 前 N 个请求返回 503（测试重试）
+        """
+        self.bucket = bucket
+        self.credentials = credentials
+        self.objects: Dict[str, tuple] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.request_log: List[str] = []
+        self._fail_remaining = fail_first
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), _S3RequestHandler)
+        self._httpd.owner = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # 存储操作（处理器线程调用）
+
+    def consume_failure(self) -> bool:
+        with self._lock:
+            if self._fail_remaining > 0:
+                self._fail_remaining -= 1
+                return True
+            return False
+
+    def put_object(self, key: str, data: bytes, content_type: str) -> str:
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            self.objects[key] = (data, content_type, etag)
+            self.request_log.append(key)
+        return etag
+
+    def get_object(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            return self.objects.get(key)
+
+    def delete_object(self, key: str):
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def create_upload(self, key: str) -> str:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = {}
+        return upload_id
+
+    def put_part(self, upload_id: str, number: int, data: bytes) -> Optional[str]:
+        with self._lock:
+            if upload_id not in self.uploads:
+                return None
+            self.uploads[upload_id][number] = data
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def complete_upload(self, upload_id: str, key: str) -> Optional[str]:
+        with self._lock:
+            parts = self.uploads.pop(upload_id, None)
+        if parts is None:
+            return None
+        data = b"".join(parts[n] for n in sorted(parts))
+        # 与 S3 一致：分段对象的 ETag 为各段MD5拼接后的MD5加段数
+        digest = hashlib.md5(b"".join(hashlib.md5(parts[n]).digest() for n in sorted(parts))).hexdigest()
+        etag = f'"{digest}-{len(parts)}"'
+        with self._lock:
+            self.objects[key] = (data, "application/octet-stream", etag)
+            self.request_log.append(key)
+        return etag
+
+    def abort_upload(self, upload_id: str):
+        with self._lock:
+            self.uploads.pop(upload_id, None)
+
+    def verify_signature(self, method: str, raw_path: str, raw_query: str, headers) -> bool:
+        """按 SigV4 重新计算签名并比较"""
+        auth = headers.get("Authorization", "")
+        if not auth.startswith("AWS4-HMAC-SHA256 "):
+            return False
+        fields = dict(item.strip().split("=", 1) for item in auth[len("AWS4-HMAC-SHA256 "):].split(","))
+        access_key, date_stamp, region, service, _ = fields["Credential"].split("/")
+        if access_key != self.credentials[0]:
+            return False
+        signed_names = fields["SignedHeaders"].split(";")
+        canonical_headers = "".join(f"{name}:{(headers.get(name) or '').strip()}\n" for name in signed_names)
+        pairs = parse_qsl(raw_query, keep_blank_values=True)
+        canonical_query = "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(pairs))
+        canonical_request = "\n".join([
+            method, raw_path, canonical_query, canonical_headers, fields["SignedHeaders"],
+            headers.get("x-amz-content-sha256", "")
+        ])
+        scope = f"{date_stamp}/{region}/{service}/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", headers.get("x-amz-date", ""), scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        key = ("AWS4" + self.credentials[1]).encode()
+        for part in (date_stamp, region, service, "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        expected = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, fields["Signature"])
+
+    def start(self) -> "LocalS3Server":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="local-s3-server", daemon=True)
+        self._thread.start()
+        logger.info(f"本地S3替身服务器已启动: {self.endpoint}/{self.bucket}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        logger.info("本地S3替身服务器已停止")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
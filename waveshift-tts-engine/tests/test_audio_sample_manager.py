@@ -0,0 +1,88 @@
+import asyncio
+from pathlib import Path
+
+from core.audio_sample_manager import AudioSampleManager
+from local_http_server import LocalHTTPServer
+
+SIZE = 40 * 1024
+
+
+def _manager(cache_dir, **kwargs) -> AudioSampleManager:
+    options = dict(max_cache_bytes=2 * SIZE + 1024, revalidate_after=0, enable_pcm_sidecar=False)
+    options.update(kwargs)
+    return AudioSampleManager(cache_dir, **options)
+
+
+def _serve(root: Path, names):
+    root.mkdir()
+    for index, name in enumerate(names):
+        (root / name).write_bytes(bytes([index]) * SIZE)
+    return LocalHTTPServer(root)
+
+
+def test_pinned_samples_survive_eviction(tmp_path):
+    names = [f"s{i}.wav" for i in range(4)]
+    with _serve(tmp_path / "www", names) as server:
+        urls = [server.url_for(name) for name in names]
+
+        async def _main():
+            manager = _manager(tmp_path / "cache")
+            try:
+                pinned = await manager.get_local_path(urls[0], owner="session-a")
+                await manager.get_local_path(urls[1], owner="batch-b")
+                # 超出预算：未被引用的条目按LRU淘汰，被引用的条目保留
+                for url in urls[2:]:
+                    await manager.get_local_path(url)
+                assert Path(pinned).exists()
+                assert urls[0] in manager._index and urls[1] in manager._index
+                assert manager.get_cache_info()["pinned_count"] == 2
+
+                await manager.release("session-a")
+                await manager.release("batch-b")
+                assert not Path(pinned).exists() and urls[0] not in manager._index
+                assert sum(e.total_size for e in manager._index.values()) <= manager.max_cache_bytes
+                assert manager.get_cache_info()["pinned_count"] == 0
+            finally:
+                await manager.close()
+
+        asyncio.run(_main())
+
+
+def test_shared_pin_released_by_last_owner(tmp_path):
+    names = ["a.wav", "b.wav", "c.wav"]
+    with _serve(tmp_path / "www", names) as server:
+        urls = [server.url_for(name) for name in names]
+
+        async def _main():
+            manager = _manager(tmp_path / "cache", max_cache_bytes=SIZE + 1024)
+            try:
+                path = await manager.get_local_path(urls[0], owner="one")
+                await manager.get_local_path(urls[0], owner="two")
+                await manager.get_local_path(urls[1])
+                await manager.release("one")
+                await manager.get_local_path(urls[2])
+                assert Path(path).exists()
+                await manager.release("two")
+                assert not Path(path).exists()
+            finally:
+                await manager.close()
+
+        asyncio.run(_main())
+
+
+def test_pinned_entry_is_not_revalidated(tmp_path):
+    with _serve(tmp_path / "www", ["a.wav"]) as server:
+        url = server.url_for("a.wav")
+
+        async def _main():
+            manager = _manager(tmp_path / "cache", revalidate_after=1e-6)
+            try:
+                await manager.get_local_path(url, owner="session")
+                entry = manager._index[url]
+                assert not manager._needs_revalidation(entry)
+                await manager.release("session")
+                assert manager._needs_revalidation(entry)
+            finally:
+                await manager.close()
+
+        asyncio.run(_main())
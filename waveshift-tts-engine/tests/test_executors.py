@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.executors import (
+    POOL_DSP, POOL_INFERENCE, POOL_IO, POOL_SEPARATION, ExecutorRegistry, separation_worker_count
+)
+
+
+def _registry(**kwargs) -> ExecutorRegistry:
+    options = dict(inference_workers=1, dsp_workers=2, io_workers=4, separation_workers=1)
+    options.update(kwargs)
+    return ExecutorRegistry(**options)
+
+
+def test_pools_are_isolated():
+    """推理池被占满时 I/O 调用不排在推理之后"""
+    registry = _registry()
+    release = threading.Event()
+
+    async def _main():
+        blocked = [asyncio.ensure_future(registry.run(POOL_INFERENCE, release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        names = await asyncio.wait_for(
+            asyncio.gather(*(registry.run(POOL_IO, lambda: threading.current_thread().name) for _ in range(4))),
+            timeout=2
+        )
+        assert all(name.startswith("pool_io") for name in names)
+        stats = registry.get_stats()[POOL_INFERENCE]
+        assert stats["running"] == 1 and stats["queued"] == 2
+        release.set()
+        await asyncio.gather(*blocked)
+
+    try:
+        asyncio.run(_main())
+    finally:
+        release.set()
+        registry.shutdown()
+
+
+def test_stats_track_wait_and_failures():
+    registry = _registry()
+
+    async def _main():
+        await asyncio.gather(*(registry.run(POOL_INFERENCE, time.sleep, 0.05) for _ in range(3)))
+        with pytest.raises(ZeroDivisionError):
+            await registry.run(POOL_DSP, lambda: 1 / 0)
+
+    asyncio.run(_main())
+    stats = registry.get_stats()
+    # 单线程推理池串行执行：后两次调用都经历了排队
+    assert stats[POOL_INFERENCE]["completed"] == 3
+    assert stats[POOL_INFERENCE]["max_wait_ms"] > 0
+    assert stats[POOL_DSP]["failed"] == 1
+    assert stats[POOL_IO]["queued"] == 0
+    registry.shutdown()
+
+
+def test_unknown_pool():
+    registry = _registry()
+    with pytest.raises(ValueError):
+        registry.get("gpu")
+    registry.shutdown()
+
+
+def test_separation_pool_matches_separator_count():
+    registry = _registry(separation_workers=0)
+    assert registry.get(POOL_SEPARATION).max_workers == separation_worker_count()
+    assert separation_worker_count(3) == 3
+    registry.shutdown()
@@ -0,0 +1,100 @@
+import asyncio
+import shutil
+
+import pytest
+
+from utils.ffmpeg_scheduler import (
+    JOB_ENCODE, JOB_PROBE, JOB_REMUX, PRIORITY_BACKGROUND, PRIORITY_CRITICAL,
+    FFmpegCancelledError, FFmpegScheduler, _with_threads, ffmpeg_job_context,
+)
+
+pytestmark = pytest.mark.skipif(shutil.which("sleep") is None, reason="需要 sleep 命令")
+
+# 占住预算的长作业；测试通过取消/退出上下文结束它，不依赖其自然退出
+BLOCKER = ["sleep", "30"]
+
+
+async def _until(predicate, timeout: float = 5.0):
+    """轮询等待条件成立（宽松超时，只用于防止测试卡死）"""
+    async def _poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(_poll(), timeout)
+
+
+def test_priority_order_when_budget_is_full():
+    async def _main():
+        scheduler = FFmpegScheduler(cpu_budget=1)
+        order = []
+
+        async def _job(name, priority=None):
+            await scheduler.run(["true"], job_type=JOB_REMUX, priority=priority, task_id="a")
+            order.append(name)
+
+        async with scheduler.job(BLOCKER, JOB_REMUX, task_id="a"):
+            tasks = [asyncio.create_task(_job("n0")), asyncio.create_task(_job("bg", PRIORITY_BACKGROUND))]
+            await _until(lambda: scheduler.get_stats()["queued"] == 2)
+            tasks.append(asyncio.create_task(_job("n1")))
+            tasks.append(asyncio.create_task(_job("critical", PRIORITY_CRITICAL)))
+            await _until(lambda: scheduler.get_stats()["queued"] == 4)
+            assert scheduler.get_stats()["queued_by_priority"] == {"critical": 1, "normal": 2, "background": 1}
+            assert scheduler.get_task_stats("a") == {"queued": 4, "running": 1}
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=10)
+        return order, scheduler.get_stats()
+
+    order, stats = asyncio.run(_main())
+    # 关键作业插队，同优先级先到先得，后台作业最后
+    assert order == ["critical", "n0", "n1", "bg"]
+    assert stats["cpu_used"] == 0 and stats["running"] == 0
+    assert stats["job_types"][JOB_REMUX]["jobs"] == 5
+
+
+def test_cancel_task_kills_running_and_rejects_queued():
+    async def _main():
+        scheduler = FFmpegScheduler(cpu_budget=1)
+        running = asyncio.create_task(scheduler.run(BLOCKER, task_id="b"))
+        await _until(lambda: scheduler.get_task_stats("b")["running"] == 1)
+        queued = asyncio.create_task(scheduler.run(["true"], task_id="b"))
+        await _until(lambda: scheduler.get_task_stats("b")["queued"] == 1)
+
+        assert scheduler.cancel_task("b") == 2
+        for task in (running, queued):
+            with pytest.raises(FFmpegCancelledError):
+                await asyncio.wait_for(task, timeout=10)
+        # 取消后的新作业直接被拒绝，reset_task 后恢复
+        with pytest.raises(FFmpegCancelledError):
+            await scheduler.run(["true"], task_id="b")
+        scheduler.reset_task("b")
+        await scheduler.run(["true"], task_id="b")
+        return scheduler.get_stats()
+
+    stats = asyncio.run(_main())
+    assert stats["cpu_used"] == 0
+    assert stats["job_types"][JOB_REMUX]["cancelled"] == 2
+
+
+def test_failed_command_raises():
+    async def _main():
+        scheduler = FFmpegScheduler(cpu_budget=2)
+        with pytest.raises(RuntimeError, match="FFmpeg command failed"):
+            await scheduler.run(["false"])
+        return scheduler.get_stats()
+
+    stats = asyncio.run(_main())
+    assert stats["cpu_used"] == 0 and stats["job_types"][JOB_REMUX]["failed"] == 1
+
+
+def test_job_context_and_thread_injection():
+    scheduler = FFmpegScheduler(cpu_budget=1, encode_threads=2)
+    with ffmpeg_job_context(task_id="c", priority=PRIORITY_CRITICAL):
+        with ffmpeg_job_context(priority=PRIORITY_BACKGROUND):
+            inner = scheduler._create_job(["ffmpeg", "-i", "x", "y"], JOB_REMUX, None, None)
+        job = scheduler._create_job(["ffmpeg", "-i", "x", "y"], JOB_ENCODE, None, None)
+    assert (inner.task_id, inner.priority, inner.cmd) == ("c", PRIORITY_BACKGROUND, ["ffmpeg", "-i", "x", "y"])
+    assert job.task_id == "c" and job.priority == PRIORITY_CRITICAL
+    assert job.cmd == ["ffmpeg", "-threads", "2", "-i", "x", "-threads", "2", "y"]
+    # 超出预算的作业按预算计费（独占执行），ffprobe 固定单线程
+    assert job.threads == 2 and job.cost == 1
+    assert scheduler._create_job(["ffprobe", "x"], JOB_PROBE, None, None).threads == 1
+
+    assert _with_threads(["ffmpeg", "-threads", "4", "-i", "x", "y"], 2) == ["ffmpeg", "-threads", "4", "-i", "x", "y"]
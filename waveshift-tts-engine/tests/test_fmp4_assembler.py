@@ -0,0 +1,69 @@
+import asyncio
+import subprocess
+
+import pytest
+
+from conftest import requires_ffmpeg
+from utils.fmp4_assembler import IncrementalMP4Assembler
+from utils.mp4_boxes import iter_boxes
+
+BOUNDS = [0.0, 4.0, 6.0, 10.0, 14.0]
+
+
+def _make_segments(video_path, work):
+    """流复制/重编码交替的片段（含 AAC 音频），每个片段的编码参数不同"""
+    paths = []
+    for index, (start, end) in enumerate(zip(BOUNDS, BOUNDS[1:])):
+        segment = work / f"segment_{index}.mp4"
+        video_codec = ["-c:v", "copy"] if index % 2 == 0 else ["-c:v", "libx264", "-preset", "superfast"]
+        subprocess.run([
+            "ffmpeg", "-v", "error", "-y", "-ss", str(start), "-t", str(end - start), "-i", video_path,
+            "-f", "lavfi", "-i", f"sine=f={440 + 110 * index}:r=24000",
+            "-map", "0:v:0", "-map", "1:a:0", "-t", str(end - start), *video_codec, "-c:a", "aac", str(segment)
+        ], check=True)
+        paths.append(segment)
+    return paths
+
+
+@requires_ffmpeg
+def test_incremental_assembly_plays_through(tmp_path, lavfi_video):
+    assembler = IncrementalMP4Assembler(tmp_path / "final.mp4", "t")
+
+    async def _main():
+        durations = [await assembler.append(path) for path in _make_segments(lavfi_video, tmp_path)]
+        await assembler.finalize()
+        assert await assembler.finalize() == assembler.path
+        with pytest.raises(RuntimeError):
+            await assembler.append(tmp_path / "segment_0.mp4")
+        return durations
+
+    durations = asyncio.run(_main())
+    # 流复制片段在关键帧处截断，时长可能略长于请求的区间
+    for duration, start, end in zip(durations, BOUNDS, BOUNDS[1:]):
+        assert duration == pytest.approx(end - start, abs=0.25)
+    assert assembler.segment_count == 4
+    assert assembler.duration == pytest.approx(sum(durations))
+
+    data = assembler.path.read_bytes()
+    top_level = [box_type for box_type, _, _, _ in iter_boxes(data)]
+    assert top_level[:3] == [b"ftyp", b"moov", b"free"] and top_level[-1] == b"mfra"
+
+    probe = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,duration_time",
+         "-of", "csv=p=0", str(assembler.path)],
+        capture_output=True, text=True, check=True
+    )
+    packets = [line.split(",")[:2] for line in probe.stdout.split()]
+    video_end = max(float(pts) + float(duration) for pts, duration in packets)
+    assert video_end == pytest.approx(assembler.duration, abs=0.05)
+
+    decode = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", str(assembler.path), "-f", "null", "-"], capture_output=True, text=True
+    )
+    assert decode.returncode == 0 and not decode.stderr.strip()
+
+
+def test_finalize_without_segments(tmp_path):
+    assembler = IncrementalMP4Assembler(tmp_path / "final.mp4")
+    with pytest.raises(RuntimeError):
+        asyncio.run(assembler.finalize())
@@ -0,0 +1,40 @@
+from utils.hls_playlist import HLSPart, HLSSegment, LLHLSPlaylistWriter, group_parts, plan_part_cuts
+
+
+def _segment(index: int) -> HLSSegment:
+    uri = f"/segment_{index:04d}.ts"
+    return HLSSegment(uri=uri, duration=2.0, parts=[
+        HLSPart(1.0, uri, (1000, 0), True), HLSPart(1.0, uri, (800, 1000)),
+    ])
+
+
+def test_ll_playlist_has_no_hint_by_default(tmp_path):
+    writer = LLHLSPlaylistWriter(tmp_path / "playlist.m3u8", segment_target=2.0, part_target=1.0)
+    writer.open()
+    writer.append([_segment(0)])
+    text = writer.path.read_text()
+    assert "#EXT-X-PRELOAD-HINT" not in text
+    assert '#EXT-X-PART:DURATION=1.000,URI="/segment_0000.ts",BYTERANGE="1000@0",INDEPENDENT=YES' in text
+    assert text == writer.dumps()
+
+    writer.end()
+    assert writer.path.read_text().endswith("/segment_0000.ts\n#EXT-X-ENDLIST\n")
+
+
+def test_ll_playlist_hint_is_replaced(tmp_path):
+    writer = LLHLSPlaylistWriter(tmp_path / "playlist.m3u8", segment_target=2.0, part_target=1.0)
+    writer.open()
+    writer.append([_segment(0)], preload_hint="/part_0001_000.ts")
+    assert writer.path.read_text().endswith(
+        '#EXT-X-PRELOAD-HINT:TYPE=PART,URI="/part_0001_000.ts",BYTERANGE-START=0\n'
+    )
+    writer.append([_segment(1)])
+    text = writer.path.read_text()
+    assert "#EXT-X-PRELOAD-HINT" not in text and text.endswith("/segment_0001.ts\n")
+
+
+def test_plan_and_group_parts():
+    cuts, independent = plan_part_cuts([0.0, 2.0], 4.0, 1.0)
+    assert cuts == sorted(cuts) and 2.0 in cuts
+    assert len(independent) == len(cuts) + 1 and independent[0]
+    assert group_parts([1.0, 1.0, 1.0, 2.5], 2.0) == [[0, 1], [2], [3]]
@@ -0,0 +1,109 @@
+import asyncio
+import struct
+from pathlib import Path
+
+import m3u8
+import numpy as np
+import pytest
+
+from conftest import requires_ffmpeg
+from utils.hls_renditions import AAC_FRAME, AUDIO_PLAYLIST, VIDEO_PLAYLIST, DubbedHLSRenditions, _parse_bitrate
+from utils.mp4_boxes import find_boxes, read_timescale
+
+SR = 24000
+
+
+def _tfdt(data: bytes) -> int:
+    body, _ = next(find_boxes(data, b"tfdt"))
+    return struct.unpack_from(">Q" if data[body] == 1 else ">I", data, body + 4)[0]
+
+
+def test_parse_bitrate():
+    assert _parse_bitrate("128k") == 128000
+    assert _parse_bitrate("1.5M") == 1500000
+    assert _parse_bitrate("96000") == 96000
+
+
+@requires_ffmpeg
+def test_audio_timeline_matches_playlist(tmp_path, lavfi_video):
+    """切分视频演绎，追加三个不连续的批次并结束：音频片段的 tfdt 落在播放列表时间轴上"""
+    renditions = DubbedHLSRenditions("t", tmp_path, SR, segment_seconds=4)
+    t = np.arange(int(SR * 5.3)) / SR
+    tone = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+    async def _main():
+        files = await renditions.prepare_video(lavfi_video)
+        for start in (0.5, 5.8, 13.0):
+            await renditions.append_audio(tone, start)
+        await renditions.finalize()
+        await renditions.set_subtitles("subtitles.m3u8", "zh")
+        return files
+
+    video_files = asyncio.run(_main())
+
+    segments = renditions.audio_writer.segments
+    total = sum(s.duration for s in segments)
+    assert total == pytest.approx(renditions.audio_end, abs=1e-3)
+    assert renditions.audio_end == pytest.approx(18.3, abs=AAC_FRAME / SR)
+
+    position, timescale = 0.0, None
+    for segment in segments:
+        if segment.init_uri:
+            timescale = read_timescale((tmp_path / segment.init_uri).read_bytes())
+        start = _tfdt((tmp_path / segment.uri).read_bytes()) / timescale
+        # 后续批次的首个片段以预编码帧开头，该帧与上一批次末帧重叠
+        later_batch_head = segment.uri.endswith("_000.m4s") and not segment.uri.startswith("audio_0000_")
+        overlap = AAC_FRAME / SR if later_batch_head else 0.0
+        assert start + overlap == pytest.approx(position, abs=1e-3)
+        position += segment.duration
+    assert len({s.init_uri for s in segments if s.init_uri}) == 1  # 初始化片段相同，只保留一份
+
+    audio = m3u8.load(str(tmp_path / AUDIO_PLAYLIST))
+    assert audio.is_endlist and len(audio.segments) == len(segments)
+    video = m3u8.load(str(tmp_path / VIDEO_PLAYLIST))
+    assert sum(s.duration for s in video.segments) == pytest.approx(16.0, abs=0.1)
+    # prepare_video 返回视频演绎的全部片段（供上传）
+    assert sorted(Path(f).name for f in video_files) == sorted(
+        ["video_init.mp4"] + [s.uri for s in video.segments]
+    )
+
+    master = renditions.master_path.read_text()
+    assert f'URI="{AUDIO_PLAYLIST}"' in master and VIDEO_PLAYLIST in master
+    assert "mp4a.40.2" in master and "RESOLUTION=320x240" in master
+    assert 'TYPE=SUBTITLES' in master and 'URI="subtitles.m3u8"' in master
+
+
+@requires_ffmpeg
+def test_restore_keeps_audio_playlist(tmp_path, lavfi_video):
+    """重启后恢复演绎：已写出的音频片段与主播放列表保留，后续批次接着追加"""
+    t = np.arange(int(SR * 5.3)) / SR
+    tone = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    assert DubbedHLSRenditions.restore("t", tmp_path) is None
+
+    first = DubbedHLSRenditions("t", tmp_path, SR, segment_seconds=4)
+
+    async def _first_run():
+        await first.prepare_video(lavfi_video)
+        for start in (0.5, 5.8):
+            await first.append_audio(tone, start)
+
+    asyncio.run(_first_run())
+    written = list(first.audio_writer.segments)
+    master = first.master_path.read_text()
+
+    restored = DubbedHLSRenditions.restore("t", tmp_path)
+    assert restored is not None
+    assert restored.audio_end == pytest.approx(first.audio_end)
+    assert restored.audio_writer.segments == written
+
+    async def _second_run():
+        await restored.append_audio(tone, 13.0)
+        await restored.finalize()
+
+    asyncio.run(_second_run())
+    assert restored.master_path.read_text() == master
+    assert restored.audio_end == pytest.approx(18.3, abs=AAC_FRAME / SR)
+    audio = m3u8.load(str(tmp_path / AUDIO_PLAYLIST))
+    assert audio.is_endlist
+    assert [s.uri for s in audio.segments][: len(written)] == [s.uri for s in written]
+    assert sum(s.duration for s in audio.segments) == pytest.approx(restored.audio_end, abs=1e-3)
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from local_http_server import LocalHTTPServer
+from utils.media_downloader import ChecksumMismatchError, MediaDownloader
+
+SIZE = 1024 * 1024 + 4321
+
+
+def _payload(seed: int) -> bytes:
+    return bytes((i * 31 + seed) % 251 for i in range(SIZE))
+
+
+def _downloader(cache_dir, **kwargs) -> MediaDownloader:
+    options = dict(connections_per_file=4, min_split_size=256 * 1024, buffer_size=64 * 1024, max_retries=3)
+    options.update(kwargs)
+    return MediaDownloader(cache_dir, **options)
+
+
+def _download(downloader: MediaDownloader, url: str, dest, checksum=None):
+    async def _run():
+        try:
+            return await downloader.download(url, dest, checksum)
+        finally:
+            await downloader.close()
+    return asyncio.run(_run())
+
+
+@pytest.fixture
+def served(tmp_path):
+    root = tmp_path / "www"
+    root.mkdir()
+    data = _payload(0)
+    (root / "video.mp4").write_bytes(data)
+    return root, data
+
+
+def test_parallel_ranges_with_checksums(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root) as server:
+        url = server.url_for("video.mp4")
+        sha256 = hashlib.sha256(data).hexdigest()
+        dest = _download(_downloader(tmp_path / "cache"), url, tmp_path / "a.mp4", f"sha256:{sha256}")
+        assert dest.read_bytes() == data
+        assert server.ranged_requests == 4
+
+        md5 = hashlib.md5(data).hexdigest()
+        dest = _download(_downloader(tmp_path / "cache"), url, tmp_path / "b.mp4", f"md5:{md5}")
+        assert dest.read_bytes() == data
+
+        with pytest.raises(ChecksumMismatchError):
+            _download(_downloader(tmp_path / "cache"), url, tmp_path / "c.mp4", "sha256:" + "0" * 64)
+        assert not (tmp_path / "c.mp4").exists()
+        assert not any(p.suffix == ".part" for p in (tmp_path / "cache").iterdir())
+
+
+def test_retry_within_range_after_drop(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root, drop_after_bytes=300 * 1024) as server:
+        dest = _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "a.mp4")
+        assert dest.read_bytes() == data
+        # 中断的分片从已写入位置续传，不重复下载整个文件
+        assert server.bytes_sent < 2 * SIZE
+
+
+def test_resume_from_saved_state(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root, drop_after_bytes=300 * 1024) as server:
+        url = server.url_for("video.mp4")
+        with pytest.raises(Exception):
+            _download(_downloader(tmp_path / "cache", max_retries=0), url, tmp_path / "a.mp4")
+        assert any(p.name.endswith(".part.json") for p in (tmp_path / "cache").iterdir())
+        first_attempt = server.bytes_sent
+
+        dest = _download(_downloader(tmp_path / "cache"), url, tmp_path / "a.mp4")
+        assert dest.read_bytes() == data
+        assert server.bytes_sent - first_attempt < SIZE
+        assert not any((tmp_path / "cache").iterdir())
+
+
+def test_remote_change_restarts_download(tmp_path, served):
+    root, _ = served
+    changed = _payload(7)
+
+    def _replace_file():
+        os.replace(_write_tmp(root, changed), root / "video.mp4")
+
+    with LocalHTTPServer(root, drop_after_bytes=300 * 1024, on_drop=_replace_file) as server:
+        dest = _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "a.mp4")
+    # If-Range 不匹配后丢弃旧分片，得到的是新版本的完整内容
+    assert dest.read_bytes() == changed
+
+
+def test_server_without_ranges(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root, support_ranges=False) as server:
+        dest = _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "a.mp4")
+        assert dest.read_bytes() == data
+        assert server.ranged_requests == 0
+
+
+def _write_tmp(root, data: bytes):
+    path = root / "video.mp4.tmp"
+    path.write_bytes(data)
+    return path
+
+
+def test_weak_etag_falls_back_to_single_stream(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root, etag_mode="weak") as server:
+        dest = _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "a.mp4")
+        assert dest.read_bytes() == data
+        # 弱 ETag 不能用于 If-Range：不分片，也不会被当成远端变化
+        assert server.ranged_requests == 0
+
+
+def test_last_modified_as_if_range_validator(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root, etag_mode="weak", last_modified=True) as server:
+        dest = _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "a.mp4")
+        assert dest.read_bytes() == data
+        assert server.ranged_requests == 4
+
+
+def test_etag_is_not_treated_as_md5(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root, etag_mode="opaque") as server:
+        dest = _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "a.mp4")
+        assert dest.read_bytes() == data
+
+
+def test_declared_content_md5(tmp_path, served):
+    root, data = served
+    with LocalHTTPServer(root, declared_md5=hashlib.md5(data).hexdigest()) as server:
+        dest = _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "a.mp4")
+        assert dest.read_bytes() == data
+
+    with LocalHTTPServer(root, declared_md5="0" * 32) as server:
+        with pytest.raises(ChecksumMismatchError):
+            _download(_downloader(tmp_path / "cache"), server.url_for("video.mp4"), tmp_path / "b.mp4")
+        assert not (tmp_path / "b.mp4").exists()
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from utils.audio_utils import apply_fade_effect, mix_background_segment, normalize_audio
+from utils.mix_engine import NUMBA_AVAILABLE, MixEngine, OverlapRing
+
+SR, OVERLAP = 24000, 500
+
+
+def _legacy(segments, background):
+    """原实现：逐句 np.concatenate 并交叉淡化，再混入背景音并归一化"""
+    full = np.array([], dtype=np.float32)
+    for seg in segments:
+        data = apply_fade_effect(seg, np.array([], dtype=np.float32), OVERLAP) if len(full) > 0 else seg
+        full = np.concatenate((full, data))
+    duration = (len(full) + SR // 2) / SR
+    return normalize_audio(mix_background_segment(background, duration, full, SR, 0.7, 0.3), 1.0)
+
+
+@pytest.mark.parametrize("use_numba", [False] + ([True] if NUMBA_AVAILABLE else []))
+def test_matches_legacy_mixing(use_numba):
+    rng = np.random.default_rng(0)
+    segments = [rng.normal(0, 0.3, int(SR * rng.uniform(0.5, 1.5))).astype(np.float32) for _ in range(6)]
+    background = rng.normal(0, 0.5, sum(map(len, segments)) + SR).astype(np.float32)
+
+    engine = MixEngine(SR, OVERLAP, use_numba=use_numba)
+    full = engine.concat(segments)
+    mixed = engine.mix(full, background, (len(full) + SR // 2) / SR, 0.7, 0.3, 1.0)
+    np.testing.assert_allclose(mixed, _legacy(segments, background), atol=1e-5)
+
+
+def test_overlap_ring_keeps_latest_samples():
+    ring = OverlapRing(5)
+    ring.push(np.arange(3, dtype=np.float32))
+    ring.push(np.arange(3, 7, dtype=np.float32))
+    assert len(ring) == 5
+    np.testing.assert_array_equal(ring.tail(5), np.arange(2, 7, dtype=np.float32))
+    np.testing.assert_array_equal(ring.tail(2), np.array([5, 6], dtype=np.float32))
+    ring.clear()
+    assert len(ring) == 0
@@ -0,0 +1,74 @@
+import asyncio
+import wave
+
+import numpy as np
+import pytest
+
+from conftest import requires_ffmpeg
+from core.music_detector import MusicDetector, _frame_features, _music_score, music_spans
+
+SR = 8000
+
+
+def _signals(seconds=10):
+    """合成信号：纯语音样式 / 纯音乐 / 语音+背景音乐"""
+    t = np.arange(SR * seconds) / SR
+    rng = np.random.default_rng(0)
+    syllables = (np.sin(2 * np.pi * 4 * t) > 0.2) * (np.sin(2 * np.pi * 0.5 * t) > -0.6)
+    voiced = sum(np.sin(2 * np.pi * (140 + 20 * np.sin(2 * np.pi * 3 * t)) * h * t) / h for h in range(1, 8))
+    speech = (voiced * 0.3 + rng.normal(0, 0.05, len(t))) * syllables + rng.normal(0, 0.002, len(t))
+    music = sum(0.08 * np.sin(2 * np.pi * f * t) for f in (220, 277.2, 329.6, 440, 554.4))
+    return speech.astype(np.float32), music.astype(np.float32), (speech + music).astype(np.float32)
+
+
+def _score(signal):
+    return _music_score(_frame_features(signal, SR))
+
+
+def test_scores_separate_speech_from_music():
+    speech, music, mixed = _signals()
+    assert _score(speech) < 0.3
+    assert _score(music) > 0.7
+    assert _score(mixed) > 0.5
+
+
+def test_silence_and_short_input():
+    assert _music_score(_frame_features(np.zeros(SR, dtype=np.float32), SR)) == 0.0
+    assert _frame_features(np.zeros(100, dtype=np.float32), SR) is None
+
+
+def test_music_spans_merges_with_margin():
+    regions = [
+        {"start": 0.0, "end": 10.0, "music": True},
+        {"start": 10.0, "end": 20.0, "music": False},
+        {"start": 20.0, "end": 30.0, "music": True},
+        {"start": 30.0, "end": 35.0, "music": True},
+    ]
+    assert music_spans(regions) == [(0.0, 10.0), (20.0, 35.0)]
+    assert music_spans(regions, margin=5.0) == [(0.0, 40.0)]
+
+
+@requires_ffmpeg
+def test_analyze_streams_regions(tmp_path):
+    speech, music, _ = _signals()
+    path = tmp_path / "input.wav"
+    pcm = (np.concatenate([speech, music]) * 0.8 * 32767).astype(np.int16)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SR)
+        wav.writeframes(pcm.tobytes())
+
+    result = asyncio.run(MusicDetector(sample_rate=SR, region_seconds=10.0).analyze(str(path)))
+
+    assert result["duration_s"] == pytest.approx(20.0, abs=0.1)
+    assert [r["music"] for r in result["regions"]] == [False, True]
+    assert result["has_music"] and result["music_ratio"] == pytest.approx(0.5, abs=0.01)
+
+
+@requires_ffmpeg
+def test_analyze_rejects_undecodable_input(tmp_path):
+    path = tmp_path / "broken.wav"
+    path.write_bytes(b"not audio")
+    with pytest.raises(RuntimeError):
+        asyncio.run(MusicDetector().analyze(str(path)))
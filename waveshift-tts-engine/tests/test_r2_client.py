@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+
+from core.cloudflare.r2_client import R2Client
+from core.exceptions import StorageError
+from local_s3_server import LocalS3Server
+
+CREDENTIALS = ("test-key", "test-secret")
+
+
+@pytest.fixture
+def server():
+    # 校验签名，前两个请求返回 503（验证重试）
+    with LocalS3Server("test-bucket", credentials=CREDENTIALS, fail_first=2) as s3:
+        yield s3
+
+
+def _run(client: R2Client, coro_fn):
+    async def _main():
+        try:
+            return await coro_fn(client)
+        finally:
+            await client.close()
+    return asyncio.run(_main())
+
+
+def test_put_and_get_object_with_retries(server):
+    async def _check(client):
+        await client.put_object("hls/t 1/playlist.m3u8", b"#EXTM3U\n")
+        assert await client.get_object("hls/t 1/playlist.m3u8") == b"#EXTM3U\n"
+        assert await client.get_object("hls/missing.m3u8") is None
+
+    _run(R2Client(server.endpoint, "test-bucket", *CREDENTIALS), _check)
+
+
+def test_parallel_small_uploads(server, tmp_path):
+    files = []
+    for i in range(32):
+        path = tmp_path / f"segment_{i:04d}.ts"
+        path.write_bytes(os.urandom(20 * 1024))
+        files.append((f"hls/t1/{path.name}", path))
+
+    async def _check(client):
+        errors = await client.upload_files(files)
+        assert not any(errors), errors
+
+    _run(R2Client(server.endpoint, "test-bucket", *CREDENTIALS, upload_concurrency=8), _check)
+    assert all(server.objects[key][0] == path.read_bytes() for key, path in files)
+
+
+def test_multipart_upload(server, tmp_path):
+    big = tmp_path / "final.mp4"
+    big.write_bytes(os.urandom(12 * 1024 * 1024))
+
+    async def _check(client):
+        await client.upload_file("outputs/t1/final.mp4", big)
+        assert await client.get_object("outputs/t1/final.mp4") == big.read_bytes()
+
+    _run(R2Client(
+        server.endpoint, "test-bucket", *CREDENTIALS,
+        multipart_threshold=8 * 1024 * 1024, part_size=5 * 1024 * 1024
+    ), _check)
+    assert not server.uploads
+
+
+def test_bad_signature_rejected():
+    async def _check(client):
+        with pytest.raises(StorageError, match="403"):
+            await client.put_object("x", b"x")
+
+    with LocalS3Server("test-bucket", credentials=CREDENTIALS) as server:
+        _run(R2Client(server.endpoint, "test-bucket", "test-key", "wrong-secret", max_retries=0), _check)
+        assert "x" not in server.objects
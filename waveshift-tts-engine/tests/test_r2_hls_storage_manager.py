@@ -0,0 +1,40 @@
+import asyncio
+
+from core.cloudflare.r2_client import R2Client
+from core.cloudflare.r2_hls_storage_manager import R2HLSStorageManager
+from core.cloudflare.upload_scheduler import UploadScheduler
+from local_s3_server import LocalS3Server
+
+
+def test_rendition_playlists_uploaded_after_segments(tmp_path):
+    """分离演绎输出：片段平铺在任务前缀下，播放列表在片段全部上传之后派发"""
+    segments = []
+    for name in ("video_init.mp4", "video_0000.m4s", "audio_init_0000.mp4", "audio_0000_000.m4s"):
+        path = tmp_path / name
+        path.write_bytes(name.encode() * 1000)
+        segments.append(path)
+    playlists = []
+    for name in ("video.m3u8", "audio.m3u8", "master.m3u8"):
+        path = tmp_path / name
+        path.write_text(f"#EXTM3U\n# {name}\n", encoding="utf-8")
+        playlists.append(path)
+
+    async def _main():
+        with LocalS3Server("test-bucket") as server:
+            client = R2Client(server.endpoint, "test-bucket", "ak", "sk")
+            scheduler = UploadScheduler(client, max_concurrency=1)
+            storage = R2HLSStorageManager(client=client, scheduler=scheduler)
+            try:
+                await storage.submit_rendition_outputs("t", segments, playlists)
+                assert await scheduler.wait_task("t", timeout=10)
+            finally:
+                await scheduler.close()
+                await client.close()
+            return server.request_log, dict(server.objects)
+
+    log, objects = asyncio.run(_main())
+    segment_keys = {f"hls/t/{p.name}" for p in segments}
+    playlist_keys = {f"hls/t/{p.name}" for p in playlists}
+    assert set(log) == segment_keys | playlist_keys
+    assert set(log[:len(segment_keys)]) == segment_keys
+    assert objects["hls/t/master.m3u8"][0] == b"#EXTM3U\n# master.m3u8\n"
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from core.task_pipeline import TaskPipeline
+
+
+def _stage(name, order, fail_on=None):
+    async def handler(value):
+        await asyncio.sleep(0)
+        order.append((name, value))
+        if value == fail_on:
+            raise RuntimeError(f"{name} 模拟失败")
+        return value
+    return handler
+
+
+def test_order_and_failure_isolation():
+    async def _main():
+        order = []
+        pipeline = TaskPipeline("t", [
+            ("tts", _stage("tts", order)),
+            ("mix", _stage("mix", order, fail_on=3)),
+            ("hls", _stage("hls", order)),
+        ], queue_size=1)
+        futures = [await pipeline.submit(i) for i in range(6)]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        stats = pipeline.get_stats()
+        await pipeline.close()
+        return order, results, stats
+
+    order, results, stats = asyncio.run(_main())
+    for name in ("tts", "mix"):
+        assert [v for n, v in order if n == name] == list(range(6))
+    # 失败的批次不进入后续阶段，其余批次不受影响
+    assert [v for n, v in order if n == "hls"] == [0, 1, 2, 4, 5]
+    assert isinstance(results[3], RuntimeError)
+    assert [r for i, r in enumerate(results) if i != 3] == [0, 1, 2, 4, 5]
+    assert stats["submitted"] == 6 and stats["completed"] == 5 and stats["pending"] == 0
+    assert stats["stages"]["mix"]["failed"] == 1 and stats["stages"]["hls"]["processed"] == 5
+
+
+def test_stages_overlap():
+    """批次 1 的合成需要等批次 0 进入混合阶段：串行执行会在这里卡住"""
+    async def _main():
+        mixing = asyncio.Event()
+
+        async def tts(value):
+            if value == 1:
+                await mixing.wait()
+            return value
+
+        async def mix(value):
+            mixing.set()
+            return value * 10
+
+        pipeline = TaskPipeline("t", [("tts", tts), ("mix", mix)])
+        futures = [await pipeline.submit(i) for i in range(3)]
+        try:
+            return await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+        finally:
+            await pipeline.close()
+
+    assert asyncio.run(_main()) == [0, 10, 20]
+
+
+def test_on_error_callback_resolves_future():
+    async def _main():
+        errors = []
+
+        async def on_error(value, error):
+            errors.append((value, str(error)))
+
+        async def fail(value):
+            raise ValueError("坏批次")
+
+        pipeline = TaskPipeline("t", [("tts", fail)], on_error=on_error)
+        result = await pipeline.process("batch")
+        await pipeline.close()
+        return result, errors
+
+    assert asyncio.run(_main()) == (None, [("batch", "坏批次")])
+
+
+def test_backpressure_and_close():
+    async def _main():
+        gate = asyncio.Event()
+
+        async def slow(value):
+            await gate.wait()
+            return value
+
+        pipeline = TaskPipeline("t", [("tts", slow)], queue_size=1)
+        first = await pipeline.submit(0)
+        for _ in range(5):
+            await asyncio.sleep(0)  # 工作者取走批次 0
+        second = await pipeline.submit(1)
+        blocked = asyncio.create_task(pipeline.submit(2))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert not blocked.done()  # 队列已满，提交方被阻塞
+
+        gate.set()
+        third = await asyncio.wait_for(blocked, timeout=5)
+        assert await asyncio.wait_for(asyncio.gather(first, second, third), timeout=5) == [0, 1, 2]
+
+        gate.clear()
+        pending = await pipeline.submit(3)
+        await pipeline.close()
+        assert pending.cancelled()
+        with pytest.raises(RuntimeError):
+            await pipeline.submit(4)
+
+    asyncio.run(_main())
+
+
+def test_requires_stages():
+    with pytest.raises(ValueError):
+        TaskPipeline("t", [])
@@ -0,0 +1,64 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from utils.time_stretch import MAX_SPEED, MIN_SPEED, NUMBA_AVAILABLE, TimeStretcher, time_stretch
+
+SR = 24000
+KERNELS = [False] + ([True] if NUMBA_AVAILABLE else [])
+
+
+def _tone(freq=440.0, seconds=1.0):
+    t = np.arange(int(SR * seconds)) / SR
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def _peak_hz(audio):
+    spectrum = np.abs(np.fft.rfft(audio * np.hanning(len(audio))))
+    return np.argmax(spectrum) * SR / len(audio)
+
+
+@pytest.mark.parametrize("use_numba", KERNELS)
+@pytest.mark.parametrize("speed", [0.5, 0.8, 1.0, 1.37, 2.0])
+def test_output_length(use_numba, speed):
+    audio = _tone(seconds=1.3)
+    out = time_stretch(audio, speed, SR, use_numba=use_numba)
+    assert len(out) == round(len(audio) / speed)
+    assert np.isfinite(out).all()
+
+
+@pytest.mark.parametrize("use_numba", KERNELS)
+def test_pitch_preserved(use_numba):
+    audio = _tone(440.0, seconds=2.0)
+    out = time_stretch(audio, 1.5, SR, use_numba=use_numba)
+    assert abs(_peak_hz(out) - 440.0) < 10.0
+
+
+def test_kernels_agree():
+    if not NUMBA_AVAILABLE:
+        pytest.skip("numba 未安装")
+    audio = np.random.default_rng(0).normal(0, 0.3, SR).astype(np.float32)
+    np.testing.assert_allclose(
+        time_stretch(audio, 1.3, SR, use_numba=True),
+        time_stretch(audio, 1.3, SR, use_numba=False),
+        atol=1e-4,
+    )
+
+
+@pytest.mark.parametrize("speed", [MIN_SPEED / 2, MAX_SPEED * 2])
+def test_rejects_out_of_range_speed(speed):
+    with pytest.raises(ValueError):
+        time_stretch(_tone(), speed, SR)
+
+
+def test_stretch_batch():
+    stretcher = TimeStretcher(sample_rate=SR, max_workers=2)
+    try:
+        items = [(_tone(seconds=0.5), 1.2), (_tone(seconds=0.8), 0.9), (_tone(), MAX_SPEED * 2)]
+        results = asyncio.run(stretcher.stretch_batch(items))
+    finally:
+        stretcher.close()
+
+    assert [len(r) for r in results[:2]] == [round(len(a) / s) for a, s in items[:2]]
+    assert isinstance(results[2], ValueError)
@@ -0,0 +1,90 @@
+import asyncio
+import os
+from pathlib import Path
+
+from core.cloudflare.r2_client import R2Client
+from core.cloudflare.upload_scheduler import UploadPriority, UploadScheduler
+from core.exceptions import StorageError
+from local_s3_server import LocalS3Server
+
+
+def _run(check, **scheduler_options):
+    """单并发槽位的调度器对本地S3替身服务器运行 check(server, scheduler)"""
+    async def _main():
+        with LocalS3Server("test-bucket") as server:
+            client = R2Client(server.endpoint, "test-bucket", "ak", "sk")
+            options = dict(max_concurrency=1, small_object_bytes=64 * 1024, batch_max_items=4)
+            options.update(scheduler_options)
+            scheduler = UploadScheduler(client, **options)
+            try:
+                await check(server, scheduler)
+            finally:
+                await scheduler.close()
+                await client.close()
+    asyncio.run(_main())
+
+
+def _file(tmp_path: Path, name: str, size: int) -> Path:
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+def test_playlist_priority_and_coalescing(tmp_path):
+    async def _check(server, scheduler):
+        # 任务 A：大量普通片段；任务 B：晚到的首批片段 + 播放列表；任务 C：小对象批量
+        a_futures = [
+            scheduler.submit_file("A", f"hls/A/seg_{i:02d}.ts", _file(tmp_path, f"a{i}.ts", 300 * 1024))
+            for i in range(12)
+        ]
+        await asyncio.sleep(0)
+        b_futures = [
+            scheduler.submit_file("B", f"hls/B/seg_{i:02d}.ts", _file(tmp_path, f"b{i}.ts", 300 * 1024))
+            for i in range(6)
+        ]
+        scheduler.submit_content("B", "hls/B/playlist.m3u8", "#EXTM3U\n#v1\n")
+        playlist = scheduler.submit_content("B", "hls/B/playlist.m3u8", "#EXTM3U\n#v2\n")
+        small = [
+            scheduler.submit_file("C", f"audio/C/{i}.wav", _file(tmp_path, f"c{i}.wav", 8 * 1024), UploadPriority.BULK)
+            for i in range(8)
+        ]
+        await asyncio.gather(playlist, *a_futures, *b_futures, *small)
+
+        order = list(server.request_log)
+        playlist_at = order.index("hls/B/playlist.m3u8")
+        # 播放列表在其依赖的片段之后、任务 A 的剩余片段之前上传，未派发的旧版本被合并
+        assert all(order.index(f"hls/B/seg_{i:02d}.ts") < playlist_at for i in range(6))
+        assert playlist_at < order.index("hls/A/seg_11.ts")
+        assert order.count("hls/B/playlist.m3u8") == 1
+        assert server.objects["hls/B/playlist.m3u8"][0].endswith(b"#v2\n")
+        assert all(f"audio/C/{i}.wav" in server.objects for i in range(8))
+
+    _run(_check)
+
+
+def test_failed_dependency_blocks_playlist(tmp_path):
+    async def _check(server, scheduler):
+        bad = scheduler.submit_file("D", "hls/D/seg_00.ts", tmp_path / "missing.ts")
+        dependent = scheduler.submit_content("D", "hls/D/playlist.m3u8", "#EXTM3U\n")
+        results = await asyncio.gather(bad, dependent, return_exceptions=True)
+        assert all(isinstance(r, StorageError) for r in results), results
+        assert "hls/D/playlist.m3u8" not in server.objects
+
+    _run(_check, job_retries=0)
+
+
+def test_cancel_task_drops_queued_uploads(tmp_path):
+    async def _check(server, scheduler):
+        futures = [
+            scheduler.submit_file("E", f"hls/E/seg_{i:02d}.ts", _file(tmp_path, f"e{i}.ts", 300 * 1024))
+            for i in range(6)
+        ]
+        await asyncio.sleep(0)
+        cancelled = scheduler.cancel_task("E")
+        assert cancelled >= 5
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        assert sum(isinstance(r, asyncio.CancelledError) for r in results) == cancelled
+        assert len(server.objects) == len(futures) - cancelled
+        assert scheduler.pending_count("E") == 0
+
+    _run(_check)
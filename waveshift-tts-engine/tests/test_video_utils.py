@@ -0,0 +1,74 @@
+import asyncio
+import json
+import subprocess
+
+import numpy as np
+import pytest
+
+from conftest import requires_ffmpeg
+from utils.media_probe import MediaProbe
+from utils.video_utils import add_video_segment, edge_encode_params, plan_segment_cut
+
+SR = 24000
+KEYFRAMES = [(0.0, -0.08), (2.0, 1.92), (4.0, 3.92), (6.0, 5.92)]
+
+
+def test_plan_segment_cut_modes():
+    assert plan_segment_cut(KEYFRAMES, 2.0, 6.0).mode == "copy"
+    smart = plan_segment_cut(KEYFRAMES, 1.5, 5.5)
+    assert (smart.mode, smart.copy_start, smart.copy_end, smart.copy_end_dts) == ("smart", 2.0, 4.0, 3.92)
+    # 首尾不能按源参数重编码时：对齐的区间仍流复制，未对齐的区间整段重编码
+    assert plan_segment_cut(KEYFRAMES, 1.5, 5.5, smart_cut=False).mode == "encode"
+    assert plan_segment_cut(KEYFRAMES, 2.0, 6.0, smart_cut=False).mode == "copy"
+    assert plan_segment_cut(KEYFRAMES, 1.5, 5.5, burn_subtitles=True).mode == "encode"
+
+
+def test_edge_encode_params_follow_source():
+    probe = MediaProbe(video_codec="h264", video_profile="High", video_level=41, pix_fmt="yuv420p")
+    assert edge_encode_params(probe) == {"profile": "high", "level": "4.1", "pix_fmt": "yuv420p"}
+    probe.video_profile = "Constrained Baseline"
+    probe.video_level = 0
+    assert edge_encode_params(probe) == {"profile": "baseline", "pix_fmt": "yuv420p"}
+    assert edge_encode_params(MediaProbe(video_codec="hevc", video_profile="Main")) is None
+    assert edge_encode_params(MediaProbe(video_codec="h264", video_profile="Extended")) is None
+    assert edge_encode_params(None) is None
+
+
+def _stream_info(path: str) -> dict:
+    stdout = subprocess.run([
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,profile,level,pix_fmt", "-of", "json", path
+    ], check=True, capture_output=True).stdout
+    return json.loads(stdout)["streams"][0]
+
+
+def _cut(source: str, output: str) -> str:
+    return asyncio.run(add_video_segment(
+        source, 1.5, 4.0, np.zeros(SR * 4, dtype=np.float32), output, [], False, "zh", SR, 320, 240
+    ))
+
+
+@requires_ffmpeg
+def test_smart_cut_matches_source_parameters(tmp_path, lavfi_video):
+    output = str(tmp_path / "smart.mp4")
+    assert _cut(lavfi_video, output) == "smart"
+    source, result = _stream_info(lavfi_video), _stream_info(output)
+    assert (result["profile"], result["level"], result["pix_fmt"]) == (
+        source["profile"], source["level"], source["pix_fmt"]
+    )
+    decode = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", output, "-f", "null", "-"], capture_output=True, text=True
+    )
+    assert decode.returncode == 0 and not decode.stderr.strip()
+
+
+@requires_ffmpeg
+def test_non_h264_source_is_reencoded(tmp_path):
+    source = str(tmp_path / "mpeg4.mp4")
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=320x240:rate=25", "-t", "8",
+        "-c:v", "mpeg4", "-g", "50", str(source)
+    ], check=True)
+    output = str(tmp_path / "cut.mp4")
+    assert _cut(source, output) == "encode"
+    assert _stream_info(output)["codec_name"] == "h264"
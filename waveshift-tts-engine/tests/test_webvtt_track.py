@@ -0,0 +1,136 @@
+import asyncio
+import re
+
+from core.sentence_tools import Sentence
+from utils.webvtt_track import WebVTTSubtitleTrack, _escape_cue_text, format_vtt_timestamp
+
+TEXT = "你好，世界。这是一个很长很长的句子，需要被拆分成多行字幕来显示。"
+_TIMING = re.compile(r"^(\d\d):(\d\d):(\d\d)\.(\d{3}) --> (\d\d):(\d\d):(\d\d)\.(\d{3})$", re.M)
+
+
+def _ms(h, m, s, ms):
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms)
+
+
+def _cue_times(vtt: str):
+    return [(_ms(*g[:4]), _ms(*g[4:])) for g in _TIMING.findall(vtt)]
+
+
+def _batch(batch: int):
+    return [
+        Sentence("", TEXT if i % 2 == 0 else "短句 <b>&", batch * 3 + i, "s", 0, 0,
+                 adjusted_start=(batch * 3 + i) * 2500, speech_duration=2200)
+        for i in range(3)
+    ]
+
+
+def _run(track: WebVTTSubtitleTrack, batches: int = 3):
+    async def _main():
+        appended = []
+        for batch in range(batches):
+            appended.append(await track.append(_batch(batch), batch * 7.5, (batch + 1) * 7.5))
+        return appended, await track.finalize()
+    return asyncio.run(_main())
+
+
+def test_timestamp_and_escaping():
+    assert format_vtt_timestamp(0) == "00:00:00.000"
+    assert format_vtt_timestamp(3_723_004.6) == "01:02:03.005"
+    assert format_vtt_timestamp(-5) == "00:00:00.000"
+    assert _escape_cue_text("a <b> & c --> d") == "a &lt;b&gt; &amp; c --&gt; d"
+
+
+def test_sidecar_is_appended_incrementally(tmp_path):
+    track = WebVTTSubtitleTrack("t", tmp_path, "zh")
+    _run(track)
+
+    vtt = track.sidecar_path.read_text(encoding="utf-8")
+    assert vtt.startswith("WEBVTT\n\n") and vtt.count("WEBVTT") == 1
+    assert "短句 &lt;b&gt;&amp;" in vtt
+    times = _cue_times(vtt)
+    assert len(times) == track.cue_count > 9  # 长句被拆成多条
+    assert all(start < end for start, end in times)
+    assert all(prev[1] <= cur[0] for prev, cur in zip(times, times[1:]))
+    assert track.playlist_path is None
+
+
+def test_hls_windows_cover_timeline(tmp_path):
+    track = WebVTTSubtitleTrack("t", tmp_path, "zh", segment_seconds=4, hls=True, mpegts_offset=900)
+    appended, final_files = _run(track)
+
+    # 第一批覆盖到 7.5s，只写出完整的第一个 4s 窗口
+    assert [p.rsplit("/", 1)[-1] for p in appended[0]] == ["subtitles.vtt", "subtitles_00000.vtt"]
+    assert final_files
+
+    playlist = track.playlist_path.read_text(encoding="utf-8")
+    durations = [float(d) for d in re.findall(r"#EXTINF:([\d.]+),", playlist)]
+    segments = re.findall(r"^subtitles_\d{5}\.vtt$", playlist, re.M)
+    assert playlist.rstrip().endswith("#EXT-X-ENDLIST")
+    assert len(segments) == len(durations)
+    assert sum(durations) == 22.5
+
+    sidecar_cues = set(_cue_times(track.sidecar_path.read_text(encoding="utf-8")))
+    seen = set()
+    for index, name in enumerate(segments):
+        body = (tmp_path / name).read_text(encoding="utf-8")
+        assert body.startswith("WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:900,LOCAL:00:00:00.000\n")
+        for start, end in _cue_times(body):
+            assert start < (index + 1) * 4000 and end > index * 4000
+            seen.add((start, end))
+    assert seen == sidecar_cues
+
+
+def test_late_cues_do_not_enter_written_windows(tmp_path):
+    track = WebVTTSubtitleTrack("t", tmp_path, "zh", segment_seconds=4, hls=True)
+
+    async def _main():
+        await track.append([], 0, 8.0)  # 两个窗口已写出
+        await track.append(
+            [Sentence("", "迟到的字幕", 0, "s", 0, 0, adjusted_start=3000, speech_duration=7000)], 0, 12.0
+        )
+        await track.finalize()
+        assert await track.finalize() == []
+
+    asyncio.run(_main())
+    assert _cue_times(track.sidecar_path.read_text(encoding="utf-8")) == [(8000, 10000)]
+
+
+def test_restore_continues_where_it_left_off(tmp_path):
+    reference = WebVTTSubtitleTrack("t", tmp_path / "ref", "zh", segment_seconds=4, hls=True)
+    _run(reference)
+
+    first = WebVTTSubtitleTrack("t", tmp_path / "out", "zh", segment_seconds=4, hls=True)
+
+    async def _first_run():
+        for batch in range(2):
+            await first.append(_batch(batch), batch * 7.5, (batch + 1) * 7.5)
+
+    asyncio.run(_first_run())
+
+    # 模拟引擎重启：从输出目录恢复后继续追加第三批
+    restored = WebVTTSubtitleTrack.restore("t", tmp_path / "out")
+    assert restored is not None and restored.cue_count == first.cue_count
+
+    async def _second_run():
+        await restored.append(_batch(2), 15.0, 22.5)
+        await restored.finalize()
+
+    asyncio.run(_second_run())
+    assert restored.sidecar_path.read_text(encoding="utf-8") == reference.sidecar_path.read_text(encoding="utf-8")
+    assert restored.playlist_path.read_text(encoding="utf-8") == reference.playlist_path.read_text(encoding="utf-8")
+    for path in sorted((tmp_path / "ref").glob("subtitles_*.vtt")):
+        assert (tmp_path / "out" / path.name).read_text(encoding="utf-8") == path.read_text(encoding="utf-8")
+
+
+def test_restore_without_state_and_existing_sidecar_is_kept(tmp_path):
+    assert WebVTTSubtitleTrack.restore("t", tmp_path) is None
+
+    track = WebVTTSubtitleTrack("t", tmp_path, "zh")
+    _run(track, batches=1)
+    before = track.sidecar_path.read_text(encoding="utf-8")
+
+    # 没有续写状态时新建的字幕轨也不清空已有外挂字幕
+    track.state_path.unlink()
+    fresh = WebVTTSubtitleTrack("t", tmp_path, "zh")
+    asyncio.run(fresh.append([], 7.5, 10.0))
+    assert fresh.sidecar_path.read_text(encoding="utf-8") == before
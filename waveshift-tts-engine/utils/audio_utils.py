@@ -1,11 +1,131 @@
 import numpy as np
 import soundfile as sf
 import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional, Union
-import asyncio
+from utils.executors import POOL_DSP, run_in_pool
 
 logger = logging.getLogger(__name__)
 
+
+class BackgroundTrack:
+    """
+    可随机访问的背景音轨
+    首次使用时把背景音一次性转换为目标采样率的单声道 float32 原始文件（逐块读取、流式重采样），
+    之后通过内存映射按区间零拷贝切片，每批次的读取开销只与批次时长相关。
+    """
+
+    BLOCK_FRAMES = 1 << 18
+
+    def __init__(self, path: str, sample_rate: int, raw_path: Optional[str] = None):
+        """
+        Args:
+            path: 背景音文件路径（任意 soundfile 支持的格式）
+            sample_rate: 目标采样率
+            raw_path: 原始 float32 文件路径，默认与源文件同目录
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.raw_path = raw_path or f"{os.path.splitext(path)[0]}.{sample_rate}.f32"
+        self._data: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+    @property
+    def num_samples(self) -> int:
+        return len(self._data) if self._data is not None else 0
+
+    def prepare(self) -> None:
+        """转换（如需要）并建立内存映射，线程安全且只执行一次"""
+        with self._lock:
+            if self._data is not None:
+                return
+            if not self._raw_is_fresh():
+                self._convert()
+            if os.path.getsize(self.raw_path) == 0:
+                self._data = np.zeros(0, dtype=np.float32)
+            else:
+                self._data = np.memmap(self.raw_path, dtype=np.float32, mode="r")
+            logger.debug(f"BackgroundTrack 就绪: {self.raw_path} ({self.num_samples} samples @ {self.sample_rate}Hz)")
+
+    def _raw_is_fresh(self) -> bool:
+        try:
+            return os.path.getmtime(self.raw_path) >= os.path.getmtime(self.path)
+        except OSError:
+            return False
+
+    def _convert(self) -> None:
+        """逐块读取源文件 -> 单声道 -> 流式重采样 -> 追加写入原始文件"""
+        tmp_path = self.raw_path + ".tmp"
+        with sf.SoundFile(self.path) as source, open(tmp_path, "wb") as out:
+            resampler = None
+            if source.samplerate != self.sample_rate:
+                import soxr
+                resampler = soxr.ResampleStream(source.samplerate, self.sample_rate, 1, dtype="float32")
+                logger.info(f"背景音采样率 {source.samplerate} -> {self.sample_rate}，转换时重采样")
+            while True:
+                block = source.read(self.BLOCK_FRAMES, dtype="float32", always_2d=True)
+                last = len(block) < self.BLOCK_FRAMES
+                mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+                if resampler is not None:
+                    mono = resampler.resample_chunk(np.ascontiguousarray(mono), last=last)
+                out.write(np.ascontiguousarray(mono, dtype=np.float32).tobytes())
+                if last:
+                    break
+        os.replace(tmp_path, self.raw_path)
+
+    def slice(self, start_time: float, duration: float) -> np.ndarray:
+        """
+        返回 [start_time, start_time + duration] 的只读视图（文件末尾可能更短）
+        """
+        if self._data is None:
+            self.prepare()
+        start = max(0, int(start_time * self.sample_rate))
+        end = start + int(duration * self.sample_rate)
+        return self._data[start:end]
+
+    async def read(self, start_time: float, duration: float, wait_timeout: Optional[float] = None) -> np.ndarray:
+        """与窗口化分离相同的异步读取接口（首次读取时在线程中完成转换）"""
+        if self._data is None:
+            await run_in_pool(POOL_DSP, self.prepare)
+        return self.slice(start_time, duration)
+
+    def progress(self) -> dict:
+        return {"raw_path": self.raw_path, "samples": self.num_samples, "sample_rate": self.sample_rate}
+
+
+# 按 (路径, 采样率) 复用已映射的背景音轨；容量有限，避免映射已删除任务的文件
+_TRACK_CACHE_SIZE = 4
+_track_cache: "OrderedDict[tuple, BackgroundTrack]" = OrderedDict()
+_track_cache_lock = threading.Lock()
+
+def get_background_track(path: str, sample_rate: int) -> BackgroundTrack:
+    """获取（必要时创建）背景音轨"""
+    key = (os.path.abspath(path), sample_rate)
+    with _track_cache_lock:
+        track = _track_cache.get(key)
+        if track is None:
+            track = BackgroundTrack(path, sample_rate)
+            _track_cache[key] = track
+            while len(_track_cache) > _TRACK_CACHE_SIZE:
+                _track_cache.popitem(last=False)
+        else:
+            _track_cache.move_to_end(key)
+        return track
+
+@lru_cache(maxsize=32)
+def fade_windows(length: int) -> tuple:
+    """
+    等功率淡入/淡出窗口 (fade_in, fade_out)，按长度缓存，返回只读数组
+    """
+    fade_in = np.sqrt(np.linspace(0.0, 1.0, length, dtype=np.float32))
+    fade_out = np.sqrt(np.linspace(1.0, 0.0, length, dtype=np.float32))
+    fade_in.setflags(write=False)
+    fade_out.setflags(write=False)
+    return fade_in, fade_out
+
 def apply_fade_effect(audio_data: np.ndarray, full_audio_buffer: Optional[np.ndarray] = None, 
                      overlap: int = 0, fade_mode: str = "overlap", position: str = "start") -> np.ndarray:
     """
@@ -34,11 +154,11 @@ def apply_fade_effect(audio_data: np.ndarray, full_audio_buffer: Optional[np.nda
         
         if position == "start":
             # 静音→语音过渡（淡入）
-            fade_in = np.sqrt(np.linspace(0.0, 1.0, fade_length, dtype=np.float32))
+            fade_in, _ = fade_windows(fade_length)
             audio_data[:fade_length] *= fade_in
         else:
             # 语音→静音过渡（淡出）
-            fade_out = np.sqrt(np.linspace(1.0, 0.0, fade_length, dtype=np.float32))
+            _, fade_out = fade_windows(fade_length)
             audio_data[-fade_length:] *= fade_out
             
         return audio_data
@@ -51,8 +171,7 @@ def apply_fade_effect(audio_data: np.ndarray, full_audio_buffer: Optional[np.nda
     if cross_len <= 0:
         return audio_data
 
-    fade_out = np.sqrt(np.linspace(1.0, 0.0, cross_len, dtype=np.float32))
-    fade_in  = np.sqrt(np.linspace(0.0, 1.0, cross_len, dtype=np.float32))
+    fade_in, fade_out = fade_windows(cross_len)
 
     audio_data = audio_data.copy()
     overlap_region = full_audio_buffer[-cross_len:]
@@ -71,7 +190,7 @@ async def mix_with_background(
 ) -> np.ndarray:
     """
     从 bg_path 读取背景音乐，在 [start_time, start_time+duration] 区间截取，
-    与 audio_data (人声) 混合。
+    与 audio_data (人声) 混合。背景音经 BackgroundTrack 内存映射，只读取所需区间。
     
     Args:
         bg_path: 背景音乐文件路径
@@ -85,21 +204,11 @@ async def mix_with_background(
     Returns:
         混合后的音频数据
     """
-    try: # 添加 try...except 来捕获 sf.read 的潜在错误
-        # 异步读取背景音乐
-        background_audio, sr = await asyncio.to_thread(sf.read, bg_path)
-        logger.debug(f"mix_with_background: 读取背景音频: {bg_path}, 长度: {len(background_audio)}, 采样率: {sr}") # 使用 debug 级别
-        background_audio = np.asarray(background_audio, dtype=np.float32)
-        
-        # 验证音频格式（VocalSeparator已确保单声道输出）
-        if background_audio.ndim != 1:
-            logger.error(f"mix_with_background: 背景音频格式异常 {background_audio.shape}，期望单声道")
-            return audio_data * vocals_volume  # 降级处理，只返回人声
-        logger.debug(f"mix_with_background: 背景音频格式正确 {background_audio.shape}")
-        if sr != sample_rate:
-            logger.warning(
-                f"背景音采样率={sr} 与目标={sample_rate}不匹配, 未做重采样, 可能有问题."
-            )
+    try: # 添加 try...except 来捕获读取背景音的潜在错误
+        # 背景音首次使用时转换为目标采样率的单声道原始文件，之后按区间内存映射读取
+        track = get_background_track(bg_path, sample_rate)
+        bg_segment = await track.read(start_time, duration)
+        logger.debug(f"mix_with_background: 读取背景音区间: {bg_path}, [{start_time:.2f}s, +{duration:.2f}s], 长度: {len(bg_segment)}")
     except Exception as e:
         logger.error(f"mix_with_background: 读取背景音频失败: {bg_path}, 错误: {e}", exc_info=True)
         # 如果读取失败，直接返回原始人声音频（应用音量）
@@ -110,15 +219,31 @@ async def mix_with_background(
              result[:audio_len] = audio_data[:audio_len] * vocals_volume
         return result
 
-    target_length = int(duration * sample_rate)
-    start_sample = int(start_time * sample_rate)
-    end_sample   = start_sample + target_length
-
-    if end_sample <= len(background_audio):
-        bg_segment = background_audio[start_sample:end_sample]
-    else:
-        bg_segment = background_audio[start_sample:]
+    return mix_background_segment(bg_segment, duration, audio_data, sample_rate, vocals_volume, background_volume)
 
+def mix_background_segment(
+    bg_segment: np.ndarray,
+    duration: float,
+    audio_data: np.ndarray,
+    sample_rate: int,
+    vocals_volume: float,
+    background_volume: float
+) -> np.ndarray:
+    """
+    将已截取好的背景音片段与人声混合（窗口化分离直接提供片段）
+    
+    Args:
+        bg_segment: 与本批次对齐的背景音片段
+        duration: 持续时间（秒）
+        audio_data: 人声音频数据
+        sample_rate: 采样率
+        vocals_volume: 人声音量系数
+        background_volume: 背景音乐音量系数
+        
+    Returns:
+        混合后的音频数据
+    """
+    target_length = int(duration * sample_rate)
     result = np.zeros(target_length, dtype=np.float32)
     audio_len = min(len(audio_data), target_length)
     bg_len    = min(len(bg_segment), target_length)
@@ -1,21 +1,26 @@
 import logging
 import numpy as np
 import librosa
-from typing import List
+from typing import Dict, List
 from core.sentence_tools import Sentence
 from utils.ffmpeg_utils import change_speed_ffmpeg
 from utils.audio_utils import apply_fade_effect
+from utils.time_stretch import get_time_stretcher
 import asyncio
-from config import Config
+from config import Config, get_config
 
 logger = logging.getLogger(__name__)
 
-async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int = 24000) -> None:
+async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int = 24000, voice_synthesizer=None) -> None:
     """异步应用速度调整和添加静音到句子的音频数据中
     
+    整个批次需要变速的句子一次性提交到变速引擎并行处理；
+    提供 voice_synthesizer 时，保存了 GPT latent 的句子改为插值 latent 重新声码到目标时长
+    
     Args:
         sentences: 句子列表
         sample_rate: 音频采样率，默认24kHz
+        voice_synthesizer: 可选，用于 latent 时长控制的语音合成器
     """
     if not sentences:
         logger.warning("apply_speed_and_silence: 收到空句子列表")
@@ -27,7 +32,12 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
     config = Config()
     fade_length = int(config.SILENCE_FADE_MS * sample_rate / 1000)
     
-    for i, sentence in enumerate(sentences):
+    # 原始时长（毫秒）与语速调整后的纯语音时长，按句子记录
+    original_durations = {}
+    speech_durations = {}
+    valid_sentences = []
+    
+    for sentence in sentences:
         try:
             if sentence.generated_audio is None or len(sentence.generated_audio) == 0:
                 logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 没有可调整的音频数据")
@@ -35,12 +45,29 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
                 continue
             
             original_duration = (len(sentence.generated_audio) / sample_rate) * 1000  # 原始时长（毫秒）
+            original_durations[id(sentence)] = original_duration
             # 初始化speech_duration为原始音频长度
-            speech_duration = original_duration
+            speech_durations[id(sentence)] = original_duration
+            valid_sentences.append(sentence)
+        
+        except Exception as e:
+            logger.error(f"[{task_id}] 处理句子 {sentence.sequence} 时出错: {e}")
+    
+    # --- 0. latent 时长控制：在添加静音前直接声码到变速后的长度 ---
+    revocoded = set()
+    if voice_synthesizer is not None:
+        revocoded = await _revocode_batch(valid_sentences, sample_rate, task_id, voice_synthesizer, speech_durations)
+    
+    for sentence in valid_sentences:
+        try:
+            original_duration = original_durations[id(sentence)]
             
             # --- 1. 为第一个句子在音频前添加静音 ---
             if sentence.is_first and sentence.start_ms > 0:
                 silence_samples = int(sentence.start_ms * sample_rate / 1000)
+                if id(sentence) in revocoded:
+                    # 与波形变速路径（开头静音随音频一起变速）保持相同的总时长
+                    silence_samples = int(round(silence_samples / sentence.speed))
                 if silence_samples > 0:
                     logger.info(f"[{task_id}] 句子 {sentence.sequence}: 在开头添加 {sentence.start_ms:.2f}毫秒静音 ({silence_samples} 个采样点)")
                     
@@ -60,32 +87,18 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
                     # 记录操作结果
                     current_duration = (len(sentence.generated_audio) / sample_rate) * 1000
                     logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 开头静音已添加，原始时长: {original_duration:.2f}毫秒，新时长: {current_duration:.2f}毫秒")
-            
-            # --- 2. 应用速度调整 ---
-            if hasattr(sentence, 'speed') and sentence.speed != 1.0 and sentence.speed > 0:
-                try:
-                    logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 调整速度至 {sentence.speed}")
-                    
-                    # 使用 librosa 时间伸缩调整速度
-                    audio_np = sentence.generated_audio.astype(np.float32)
-                    
-                    # 确保音频是单通道
-                    if audio_np.ndim > 1:
-                        audio_np = audio_np.mean(axis=0)
-                    
-                    # 使用 FFmpeg atempo 滤镜进行高质量变速
-                    sentence.generated_audio = await change_speed_ffmpeg(audio_np, sentence.speed, sample_rate)
-                    
-                    # 记录操作结果
-                    new_duration = (len(sentence.generated_audio) / sample_rate) * 1000
-                    
-                    # 计算speech_duration（语速调整后的纯语音长度）
-                    speech_duration = original_duration / sentence.speed
-                    
-                    logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 音频速度已调整，原始时长: {original_duration:.2f}毫秒，新时长: {new_duration:.2f}毫秒，纯语音时长: {speech_duration:.2f}毫秒")
-                
-                except Exception as e:
-                    logger.error(f"[{task_id}] 句子 {sentence.sequence}: 调整速度失败: {e}")
+        
+        except Exception as e:
+            logger.error(f"[{task_id}] 处理句子 {sentence.sequence} 时出错: {e}")
+    
+    # --- 2. 批量应用速度调整 ---
+    pending = [s for s in valid_sentences if id(s) not in revocoded]
+    await _apply_speed_batch(pending, sample_rate, task_id, original_durations, speech_durations)
+    
+    for sentence in valid_sentences:
+        try:
+            original_duration = original_durations[id(sentence)]
+            speech_duration = speech_durations[id(sentence)]
             
             # --- 3. 添加静音 ---
             if hasattr(sentence, 'silence_duration') and sentence.silence_duration > 0:
@@ -150,6 +163,105 @@ async def apply_speed_and_silence(sentences: List[Sentence], sample_rate: int =
         except Exception as e:
             logger.error(f"[{task_id}] 处理句子 {sentence.sequence} 时出错: {e}")
 
+async def _revocode_batch(
+    sentences: List[Sentence],
+    sample_rate: int,
+    task_id: str,
+    voice_synthesizer,
+    speech_durations: Dict[int, float]
+) -> set:
+    """对保存了 GPT latent 且速度不为1的句子，插值 latent 后重新声码到目标长度
+    
+    Args:
+        sentences: 有音频数据的句子列表
+        sample_rate: 音频采样率
+        task_id: 任务ID（用于日志）
+        voice_synthesizer: 语音合成器（提供 revocode）
+        speech_durations: 纯语音时长（毫秒），重新声码成功的句子会被更新
+        
+    Returns:
+        set: 重新声码成功的句子 id，这些句子不再做波形变速
+    """
+    pending = [
+        s for s in sentences
+        if getattr(s, 'tts_latent', None) and hasattr(s, 'speed') and s.speed != 1.0 and s.speed > 0
+    ]
+    if not pending:
+        return set()
+    
+    items = [(s.tts_latent, int(round(len(s.generated_audio) / s.speed))) for s in pending]
+    results = await voice_synthesizer.revocode(items)
+    
+    revocoded = set()
+    for sentence, result in zip(pending, results):
+        if result is None:
+            logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 重新声码失败，回退波形变速")
+            continue
+        original_duration = (len(sentence.generated_audio) / sample_rate) * 1000
+        sentence.generated_audio = result
+        speech_durations[id(sentence)] = original_duration / sentence.speed
+        revocoded.add(id(sentence))
+        logger.info(f"[{task_id}] 句子 {sentence.sequence}: latent 重新声码完成，速度 {sentence.speed:.3f}，"
+                    f"原始时长: {original_duration:.2f}毫秒，新时长: {len(result) / sample_rate * 1000:.2f}毫秒")
+    return revocoded
+
+async def _apply_speed_batch(
+    sentences: List[Sentence],
+    sample_rate: int,
+    task_id: str,
+    original_durations: Dict[int, float],
+    speech_durations: Dict[int, float]
+) -> None:
+    """对批次中速度不为1的句子做变速（保持音高），单句失败时保留原音频
+    
+    Args:
+        sentences: 有音频数据的句子列表
+        sample_rate: 音频采样率
+        task_id: 任务ID（用于日志）
+        original_durations: 句子原始时长（毫秒）
+        speech_durations: 纯语音时长（毫秒），变速成功的句子会被更新
+    """
+    pending = [s for s in sentences if hasattr(s, 'speed') and s.speed != 1.0 and s.speed > 0]
+    if not pending:
+        return
+    
+    items = []
+    for sentence in pending:
+        logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 调整速度至 {sentence.speed}")
+        audio_np = sentence.generated_audio.astype(np.float32)
+        # 确保音频是单通道
+        if audio_np.ndim > 1:
+            audio_np = audio_np.mean(axis=0)
+        items.append((audio_np, sentence.speed))
+    
+    engine = get_config().tts.time_stretch_engine
+    if engine == "ffmpeg":
+        # 逐句 FFmpeg atempo 滤镜
+        results = await asyncio.gather(
+            *(change_speed_ffmpeg(audio, speed, sample_rate) for audio, speed in items),
+            return_exceptions=True
+        )
+    else:
+        # 进程内 WSOLA，整批并行
+        results = await get_time_stretcher().stretch_batch(items, sample_rate)
+    
+    for sentence, result in zip(pending, results):
+        if isinstance(result, BaseException):
+            logger.error(f"[{task_id}] 句子 {sentence.sequence}: 调整速度失败: {result}")
+            continue
+        
+        sentence.generated_audio = result
+        original_duration = original_durations[id(sentence)]
+        
+        # 记录操作结果
+        new_duration = (len(sentence.generated_audio) / sample_rate) * 1000
+        
+        # 计算speech_duration（语速调整后的纯语音长度）
+        speech_duration = original_duration / sentence.speed
+        speech_durations[id(sentence)] = speech_duration
+        
+        logger.warning(f"[{task_id}] 句子 {sentence.sequence}: 音频速度已调整，原始时长: {original_duration:.2f}毫秒，新时长: {new_duration:.2f}毫秒，纯语音时长: {speech_duration:.2f}毫秒")
+
 def align_batch(sentences: List[Sentence]) -> List[Sentence]:
     """对句子批次进行时长对齐
     
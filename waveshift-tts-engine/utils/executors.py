@@ -0,0 +1,211 @@
+"""
+按负载类别划分的执行器线程池 - 替代共用默认执行器的 asyncio.to_thread
+- inference：模型推理（IndexTTS 生成/声码），与 GPU 锁配合，线程数很少
+- dsp：CPU 数值处理（对齐、变速、背景音拼接、特征提取、音频解码）
+- io：磁盘/网络阻塞调用（文件读写、播放列表解析、SQLite、同步 SDK）
+- separation：音频分离推理（常驻分离器实例）
+各池按配置与核数确定大小；torch 的 intra-op 线程数按推理/分离池的并发统一设置，避免线程超订
+每个池统计排队深度、运行数、排队等待与忙碌时间
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+POOL_INFERENCE = "inference"
+POOL_DSP = "dsp"
+POOL_IO = "io"
+POOL_SEPARATION = "separation"
+
+
+def separation_worker_count(configured: int = 0) -> int:
+    """
+    常驻分离器实例数（也是分离线程池大小）
+    - configured > 0：按配置
+    - GPU：每 6GB 显存一个实例，最多4个
+    - CPU：ONNX推理本身会占满多核，每 8 核一个实例，最多2个
+    """
+    if configured > 0:
+        return configured
+    try:
+        import torch
+        if torch.cuda.is_available():
+            try:
+                total_gb = torch.cuda.get_device_properties(0).total_memory / (1024 ** 3)
+            except Exception:
+                total_gb = 0
+            return max(1, min(4, int(total_gb // 6)))
+    except ImportError:
+        pass
+    return max(1, min(2, (os.cpu_count() or 1) // 8))
+
+
+class ExecutorPool:
+    """带统计的命名线程池"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"pool_{name}")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.created_at = time.time()
+
+    @property
+    def queued(self) -> int:
+        """已提交但尚未开始执行的调用数"""
+        return self.submitted - self.completed - self.failed - self.running
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在本池中执行阻塞调用"""
+        submitted_at = time.time()
+        with self._lock:
+            self.submitted += 1
+        call = functools.partial(self._call, submitted_at, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    def _call(self, submitted_at: float, func: Callable[..., Any], *args, **kwargs) -> Any:
+        started = time.time()
+        waited = started - submitted_at
+        with self._lock:
+            self.running += 1
+            self.wait_seconds += waited
+            self.max_wait = max(self.max_wait, waited)
+        ok = False
+        try:
+            result = func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.busy_seconds += time.time() - started
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.created_at, 1e-6)
+        finished = self.completed + self.failed
+        return {
+            "workers": self.max_workers,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_s": round(self.busy_seconds, 2),
+            "utilization": round(self.busy_seconds / (elapsed * self.max_workers), 3),
+            "avg_wait_ms": round(self.wait_seconds / finished * 1000, 1) if finished else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "avg_run_ms": round(self.busy_seconds / finished * 1000, 1) if finished else 0.0,
+        }
+
+    def shutdown(self, wait: bool = False):
+        self.executor.shutdown(wait=wait)
+
+
+class ExecutorRegistry:
+    """进程内所有命名线程池"""
+
+    def __init__(
+        self,
+        inference_workers: int = 1,
+        dsp_workers: int = 0,
+        io_workers: int = 0,
+        separation_workers: int = 0,
+        torch_threads: int = 0
+    ):
+        """
+        Args:
+            inference_workers: 模型推理池大小
+            dsp_workers: CPU 数值处理池大小，0表示按核数自动确定
+            io_workers: 阻塞 I/O 池大小，0表示按核数自动确定
+            separation_workers: 分离池大小，0表示与常驻分离器实例数相同（separation_worker_count）
+            torch_threads: torch intra-op 线程数，0表示按核数减去 DSP 池后在推理/分离并发间均分
+        """
+        cores = os.cpu_count() or 1
+        sizes = {
+            POOL_INFERENCE: max(1, inference_workers),
+            POOL_DSP: dsp_workers or max(2, cores // 2),
+            POOL_IO: io_workers or min(32, cores * 2 + 4),
+            POOL_SEPARATION: separation_worker_count(separation_workers),
+        }
+        self.pools: Dict[str, ExecutorPool] = {name: ExecutorPool(name, size) for name, size in sizes.items()}
+        # 推理与分离都使用 torch/ONNX 的 intra-op 线程池；两者并发乘以线程数不超过 DSP 池之外的核数
+        compute_slots = sizes[POOL_INFERENCE] + sizes[POOL_SEPARATION]
+        self.torch_threads = torch_threads or max(1, (cores - min(sizes[POOL_DSP], cores // 2)) // compute_slots)
+        logger.info(
+            f"执行器线程池: {', '.join(f'{name}={size}' for name, size in sizes.items())}, "
+            f"torch线程数={self.torch_threads}, CPU核数={cores}"
+        )
+
+    def get(self, name: str) -> ExecutorPool:
+        try:
+            return self.pools[name]
+        except KeyError:
+            raise ValueError(f"未知的执行器线程池: {name}")
+
+    async def run(self, name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        return await self.get(name).run(func, *args, **kwargs)
+
+    def configure_torch_threads(self) -> None:
+        """设置 torch intra-op/inter-op 线程数（需在模型加载与首次推理前调用；未安装 torch 时跳过）"""
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(self.torch_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # inter-op 线程池已启动后不能再修改
+            pass
+        logger.info(f"torch 线程数已设置: intra-op={self.torch_threads}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {name: pool.get_stats() for name, pool in self.pools.items()}
+        stats["torch_threads"] = self.torch_threads
+        return stats
+
+    def shutdown(self, wait: bool = False) -> None:
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
+
+
+# 全局单例
+_executors: Optional[ExecutorRegistry] = None
+
+
+def get_executors() -> ExecutorRegistry:
+    """获取全局执行器线程池"""
+    global _executors
+    if _executors is None:
+        from config import get_config
+        config = get_config()
+        _executors = ExecutorRegistry(
+            inference_workers=config.tts.inference_workers,
+            dsp_workers=config.tts.dsp_workers,
+            io_workers=config.tts.io_workers,
+            separation_workers=config.tts.separation_workers,
+            torch_threads=config.tts.torch_threads
+        )
+    return _executors
+
+
+async def run_in_pool(name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在指定类别的线程池中执行阻塞调用（替代 asyncio.to_thread）"""
+    return await get_executors().run(name, func, *args, **kwargs)
+
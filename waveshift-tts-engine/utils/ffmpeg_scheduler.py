@@ -0,0 +1,366 @@
+"""
+FFmpeg 作业调度器 - 所有 ffmpeg/ffprobe 子进程经此启动
+- 按核数确定的 CPU 预算：每个作业按其线程数占用预算，预算不足时排队（单个作业超出预算时独占执行）
+- 优先级：首个片段等影响首帧延迟的作业优先于普通片段，成品导出等后台作业最后；同优先级先到先得
+- 每个作业的线程数按作业类型配置，以 -threads 注入命令（解码与编码各一份）
+- 按任务登记排队与运行中的作业，任务删除时取消排队作业并结束运行中的进程
+- 按作业类型统计作业数、排队等待、墙钟时间与 CPU 时间（运行期间按进程采样）
+任务ID与优先级可显式传入，也可由 ffmpeg_job_context 在调用链上设置（子任务继承）
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# 优先级（数值越小越先执行）
+PRIORITY_CRITICAL = 0  # 首个片段等影响首帧延迟的作业
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2  # 成品合并、字幕烧录等不影响播放的作业
+
+# 作业类型
+JOB_PROBE = "probe"  # ffprobe 探测
+JOB_EXTRACT = "extract"  # 音频提取/截取
+JOB_REMUX = "remux"  # 流复制切分/合并/重封装
+JOB_AUDIO = "audio"  # 音频编码/滤镜
+JOB_ENCODE = "encode"  # 视频重编码
+
+_job_context: contextvars.ContextVar[Tuple[Optional[str], Optional[int]]] = contextvars.ContextVar(
+    "ffmpeg_job_context", default=(None, None)
+)
+
+
+@contextmanager
+def ffmpeg_job_context(task_id: Optional[str] = None, priority: Optional[int] = None) -> Iterator[None]:
+    """
+    为当前调用链（及其中创建的子任务）设置 ffmpeg 作业的所属任务与默认优先级
+    未指定的字段沿用外层设置
+    """
+    outer_task, outer_priority = _job_context.get()
+    token = _job_context.set((task_id or outer_task, priority if priority is not None else outer_priority))
+    try:
+        yield
+    finally:
+        _job_context.reset(token)
+
+
+class FFmpegCancelledError(RuntimeError):
+    """作业所属任务已被取消"""
+
+
+@dataclass(eq=False)
+class FFmpegJob:
+    """单个 ffmpeg/ffprobe 调用"""
+    cmd: List[str]
+    job_type: str
+    priority: int
+    task_id: Optional[str]
+    threads: int
+    cost: int
+    seq: int
+    submitted_at: float = field(default_factory=time.time)
+    granted: Optional[asyncio.Future] = None
+    process: Optional[asyncio.subprocess.Process] = None
+    started_at: float = 0.0
+    cpu_seconds: float = 0.0
+    cancelled: bool = False
+
+
+class JobTypeStats:
+    """单个作业类型的统计"""
+
+    def __init__(self):
+        self.jobs = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "jobs": self.jobs,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "wall_s": round(self.wall_seconds, 2),
+            "cpu_s": round(self.cpu_seconds, 2),
+            "avg_wall_ms": round(self.wall_seconds / self.jobs * 1000, 1) if self.jobs else 0.0,
+            "avg_wait_ms": round(self.wait_seconds / self.jobs * 1000, 1) if self.jobs else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            # CPU 时间 / 墙钟时间：作业实际占用的核数
+            "cores_used": round(self.cpu_seconds / self.wall_seconds, 2) if self.wall_seconds > 0 else 0.0,
+        }
+
+
+class FFmpegScheduler:
+    """进程内全部 ffmpeg/ffprobe 作业的调度器"""
+
+    def __init__(
+        self,
+        cpu_budget: int = 0,
+        encode_threads: int = 2,
+        default_threads: int = 1,
+        sample_interval: float = 0.1
+    ):
+        """
+        Args:
+            cpu_budget: 同时运行作业的线程数之和上限，0表示CPU核数
+            encode_threads: 视频重编码作业的线程数
+            default_threads: 其他作业的线程数
+            sample_interval: 运行中作业 CPU 时间的采样间隔（秒）
+        """
+        self.cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+        self.thread_counts = {JOB_ENCODE: max(1, encode_threads)}
+        self.default_threads = max(1, default_threads)
+        self.sample_interval = sample_interval
+        self.used = 0
+        self._waiting: List[Tuple[int, int, FFmpegJob]] = []
+        self._running: Set[FFmpegJob] = set()
+        self._cancelled_tasks: Set[str] = set()
+        self._seq = itertools.count()
+        self._sampler: Optional[asyncio.Task] = None
+        self.stats: Dict[str, JobTypeStats] = {}
+        logger.info(
+            f"FFmpeg调度器: CPU预算={self.cpu_budget}, 编码线程数={self.thread_counts[JOB_ENCODE]}, "
+            f"其他作业线程数={self.default_threads}"
+        )
+
+    def threads_for(self, job_type: str) -> int:
+        return self.thread_counts.get(job_type, self.default_threads)
+
+    async def run(
+        self,
+        cmd: List[str],
+        input_bytes: Optional[bytes] = None,
+        job_type: str = JOB_REMUX,
+        priority: Optional[int] = None,
+        task_id: Optional[str] = None
+    ) -> Tuple[bytes, bytes]:
+        """
+        排队并运行命令，返回 (stdout, stderr)
+
+        Raises:
+            FFmpegCancelledError: 所属任务已取消
+            RuntimeError: 命令返回码非 0
+        """
+        async with self.job(cmd, job_type, priority, task_id, stdin=input_bytes is not None) as process:
+            stdout, stderr = await process.communicate(input=input_bytes)
+        if process.returncode != 0:
+            error_msg = stderr.decode(errors="replace") or "Unknown error"
+            raise RuntimeError(f"FFmpeg command failed: {error_msg}")
+        return stdout, stderr
+
+    @asynccontextmanager
+    async def job(
+        self,
+        cmd: List[str],
+        job_type: str = JOB_REMUX,
+        priority: Optional[int] = None,
+        task_id: Optional[str] = None,
+        stdin: bool = False
+    ):
+        """
+        排队获得 CPU 预算后启动进程（stdout/stderr 为管道），退出时结束未退出的进程并归还预算
+        供需要流式读取输出的调用方使用；作业被取消时退出处抛出 FFmpegCancelledError
+        """
+        job = self._create_job(cmd, job_type, priority, task_id)
+        await self._acquire(job)
+        ok = False
+        try:
+            job.process = await asyncio.create_subprocess_exec(
+                *job.cmd,
+                stdin=asyncio.subprocess.PIPE if stdin else None,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            job.started_at = time.time()
+            self._running.add(job)
+            self._sample(job)
+            self._ensure_sampler()
+            try:
+                yield job.process
+            finally:
+                if job.process.returncode is None:
+                    job.process.kill()
+                    await job.process.wait()
+            if job.cancelled:
+                raise FFmpegCancelledError(f"任务 {job.task_id} 已取消，ffmpeg 作业已终止")
+            ok = job.process.returncode == 0
+        finally:
+            self._release(job, ok)
+
+    def _create_job(self, cmd: List[str], job_type: str, priority: Optional[int], task_id: Optional[str]) -> FFmpegJob:
+        context_task, context_priority = _job_context.get()
+        task_id = task_id or context_task
+        if task_id is not None and task_id in self._cancelled_tasks:
+            raise FFmpegCancelledError(f"任务 {task_id} 已取消，拒绝新的 ffmpeg 作业")
+        if priority is None:
+            priority = context_priority if context_priority is not None else PRIORITY_NORMAL
+        threads = 1 if cmd[0] == "ffprobe" else self.threads_for(job_type)
+        if threads > 1:
+            cmd = _with_threads(cmd, threads)
+        return FFmpegJob(
+            cmd=cmd, job_type=job_type, priority=priority, task_id=task_id,
+            threads=threads, cost=min(threads, self.cpu_budget), seq=next(self._seq)
+        )
+
+    async def _acquire(self, job: FFmpegJob) -> None:
+        job.granted = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (job.priority, job.seq, job))
+        self._dispatch()
+        try:
+            await job.granted
+        except asyncio.CancelledError:
+            if job.granted.done() and not job.granted.cancelled() and job.granted.exception() is None:
+                # 已获得预算但调用方被取消
+                self.used -= job.cost
+                self._dispatch()
+            else:
+                job.granted.cancel()
+            raise
+
+    def _dispatch(self) -> None:
+        """按优先级授予预算；队首作业放不下时后续作业也等待（避免大作业饿死）"""
+        while self._waiting:
+            _, _, job = self._waiting[0]
+            if job.granted.done():
+                heapq.heappop(self._waiting)
+                continue
+            if self.used > 0 and self.used + job.cost > self.cpu_budget:
+                return
+            heapq.heappop(self._waiting)
+            self.used += job.cost
+            job.granted.set_result(None)
+
+    def _release(self, job: FFmpegJob, ok: bool) -> None:
+        self.used -= job.cost
+        self._running.discard(job)
+        if job.process is not None:
+            self._record(job, ok)
+        self._dispatch()
+
+    def _record(self, job: FFmpegJob, ok: bool) -> None:
+        stats = self.stats.setdefault(job.job_type, JobTypeStats())
+        waited = job.started_at - job.submitted_at if job.started_at else 0.0
+        stats.jobs += 1
+        stats.wait_seconds += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        stats.wall_seconds += time.time() - (job.started_at or job.submitted_at)
+        stats.cpu_seconds += job.cpu_seconds
+        if job.cancelled:
+            stats.cancelled += 1
+        elif not ok:
+            stats.failed += 1
+
+    def _sample(self, job: FFmpegJob) -> None:
+        """读取运行中进程的累计 CPU 时间（进程退出后即不可读，保留最后一次采样）"""
+        if job.process.returncode is not None:
+            return
+        try:
+            times = psutil.Process(job.process.pid).cpu_times()
+            job.cpu_seconds = times.user + times.system
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
+
+    def _ensure_sampler(self) -> None:
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.create_task(self._sample_loop(), name="ffmpeg_cpu_sampler")
+
+    async def _sample_loop(self) -> None:
+        while self._running:
+            await asyncio.sleep(self.sample_interval)
+            for job in list(self._running):
+                self._sample(job)
+
+    def cancel_task(self, task_id: str) -> int:
+        """
+        取消任务的全部 ffmpeg 作业：排队中的作业以 FFmpegCancelledError 结束，运行中的进程被终止，
+        之后该任务提交的作业直接被拒绝（直到 reset_task；任务清理完成时须调用，以免取消标记常驻）
+
+        Returns:
+            取消的作业数
+        """
+        self._cancelled_tasks.add(task_id)
+        count = 0
+        for _, _, job in self._waiting:
+            if job.task_id == task_id and not job.granted.done():
+                job.cancelled = True
+                job.granted.set_exception(FFmpegCancelledError(f"任务 {task_id} 已取消，ffmpeg 作业未执行"))
+                self.stats.setdefault(job.job_type, JobTypeStats()).cancelled += 1
+                count += 1
+        for job in list(self._running):
+            if job.task_id == task_id and job.process.returncode is None:
+                job.cancelled = True
+                job.process.kill()
+                count += 1
+        if count:
+            logger.info(f"[{task_id}] 已取消 {count} 个 ffmpeg 作业")
+        self._dispatch()
+        return count
+
+    def reset_task(self, task_id: str) -> None:
+        """移除任务的取消标记：任务清理完成或重新初始化时调用，之后可再次提交作业"""
+        self._cancelled_tasks.discard(task_id)
+
+    def get_task_stats(self, task_id: str) -> Dict[str, int]:
+        """任务当前排队与运行中的作业数"""
+        return {
+            "queued": sum(1 for _, _, job in self._waiting if job.task_id == task_id and not job.granted.done()),
+            "running": sum(1 for job in self._running if job.task_id == task_id),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        waiting = [job for _, _, job in self._waiting if not job.granted.done()]
+        return {
+            "cpu_budget": self.cpu_budget,
+            "cpu_used": self.used,
+            "running": len(self._running),
+            "queued": len(waiting),
+            "queued_by_priority": {
+                name: sum(1 for job in waiting if job.priority == priority)
+                for name, priority in (("critical", PRIORITY_CRITICAL), ("normal", PRIORITY_NORMAL),
+                                       ("background", PRIORITY_BACKGROUND))
+            },
+            "job_types": {job_type: stats.to_dict() for job_type, stats in self.stats.items()},
+        }
+
+
+def _with_threads(cmd: List[str], threads: int) -> List[str]:
+    """每个输入前与输出前注入 -threads（命令已指定时不修改）"""
+    if "-threads" in cmd:
+        return cmd
+    value = str(threads)
+    result = [cmd[0]]
+    for arg in cmd[1:-1]:
+        if arg == "-i":
+            result += ["-threads", value]
+        result.append(arg)
+    return result + ["-threads", value, cmd[-1]]
+
+
+# 全局单例
+_ffmpeg_scheduler: Optional[FFmpegScheduler] = None
+
+
+def get_ffmpeg_scheduler() -> FFmpegScheduler:
+    """获取全局 FFmpeg 作业调度器"""
+    global _ffmpeg_scheduler
+    if _ffmpeg_scheduler is None:
+        from config import get_config
+        config = get_config()
+        _ffmpeg_scheduler = FFmpegScheduler(
+            cpu_budget=config.tts.ffmpeg_cpu_budget,
+            encode_threads=config.tts.ffmpeg_encode_threads,
+            default_threads=config.tts.ffmpeg_threads
+        )
+    return _ffmpeg_scheduler
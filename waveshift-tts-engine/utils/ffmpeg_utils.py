@@ -6,30 +6,36 @@ import logging
 import subprocess
 from pathlib import Path
 from typing import List, Tuple, Optional, Union
-import asyncio
 import numpy as np
 
+from utils.ffmpeg_scheduler import (
+    FFmpegCancelledError, get_ffmpeg_scheduler,
+    JOB_AUDIO, JOB_ENCODE, JOB_EXTRACT, JOB_PROBE, JOB_REMUX, PRIORITY_BACKGROUND
+)
+
 logger = logging.getLogger(__name__)
 
 
-async def run_command(cmd: List[str], input_bytes: Optional[bytes] = None) -> Tuple[bytes, bytes]:
+async def run_command(
+    cmd: List[str],
+    input_bytes: Optional[bytes] = None,
+    job_type: str = JOB_REMUX,
+    priority: Optional[int] = None
+) -> Tuple[bytes, bytes]:
     """
     异步运行 ffmpeg 命令，返回 (stdout, stderr)，支持输入管道数据 input_bytes。
-    若命令返回码非 0，则抛出 RuntimeError。
+    命令经全局 FFmpeg 作业调度器排队（CPU 预算、优先级、按任务取消），job_type 决定线程数与统计分类，
+    priority 未指定时沿用 ffmpeg_job_context 的设置。
+    若命令返回码非 0，则抛出 RuntimeError；所属任务已取消时抛出 FFmpegCancelledError。
     """
     logger.debug(f"[FFmpegUtils] Running command: {' '.join(cmd)}")
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdin=asyncio.subprocess.PIPE if input_bytes is not None else None,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate(input=input_bytes)
-    if process.returncode != 0:
-        error_msg = stderr.decode() or "Unknown error"
-        logger.error(f"[FFmpegUtils] Command failed with error: {error_msg}")
-        raise RuntimeError(f"FFmpeg command failed: {error_msg}")
-    return stdout, stderr
+    try:
+        return await get_ffmpeg_scheduler().run(cmd, input_bytes, job_type=job_type, priority=priority)
+    except FFmpegCancelledError:
+        raise
+    except RuntimeError as e:
+        logger.error(f"[FFmpegUtils] Command failed with error: {e}")
+        raise
 
 async def extract_audio(
     input_path: str,
@@ -53,7 +59,31 @@ async def extract_audio(
         "-ac", "1",
         output_path
     ]
-    await run_command(cmd)
+    await run_command(cmd, job_type=JOB_EXTRACT)
+
+async def extract_audio_window(
+    input_path: str,
+    output_path: str,
+    start: float,
+    duration: float,
+    sample_rate: int,
+    channels: int = 2
+) -> None:
+    """
+    截取音频窗口（-ss 置于 -i 之前快速定位），输出 PCM float32 WAV。
+    """
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-ss", f"{max(0.0, start):.3f}",
+        "-i", input_path,
+        "-t", f"{duration:.3f}",
+        "-vn",
+        "-ac", str(channels),
+        "-ar", str(sample_rate),
+        "-acodec", "pcm_f32le",
+        output_path
+    ]
+    await run_command(cmd, job_type=JOB_EXTRACT)
 
 async def extract_video(
     input_path: str,
@@ -78,7 +108,7 @@ async def extract_video(
         "-tune", "fastdecode",
         output_path
     ]
-    await run_command(cmd)
+    await run_command(cmd, job_type=JOB_ENCODE)
 
 async def hls_segment(
     input_path: str,
@@ -104,104 +134,251 @@ async def hls_segment(
         "-hls_segment_filename", segment_pattern,
         playlist_path
     ]
-    await run_command(cmd)
+    await run_command(cmd, job_type=JOB_REMUX)
 
-async def cut_video_track(
+async def hls_split_parts(
+    input_path: str,
+    part_pattern: str,
+    list_path: str,
+    cut_times: List[float]
+) -> List[Tuple[str, float, float]]:
+    """
+    将输入视频（流复制）在指定时间点切割为 LL-HLS 部分片段（mpegts），允许在非关键帧处切分。
+    part_pattern 形如 "part_%03d.ts"
+
+    Returns:
+        [(文件名, 起始时间, 结束时间), ...]，按顺序排列
+    """
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", input_path,
+        "-c", "copy",
+        "-f", "segment",
+        "-segment_format", "mpegts",
+        "-break_non_keyframes", "1",
+        "-reset_timestamps", "0",
+        "-segment_list", list_path,
+        "-segment_list_type", "csv",
+    ]
+    if cut_times:
+        cmd += ["-segment_times", ",".join(f"{t:.3f}" for t in cut_times)]
+    else:
+        cmd += ["-segment_time", "86400"]
+    cmd.append(part_pattern)
+    await run_command(cmd, job_type=JOB_REMUX)
+    parts = []
+    with open(list_path, "r", encoding="utf-8") as f:
+        for line in f:
+            fields = line.strip().rsplit(",", 2)
+            if len(fields) == 3:
+                parts.append((fields[0], float(fields[1]), float(fields[2])))
+    return parts
+
+async def hls_copy_video_fmp4(
+    input_path: str,
+    output_dir: str,
+    playlist_name: str,
+    init_name: str,
+    segment_pattern: str,
+    master_name: str,
+    hls_time: float = 4
+) -> None:
+    """
+    仅视频流复制切分为 fMP4 HLS（VOD 播放列表），在关键帧处切分、不重编码。
+    ffmpeg 同时写出只含该视频的主播放列表 master_name（带 BANDWIDTH/CODECS/RESOLUTION）。
+    文件名均相对 output_dir。
+    """
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-i", input_path,
+        "-map", "0:v:0",
+        "-an", "-sn",
+        "-c", "copy",
+        "-f", "hls",
+        "-hls_time", f"{hls_time:g}",
+        "-hls_list_size", "0",
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", init_name,
+        "-hls_segment_filename", str(Path(output_dir) / segment_pattern),
+        "-master_pl_name", master_name,
+        str(Path(output_dir) / playlist_name)
+    ]
+    await run_command(cmd, job_type=JOB_REMUX)
+
+async def hls_encode_audio_fmp4(
+    audio_data: np.ndarray,
+    sample_rate: int,
+    output_dir: str,
+    playlist_name: str,
+    init_name: str,
+    segment_pattern: str,
+    hls_time: float = 4,
+    bitrate: str = "128k"
+) -> None:
+    """
+    单次 ffmpeg 调用：音频从 stdin 以 f32le 输入，编码为 AAC 并切分为 fMP4 HLS 片段（时间戳从0开始）。
+    文件名均相对 output_dir。
+    """
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        *_audio_pipe_args(sample_rate),
+        "-c:a", "aac",
+        "-b:a", bitrate,
+        "-f", "hls",
+        "-hls_time", f"{hls_time:g}",
+        "-hls_list_size", "0",
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", init_name,
+        "-hls_segment_filename", str(Path(output_dir) / segment_pattern),
+        str(Path(output_dir) / playlist_name)
+    ]
+    await run_command(cmd, input_bytes=_pcm_bytes(audio_data), job_type=JOB_AUDIO)
+
+def _audio_pipe_args(sample_rate: int) -> List[str]:
+    """单声道 float32 PCM 从 stdin 输入"""
+    return ["-f", "f32le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0"]
+
+def _pcm_bytes(audio_data: np.ndarray) -> bytes:
+    return np.ascontiguousarray(audio_data, dtype=np.float32).tobytes()
+
+async def probe_keyframes(input_path: str) -> List[Tuple[float, float]]:
+    """
+    列出首个视频流的关键帧 (pts, dts)，单位秒，按 pts 排序。
+    只读取包头，不解码。
+    """
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,dts_time,flags",
+        "-of", "csv=p=0",
+        input_path
+    ]
+    stdout, _ = await run_command(cmd, job_type=JOB_PROBE)
+    keyframes = []
+    for line in stdout.decode().splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 3 or "K" not in parts[2]:
+            continue
+        try:
+            pts = float(parts[0])
+            dts = float(parts[1]) if parts[1] not in ("", "N/A") else pts
+        except ValueError:
+            continue
+        keyframes.append((pts, dts))
+    keyframes.sort()
+    return keyframes
+
+async def encode_video_range(
     input_path: str,
     output_path: str,
     start: float,
-    end: float
+    duration: float,
+    profile: Optional[str] = None,
+    level: Optional[str] = None,
+    pix_fmt: Optional[str] = None
 ) -> None:
     """
-    截取 [start, end] 的无声视频段，end为绝对秒数。
-    """
-    duration = end - start
-    if duration <= 0:
-        raise ValueError(f"Invalid duration: {duration}")
+    重编码 [start, start + duration] 的无声视频段（-ss 置于 -i 之前，帧精确），
+    用于关键帧未对齐时的首尾不完整 GOP。
+    与流复制的源 GOP 拼接时应传入源视频的 profile/level/像素格式，使拼接后的码流参数一致。
 
+    Args:
+        profile: libx264 profile（如 high），None 时由编码器决定
+        level: H.264 level（如 4.1），None 时由编码器决定
+        pix_fmt: 像素格式，None 时为 yuv420p
+    """
     cmd = [
-        "ffmpeg", "-y",
+        "ffmpeg", "-y", "-v", "error",
+        "-ss", f"{start:.6f}",
         "-i", input_path,
-        "-ss", str(start),
-        "-t", str(duration),
+        "-t", f"{duration:.6f}",
+        "-an",
+        "-vsync", "vfr",
         "-c:v", "libx264",
         "-preset", "superfast",
-        "-an",  # 去除音轨
-        "-vsync", "vfr",
-        output_path
+        "-crf", "18",
+        "-pix_fmt", pix_fmt or "yuv420p",
     ]
-    await run_command(cmd)
+    if profile:
+        cmd += ["-profile:v", profile]
+    if level:
+        cmd += ["-level:v", level]
+    cmd.append(output_path)
+    await run_command(cmd, job_type=JOB_ENCODE)
 
-async def cut_video_with_audio(
-    input_video_path: str,
-    input_audio_path: str,
-    output_path: str
+async def render_video_with_audio(
+    input_path: str,
+    start: float,
+    duration: float,
+    audio_data: np.ndarray,
+    sample_rate: int,
+    output_path: str,
+    subtitles_path: Optional[str] = None
 ) -> None:
     """
-    将无声视频与音频合并 (视频copy，音频AAC)。
+    单次 ffmpeg 调用：截取 [start, start + duration] 视频并重编码，音频从 stdin 以 f32le 输入，
+    可选烧录 .ass 字幕（无 force_style, 由 .ass 内样式全权决定）。
+    
+    若字幕渲染失败，则回退到不带字幕重新渲染。
     """
     cmd = [
-        "ffmpeg", "-y",
-        "-i", input_video_path,
-        "-i", input_audio_path,
-        "-c:v", "copy",
+        "ffmpeg", "-y", "-v", "error",
+        "-ss", f"{start:.6f}",
+        "-i", input_path,
+        *_audio_pipe_args(sample_rate),
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-t", f"{duration:.6f}",
+    ]
+    tail = [
+        "-vsync", "vfr",
+        "-c:v", "libx264",
+        "-preset", "superfast",
+        "-crf", "23",
         "-c:a", "aac",
         output_path
     ]
-    await run_command(cmd)
+    audio_bytes = _pcm_bytes(audio_data)
+
+    if subtitles_path:
+        if not Path(subtitles_path).exists():
+            raise FileNotFoundError(f"文件不存在: {subtitles_path}")
+        escaped_path = subtitles_path.replace(':', r'\\:')
+        try:
+            await run_command(cmd + ["-vf", f"subtitles='{escaped_path}'"] + tail, input_bytes=audio_bytes, job_type=JOB_ENCODE)
+            return
+        except RuntimeError as e:
+            logger.warning(f"[FFmpegUtils] subtitles滤镜方案失败: {str(e)}")
+            logger.warning("[FFmpegUtils] 已跳过字幕，仅合并音视频")
 
-async def cut_video_with_subtitles_and_audio(
-    input_video_path: str,
-    input_audio_path: str,
-    subtitles_path: str,
+    await run_command(cmd + tail, input_bytes=audio_bytes, job_type=JOB_ENCODE)
+
+async def concat_copy_with_audio(
+    concat_list_path: str,
+    duration: float,
+    audio_data: np.ndarray,
+    sample_rate: int,
     output_path: str
 ) -> None:
     """
-    将无声视频 + 音频 + .ass字幕 合并输出到 output_path。
-    (无 force_style, 由 .ass 内样式全权决定)
-    
-    若字幕渲染失败，则回退到仅合并音视频。
+    单次 ffmpeg 调用：按 concat 列表（可含 inpoint/outpoint）流复制视频，
+    音频从 stdin 以 f32le 输入并编码为 AAC。
     """
-    # 检查输入文件是否存在
-    for file_path in [input_video_path, input_audio_path, subtitles_path]:
-        if not Path(file_path).exists():
-            raise FileNotFoundError(f"文件不存在: {file_path}")
-
-    # 构建"subtitles"过滤器, 不带 force_style
-    escaped_path = subtitles_path.replace(':', r'\\:')
-
-    try:
-        # 方式1: subtitles 滤镜
-        # 当前设置是合理的，但需要注意：
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", input_video_path,
-            "-i", input_audio_path,
-            "-filter_complex",
-            f"[0:v]subtitles='{escaped_path}'[v]",
-            "-map", "[v]",
-            "-map", "1:a",
-            "-c:v", "libx264",
-            "-preset", "superfast",
-            "-crf", "23",  # 建议添加 CRF 参数控制视频质量
-            "-c:a", "aac",
-            output_path
-        ]
-        await run_command(cmd)
-
-    except RuntimeError as e:
-        logger.warning(f"[FFmpegUtils] subtitles滤镜方案失败: {str(e)}")
-        # 方式2: 最终回退 - 仅合并音视频
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", input_video_path,
-            "-i", input_audio_path,
-            "-c:v", "copy",
-            "-c:a", "aac",
-            output_path
-        ]
-        await run_command(cmd)
-        logger.warning("[FFmpegUtils] 已跳过字幕，仅合并音视频")
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "concat", "-safe", "0",
+        "-i", concat_list_path,
+        *_audio_pipe_args(sample_rate),
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-t", f"{duration:.6f}",
+        "-c:v", "copy",
+        "-c:a", "aac",
+        output_path
+    ]
+    await run_command(cmd, input_bytes=_pcm_bytes(audio_data), job_type=JOB_AUDIO)
 
 async def get_duration(input_path: str) -> float:
     """
@@ -215,7 +392,7 @@ async def get_duration(input_path: str) -> float:
         input_path
     ]
     try:
-        stdout, _ = await run_command(cmd)
+        stdout, _ = await run_command(cmd, job_type=JOB_PROBE)
         return float(stdout.decode().strip())
     except (ValueError, RuntimeError) as e:
         logger.error(f"[FFmpegUtils] 获取时长失败: {str(e)}, 输入: {input_path}")
@@ -242,12 +419,66 @@ async def concat_videos(input_list: str, output_path: str) -> Union[Path, None]:
     ]
     
     try:
-        await run_command(cmd)
+        await run_command(cmd, job_type=JOB_REMUX, priority=PRIORITY_BACKGROUND)
         return Path(output_path)
     except Exception as e:
         logger.error(f"[FFmpegUtils] 合并视频失败: {e}")
         return None
 
+async def burn_subtitles(input_path: str, subtitles_path: str, output_path: str) -> Union[Path, None]:
+    """
+    成品导出时烧录字幕（.vtt / .ass）：视频重编码，音频流复制。
+    
+    Args:
+        input_path: 输入视频路径
+        subtitles_path: 字幕文件路径
+        output_path: 输出视频路径
+        
+    Returns:
+        Path: 输出视频路径，若失败则返回None
+    """
+    escaped_path = subtitles_path.replace(':', r'\\:')
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-i", input_path,
+        "-vf", f"subtitles='{escaped_path}'",
+        "-c:v", "libx264",
+        "-preset", "superfast",
+        "-crf", "23",
+        "-c:a", "copy",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    try:
+        await run_command(cmd, job_type=JOB_ENCODE, priority=PRIORITY_BACKGROUND)
+        return Path(output_path)
+    except Exception as e:
+        logger.error(f"[FFmpegUtils] 烧录字幕失败: {e}")
+        return None
+
+async def remux_fragmented_mp4(input_path: str) -> bytes:
+    """
+    流复制重封装为 fMP4（每个关键帧一个 moof/mdat，数据偏移相对 moof），经 stdout 返回，不落盘。
+    忽略输入的编辑列表，保留原始样本时间（呈现偏移由调用方按原文件编辑列表处理）。
+
+    Args:
+        input_path: 输入 MP4 路径
+
+    Returns:
+        bytes: fMP4 内容（ftyp + moov + 若干 moof/mdat）
+    """
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-ignore_editlist", "1", "-i", input_path,
+        "-map", "0:v?", "-map", "0:a?",
+        "-c", "copy",
+        "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+        "-f", "mp4", "pipe:1"
+    ]
+    stdout, _ = await run_command(cmd, job_type=JOB_REMUX)
+    return stdout
+
+
 async def change_speed_ffmpeg(audio: np.ndarray, speed: float, sample_rate: int = 24000) -> np.ndarray:
     """使用 FFmpeg 的 atempo 滤镜对 PCM float32 数组进行变速，保持音高不变（异步）。"""
     if speed <= 0:
@@ -264,5 +495,5 @@ async def change_speed_ffmpeg(audio: np.ndarray, speed: float, sample_rate: int
         "-filter:a", f"atempo={speed}",
         "-f", "f32le", "pipe:1"
     ]
-    stdout, _ = await run_command(cmd, input_bytes=audio.tobytes())
+    stdout, _ = await run_command(cmd, input_bytes=audio.tobytes(), job_type=JOB_AUDIO)
     return np.frombuffer(stdout, dtype=np.float32)
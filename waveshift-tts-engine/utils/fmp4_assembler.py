@@ -0,0 +1,668 @@
+"""
+增量成品组装 - 每个混合片段完成时即追加到任务的 fMP4 成品文件，任务结束时不再整体合并
+- 片段经流复制重封装为 fMP4（每个关键帧一个 moof/mdat），取出 moof/mdat 追加到成品文件末尾
+- 成品文件头部 = ftyp + moov + free（预留空间）；moov 只在预留空间内原地重写，片段数据从不移动
+- 片段按累计时长改写 tfdt 落到任务时间轴：按原片段编辑列表扣除 B 帧延迟与 AAC 预编码，
+  后续片段中落在片段起点之前的音频预编码帧直接丢弃
+- H.264/H.265 视频使用 avc3/hev1 样本描述，每个关键帧前带内写入所属片段的参数集（SPS/PPS），
+  流复制与重编码片段的编码参数不同也可直接拼接；其余样本描述（忽略码率）须与首个片段一致
+- finalize 只重写 moov 中的时长字段并在末尾追加 mfra 随机访问索引
+"""
+import asyncio
+import logging
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from utils.ffmpeg_utils import remux_fragmented_mp4
+from utils.mp4_boxes import Box, iter_boxes, make_box, make_full_box, read_top_level_box
+from utils.executors import POOL_IO, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+# 成品时间轴的统一呈现偏移（秒）：解码时间整体后移该值，由编辑列表抵消；
+# 覆盖 B 帧重排延迟与 AAC 预编码，后续片段的延迟不超过该值时解码时间保持单调
+EDIT_HEADROOM = 0.25
+# moov 之后预留的空间（字节），用于新增样本描述与 finalize 改写 moov
+HEADER_RESERVE = 16 * 1024
+
+# tfhd 标志
+_TFHD_BASE_DATA_OFFSET = 0x01
+_TFHD_SAMPLE_DESCRIPTION = 0x02
+_TFHD_DEFAULT_DURATION = 0x08
+_TFHD_DEFAULT_SIZE = 0x10
+_TFHD_DEFAULT_FLAGS = 0x20
+_TFHD_DEFAULT_BASE_MOOF = 0x20000
+# trun 标志（样本字段按此顺序排列）
+_TRUN_DATA_OFFSET = 0x01
+_TRUN_FIRST_FLAGS = 0x04
+_TRUN_SAMPLE_FIELDS = (0x100, 0x200, 0x400, 0x800)  # 时长、大小、标志、合成时间偏移
+_TRUN_DURATION, _TRUN_SIZE, _TRUN_FLAGS, _TRUN_CTO = _TRUN_SAMPLE_FIELDS
+_SAMPLE_NON_SYNC = 0x10000
+
+# 可带内传参数集的视频格式：原格式 -> (成品格式, 配置盒子)
+_INBAND_FORMATS = {
+    b"avc1": (b"avc3", b"avcC"), b"avc3": (b"avc3", b"avcC"),
+    b"hvc1": (b"hev1", b"hvcC"), b"hev1": (b"hev1", b"hvcC"),
+}
+# 样本描述条目中子盒子的起始偏移：盒子头 8 + SampleEntry 8 + Visual 70 / Audio(v0) 20
+_VISUAL_ENTRY_HEADER = 86
+_AUDIO_ENTRY_HEADER = 36
+
+
+def _full_header(payload: bytes) -> Tuple[int, int]:
+    word = struct.unpack_from(">I", payload, 0)[0]
+    return word >> 24, word & 0xFFFFFF
+
+
+def _timescale(payload: bytes) -> int:
+    """mvhd / mdhd 的时间刻度"""
+    version, _ = _full_header(payload)
+    return struct.unpack_from(">I", payload, 20 if version == 1 else 12)[0]
+
+
+def _track_id(trak: Box) -> int:
+    payload = trak.child(b"tkhd").payload
+    version, _ = _full_header(payload)
+    return struct.unpack_from(">I", payload, 20 if version == 1 else 12)[0]
+
+
+def _set_duration(box: Box, duration: int, offset_v0: int, offset_v1: int) -> None:
+    """改写 mvhd / tkhd 的时长字段（32位放不下时取最大值）"""
+    payload = bytearray(box.payload)
+    version, _ = _full_header(payload)
+    if version == 1:
+        struct.pack_into(">Q", payload, offset_v1, duration)
+    else:
+        struct.pack_into(">I", payload, offset_v0, min(duration, 0xFFFFFFFF))
+    box.payload = bytes(payload)
+
+
+def _stsd_entries(payload: bytes) -> List[bytes]:
+    """stsd 中的样本描述条目（完整盒子字节）"""
+    return [payload[offset:offset + size] for _, offset, _, size in iter_boxes(payload, 8)]
+
+
+def _entry_children(entry: bytes, header: int) -> List[Tuple[bytes, bytes]]:
+    return [(box_type, entry[offset + box_header:offset + size]) for box_type, offset, box_header, size in iter_boxes(entry, header)]
+
+
+def _descriptor(data: bytes, position: int) -> Tuple[int, int, int]:
+    """解析 MPEG-4 描述符头，返回 (标签, 内容偏移, 内容长度)"""
+    tag, position, length = data[position], position + 1, 0
+    for _ in range(4):
+        byte = data[position]
+        position += 1
+        length = (length << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+    return tag, position, length
+
+
+def _decoder_specific_info(esds: bytes) -> bytes:
+    """esds 中的 DecoderSpecificInfo（AAC 为 AudioSpecificConfig），不含码率字段"""
+    tag, position, length = _descriptor(esds, 4)
+    if tag != 0x03:
+        return esds
+    flags = esds[position + 2]
+    position += 3 + (2 if flags & 0x80 else 0)
+    if flags & 0x40:
+        position += 1 + esds[position]
+    position += 2 if flags & 0x20 else 0
+    tag, position, length = _descriptor(esds, position)
+    if tag != 0x04:
+        return esds
+    tag, position, length = _descriptor(esds, position + 13)
+    return esds[position:position + length] if tag == 0x05 else b""
+
+
+def _description_key(handler: bytes, entry: bytes) -> bytes:
+    """样本描述的比较键：忽略码率（btrt、esds 码率字段），带内参数集的视频只比较格式与画面尺寸"""
+    sample_format = entry[4:8]
+    if handler == b"vide" and sample_format in _INBAND_FORMATS:
+        return _INBAND_FORMATS[sample_format][0] + entry[32:36]
+    header = {b"vide": _VISUAL_ENTRY_HEADER, b"soun": _AUDIO_ENTRY_HEADER}.get(handler)
+    if header is None:
+        return entry
+    parts = [entry[4:header]]
+    for box_type, payload in _entry_children(entry, header):
+        if box_type == b"esds":
+            parts.append(box_type + _decoder_specific_info(payload))
+        elif box_type != b"btrt":
+            parts.append(box_type + payload)
+    return b"".join(parts)
+
+
+def _parameter_sets(entry: bytes) -> bytes:
+    """样本描述中的 H.264/H.265 参数集，按样本的 NAL 长度前缀格式拼接；非 AVC/HEVC 返回空"""
+    sample_format = entry[4:8]
+    if sample_format not in _INBAND_FORMATS:
+        return b""
+    config_type = _INBAND_FORMATS[sample_format][1]
+    config = next((payload for box_type, payload in _entry_children(entry, _VISUAL_ENTRY_HEADER) if box_type == config_type), None)
+    if config is None:
+        return b""
+    units = []
+    if config_type == b"avcC":
+        length_size = (config[4] & 0x03) + 1
+        position = 5
+        for mask in (0x1F, 0xFF):  # SPS、PPS
+            count = config[position] & mask
+            position += 1
+            for _ in range(count):
+                size = struct.unpack_from(">H", config, position)[0]
+                units.append(config[position + 2:position + 2 + size])
+                position += 2 + size
+    else:
+        length_size = (config[21] & 0x03) + 1
+        position = 23
+        for _ in range(config[22]):
+            count = struct.unpack_from(">H", config, position + 1)[0]
+            position += 3
+            for _ in range(count):
+                size = struct.unpack_from(">H", config, position)[0]
+                units.append(config[position + 2:position + 2 + size])
+                position += 2 + size
+    return b"".join(len(unit).to_bytes(length_size, "big") + unit for unit in units)
+
+
+def _edit_lists(moov_payload: bytes) -> Dict[int, Tuple[float, float]]:
+    """
+    原片段各轨道编辑列表的呈现区间
+
+    Args:
+        moov_payload: 原片段 moov 内容（不含头部）
+
+    Returns:
+        {track_id: (偏移, 时长)}（秒）。偏移 = 起始 media_time 减去起始空编辑时长，
+        正值表示样本呈现时间早于解码时间轴（B 帧延迟、AAC 预编码）；没有编辑列表时长为 0
+    """
+    moov = Box(b"moov", children=Box.parse(moov_payload))
+    movie_timescale = _timescale(moov.child(b"mvhd").payload)
+    edit_lists = {}
+    for trak in moov.all(b"trak"):
+        timescale = _timescale(trak.path(b"mdia", b"mdhd").payload)
+        shift, presentation = 0.0, 0.0
+        elst = trak.path(b"edts", b"elst")
+        if elst is not None:
+            payload = elst.payload
+            version, _ = _full_header(payload)
+            count = struct.unpack_from(">I", payload, 4)[0]
+            position, delay = 8, 0
+            for _ in range(count):
+                if version == 1:
+                    duration, media_time = struct.unpack_from(">Qq", payload, position)
+                    position += 20
+                else:
+                    duration, media_time = struct.unpack_from(">Ii", payload, position)
+                    position += 12
+                if media_time == -1:
+                    delay += duration
+                    continue
+                shift = media_time / timescale - delay / movie_timescale
+                presentation = duration / movie_timescale
+                break
+        edit_lists[_track_id(trak)] = (shift, presentation)
+    return edit_lists
+
+
+@dataclass
+class _Tfhd:
+    track_id: int
+    flags: int
+    sample_description_index: Optional[int] = None
+    default_duration: Optional[int] = None
+    default_size: Optional[int] = None
+    default_flags: Optional[int] = None
+
+    @classmethod
+    def parse(cls, payload: bytes) -> "_Tfhd":
+        _, flags = _full_header(payload)
+        tfhd = cls(struct.unpack_from(">I", payload, 4)[0], flags)
+        position = 8
+        if flags & _TFHD_BASE_DATA_OFFSET:
+            position += 8
+        for flag, name in (
+            (_TFHD_SAMPLE_DESCRIPTION, "sample_description_index"),
+            (_TFHD_DEFAULT_DURATION, "default_duration"),
+            (_TFHD_DEFAULT_SIZE, "default_size"),
+            (_TFHD_DEFAULT_FLAGS, "default_flags"),
+        ):
+            if flags & flag:
+                setattr(tfhd, name, struct.unpack_from(">I", payload, position)[0])
+                position += 4
+        return tfhd
+
+    def serialize(self) -> bytes:
+        """所有默认值显式写出，片段不再依赖原初始化片段的 trex"""
+        flags = (
+            _TFHD_DEFAULT_BASE_MOOF | _TFHD_SAMPLE_DESCRIPTION
+            | _TFHD_DEFAULT_DURATION | _TFHD_DEFAULT_SIZE | _TFHD_DEFAULT_FLAGS
+        )
+        return struct.pack(
+            ">IIIIII", flags, self.track_id, self.sample_description_index,
+            self.default_duration, self.default_size, self.default_flags
+        )
+
+
+@dataclass
+class _Trun:
+    version: int
+    flags: int
+    data_offset: int
+    first_sample_flags: Optional[int]
+    samples: List[List[int]]  # 每个样本的字段值，顺序同 _TRUN_SAMPLE_FIELDS 中存在的字段
+
+    @classmethod
+    def parse(cls, payload: bytes) -> "_Trun":
+        version, flags = _full_header(payload)
+        if not flags & _TRUN_DATA_OFFSET:
+            raise ValueError("trun 缺少 data_offset")
+        count, data_offset = struct.unpack_from(">Ii", payload, 4)
+        position = 12
+        first_sample_flags = None
+        if flags & _TRUN_FIRST_FLAGS:
+            first_sample_flags = struct.unpack_from(">I", payload, position)[0]
+            position += 4
+        fields = [flag for flag in _TRUN_SAMPLE_FIELDS if flags & flag]
+        fmt = ">" + "".join("i" if flag == _TRUN_CTO and version == 1 else "I" for flag in fields)
+        step = 4 * len(fields)
+        samples = [list(struct.unpack_from(fmt, payload, position + i * step)) for i in range(count)]
+        return cls(version, flags, data_offset, first_sample_flags, samples)
+
+    def _field(self, flag: int, default: Optional[int]) -> List[int]:
+        if not self.flags & flag:
+            return [default] * len(self.samples)
+        index = [f for f in _TRUN_SAMPLE_FIELDS if self.flags & f].index(flag)
+        return [sample[index] for sample in self.samples]
+
+    def durations(self, default: int) -> List[int]:
+        return self._field(_TRUN_DURATION, default)
+
+    def sizes(self, default: int) -> List[int]:
+        return self._field(_TRUN_SIZE, default)
+
+    def composition_offsets(self) -> List[int]:
+        return self._field(_TRUN_CTO, 0)
+
+    def sample_flags(self, default: int) -> List[int]:
+        flags = self._field(_TRUN_FLAGS, default)
+        if self.first_sample_flags is not None and flags:
+            flags[0] = self.first_sample_flags
+        return flags
+
+    def grow_sample(self, index: int, length: int, default_size: int) -> None:
+        """样本大小增加 length（trun 没有逐样本大小时补上该字段）"""
+        if not self.flags & _TRUN_SIZE:
+            position = 1 if self.flags & _TRUN_DURATION else 0
+            for sample in self.samples:
+                sample.insert(position, default_size)
+            self.flags |= _TRUN_SIZE
+        position = [f for f in _TRUN_SAMPLE_FIELDS if self.flags & f].index(_TRUN_SIZE)
+        self.samples[index][position] += length
+
+    def first_cto(self) -> int:
+        return self.composition_offsets()[0] if self.samples else 0
+
+    def serialize(self) -> bytes:
+        fields = [flag for flag in _TRUN_SAMPLE_FIELDS if self.flags & flag]
+        fmt = ">" + "".join("i" if flag == _TRUN_CTO and self.version == 1 else "I" for flag in fields)
+        parts = [struct.pack(">IIi", (self.version << 24) | self.flags, len(self.samples), self.data_offset)]
+        if self.first_sample_flags is not None:
+            parts.append(struct.pack(">I", self.first_sample_flags))
+        parts.extend(struct.pack(fmt, *sample) for sample in self.samples)
+        return b"".join(parts)
+
+
+@dataclass
+class _Track:
+    track_id: int
+    timescale: int
+    handler: bytes
+    description: bytes  # 样本描述比较键
+    end: int = 0  # 已写入样本的解码结束时间（轨道刻度）
+    random_access: List[Tuple[int, int]] = field(default_factory=list)  # (呈现时间, moof 文件偏移)
+
+
+@dataclass
+class _SegmentContext:
+    """单个片段的改写参数"""
+    offsets: Dict[int, int]  # 解码时间平移量（轨道刻度）
+    drop: Dict[int, int]  # 丢弃解码结束时间不晚于该值的样本（音频预编码）
+    ends: Dict[int, int]  # 丢弃呈现时间不早于该值的末尾样本（编辑区间之外）
+    parameter_sets: Dict[int, Dict[int, bytes]]  # 各轨道按原样本描述序号，关键帧前带内写入的参数集
+    trex: Dict[int, Tuple[int, int, int, int]]  # 原片段 trex 默认值 (描述序号, 时长, 大小, 标志)
+    durations: Dict[int, int] = field(default_factory=dict)  # 各轨道本片段样本总时长
+
+
+class IncrementalMP4Assembler:
+    """
+    单个任务的增量 fMP4 成品文件
+    append 按片段顺序调用（由混音会话锁串行化）；finalize 后不可再追加
+    """
+
+    def __init__(self, output_path: Union[str, Path], task_id: str = ""):
+        """
+        Args:
+            output_path: 成品文件路径（已存在时覆盖）
+            task_id: 任务ID（日志）
+        """
+        self.path = Path(output_path)
+        self.task_id = task_id
+        self.segment_count = 0
+        self.duration = 0.0  # 已追加的时长（秒）
+        self.finalized = False
+        self.failed = False
+        self._ftyp = b""
+        self._moov: Optional[Box] = None
+        self._tracks: Dict[int, _Track] = {}
+        self._header_size = 0
+        self._size = 0
+        self._sequence = 0
+        self._lock = asyncio.Lock()
+
+    async def append(self, segment_path: Union[str, Path]) -> float:
+        """
+        追加一个已完成的片段
+
+        Returns:
+            float: 片段时长（秒）
+        """
+        async with self._lock:
+            if self.finalized or self.failed:
+                raise RuntimeError(f"成品文件已{'完成' if self.finalized else '失效'}，不能再追加: {self.path}")
+            try:
+                data = await remux_fragmented_mp4(str(segment_path))
+                moov = await run_in_pool(POOL_IO, read_top_level_box, segment_path, b"moov")
+                edit_lists = _edit_lists(moov) if moov else {}
+                duration = await run_in_pool(POOL_IO, self._append_segment, data, edit_lists)
+            except Exception:
+                # 文件只在片段全部改写完成后写入，失败时成品仍停留在上一片段，但不再保证时间轴连续
+                self.failed = True
+                raise
+            self.segment_count += 1
+            self.duration += duration
+            logger.debug(
+                f"[{self.task_id}] 成品追加片段 {self.segment_count}: {Path(segment_path).name}, "
+                f"{duration:.3f}s，累计 {self.duration:.3f}s"
+            )
+            return duration
+
+    async def finalize(self) -> Path:
+        """写入总时长并追加 mfra 索引（重复调用直接返回）"""
+        async with self._lock:
+            if self.finalized:
+                return self.path
+            if self._moov is None:
+                raise RuntimeError("成品文件没有任何片段")
+            await run_in_pool(POOL_IO, self._finalize)
+            self.finalized = True
+            logger.info(
+                f"[{self.task_id}] 成品文件已完成: {self.path}, {self.segment_count} 个片段, "
+                f"{self.duration:.2f}s, {self._size / 1024 / 1024:.1f}MB"
+            )
+            return self.path
+
+    # ------------------------------------------------------------------
+    # 片段改写（工作线程）
+    # ------------------------------------------------------------------
+
+    def _append_segment(self, data: bytes, edit_lists: Dict[int, Tuple[float, float]]) -> float:
+        ftyp, moov, fragments = None, None, []
+        for box_type, offset, header, size in iter_boxes(data):
+            if box_type == b"ftyp":
+                ftyp = data[offset:offset + size]
+            elif box_type == b"moov":
+                moov = Box(b"moov", children=Box.parse(data, offset + header, offset + size))
+            elif box_type == b"moof":
+                fragments.append([offset, offset + size])
+            elif box_type == b"mdat" and fragments and fragments[-1][1] == offset:
+                fragments[-1][1] = offset + size
+        if moov is None:
+            raise ValueError("重封装结果中没有 moov")
+
+        first = self._moov is None
+        if first:
+            self._init_header(ftyp or b"", moov)
+        context = self._segment_context(moov, edit_lists, first)
+
+        blob = bytearray()
+        for start, end in fragments:
+            blob += self._rebase_fragment(data[start:end], context, self._size + len(blob))
+
+        video = [t for t in self._tracks.values() if t.handler == b"vide"]
+        reference = video[0] if video else next(iter(self._tracks.values()))
+        shift, presentation = edit_lists.get(reference.track_id, (0.0, 0.0))
+        duration = presentation or context.durations.get(reference.track_id, 0) / reference.timescale
+        if not presentation and reference.handler != b"vide":
+            duration -= shift
+
+        with open(self.path, "r+b") as f:
+            f.seek(self._size)
+            f.write(blob)
+        self._size += len(blob)
+        return max(duration, 0.0)
+
+    def _init_header(self, ftyp: bytes, moov: Box) -> None:
+        """以首个片段的 moov 建立成品初始化信息：每个轨道加统一编辑列表，mvex 加 mehd，视频改为带内参数集格式"""
+        movie_timescale = _timescale(moov.child(b"mvhd").payload)
+        for trak in moov.all(b"trak"):
+            timescale = _timescale(trak.path(b"mdia", b"mdhd").payload)
+            elst = make_full_box(b"elst", 1, 0, struct.pack(">IQqhh", 1, 0, round(EDIT_HEADROOM * timescale), 1, 0))
+            trak.children = [box for box in trak.children if box.type != b"edts"]
+            trak.children.insert(1, Box(b"edts", children=Box.parse(elst)))
+            handler = trak.path(b"mdia", b"hdlr").payload[8:12]
+            stsd = trak.path(b"mdia", b"minf", b"stbl", b"stsd")
+            entries = _stsd_entries(stsd.payload)
+            if handler == b"vide" and entries[0][4:8] in _INBAND_FORMATS:
+                entries[0] = entries[0][:4] + _INBAND_FORMATS[entries[0][4:8]][0] + entries[0][8:]
+                stsd.payload = stsd.payload[:8] + b"".join(entries)
+            self._tracks[_track_id(trak)] = _Track(
+                track_id=_track_id(trak),
+                timescale=timescale,
+                handler=handler,
+                description=_description_key(handler, entries[0])
+            )
+        mvex = moov.child(b"mvex")
+        if mvex is not None and mvex.child(b"mehd") is None:
+            mvex.children.insert(0, Box(b"mehd", make_full_box(b"mehd", 1, 0, struct.pack(">Q", 0))[8:]))
+        self._movie_timescale = movie_timescale
+        self._ftyp = ftyp
+        self._moov = moov
+        moov_size = len(moov.serialize())
+        self._header_size = len(ftyp) + moov_size + HEADER_RESERVE
+        with open(self.path, "wb") as f:
+            f.write(self._header_bytes())
+        self._size = self._header_size
+
+    def _header_bytes(self) -> bytes:
+        """ftyp + moov + free 填充到固定的头部长度"""
+        head = self._ftyp + self._moov.serialize()
+        padding = self._header_size - len(head)
+        if padding < 8:
+            raise ValueError("moov 超出预留空间")
+        return head + make_box(b"free", bytes(padding - 8))
+
+    def _segment_context(self, moov: Box, edit_lists: Dict[int, Tuple[float, float]], first: bool) -> _SegmentContext:
+        trex = {}
+        mvex = moov.child(b"mvex")
+        for box in mvex.all(b"trex") if mvex is not None else []:
+            track_id, *defaults = struct.unpack_from(">IIIII", box.payload, 4)
+            trex[track_id] = tuple(defaults)
+
+        context = _SegmentContext(offsets={}, drop={}, ends={}, parameter_sets={}, trex=trex)
+        track_ids = set()
+        for trak in moov.all(b"trak"):
+            track_id = _track_id(trak)
+            track_ids.add(track_id)
+            track = self._tracks.get(track_id)
+            timescale = _timescale(trak.path(b"mdia", b"mdhd").payload)
+            if track is None or track.timescale != timescale:
+                raise ValueError(f"片段轨道 {track_id} 与成品不一致（时间刻度 {timescale}）")
+            shift, presentation = edit_lists.get(track_id, (0.0, 0.0))
+            context.offsets[track_id] = round((self.duration + EDIT_HEADROOM - shift) * timescale)
+            # 后续片段开头的 AAC 预编码帧落在片段起点之前，与上一片段末尾重叠，直接丢弃
+            if not first and track.handler == b"soun" and shift > 0:
+                context.drop[track_id] = round(shift * timescale)
+            # 流复制裁切的片段末尾可能带有呈现时间超出编辑区间的样本，与下一片段重叠，直接丢弃
+            if presentation > 0:
+                context.ends[track_id] = round((shift + presentation) * timescale)
+
+            # 成品每个轨道只有一个样本描述：编码参数差异通过带内参数集承载，其余须一致
+            parameter_sets = {}
+            for index, entry in enumerate(_stsd_entries(trak.path(b"mdia", b"minf", b"stbl", b"stsd").payload), 1):
+                if _description_key(track.handler, entry) != track.description:
+                    raise ValueError(f"片段轨道 {track_id} 的样本描述与成品不兼容（{entry[4:8].decode(errors='replace')}）")
+                parameter_sets[index] = _parameter_sets(entry)
+            context.parameter_sets[track_id] = parameter_sets
+        if track_ids != set(self._tracks):
+            raise ValueError(f"片段轨道 {sorted(track_ids)} 与成品 {sorted(self._tracks)} 不一致")
+        return context
+
+    def _rebase_fragment(self, fragment: bytes, context: _SegmentContext, file_offset: int) -> bytes:
+        """改写单个 moof/mdat：时间戳平移、丢弃预编码帧、显式默认值与样本描述序号、重新编号"""
+        _, _, header, moof_size = next(iter_boxes(fragment))
+        moof = Box(b"moof", children=Box.parse(fragment, header, moof_size))
+        edits: List[Tuple[int, int, bytes]] = []  # 媒体数据改动 (片段内偏移, 删除长度, 插入内容)
+        trun_boxes: List[Tuple[Box, _Trun]] = []
+
+        for traf in moof.all(b"traf"):
+            tfhd_box = traf.child(b"tfhd")
+            tfhd = _Tfhd.parse(tfhd_box.payload)
+            if tfhd.flags & _TFHD_BASE_DATA_OFFSET or not tfhd.flags & _TFHD_DEFAULT_BASE_MOOF:
+                raise ValueError("仅支持数据偏移相对 moof 的 fMP4")
+            track = self._tracks[tfhd.track_id]
+            trex = context.trex.get(tfhd.track_id, (1, 0, 0, 0))
+            source_index = tfhd.sample_description_index or trex[0]
+            tfhd.sample_description_index = 1
+            tfhd.default_duration = tfhd.default_duration if tfhd.default_duration is not None else trex[1]
+            tfhd.default_size = tfhd.default_size if tfhd.default_size is not None else trex[2]
+            tfhd.default_flags = tfhd.default_flags if tfhd.default_flags is not None else trex[3]
+            tfhd_box.payload = tfhd.serialize()
+
+            tfdt_box = traf.child(b"tfdt")
+            version, _ = _full_header(tfdt_box.payload)
+            decode_time = struct.unpack_from(">Q" if version == 1 else ">I", tfdt_box.payload, 4)[0]
+            truns = [(box, _Trun.parse(box.payload)) for box in traf.all(b"trun")]
+
+            limit = context.drop.pop(tfhd.track_id, 0)
+            if limit and truns:
+                trun = truns[0][1]
+                durations = trun.durations(tfhd.default_duration)
+                sizes = trun.sizes(tfhd.default_size)
+                count = 0
+                while count < len(durations) - 1 and decode_time + durations[count] <= limit:
+                    decode_time += durations[count]
+                    count += 1
+                if count:
+                    dropped = sum(sizes[:count])
+                    edits.append((trun.data_offset, dropped, b""))
+                    trun.data_offset += dropped
+                    trun.samples = trun.samples[count:]
+
+            end = context.ends.get(tfhd.track_id)
+            if end is not None:
+                starts, time = [], decode_time
+                for _, trun in truns:
+                    starts.append(time)
+                    time += sum(trun.durations(tfhd.default_duration))
+                # 只丢弃解码顺序末尾的样本，保留的样本不会参考被丢弃的样本
+                for (_, trun), start in reversed(list(zip(truns, starts))):
+                    durations = trun.durations(tfhd.default_duration)
+                    sizes = trun.sizes(tfhd.default_size)
+                    ctos = trun.composition_offsets()
+                    times = [start + sum(durations[:index]) for index in range(len(durations))]
+                    keep = len(trun.samples)
+                    while keep and times[keep - 1] + ctos[keep - 1] >= end:
+                        keep -= 1
+                    if keep < len(trun.samples):
+                        edits.append((trun.data_offset + sum(sizes[:keep]), sum(sizes[keep:]), b""))
+                        trun.samples = trun.samples[:keep]
+                    if keep:
+                        break
+
+            prefix = context.parameter_sets.get(tfhd.track_id, {}).get(source_index)
+            if prefix:
+                for _, trun in truns:
+                    position = trun.data_offset
+                    sizes = trun.sizes(tfhd.default_size)
+                    for index, flags in enumerate(trun.sample_flags(tfhd.default_flags)):
+                        if not flags & _SAMPLE_NON_SYNC:
+                            edits.append((position, 0, prefix))
+                            trun.grow_sample(index, len(prefix), tfhd.default_size)
+                        position += sizes[index]
+
+            duration = sum(sum(trun.durations(tfhd.default_duration)) for _, trun in truns)
+            new_time = decode_time + context.offsets[tfhd.track_id]
+            if new_time < track.end:
+                if track.end - new_time > tfhd.default_duration:
+                    logger.debug(f"[{self.task_id}] 轨道 {track.track_id} 解码时间回退 {track.end - new_time}，已顺延")
+                new_time = track.end
+            track.end = new_time + duration
+            context.durations[track.track_id] = context.durations.get(track.track_id, 0) + duration
+            tfdt_box.payload = struct.pack(">IQ", 1 << 24, new_time)
+            if truns and truns[0][1].samples:
+                track.random_access.append((new_time + truns[0][1].first_cto(), file_offset))
+            trun_boxes.extend(truns)
+
+        self._sequence += 1
+        moof.child(b"mfhd").payload = struct.pack(">II", 0, self._sequence)
+
+        # 字段长度固定：先序列化得到新 moof 长度，再修正数据偏移
+        for box, trun in trun_boxes:
+            box.payload = trun.serialize()
+        delta = len(moof.serialize()) - moof_size
+        for box, trun in trun_boxes:
+            # 删除区间位于数据起点之前、插入点严格位于数据起点之前的改动才移动该 trun 的数据
+            moved = sum(
+                len(inserted) - length for start, length, inserted in edits
+                if (start + length <= trun.data_offset if length else start < trun.data_offset)
+            )
+            trun.data_offset += delta + moved
+            box.payload = trun.serialize()
+        new_moof = moof.serialize()
+
+        media = fragment[moof_size:]
+        if not edits:
+            return new_moof + media
+        mdat_boxes = list(iter_boxes(media))
+        if len(mdat_boxes) != 1:
+            raise ValueError("改写样本数据时要求每个 moof 之后只有一个 mdat")
+        _, _, mdat_header, _ = mdat_boxes[0]
+        chunks, position = [], moof_size + mdat_header
+        for start, length, inserted in sorted(edits, key=lambda edit: edit[0]):
+            chunks.append(fragment[position:start])
+            chunks.append(inserted)
+            position = start + length
+        chunks.append(fragment[position:])
+        return new_moof + make_box(b"mdat", b"".join(chunks))
+
+    def _finalize(self) -> None:
+        movie_duration = round(self.duration * self._movie_timescale)
+        _set_duration(self._moov.child(b"mvhd"), movie_duration, 16, 24)
+        for trak in self._moov.all(b"trak"):
+            _set_duration(trak.child(b"tkhd"), movie_duration, 20, 28)
+            elst = trak.path(b"edts", b"elst")
+            payload = bytearray(elst.payload)
+            struct.pack_into(">Q", payload, 8, movie_duration)
+            elst.payload = bytes(payload)
+        mehd = self._moov.path(b"mvex", b"mehd")
+        if mehd is not None:
+            mehd.payload = struct.pack(">IQ", 1 << 24, movie_duration)
+
+        tfras = []
+        for track in self._tracks.values():
+            entries = b"".join(struct.pack(">QQBBB", time, offset, 1, 1, 1) for time, offset in track.random_access)
+            tfras.append(make_full_box(
+                b"tfra", 1, 0, struct.pack(">III", track.track_id, 0, len(track.random_access)) + entries
+            ))
+        body = b"".join(tfras)
+        mfra = make_box(b"mfra", body + make_full_box(b"mfro", 0, 0, struct.pack(">I", len(body) + 8 + 16)))
+
+        with open(self.path, "r+b") as f:
+            f.write(self._header_bytes())
+            f.seek(self._size)
+            f.write(mfra)
+            f.truncate()
+        self._size += len(mfra)
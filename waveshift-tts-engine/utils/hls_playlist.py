@@ -0,0 +1,348 @@
+"""
+HLS 播放列表 - 只追加的媒体播放列表写入、LL-HLS 部分片段（EXT-X-PART）规划、主播放列表
+- 每个 GOP 在关键帧处切开，GOP 内部再均分为不超过部分目标时长的部分片段（关键帧起始的部分标记 INDEPENDENT）
+- 部分片段按顺序拼接为完整片段文件，播放列表中以 BYTERANGE 引用
+- 播放列表文件只追加新增内容：头部写一次，之后每次只在正文末尾写入增量并重写尾部（预加载提示/结束标记）
+"""
+import logging
+import math
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 关键帧与切分点的匹配容差（秒）
+CUT_TOLERANCE = 0.02
+# B 帧重排导致实际切分点滞后于计划点的余量（秒），规划时从部分目标时长中扣除
+REORDER_MARGIN = 0.12
+
+
+@dataclass
+class HLSPart:
+    """部分片段"""
+    duration: float
+    uri: str
+    byterange: Optional[Tuple[int, int]] = None  # (长度, 偏移)
+    independent: bool = False
+
+    def render(self) -> str:
+        attrs = [f"DURATION={self.duration:.3f}", f'URI="{self.uri}"']
+        if self.byterange:
+            attrs.append(f'BYTERANGE="{self.byterange[0]}@{self.byterange[1]}"')
+        if self.independent:
+            attrs.append("INDEPENDENT=YES")
+        return "#EXT-X-PART:" + ",".join(attrs)
+
+
+@dataclass
+class HLSSegment:
+    """完整片段（可由若干部分片段组成）"""
+    uri: str
+    duration: float
+    parts: List[HLSPart] = field(default_factory=list)
+    discontinuity: bool = False
+    # fMP4 初始化片段（EXT-X-MAP），仅在与上一片段不同时设置
+    init_uri: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HLSSegment":
+        data = dict(data)
+        data["parts"] = [
+            HLSPart(**{**part, "byterange": tuple(part["byterange"]) if part.get("byterange") else None})
+            for part in data.get("parts") or []
+        ]
+        return cls(**data)
+
+    def render(self) -> str:
+        lines = []
+        if self.discontinuity:
+            lines.append("#EXT-X-DISCONTINUITY")
+        if self.init_uri:
+            lines.append(f'#EXT-X-MAP:URI="{self.init_uri}"')
+        lines.extend(part.render() for part in self.parts)
+        lines.append(f"#EXTINF:{self.duration:.3f},")
+        lines.append(self.uri)
+        return "\n".join(lines) + "\n"
+
+
+def plan_part_cuts(
+    keyframes: Sequence[float],
+    duration: float,
+    part_target: float
+) -> Tuple[List[float], List[bool]]:
+    """
+    规划部分片段切分点
+
+    Args:
+        keyframes: 关键帧 pts（秒，升序）
+        duration: 视频时长（秒）
+        part_target: 部分目标时长（秒）
+
+    Returns:
+        (切分点列表（不含0）, 每个部分片段是否以关键帧开始)
+    """
+    budget = max(part_target - REORDER_MARGIN, part_target * 0.5)
+    anchors = [0.0] + [k for k in keyframes if CUT_TOLERANCE < k < duration - CUT_TOLERANCE] + [duration]
+    cuts: List[float] = []
+    independent: List[bool] = []
+    for start, end in zip(anchors, anchors[1:]):
+        pieces = max(1, math.ceil((end - start) / budget - 1e-6))
+        step = (end - start) / pieces
+        for index in range(pieces):
+            t = start + index * step
+            if t > 0:
+                cuts.append(round(t, 3))
+            # 除视频开头外，每个区间都从关键帧开始
+            independent.append(index == 0)
+    # 首个部分片段：视频从关键帧开始时才独立
+    if independent:
+        independent[0] = any(abs(k) <= CUT_TOLERANCE for k in keyframes)
+    return cuts, independent
+
+
+def group_parts(durations: Sequence[float], segment_target: float) -> List[List[int]]:
+    """
+    将部分片段按顺序分组为完整片段，每组时长不超过片段目标时长（单个部分片段超长时独占一组）
+
+    Returns:
+        每个完整片段包含的部分片段下标
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_duration = 0.0
+    for index, part_duration in enumerate(durations):
+        if current and current_duration + part_duration > segment_target + 1e-3:
+            groups.append(current)
+            current, current_duration = [], 0.0
+        current.append(index)
+        current_duration += part_duration
+    if current:
+        groups.append(current)
+    return groups
+
+
+def concat_part_files(part_paths: Sequence[Union[str, Path]], segment_path: Union[str, Path]) -> List[Tuple[int, int]]:
+    """
+    将部分片段文件按顺序拼接为完整片段文件（mpegts 可直接拼接），并删除部分片段文件
+
+    Returns:
+        每个部分片段在完整片段中的 (长度, 偏移)
+    """
+    ranges = []
+    offset = 0
+    with open(segment_path, "wb") as out:
+        for part_path in part_paths:
+            with open(part_path, "rb") as f:
+                data = f.read()
+            out.write(data)
+            ranges.append((len(data), offset))
+            offset += len(data)
+    for part_path in part_paths:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+    return ranges
+
+
+def render_master_playlist(
+    video_uri: str,
+    audio_uri: str,
+    bandwidth: int,
+    codecs: str,
+    resolution: Optional[str] = None,
+    audio_group: str = "dub",
+    audio_name: str = "Dubbed",
+    audio_channels: int = 1,
+    subtitles_uri: Optional[str] = None,
+    subtitles_language: Optional[str] = None,
+    subtitles_group: str = "subs",
+    subtitles_name: str = "Subtitles"
+) -> str:
+    """
+    主播放列表：视频变体 + 独立的配音音频演绎（EXT-X-MEDIA TYPE=AUDIO）+ 可选 WebVTT 字幕演绎
+
+    Args:
+        video_uri: 视频媒体播放列表 URI
+        audio_uri: 音频媒体播放列表 URI
+        bandwidth: 视频+音频峰值码率（bit/s）
+        codecs: 视频与音频编码（如 "avc1.64001f,mp4a.40.2"）
+        resolution: 分辨率（如 "1280x720"）
+        subtitles_uri: 字幕媒体播放列表 URI（None 表示无字幕演绎）
+        subtitles_language: 字幕语言（如 "zh"）
+    """
+    stream_attrs = [f"BANDWIDTH={bandwidth}"]
+    if resolution:
+        stream_attrs.append(f"RESOLUTION={resolution}")
+    stream_attrs += [f'CODECS="{codecs}"', f'AUDIO="{audio_group}"']
+    media = [
+        f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{audio_group}",NAME="{audio_name}",'
+        f'DEFAULT=YES,AUTOSELECT=YES,CHANNELS="{audio_channels}",URI="{audio_uri}"',
+    ]
+    if subtitles_uri:
+        language = f'LANGUAGE="{subtitles_language}",' if subtitles_language else ""
+        media.append(
+            f'#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="{subtitles_group}",NAME="{subtitles_name}",'
+            f'{language}DEFAULT=YES,AUTOSELECT=YES,FORCED=NO,URI="{subtitles_uri}"'
+        )
+        stream_attrs.append(f'SUBTITLES="{subtitles_group}"')
+    return "\n".join([
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+        *media,
+        "#EXT-X-STREAM-INF:" + ",".join(stream_attrs),
+        video_uri,
+    ]) + "\n"
+
+
+class MediaPlaylistWriter:
+    """
+    只追加的 HLS 媒体播放列表
+    文件 = 头部 + 正文（只增不改）+ 尾部（EXT-X-ENDLIST 等，每次重写）
+    每次更新只从正文末尾写入 增量正文 + 新尾部，并截断到新长度
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        segment_target: float,
+        playlist_type: str = "EVENT",
+        media_sequence: int = 0,
+        version: int = 6,
+        extra_header: Sequence[str] = ()
+    ):
+        """
+        Args:
+            path: 播放列表文件路径
+            segment_target: 片段目标时长（秒）
+            playlist_type: EVENT / VOD
+            media_sequence: 起始媒体序列号
+            version: EXT-X-VERSION
+            extra_header: 追加到头部的标签行
+        """
+        self.path = Path(path)
+        self.segment_target = segment_target
+        self.header = "\n".join([
+            "#EXTM3U",
+            f"#EXT-X-VERSION:{version}",
+            f"#EXT-X-TARGETDURATION:{int(math.ceil(segment_target))}",
+            f"#EXT-X-PLAYLIST-TYPE:{playlist_type}",
+            f"#EXT-X-MEDIA-SEQUENCE:{media_sequence}",
+            *extra_header,
+        ]) + "\n"
+        self._body: List[str] = []
+        self._body_end = 0  # 正文在文件中的结束偏移（字节）
+        self._tail = ""
+        self.segments: List[HLSSegment] = []
+        self.ended = False
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.segments)
+
+    def open(self):
+        """写入头部（覆盖已有文件）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = self.header.encode("utf-8")
+        with open(self.path, "wb") as f:
+            f.write(data)
+        self._body_end = len(data)
+        self._tail = ""
+
+    def resume(self, segments: Sequence[HLSSegment], ended: bool = False):
+        """从已写出的片段恢复（进程重启后继续追加）：按片段列表重写播放列表文件"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.segments = list(segments)
+        self._body = [segment.render() for segment in self.segments]
+        data = (self.header + "".join(self._body)).encode("utf-8")
+        self._tail = "#EXT-X-ENDLIST\n" if ended else ""
+        with open(self.path, "wb") as f:
+            f.write(data + self._tail.encode("utf-8"))
+        self._body_end = len(data)
+        self.ended = ended
+
+    def append(self, segments: Sequence[HLSSegment], tail: str = ""):
+        """
+        追加片段，并把尾部替换为 tail（结束后再追加会移除结束标记）
+
+        Args:
+            segments: 新增片段
+            tail: 新尾部内容
+        """
+        delta = "".join(segment.render() for segment in segments)
+        self._write(delta, tail)
+        self.segments.extend(segments)
+        self.ended = False
+
+    def end(self):
+        """标记播放列表结束"""
+        self._write("", "#EXT-X-ENDLIST\n")
+        self.ended = True
+
+    def _write(self, delta: str, tail: str):
+        if self._body_end == 0:
+            self.open()
+        delta_bytes = delta.encode("utf-8")
+        with open(self.path, "r+b") as f:
+            f.seek(self._body_end)
+            f.write(delta_bytes)
+            f.write(tail.encode("utf-8"))
+            f.truncate()
+        self._body.append(delta)
+        self._body_end += len(delta_bytes)
+        self._tail = tail
+
+    def dumps(self) -> str:
+        """完整播放列表内容（用于上传）"""
+        return self.header + "".join(self._body) + self._tail
+
+
+class LLHLSPlaylistWriter(MediaPlaylistWriter):
+    """
+    只追加的 LL-HLS 媒体播放列表
+    尾部为可选的预加载提示（仅提示已可请求的部分片段），结束时替换为 EXT-X-ENDLIST
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        segment_target: float,
+        part_target: float,
+        playlist_type: str = "EVENT",
+        media_sequence: int = 0,
+        version: int = 6
+    ):
+        """
+        Args:
+            path: 播放列表文件路径
+            segment_target: 片段目标时长（秒）
+            part_target: 部分目标时长（秒）
+            playlist_type: EVENT / VOD
+            media_sequence: 起始媒体序列号
+            version: EXT-X-VERSION
+        """
+        super().__init__(
+            path, segment_target, playlist_type, media_sequence, version,
+            extra_header=[
+                f"#EXT-X-SERVER-CONTROL:PART-HOLD-BACK={3 * part_target:.3f}",
+                f"#EXT-X-PART-INF:PART-TARGET={part_target:.3f}",
+            ]
+        )
+        self.part_target = part_target
+
+    def append(self, segments: Sequence[HLSSegment], preload_hint: Optional[str] = None):
+        """
+        追加完整片段，并把尾部更新为预加载提示
+
+        Args:
+            segments: 新增片段
+            preload_hint: 下一个部分片段的 URI，须指向已存在（正在写入）的文件；None 表示不提示
+        """
+        tail = f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="{preload_hint}",BYTERANGE-START=0\n' if preload_hint else ""
+        super().append(segments, tail)
@@ -0,0 +1,329 @@
+"""
+分离演绎的 HLS 输出 - 主播放列表 + 视频演绎 + 配音音频演绎
+- 视频只在任务初始化时流复制切分一次（fMP4，关键帧处切分，不重编码）
+- 每个批次只把混合后的 PCM 编码为 AAC 并切分为 fMP4 片段，追加到只追加的音频播放列表
+- 每次编码的时间戳从0开始，写入播放列表前改写片段的 tfdt/sidx，使其落在任务时间轴上
+- 批次音频按 AAC 帧（1024 样本）对齐编码，不足一帧的尾部留到下一批次或 flush
+- 每次编码以一帧预编码（priming）开始：时间戳前移一帧使正文对齐时间轴，该帧与上一批次末帧重叠
+- 每次追加后保存续写状态（renditions.state.json），引擎重启后 restore 继续追加，不重新切分视频
+"""
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import m3u8
+import numpy as np
+
+from utils.ffmpeg_utils import hls_copy_video_fmp4, hls_encode_audio_fmp4
+from utils.hls_playlist import HLSSegment, MediaPlaylistWriter, render_master_playlist
+from utils.mp4_boxes import read_timescale, shift_fragment_times
+from utils.executors import POOL_IO, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+# AAC-LC 每帧样本数（也是编码器预编码的时长）
+AAC_FRAME = 1024
+AAC_CODEC = "mp4a.40.2"
+
+MASTER_PLAYLIST = "master.m3u8"
+VIDEO_PLAYLIST = "video.m3u8"
+AUDIO_PLAYLIST = "audio.m3u8"
+_VIDEO_ONLY_MASTER = "video_master.m3u8"
+_VIDEO_INIT = "video_init.mp4"
+STATE_NAME = "renditions.state.json"
+
+
+def _parse_bitrate(bitrate: str) -> int:
+    """解析 ffmpeg 码率字符串（如 '128k'）为 bit/s"""
+    text = bitrate.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+class DubbedHLSRenditions:
+    """
+    单个任务的分离演绎 HLS 输出
+    prepare_video 在任务初始化时调用一次；append_audio 按批次顺序调用（由混音会话锁串行化）
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        output_dir: Union[str, Path],
+        sample_rate: int,
+        segment_seconds: float = 4,
+        audio_bitrate: str = "128k"
+    ):
+        """
+        Args:
+            task_id: 任务ID
+            output_dir: 输出目录（主播放列表、两个媒体播放列表及全部片段）
+            sample_rate: 混合音频采样率
+            segment_seconds: 片段目标时长（秒）
+            audio_bitrate: AAC 码率
+        """
+        self.task_id = task_id
+        self.output_dir = Path(output_dir)
+        self.sample_rate = sample_rate
+        self.segment_seconds = segment_seconds
+        self.audio_bitrate = audio_bitrate
+        # 音频片段时长可能因帧对齐略超目标时长，目标时长取整后留一秒余量
+        self.audio_writer = MediaPlaylistWriter(
+            self.output_dir / AUDIO_PLAYLIST, segment_seconds + 1, playlist_type="EVENT", version=7,
+            extra_header=["#EXT-X-INDEPENDENT-SEGMENTS"]
+        )
+        self.video_ready = False
+        # 下一个编码样本在时间轴上的位置：时间轴最前一帧由首次编码的预编码帧占据
+        self._encoded = AAC_FRAME
+        # 不足一帧、尚未编码的尾部样本（紧接 _encoded）
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._batch = 0
+        self._init_data: Optional[bytes] = None
+        self._init_uri: Optional[str] = None  # _init_data 对应的初始化片段
+        self._master_args: dict = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def master_path(self) -> Path:
+        return self.output_dir / MASTER_PLAYLIST
+
+    @property
+    def audio_end(self) -> float:
+        """音频演绎已覆盖到的时间轴位置（秒，含未编码尾部）"""
+        return (self._encoded + len(self._pending)) / self.sample_rate
+
+    @property
+    def audio_playlist_path(self) -> Path:
+        return self.output_dir / AUDIO_PLAYLIST
+
+    @property
+    def video_playlist_path(self) -> Path:
+        return self.output_dir / VIDEO_PLAYLIST
+
+    @property
+    def state_path(self) -> Path:
+        return self.output_dir / STATE_NAME
+
+    @classmethod
+    def restore(cls, task_id: str, output_dir: Union[str, Path]) -> Optional["DubbedHLSRenditions"]:
+        """
+        从输出目录中的续写状态恢复（同步文件操作，应在线程池中调用）
+        视频演绎与主播放列表沿用已有文件，音频演绎从上次的时间轴位置继续追加
+
+        Returns:
+            恢复的演绎输出；没有续写状态或视频尚未切分完成时返回 None
+        """
+        output_dir = Path(output_dir)
+        state_path = output_dir / STATE_NAME
+        if not state_path.exists():
+            return None
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        if not state["video_ready"] or not (output_dir / MASTER_PLAYLIST).exists():
+            return None
+        renditions = cls(
+            task_id, output_dir, state["sample_rate"], state["segment_seconds"], state["audio_bitrate"]
+        )
+        renditions.video_ready = True
+        renditions._encoded = state["encoded"]
+        renditions._pending = np.asarray(state["pending"], dtype=np.float32)
+        renditions._batch = state["batch"]
+        renditions._master_args = state["master_args"]
+        renditions._init_uri = state["init_uri"]
+        if renditions._init_uri:
+            renditions._init_data = (output_dir / renditions._init_uri).read_bytes()
+        renditions.audio_writer.resume(
+            [HLSSegment.from_dict(s) for s in state["segments"]], ended=state["ended"]
+        )
+        logger.info(
+            f"[{task_id}] 分离演绎已恢复: {renditions.audio_writer.segment_count} 个音频片段，"
+            f"时间轴至 {renditions.audio_end:.2f}s"
+        )
+        return renditions
+
+    async def prepare_video(self, video_path: str) -> List[str]:
+        """
+        流复制切分视频演绎并写出主播放列表
+
+        Returns:
+            视频演绎的文件路径（初始化片段与媒体片段）
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        await hls_copy_video_fmp4(
+            input_path=video_path,
+            output_dir=str(self.output_dir),
+            playlist_name=VIDEO_PLAYLIST,
+            init_name=_VIDEO_INIT,
+            segment_pattern="video_%04d.m4s",
+            master_name=_VIDEO_ONLY_MASTER,
+            hls_time=self.segment_seconds
+        )
+        video_master_path = self.output_dir / _VIDEO_ONLY_MASTER
+        video_master = await run_in_pool(POOL_IO, m3u8.load, str(video_master_path))
+        stream_info = video_master.playlists[0].stream_info if video_master.playlists else None
+        video_bandwidth = (stream_info.bandwidth or 0) if stream_info else 0
+        video_codecs = (stream_info.codecs or "") if stream_info else ""
+        resolution = "{}x{}".format(*stream_info.resolution) if stream_info and stream_info.resolution else None
+
+        self._master_args = dict(
+            video_uri=VIDEO_PLAYLIST,
+            audio_uri=AUDIO_PLAYLIST,
+            bandwidth=video_bandwidth + _parse_bitrate(self.audio_bitrate),
+            codecs=",".join(c for c in (video_codecs, AAC_CODEC) if c),
+            resolution=resolution
+        )
+        master = render_master_playlist(**self._master_args)
+        await run_in_pool(POOL_IO, self.master_path.write_text, master, "utf-8")
+        await run_in_pool(POOL_IO, self.audio_writer.open)
+        await run_in_pool(POOL_IO, video_master_path.unlink)
+        self.video_ready = True
+        await run_in_pool(POOL_IO, self._save_state)
+        files = await run_in_pool(POOL_IO, self._video_files)
+        logger.info(f"[{self.task_id}] 视频演绎已切分（流复制，{len(files)} 个文件），主播放列表: {self.master_path}")
+        return files
+
+    async def set_subtitles(self, playlist_uri: str, language: Optional[str] = None) -> str:
+        """
+        在主播放列表中加入 WebVTT 字幕演绎（字幕播放列表与主播放列表同目录）
+
+        Returns:
+            主播放列表路径
+        """
+        self._master_args.update(subtitles_uri=playlist_uri, subtitles_language=language)
+        master = render_master_playlist(**self._master_args)
+        await run_in_pool(POOL_IO, self.master_path.write_text, master, "utf-8")
+        await run_in_pool(POOL_IO, self._save_state)
+        logger.info(f"[{self.task_id}] 主播放列表已加入字幕演绎: {playlist_uri}")
+        return str(self.master_path)
+
+    async def append_audio(self, audio: np.ndarray, start_time: float) -> List[str]:
+        """
+        追加一个批次的混合音频；与已有音频之间的空隙补静音，重叠部分以已有音频为准
+
+        Args:
+            audio: 单声道 float32 PCM
+            start_time: 批次在时间轴上的起点（秒）
+
+        Returns:
+            新生成的文件路径（初始化片段与媒体片段）
+        """
+        async with self._lock:
+            position = self._encoded + len(self._pending)
+            start = int(round(start_time * self.sample_rate))
+            if start >= position:
+                data = [self._pending, np.zeros(start - position, dtype=np.float32), audio]
+            else:
+                data = [self._pending, audio[position - start:]]
+            data = np.concatenate([np.asarray(part, dtype=np.float32) for part in data])
+            usable = len(data) // AAC_FRAME * AAC_FRAME
+            self._pending = data[usable:]
+            files = await self._encode(data[:usable]) if usable else []
+            await run_in_pool(POOL_IO, self._save_state)
+            return files
+
+    async def flush(self) -> List[str]:
+        """编码不足一帧的尾部（补静音到整帧）"""
+        async with self._lock:
+            if len(self._pending) == 0:
+                return []
+            data = np.concatenate([self._pending, np.zeros(AAC_FRAME - len(self._pending), dtype=np.float32)])
+            self._pending = np.zeros(0, dtype=np.float32)
+            files = await self._encode(data)
+            await run_in_pool(POOL_IO, self._save_state)
+            return files
+
+    async def finalize(self) -> List[str]:
+        """输出剩余音频并结束音频播放列表（之后仍可追加，追加时移除结束标记）"""
+        files = await self.flush()
+        async with self._lock:
+            await run_in_pool(POOL_IO, self.audio_writer.end)
+            await run_in_pool(POOL_IO, self._save_state)
+        return files
+
+    async def _encode(self, pcm: np.ndarray) -> List[str]:
+        """编码一段帧对齐的音频，平移时间戳后追加到音频播放列表"""
+        batch = self._batch
+        temp_playlist = self.output_dir / f"audio_{batch:04d}.m3u8"
+        init_name = f"audio_init_{batch:04d}.mp4"
+        await hls_encode_audio_fmp4(
+            audio_data=pcm,
+            sample_rate=self.sample_rate,
+            output_dir=str(self.output_dir),
+            playlist_name=temp_playlist.name,
+            init_name=init_name,
+            segment_pattern=f"audio_{batch:04d}_%03d.m4s",
+            # 含预编码帧与帧对齐余量，避免批次末尾切出只有一两帧的片段
+            hls_time=self.segment_seconds + 2 * AAC_FRAME / self.sample_rate,
+            bitrate=self.audio_bitrate
+        )
+        segments, files = await run_in_pool(POOL_IO, self._collect_segments, temp_playlist, init_name)
+        await run_in_pool(POOL_IO, self.audio_writer.append, segments)
+        self._encoded += len(pcm)
+        self._batch += 1
+        logger.info(
+            f"[{self.task_id}] 音频演绎追加 {len(segments)} 个片段，时长 {len(pcm) / self.sample_rate:.2f}s，"
+            f"时间轴至 {self._encoded / self.sample_rate:.2f}s"
+        )
+        return files
+
+    def _video_files(self) -> List[str]:
+        return [str(self.output_dir / _VIDEO_INIT)] + [str(p) for p in sorted(self.output_dir.glob("video_*.m4s"))]
+
+    def _save_state(self) -> None:
+        """原子写入续写状态（时间轴位置、未编码尾部、已写出的音频片段与主播放列表参数）"""
+        state = {
+            "sample_rate": self.sample_rate,
+            "segment_seconds": self.segment_seconds,
+            "audio_bitrate": self.audio_bitrate,
+            "video_ready": self.video_ready,
+            "encoded": self._encoded,
+            "pending": self._pending.tolist(),
+            "batch": self._batch,
+            "init_uri": self._init_uri,
+            "master_args": self._master_args,
+            "segments": [s.to_dict() for s in self.audio_writer.segments],
+            "ended": self.audio_writer.ended,
+        }
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp_path, self.state_path)
+
+    def _collect_segments(self, temp_playlist: Path, init_name: str) -> Tuple[List[HLSSegment], List[str]]:
+        """读取单次编码的播放列表，改写片段时间戳，初始化片段与上一次相同时删除复用"""
+        init_path = self.output_dir / init_name
+        init_data = init_path.read_bytes()
+        files = []
+        init_uri = None
+        if init_data == self._init_data:
+            init_path.unlink()
+        else:
+            self._init_data = init_data
+            self._init_uri = init_name
+            init_uri = init_name
+            files.append(str(init_path))
+
+        # 正文首样本位于编码时间戳 AAC_FRAME（预编码帧之后），平移到 _encoded
+        timescale = read_timescale(init_data)
+        offset = (self._encoded - AAC_FRAME) * timescale // self.sample_rate
+
+        playlist = m3u8.load(str(temp_playlist))
+        segments = []
+        for index, segment in enumerate(playlist.segments):
+            segment_path = self.output_dir / Path(segment.uri).name
+            data = bytearray(segment_path.read_bytes())
+            shift_fragment_times(data, offset)
+            segment_path.write_bytes(data)
+            duration = segment.duration
+            # 预编码帧与上一批次末帧重叠，不计入时长（首次编码时它占据时间轴最前一帧）
+            if index == 0 and self._batch > 0:
+                duration -= AAC_FRAME / self.sample_rate
+            segments.append(HLSSegment(
+                uri=segment_path.name,
+                duration=duration,
+                init_uri=init_uri if index == 0 else None
+            ))
+            files.append(str(segment_path))
+        temp_playlist.unlink()
+        return segments, files
@@ -0,0 +1,486 @@
+"""
+媒体下载引擎 - 共享连接池、HTTP Range 并行分片、断点续传和校验
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import List, Mapping, Optional, Tuple
+
+import aiohttp
+from utils.executors import POOL_IO, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+# 服务端声明的整文件校验和（值为 base64），按优先级排列
+_CHECKSUM_HEADERS = (
+    ("x-amz-checksum-sha256", "sha256"),
+    ("x-amz-checksum-sha1", "sha1"),
+    ("Content-MD5", "md5"),
+)
+
+
+@dataclass
+class _RangeState:
+    """单个分片的下载进度"""
+    start: int
+    end: int          # 包含端点
+    done: int = 0     # 已写入字节数
+
+    @property
+    def remaining(self) -> int:
+        return self.end - self.start + 1 - self.done
+
+    @property
+    def offset(self) -> int:
+        return self.start + self.done
+
+
+@dataclass
+class _RemoteInfo:
+    """探测得到的远端文件信息"""
+    size: Optional[int]
+    accept_ranges: bool
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    checksum: Optional[str] = None
+
+
+@dataclass
+class _DownloadState:
+    """可续传的下载状态（保存在 .part.json 中）"""
+    url: str
+    size: int
+    etag: Optional[str] = None
+    ranges: List[_RangeState] = field(default_factory=list)
+    last_modified: Optional[str] = None
+    checksum: Optional[str] = None  # 服务端声明的校验和 "<算法>:<hex>"
+
+    @property
+    def validator(self) -> Optional[str]:
+        """
+        If-Range 使用的验证器：强 ETag，其次 Last-Modified
+        弱 ETag（W/"..."）永远不匹配 If-Range，服务端每次都会返回完整内容，不能用于分片
+        """
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, text: str) -> "_DownloadState":
+        data = json.loads(text)
+        data["ranges"] = [_RangeState(**r) for r in data.get("ranges", [])]
+        return cls(**data)
+
+
+class ChecksumMismatchError(Exception):
+    """下载文件校验失败"""
+    pass
+
+
+class RemoteChangedError(Exception):
+    """下载过程中远端文件已变化（If-Range 不匹配，服务端返回完整内容）"""
+    pass
+
+
+class MediaDownloader:
+    """
+    媒体下载引擎
+    - 全局共享一个 aiohttp 连接池（keep-alive）
+    - 服务端支持 Range 时把大文件拆成 N 段并行下载
+    - 大块缓冲，写盘通过 os.pwrite 在线程池中完成，不阻塞事件循环
+    - 分片进度持久化在 .part.json，失败或重启后从断点继续
+    - 只在有强验证器（强 ETag 或 Last-Modified）时分片，分片请求带 If-Range，否则单连接顺序下载
+    - 支持显式校验和（sha256/md5），或服务端声明的 Content-MD5 / x-amz-checksum-*（ETag 不视为校验和）
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        connections_per_file: int = 4,
+        max_connections: int = 16,
+        buffer_size: int = 1024 * 1024,
+        min_split_size: int = 16 * 1024 * 1024,
+        max_retries: int = 5,
+        read_timeout: float = 60.0
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.connections_per_file = max(1, connections_per_file)
+        self.max_connections = max_connections
+        self.buffer_size = buffer_size
+        self.min_split_size = min_split_size
+        self.max_retries = max_retries
+        self.read_timeout = read_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        # 同一URL只允许一个下载在进行：url -> [锁, 引用计数]
+        self._url_locks = {}
+        # 下载状态写盘节流：url -> 上次保存时间
+        self._state_saved_at = {}
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的连接池会话（懒创建，需在事件循环内调用）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(total=None, connect=30, sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def download(
+        self,
+        url: str,
+        dest: Path,
+        checksum: Optional[str] = None
+    ) -> Path:
+        """
+        下载文件到 dest
+
+        Args:
+            url: 文件URL
+            dest: 目标路径
+            checksum: 期望的校验和，格式 "sha256:<hex>" / "md5:<hex>"，无前缀按sha256处理
+
+        Returns:
+            目标文件路径
+        """
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        entry = self._url_locks.setdefault(url, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                start_time = time.time()
+                part_path, state = await self._prepare(url)
+                try:
+                    await self._fetch_ranges(url, part_path, state)
+                except RemoteChangedError:
+                    # 已下载的分片属于旧版本：丢弃部分下载，按新版本完整重下一次
+                    logger.warning(f"下载过程中远端文件已变化，丢弃部分下载并重新开始: {url}")
+                    self._discard_partial(url)
+                    part_path, state = await self._prepare(url)
+                    await self._fetch_ranges(url, part_path, state)
+                await self._verify(part_path, state, checksum)
+
+                await run_in_pool(POOL_IO, shutil.move, str(part_path), str(dest))
+                self._state_path(url).unlink(missing_ok=True)
+
+                elapsed = time.time() - start_time
+                speed = state.size / max(elapsed, 1e-6) / (1024 * 1024)
+                logger.info(
+                    f"下载完成: {dest} ({state.size} bytes, {len(state.ranges)} 个分片, "
+                    f"{elapsed:.1f}s, {speed:.1f}MB/s)"
+                )
+                return dest
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._url_locks.pop(url, None)
+            self._state_saved_at.pop(url, None)
+
+    # ================================
+    # 内部实现
+    # ================================
+
+    def _cache_key(self, url: str) -> str:
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def _part_path(self, url: str) -> Path:
+        return self.cache_dir / f"{self._cache_key(url)}.part"
+
+    def _state_path(self, url: str) -> Path:
+        return self.cache_dir / f"{self._cache_key(url)}.part.json"
+
+    def _discard_partial(self, url: str) -> None:
+        self._part_path(url).unlink(missing_ok=True)
+        self._state_path(url).unlink(missing_ok=True)
+
+    async def _probe(self, url: str) -> _RemoteInfo:
+        """探测文件大小、是否支持Range、验证器与服务端声明的校验和"""
+        session = await self._get_session()
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                if response.status < 400:
+                    size = response.headers.get("Content-Length")
+                    return _RemoteInfo(
+                        size=int(size) if size else None,
+                        accept_ranges=response.headers.get("Accept-Ranges", "").lower() == "bytes",
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                        checksum=_declared_checksum(response.headers)
+                    )
+        except aiohttp.ClientError as e:
+            logger.debug(f"HEAD 请求失败，改用 Range GET 探测: {e}")
+
+        # 部分服务端不支持HEAD，用 bytes=0-0 探测
+        async with session.get(url, headers={"Range": "bytes=0-0"}) as response:
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if response.status == 206:
+                # 分片响应的 Content-MD5 只对应该分片，不作为整文件校验和
+                content_range = response.headers.get("Content-Range", "")
+                total = content_range.rsplit("/", 1)[-1]
+                return _RemoteInfo(int(total) if total.isdigit() else None, True, etag, last_modified)
+            size = response.headers.get("Content-Length")
+            return _RemoteInfo(
+                int(size) if size else None, False, etag, last_modified, _declared_checksum(response.headers)
+            )
+
+    async def _prepare(self, url: str) -> Tuple[Path, _DownloadState]:
+        """探测并建立（或恢复）下载状态"""
+        remote = await self._probe(url)
+        size = remote.size
+        part_path = self._part_path(url)
+        state_path = self._state_path(url)
+        state = _DownloadState(
+            url=url, size=size or -1, etag=remote.etag,
+            last_modified=remote.last_modified, checksum=remote.checksum
+        )
+        # 没有强验证器时无法用 If-Range 保证各分片属于同一版本
+        ranged = bool(size) and remote.accept_ranges and state.validator is not None
+
+        # 尝试从断点恢复
+        if ranged and part_path.exists() and state_path.exists():
+            try:
+                saved = _DownloadState.from_json(await run_in_pool(POOL_IO, state_path.read_text))
+                if (saved.url, saved.size, saved.validator) == (url, size, state.validator):
+                    state.ranges = saved.ranges
+                    done = sum(r.done for r in state.ranges)
+                    logger.info(f"从断点恢复下载: {url} ({done}/{size} bytes)")
+                    return part_path, state
+                logger.info(f"远端文件已变化，丢弃旧的部分下载: {url}")
+            except Exception as e:
+                logger.warning(f"读取下载状态失败，重新下载: {e}")
+
+        part_path.unlink(missing_ok=True)
+        state_path.unlink(missing_ok=True)
+
+        if not ranged:
+            # 不支持Range或没有强验证器：单连接顺序下载，无法续传
+            if size and remote.accept_ranges:
+                logger.info(f"远端没有强 ETag 或 Last-Modified，改为单连接顺序下载: {url}")
+            return part_path, state
+
+        parts = 1
+        if size >= self.min_split_size:
+            parts = min(self.connections_per_file, max(1, size // (self.min_split_size // 2)))
+        step = -(-size // parts)
+        state.ranges = [
+            _RangeState(start=i, end=min(i + step, size) - 1)
+            for i in range(0, size, step)
+        ]
+
+        # 预分配文件，各分片按偏移写入
+        def _allocate():
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            state_path.write_text(state.to_json())
+        await run_in_pool(POOL_IO, _allocate)
+        return part_path, state
+
+    async def _fetch_ranges(self, url: str, part_path: Path, state: _DownloadState) -> None:
+        """并行下载所有未完成的分片"""
+        if not state.ranges:
+            await self._fetch_sequential(url, part_path, state)
+            return
+
+        fd = await run_in_pool(POOL_IO, os.open, str(part_path), os.O_WRONLY)
+        try:
+            pending = [r for r in state.ranges if r.remaining > 0]
+            tasks = [asyncio.create_task(self._fetch_range(url, fd, state, r)) for r in pending]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # 一个分片失败时停止其余分片，再关闭文件
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            finally:
+                await self._save_state(state, force=True)
+            await run_in_pool(POOL_IO, os.fsync, fd)
+        finally:
+            await run_in_pool(POOL_IO, os.close, fd)
+
+    async def _fetch_range(self, url: str, fd: int, state: _DownloadState, rng: _RangeState) -> None:
+        """下载单个分片，失败时从已写入位置重试"""
+        session = await self._get_session()
+        attempt = 0
+        while rng.remaining > 0:
+            done_before = rng.done
+            buffer = bytearray()
+            try:
+                headers = {"Range": f"bytes={rng.offset}-{rng.end}", "If-Range": state.validator}
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 200:
+                        # If-Range 不匹配：服务端返回新版本的完整内容，分片不可续传
+                        raise RemoteChangedError(f"远端文件已变化: {url}")
+                    if response.status != 206:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history,
+                            status=response.status, message="服务端未返回分片内容"
+                        )
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        buffer += chunk
+                        if len(buffer) >= self.buffer_size:
+                            await self._flush(fd, state, rng, buffer)
+                            buffer = bytearray()
+                    if buffer:
+                        await self._flush(fd, state, rng, buffer)
+                        buffer = bytearray()
+                if rng.remaining > 0 and rng.done == done_before:
+                    raise ConnectionError("分片响应提前结束且没有新数据")
+                attempt = 0
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                # 保留中断前已收到的数据，重试时从该位置继续
+                if buffer:
+                    await self._flush(fd, state, rng, buffer)
+                attempt += 1
+                if attempt > self.max_retries:
+                    await self._save_state(state, force=True)
+                    raise
+                delay = min(2 ** attempt, 30)
+                logger.warning(
+                    f"分片 {rng.start}-{rng.end} 下载中断 ({rng.done} bytes 已完成)，"
+                    f"{delay}s 后重试 {attempt}/{self.max_retries}: {e}"
+                )
+                await asyncio.sleep(delay)
+
+    async def _flush(self, fd: int, state: _DownloadState, rng: _RangeState, buffer: bytearray) -> None:
+        """在线程池中按偏移写入缓冲区并记录进度"""
+        data = bytes(buffer[:rng.remaining])
+        await run_in_pool(POOL_IO, os.pwrite, fd, data, rng.offset)
+        rng.done += len(data)
+        await self._save_state(state)
+
+    async def _save_state(self, state: _DownloadState, force: bool = False) -> None:
+        """持久化分片进度（每秒至多一次，force时立即写入）"""
+        now = time.monotonic()
+        if not force and now - self._state_saved_at.get(state.url, 0.0) < 1.0:
+            return
+        self._state_saved_at[state.url] = now
+        try:
+            await run_in_pool(POOL_IO, self._state_path(state.url).write_text, state.to_json())
+        except Exception as e:
+            logger.debug(f"保存下载状态失败: {e}")
+
+    async def _fetch_sequential(self, url: str, part_path: Path, state: _DownloadState) -> None:
+        """不支持Range的服务端：单连接顺序下载"""
+        session = await self._get_session()
+        attempt = 0
+        while True:
+            try:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    f = await run_in_pool(POOL_IO, open, part_path, "wb")
+                    written = 0
+                    try:
+                        buffer = bytearray()
+                        async for chunk in response.content.iter_chunked(64 * 1024):
+                            buffer += chunk
+                            if len(buffer) >= self.buffer_size:
+                                await run_in_pool(POOL_IO, f.write, bytes(buffer))
+                                written += len(buffer)
+                                buffer = bytearray()
+                        if buffer:
+                            await run_in_pool(POOL_IO, f.write, bytes(buffer))
+                            written += len(buffer)
+                    finally:
+                        await run_in_pool(POOL_IO, f.close)
+                    state.size = written
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 30)
+                logger.warning(f"顺序下载中断，{delay}s 后从头重试 {attempt}/{self.max_retries}: {e}")
+                await asyncio.sleep(delay)
+
+    async def _verify(self, part_path: Path, state: _DownloadState, checksum: Optional[str]) -> None:
+        """
+        校验下载结果：长度，以及显式校验和或服务端声明的校验和
+        ETag 不作为校验和：SSE-KMS/SSE-C、分段上传与复制的对象以及多数 CDN 的 ETag 都不是内容MD5
+        """
+        actual_size = part_path.stat().st_size
+        if state.size >= 0 and actual_size != state.size:
+            raise ChecksumMismatchError(f"文件长度不匹配: 期望 {state.size}, 实际 {actual_size}")
+
+        checksum = checksum or state.checksum
+        if not checksum:
+            return
+        algo, _, expected = checksum.partition(":") if ":" in checksum else ("sha256", "", checksum)
+
+        actual = await run_in_pool(POOL_IO, _file_digest, part_path, algo.lower())
+        if actual.lower() != expected.lower():
+            # 校验失败时丢弃部分文件，下次完整重下
+            part_path.unlink(missing_ok=True)
+            self._state_path(state.url).unlink(missing_ok=True)
+            raise ChecksumMismatchError(f"{algo} 校验失败: 期望 {expected}, 实际 {actual}")
+        logger.debug(f"{algo} 校验通过: {part_path}")
+
+
+def _declared_checksum(headers: Mapping[str, str]) -> Optional[str]:
+    """
+    服务端声明的整文件校验和，返回 "<算法>:<hex>"
+    分段上传的组合校验和（"<base64>-<段数>"）不是整文件摘要，忽略
+    """
+    for header, algo in _CHECKSUM_HEADERS:
+        value = headers.get(header)
+        if not value or "-" in value:
+            continue
+        try:
+            return f"{algo}:{base64.b64decode(value, validate=True).hex()}"
+        except (binascii.Error, ValueError):
+            logger.debug(f"无法解析校验和响应头 {header}: {value}")
+    return None
+
+
+def _file_digest(path: Path, algo: str, block_size: int = 4 * 1024 * 1024) -> str:
+    """分块计算文件摘要"""
+    digest = hashlib.new(algo)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# 全局单例
+_media_downloader: Optional[MediaDownloader] = None
+
+
+def get_media_downloader() -> MediaDownloader:
+    """获取全局媒体下载引擎"""
+    global _media_downloader
+    if _media_downloader is None:
+        from config import get_config
+        config = get_config()
+        _media_downloader = MediaDownloader(
+            cache_dir=Path(config.tts.download_cache_dir),
+            connections_per_file=config.tts.download_connections,
+            max_connections=config.tts.download_max_connections,
+            buffer_size=config.tts.download_buffer_kb * 1024,
+            min_split_size=config.tts.download_min_split_mb * 1024 * 1024,
+            read_timeout=config.tts.download_timeout
+        )
+    return _media_downloader
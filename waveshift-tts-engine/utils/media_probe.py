@@ -0,0 +1,120 @@
+"""
+媒体探测 - 任务初始化时对视频做一次 ffprobe，结果缓存在任务上下文中
+（时长、帧率、分辨率、音频采样率、关键帧索引），供混音时输入端定位与批次边界对齐
+"""
+import asyncio
+import bisect
+import json
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.ffmpeg_utils import run_command, probe_keyframes
+from utils.ffmpeg_scheduler import JOB_PROBE
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """解析 ffprobe 的帧率字符串（如 '30000/1001'）"""
+    if not rate:
+        return 0.0
+    try:
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(rate)
+    except ValueError:
+        return 0.0
+
+
+@dataclass
+class MediaProbe:
+    """视频探测结果"""
+    duration: float = 0.0
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    video_codec: str = ""
+    video_profile: str = ""       # ffprobe 的 profile 名称（如 High、Main）
+    video_level: int = 0          # H.264 level × 10（如 31），未知时为 0
+    pix_fmt: str = ""
+    audio_sample_rate: int = 0
+    audio_channels: int = 0
+    # 关键帧 (pts, dts)，按 pts 排序
+    keyframes: List[Tuple[float, float]] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._keyframe_pts = [k[0] for k in self.keyframes]
+
+    def keyframe_at_or_before(self, t: float) -> Optional[Tuple[float, float]]:
+        """不晚于 t 的最后一个关键帧"""
+        index = bisect.bisect_right(self._keyframe_pts, t) - 1
+        return self.keyframes[index] if index >= 0 else None
+
+    def keyframe_at_or_after(self, t: float) -> Optional[Tuple[float, float]]:
+        """不早于 t 的第一个关键帧"""
+        index = bisect.bisect_left(self._keyframe_pts, t)
+        return self.keyframes[index] if index < len(self.keyframes) else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MediaProbe":
+        data = dict(data)
+        data["keyframes"] = [tuple(k) for k in data.get("keyframes", [])]
+        return cls(**data)
+
+    def summary(self) -> Dict[str, Any]:
+        """不含关键帧列表的摘要（用于状态接口/日志）"""
+        info = self.to_dict()
+        info.pop("keyframes")
+        info["keyframe_count"] = len(self.keyframes)
+        return info
+
+
+async def probe_media(path: str) -> MediaProbe:
+    """
+    探测媒体文件：流信息与关键帧索引并行获取
+
+    Args:
+        path: 本地媒体文件路径
+
+    Returns:
+        MediaProbe
+    """
+    info_cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries",
+        "format=duration:stream=codec_type,codec_name,profile,level,pix_fmt,width,height,avg_frame_rate,r_frame_rate,"
+        "sample_rate,channels",
+        "-of", "json",
+        path
+    ]
+    (stdout, _), keyframes = await asyncio.gather(run_command(info_cmd, job_type=JOB_PROBE), probe_keyframes(path))
+    info = json.loads(stdout.decode() or "{}")
+
+    probe = MediaProbe(keyframes=keyframes)
+    try:
+        probe.duration = float(info.get("format", {}).get("duration") or 0.0)
+    except ValueError:
+        pass
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == "video" and not probe.video_codec:
+            probe.video_codec = stream.get("codec_name", "")
+            probe.video_profile = stream.get("profile", "")
+            probe.video_level = max(0, int(stream.get("level") or 0))
+            probe.pix_fmt = stream.get("pix_fmt", "")
+            probe.width = int(stream.get("width") or 0)
+            probe.height = int(stream.get("height") or 0)
+            probe.fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+        elif stream.get("codec_type") == "audio" and not probe.audio_sample_rate:
+            probe.audio_sample_rate = int(stream.get("sample_rate") or 0)
+            probe.audio_channels = int(stream.get("channels") or 0)
+
+    logger.info(
+        f"媒体探测完成: {path}, 时长 {probe.duration:.1f}s, {probe.width}x{probe.height}@{probe.fps:.2f}fps, "
+        f"关键帧 {len(probe.keyframes)} 个"
+    )
+    return probe
@@ -0,0 +1,230 @@
+"""
+混音引擎 - MediaMixer 的数值内核
+- 按句子时间线一次性分配批次输出缓冲区，逐句写入（替代反复 np.concatenate）
+- 跨批次的衔接历史保存在固定大小的环形缓冲区中（也可由调用方显式传入上一批次末尾，批次间互不依赖）
+- 淡入淡出窗口按长度缓存
+- 可选 numba 内核（交叉淡化 / 人声背景混合+峰值 / 缩放），未安装时回退 numpy
+"""
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from utils.audio_utils import fade_windows
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+
+def _crossfade_py(out, offset, tail, fade_in, fade_out):
+    """out[offset:offset+n] = tail * fade_out + out[offset:offset+n] * fade_in"""
+    for i in range(len(tail)):
+        out[offset + i] = tail[i] * fade_out[i] + out[offset + i] * fade_in[i]
+
+
+def _mix_py(out, vocals, vocals_volume, background, background_volume):
+    """out = vocals * vv + background * bv（超出各自长度的部分视为0），返回峰值"""
+    peak = 0.0
+    n_vocals = len(vocals)
+    n_background = len(background)
+    for i in range(len(out)):
+        value = 0.0
+        if i < n_vocals:
+            value += vocals[i] * vocals_volume
+        if i < n_background:
+            value += background[i] * background_volume
+        out[i] = value
+        magnitude = abs(out[i])
+        if magnitude > peak:
+            peak = magnitude
+    return peak
+
+
+def _scale_py(out, gain):
+    for i in range(len(out)):
+        out[i] *= gain
+
+
+if NUMBA_AVAILABLE:
+    _crossfade_nb = njit(cache=True, nogil=True)(_crossfade_py)
+    _mix_nb = njit(cache=True, nogil=True)(_mix_py)
+    _scale_nb = njit(cache=True, nogil=True)(_scale_py)
+
+
+class OverlapRing:
+    """
+    固定容量的环形缓冲区，保存已输出音频的末尾若干采样，用于下一批次的衔接
+    写入只做定长拷贝，不随批次数增长分配内存
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._buffer = np.zeros(self.capacity, dtype=np.float32)
+        self._pos = 0  # 下一次写入位置
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, audio: np.ndarray):
+        """追加音频，超出容量的旧数据被覆盖"""
+        n = len(audio)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            self._buffer[:] = audio[-self.capacity:]
+            self._pos = 0
+            self._size = self.capacity
+            return
+        first = min(n, self.capacity - self._pos)
+        self._buffer[self._pos:self._pos + first] = audio[:first]
+        if first < n:
+            self._buffer[:n - first] = audio[first:]
+        self._pos = (self._pos + n) % self.capacity
+        self._size = min(self.capacity, self._size + n)
+
+    def tail(self, n: int) -> np.ndarray:
+        """最近写入的 n 个采样（连续副本，不足时返回全部）"""
+        n = min(n, self._size)
+        if n <= 0:
+            return np.zeros(0, dtype=np.float32)
+        start = self._pos - n
+        if start >= 0:
+            return self._buffer[start:self._pos].copy()
+        return np.concatenate((self._buffer[start:], self._buffer[:self._pos]))
+
+    def clear(self):
+        self._pos = 0
+        self._size = 0
+
+
+class MixEngine:
+    """
+    单个混音流（一个 MediaMixer）的混音引擎
+    输出与原 _concat_audio_segments / mix_background_segment / normalize_audio 组合一致
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        overlap: int,
+        history_seconds: float = 10.0,
+        use_numba: bool = True
+    ):
+        """
+        Args:
+            sample_rate: 采样率
+            overlap: 句子衔接的交叉淡化长度（采样点数）
+            history_seconds: 环形缓冲区保留的历史时长（秒）
+            use_numba: 是否使用 numba 内核（未安装时自动回退）
+        """
+        self.sample_rate = sample_rate
+        self.overlap = int(overlap)
+        self.history = OverlapRing(max(int(history_seconds * sample_rate), self.overlap))
+        self.use_numba = use_numba and NUMBA_AVAILABLE
+
+    @property
+    def history_seconds(self) -> float:
+        return len(self.history) / self.sample_rate
+
+    def concat(self, segments: List[np.ndarray], tail: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        按时间线顺序拼接一批句子音频
+        输出缓冲区按总长度一次性分配；除第一句外，每句开头与历史末尾做等功率交叉淡化（长度不变）
+
+        Args:
+            segments: 句子音频
+            tail: 用于交叉淡化的上一批次末尾，None 时取环形缓冲区中的历史
+        """
+        segments = [np.asarray(s, dtype=np.float32) for s in segments if s is not None and len(s) > 0]
+        out = np.empty(sum(len(s) for s in segments), dtype=np.float32)
+        if len(out) == 0:
+            return out
+
+        if self.overlap <= 0:
+            tail = None
+        elif tail is None:
+            tail = self.history.tail(self.overlap)
+        else:
+            tail = np.asarray(tail[-self.overlap:], dtype=np.float32)
+        offset = 0
+        for index, segment in enumerate(segments):
+            out[offset:offset + len(segment)] = segment
+            if index > 0 and tail is not None:
+                cross_len = min(len(tail), len(segment))
+                if cross_len > 0:
+                    fade_in, fade_out = fade_windows(cross_len)
+                    head_tail = tail[-cross_len:]
+                    if self.use_numba:
+                        _crossfade_nb(out, offset, head_tail, fade_in, fade_out)
+                    else:
+                        region = out[offset:offset + cross_len]
+                        region *= fade_in
+                        region += head_tail * fade_out
+            offset += len(segment)
+        return out
+
+    def mix(
+        self,
+        vocals: np.ndarray,
+        background: Optional[np.ndarray],
+        duration: float,
+        vocals_volume: float,
+        background_volume: float,
+        max_val: float
+    ) -> np.ndarray:
+        """
+        人声与背景音混合到批次时长，并做峰值归一化
+
+        Args:
+            vocals: 拼接后的人声
+            background: 与批次对齐的背景音片段（None 或长度0表示无背景）
+            duration: 批次时长（秒）
+            vocals_volume / background_volume: 音量系数
+            max_val: 归一化上限
+
+        Returns:
+            混合后的音频（长度为 int(duration * sample_rate)）
+        """
+        target_length = int(duration * self.sample_rate)
+        vocals = vocals[:target_length]
+        if background is None:
+            background = np.zeros(0, dtype=np.float32)
+        background = np.asarray(background[:target_length], dtype=np.float32)
+        if len(background) and not np.isfinite(background).all():
+            logger.error("MixEngine: 背景音频片段包含 NaN 或 Inf 值！跳过混合背景音。")
+            background = background[:0]
+
+        out = np.empty(target_length, dtype=np.float32)
+        if self.use_numba:
+            peak = _mix_nb(out, vocals, vocals_volume, background, background_volume)
+        else:
+            out[len(vocals):] = 0.0
+            np.multiply(vocals, vocals_volume, out=out[:len(vocals)])
+            if len(background):
+                out[:len(background)] += background * np.float32(background_volume)
+            peak = float(np.max(np.abs(out))) if target_length else 0.0
+
+        if peak > max_val:
+            self._scale(out, max_val / peak)
+        return out
+
+    def _scale(self, out: np.ndarray, gain: float):
+        if self.use_numba:
+            _scale_nb(out, gain)
+        else:
+            out *= np.float32(gain)
+
+    def commit(self, audio: np.ndarray):
+        """批次输出完成后记入历史，供下一批次衔接"""
+        self.history.push(audio)
+
+    def reset(self):
+        self.history.clear()
+
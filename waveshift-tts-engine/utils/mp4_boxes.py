@@ -0,0 +1,142 @@
+"""
+ISO BMFF（MP4/fMP4）盒子工具 - 遍历、查找、构造与原地改写
+供 HLS 分离演绎（片段时间戳平移）与增量成品组装共用
+"""
+import struct
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+# 遍历时递归进入的容器盒子
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"mvex", b"edts", b"moof", b"traf"}
+
+
+def iter_boxes(data: Union[bytes, bytearray], start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int, int]]:
+    """遍历 ISO BMFF 盒子，产出 (类型, 偏移, 头部长度, 总长度)"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            break
+        yield box_type, offset, header, size
+        offset += size
+
+
+def find_boxes(data: Union[bytes, bytearray], box_type: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """递归查找指定类型的盒子，产出 (内容偏移, 盒子结束偏移)"""
+    for found_type, offset, header, size in iter_boxes(data, start, end):
+        if found_type == box_type:
+            yield offset + header, offset + size
+        if found_type in CONTAINER_BOXES:
+            yield from find_boxes(data, box_type, offset + header, offset + size)
+
+
+def make_box(box_type: bytes, payload: bytes) -> bytes:
+    """构造盒子（内容超过32位长度时使用64位长度头）"""
+    if len(payload) + 8 < 1 << 32:
+        return struct.pack(">I4s", len(payload) + 8, box_type) + payload
+    return struct.pack(">I4sQ", 1, box_type, len(payload) + 16) + payload
+
+
+def make_full_box(box_type: bytes, version: int, flags: int, payload: bytes) -> bytes:
+    """构造 FullBox（version + flags 头）"""
+    return make_box(box_type, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def read_top_level_box(path: Union[str, Path], box_type: bytes) -> Optional[bytes]:
+    """按顶层盒子头跳读文件，返回指定盒子的内容（不含头部），不存在时返回 None"""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            size, found_type = struct.unpack(">I4s", header)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                header_size = 16
+            elif size == 0:
+                return f.read() if found_type == box_type else None
+            if size < header_size:
+                return None
+            if found_type == box_type:
+                return f.read(size - header_size)
+            f.seek(size - header_size, 1)
+
+
+def read_timescale(init_data: bytes) -> int:
+    """读取初始化片段中首个轨道的时间刻度（mdhd）"""
+    for body, _ in find_boxes(init_data, b"mdhd"):
+        version = init_data[body]
+        return struct.unpack_from(">I", init_data, body + (20 if version == 1 else 12))[0]
+    raise ValueError("初始化片段中没有 mdhd")
+
+
+def shift_fragment_times(data: bytearray, offset: int) -> None:
+    """
+    原地平移 fMP4 媒体片段的解码时间（tfdt）与最早呈现时间（sidx）
+
+    Args:
+        data: 片段内容
+        offset: 平移量（轨道时间刻度）
+    """
+    for body, _ in find_boxes(data, b"tfdt"):
+        if data[body] == 1:
+            value = struct.unpack_from(">Q", data, body + 4)[0]
+            struct.pack_into(">Q", data, body + 4, value + offset)
+        else:
+            value = struct.unpack_from(">I", data, body + 4)[0] + offset
+            if value >= 1 << 32:
+                raise ValueError("tfdt 超出32位范围")
+            struct.pack_into(">I", data, body + 4, value)
+    for body, _ in find_boxes(data, b"sidx"):
+        # version/flags(4) + reference_ID(4) + timescale(4) + earliest_presentation_time
+        if data[body] == 1:
+            value = struct.unpack_from(">Q", data, body + 12)[0]
+            struct.pack_into(">Q", data, body + 12, value + offset)
+        else:
+            value = struct.unpack_from(">I", data, body + 12)[0] + offset
+            if value < 1 << 32:
+                struct.pack_into(">I", data, body + 12, value)
+
+
+class Box:
+    """可改写的盒子树（容器盒子解析出子盒子，其余保留原始内容）"""
+
+    def __init__(self, box_type: bytes, payload: bytes = b"", children: Optional[List["Box"]] = None):
+        self.type = box_type
+        self.payload = payload
+        self.children = children
+
+    @classmethod
+    def parse(cls, data: Union[bytes, bytearray], start: int = 0, end: Optional[int] = None) -> List["Box"]:
+        boxes = []
+        for box_type, offset, header, size in iter_boxes(data, start, end):
+            if box_type in CONTAINER_BOXES:
+                boxes.append(cls(box_type, children=cls.parse(data, offset + header, offset + size)))
+            else:
+                boxes.append(cls(box_type, bytes(data[offset + header:offset + size])))
+        return boxes
+
+    def child(self, box_type: bytes) -> Optional["Box"]:
+        return next((box for box in self.children or [] if box.type == box_type), None)
+
+    def all(self, box_type: bytes) -> List["Box"]:
+        return [box for box in self.children or [] if box.type == box_type]
+
+    def path(self, *box_types: bytes) -> Optional["Box"]:
+        box = self
+        for box_type in box_types:
+            box = box.child(box_type) if box is not None else None
+        return box
+
+    def serialize(self) -> bytes:
+        if self.children is None:
+            return make_box(self.type, self.payload)
+        return make_box(self.type, b"".join(child.serialize() for child in self.children))
@@ -46,6 +46,10 @@ class R2PathManager:
         """获取播放列表的 R2 key"""
         return f"{self.hls_prefix}/playlist_{self.task_id}.m3u8"
     
+    def get_tts_audio_key(self, sequence: int) -> str:
+        """获取句子合成音频的 R2 key"""
+        return f"{self.segments_prefix}/tts_{sequence:04d}.wav"
+    
     def get_segment_key(self, segment_name: str) -> str:
         """获取片段的 R2 key"""
         return f"{self.segments_prefix}/{segment_name}"
@@ -74,6 +78,12 @@ class TempFileManager:
             logger.debug(f"创建临时目录: {self.temp_dir}")
         return self.temp_dir
     
+    def attach_temp_dir(self, temp_dir: Path) -> None:
+        """复用已存在的临时目录（任务上下文恢复时使用）"""
+        self.temp_dir = Path(temp_dir)
+        self._subdirs.clear()
+        logger.debug(f"复用临时目录: {self.temp_dir}")
+    
     def get_subdir(self, name: str) -> Path:
         """获取或创建子目录"""
         if name not in self._subdirs:
@@ -178,6 +188,16 @@ class PathManager:
         self.video_file_path: Optional[str] = None
         self.vocals_file_path: Optional[str] = None
         self.instrumental_file_path: Optional[str] = None
+        # 窗口化分离时的背景音来源（按时间区间读取，替代完整的 instrumental 文件）
+        self.background_source = None
+        # 视频探测结果（MediaProbe：分辨率、关键帧索引等）
+        self.media_probe = None
+        # 分离演绎的 HLS 输出（DubbedHLSRenditions），启用时批次只编码音频
+        self.hls_renditions = None
+        # 增量组装的成品文件（IncrementalMP4Assembler），首个片段混合完成时创建
+        self.final_assembler = None
+        # 增量字幕轨（WebVTTSubtitleTrack），首个批次混合完成时创建
+        self.subtitle_track = None
     
     def set_media_paths(self, audio_path: str, video_path: str):
         """设置音频和视频文件路径"""
@@ -189,6 +209,26 @@ class PathManager:
         self.vocals_file_path = vocals_path
         self.instrumental_file_path = instrumental_path
     
+    def set_background_source(self, source):
+        """设置按区间读取的背景音来源（WindowedSeparation）"""
+        self.background_source = source
+    
+    def set_media_probe(self, probe):
+        """设置视频探测结果（MediaProbe）"""
+        self.media_probe = probe
+    
+    def set_hls_renditions(self, renditions):
+        """设置分离演绎的 HLS 输出（DubbedHLSRenditions）"""
+        self.hls_renditions = renditions
+    
+    def set_final_assembler(self, assembler):
+        """设置增量组装的成品文件（IncrementalMP4Assembler）"""
+        self.final_assembler = assembler
+    
+    def set_subtitle_track(self, track):
+        """设置增量字幕轨（WebVTTSubtitleTrack）"""
+        self.subtitle_track = track
+    
     def cleanup(self, force=False):
         """清理临时文件
         
@@ -53,8 +53,70 @@ def generate_subtitles_for_segment(
         width_scale_factor = 1.0
         height_scale_factor = 1.0
 
+    for cue in build_subtitle_cues(sentences, start_time_ms, target_language):
+        subs.append(pysubs2.SSAEvent(start=cue["start"], end=cue["end"], text=cue["text"]))
+
+    # --- 设置"类YouTube"的默认样式 (original values are for DESIGN_VIDEO_WIDTH x DESIGN_VIDEO_HEIGHT) ---
+    style = subs.styles.get("Default", pysubs2.SSAStyle())
+
+    # Original style values (designed for DESIGN_VIDEO_WIDTH x DESIGN_VIDEO_HEIGHT)
+    original_fontsize = 60
+    original_marginv = 30
+    original_marginl = 30
+    original_marginr = 30
+    original_spacing = 0.5
+    # Assuming borderstyle = 3 (opaque box), outline and shadow are less critical for direct scaling here
+    # If borderstyle = 1 (outline), then outline thickness would need scaling:
+    # original_outline_thickness = 2 # example
+    # style.outline = max(1, round(original_outline_thickness * height_scale_factor)) 
+
+    style.fontname = "Arial"             
+    style.fontsize = max(1, round(original_fontsize * width_scale_factor))
+    style.bold = True
+    style.italic = False
+    style.underline = False
+
+    style.primarycolor = pysubs2.Color(255, 255, 255, 0)
+    style.outlinecolor = pysubs2.Color(0, 0, 0, 100)
+    style.borderstyle = 3  
+    style.shadow = 0 # If shadow had a distance, it would be scaled by height_scale_factor
+    style.alignment = pysubs2.Alignment.BOTTOM_CENTER
+    style.marginv = max(0, round(original_marginv * height_scale_factor))
+    style.marginl = max(0, round(original_marginl * width_scale_factor))
+    style.marginr = max(0, round(original_marginr * width_scale_factor))
+    style.spacing = original_spacing * width_scale_factor # Spacing can be float
+
+    subs.styles["Default"] = style
+
+    # 写入文件
+    try:
+        subs.save(output_sub_path, format="ass", encoding="utf-8")
+        logger.info(f"generate_subtitles_for_segment: Subtitles successfully written to => {output_sub_path}")
+    except Exception as e:
+        logger.error(f"Failed to save subtitle file to {output_sub_path}: {e}", exc_info=True)
+
+def build_subtitle_cues(
+    sentences: List[Any],
+    start_time_ms: float,
+    target_language: str = "en"
+) -> List[Dict[str, Any]]:
+    """
+    根据对齐后的句子时间生成字幕块（ASS 烧录与 WebVTT 字幕轨共用）.
+    1. 遍历每条 Sentence, 计算其精确的语音起止时间.
+    2. 长文本按语言拆分为多块.
+    3. 对字幕块进行后处理, 调整重叠和间距.
+
+    Args:
+        sentences: 句子列表
+        start_time_ms: 时间零点（毫秒），片段字幕传片段起点，任务时间轴传 0
+        target_language: 用来确定拆分逻辑(中文/英文/日文/韩文)
+
+    Returns:
+        按时间排序的字幕块列表，每块包含 start/end（毫秒，整数）与 text
+    """
+    events = []
     for s in sentences:
-        sub_text = (s.trans_text or s.raw_text or "").strip()
+        sub_text = (s.translated_text or s.original_text or "").strip()
         if not sub_text:
             logger.debug(f"Sentence {(getattr(s, 'sentence_id', 'N/A'))} has no text, skipping subtitle.")
             continue
@@ -91,111 +153,68 @@ def generate_subtitles_for_segment(
             block_start_for_event = max(0, int(block["start"]))
             block_end_for_event = max(block_start_for_event + 1, int(block["end"]))
 
-            evt = pysubs2.SSAEvent(
-                start=block_start_for_event,
-                end=block_end_for_event,
-                text=block["text"]
-            )
-            subs.append(evt)
+            events.append({"start": block_start_for_event, "end": block_end_for_event, "text": block["text"]})
 
     # --- Adjustments for overlaps and gaps (Point 2 & 3) ---
-    if subs.events:
-        subs.sort() 
+    if events:
+        events.sort(key=lambda event: (event["start"], event["end"]))
         
         min_event_duration_ms = 100 
         min_gap_between_events_ms = 40 # Based on "一定的间距" and suggest's comment
 
         adjusted_events = []
-        for i in range(len(subs.events)):
-            current_event = subs.events[i]
+        for i in range(len(events)):
+            current_event = events[i]
             
             # Ensure minimum duration for the current event first
-            if current_event.end < current_event.start + min_event_duration_ms:
-                current_event.end = current_event.start + min_event_duration_ms
+            if current_event["end"] < current_event["start"] + min_event_duration_ms:
+                current_event["end"] = current_event["start"] + min_event_duration_ms
 
             if i > 0:
                 prev_event = adjusted_events[-1] # Get the last *adjusted* previous event
 
                 # Ensure gap between prev_event and current_event
                 # current_event should start at least min_gap after prev_event.end
-                if current_event.start < prev_event.end + min_gap_between_events_ms:
+                if current_event["start"] < prev_event["end"] + min_gap_between_events_ms:
                     # Shift current_event later
-                    current_event.start = prev_event.end + min_gap_between_events_ms
+                    current_event["start"] = prev_event["end"] + min_gap_between_events_ms
                     # Recalculate current_event.end to maintain its duration or min_duration
                     # Original duration for current_event was current_event.end (before shift) - (original current_event.start)
                     # For simplicity, just ensure min_duration after shifting start
-                    current_event.end = max(current_event.end, current_event.start + min_event_duration_ms)
+                    current_event["end"] = max(current_event["end"], current_event["start"] + min_event_duration_ms)
 
                 # Ensure prev_event does not overlap with (now possibly shifted) current_event
                 # prev_event.end should be at most current_event.start - min_gap
-                if prev_event.end > current_event.start - min_gap_between_events_ms:
-                    prev_event.end = current_event.start - min_gap_between_events_ms
+                if prev_event["end"] > current_event["start"] - min_gap_between_events_ms:
+                    prev_event["end"] = current_event["start"] - min_gap_between_events_ms
                     # Ensure prev_event still has min_duration
-                    if prev_event.end < prev_event.start + min_event_duration_ms:
-                        prev_event.end = prev_event.start + min_event_duration_ms
+                    if prev_event["end"] < prev_event["start"] + min_event_duration_ms:
+                        prev_event["end"] = prev_event["start"] + min_event_duration_ms
                         # If this re-causes overlap, it's a very dense situation.
                         # The primary rule is prev_event.end <= current_event.start - min_gap
-                        if prev_event.end > current_event.start - min_gap_between_events_ms:
-                           prev_event.end = current_event.start - min_gap_between_events_ms
+                        if prev_event["end"] > current_event["start"] - min_gap_between_events_ms:
+                           prev_event["end"] = current_event["start"] - min_gap_between_events_ms
 
 
-            if current_event.end > current_event.start:
+            if current_event["end"] > current_event["start"]:
                 adjusted_events.append(current_event)
             else:
-                logger.warning(f"Subtitle event (text: '{current_event.text[:20]}...') "
-                               f"has invalid duration ({current_event.start}ms - {current_event.end}ms) "
+                logger.warning(f"Subtitle event (text: '{current_event['text'][:20]}...') "
+                               f"has invalid duration ({current_event['start']}ms - {current_event['end']}ms) "
                                f"after adjustments and will be dropped.")
         
-        subs.events = adjusted_events
+        events = adjusted_events
         
         # Final check on the last event's duration if any events survived
-        if subs.events:
-            last_event = subs.events[-1]
-            if last_event.end < last_event.start + min_event_duration_ms:
-                last_event.end = last_event.start + min_event_duration_ms
-            if last_event.end <= last_event.start: # If still invalid
-                logger.warning(f"Last subtitle event (text: '{last_event.text[:20]}...') became invalid and was removed.")
-                subs.events.pop()
-
-
-    # --- 设置"类YouTube"的默认样式 (original values are for DESIGN_VIDEO_WIDTH x DESIGN_VIDEO_HEIGHT) ---
-    style = subs.styles.get("Default", pysubs2.SSAStyle())
-
-    # Original style values (designed for DESIGN_VIDEO_WIDTH x DESIGN_VIDEO_HEIGHT)
-    original_fontsize = 60
-    original_marginv = 30
-    original_marginl = 30
-    original_marginr = 30
-    original_spacing = 0.5
-    # Assuming borderstyle = 3 (opaque box), outline and shadow are less critical for direct scaling here
-    # If borderstyle = 1 (outline), then outline thickness would need scaling:
-    # original_outline_thickness = 2 # example
-    # style.outline = max(1, round(original_outline_thickness * height_scale_factor)) 
-
-    style.fontname = "Arial"             
-    style.fontsize = max(1, round(original_fontsize * width_scale_factor))
-    style.bold = True
-    style.italic = False
-    style.underline = False
-
-    style.primarycolor = pysubs2.Color(255, 255, 255, 0)
-    style.outlinecolor = pysubs2.Color(0, 0, 0, 100)
-    style.borderstyle = 3  
-    style.shadow = 0 # If shadow had a distance, it would be scaled by height_scale_factor
-    style.alignment = pysubs2.Alignment.BOTTOM_CENTER
-    style.marginv = max(0, round(original_marginv * height_scale_factor))
-    style.marginl = max(0, round(original_marginl * width_scale_factor))
-    style.marginr = max(0, round(original_marginr * width_scale_factor))
-    style.spacing = original_spacing * width_scale_factor # Spacing can be float
-
-    subs.styles["Default"] = style
-
-    # 写入文件
-    try:
-        subs.save(output_sub_path, format="ass", encoding="utf-8")
-        logger.info(f"generate_subtitles_for_segment: Subtitles successfully written to => {output_sub_path}")
-    except Exception as e:
-        logger.error(f"Failed to save subtitle file to {output_sub_path}: {e}", exc_info=True)
+        if events:
+            last_event = events[-1]
+            if last_event["end"] < last_event["start"] + min_event_duration_ms:
+                last_event["end"] = last_event["start"] + min_event_duration_ms
+            if last_event["end"] <= last_event["start"]: # If still invalid
+                logger.warning(f"Last subtitle event (text: '{last_event['text'][:20]}...') became invalid and was removed.")
+                events.pop()
+
+    return events
 
 def split_long_text_to_sub_blocks(
     text: str,
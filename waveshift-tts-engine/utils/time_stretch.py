@@ -0,0 +1,287 @@
+"""
+进程内变速引擎 - WSOLA（波形相似重叠相加）保持音高的时间伸缩
+- 替代逐句启动 ffmpeg atempo 子进程：一个批次的所有句子提交到常驻线程池并行处理
+- 分析帧位置在容差范围内按归一化互相关搜索与上一帧自然延续最相似的位置，周期 Hann 窗 50% 重叠相加（增益恒为1）
+- 可选 numba 内核（nogil，线程池内真正并行），未安装时回退 numpy（np.correlate 向量化搜索）
+"""
+import asyncio
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+# 与 ffmpeg atempo 一致的合法速度范围，超出说明时长对齐计算有误
+MIN_SPEED = 0.5
+MAX_SPEED = 100.0
+
+
+@lru_cache(maxsize=16)
+def _hann(frame_length: int) -> np.ndarray:
+    """周期 Hann 窗（跳步为半帧时重叠相加之和恒为1），只读缓存"""
+    window = (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(frame_length) / frame_length)).astype(np.float32)
+    window.setflags(write=False)
+    return window
+
+
+def _layout(n_input: int, speed: float, frame_length: int, tolerance: int) -> Tuple[int, int, int, float]:
+    """
+    计算输出长度、帧数、输入补零后的长度与分析跳步
+
+    输入前端补 半帧+容差 个零，使第0帧中心落在原始第一个采样上；输出丢弃前半帧
+    """
+    hop = frame_length // 2
+    analysis_hop = hop * speed
+    out_length = int(round(n_input / speed))
+    n_frames = (out_length + hop) // hop + 1
+    pad_front = hop + tolerance
+    # 最后一帧的搜索区间与自然延续模板都不能越界
+    padded_length = max(
+        pad_front + n_input,
+        pad_front - hop + int(math.ceil((n_frames - 1) * analysis_hop)) + tolerance + frame_length + hop + 1,
+    ) + frame_length
+    return out_length, n_frames, padded_length, analysis_hop
+
+
+# 粗搜索的抽取步长：先在 1/4 分辨率上找最佳位置，再在其邻域内做全分辨率精搜索
+SEARCH_DECIMATION = 4
+
+
+def _wsola_numpy(padded, squares, out, window, n_frames, hop, analysis_hop, pad_front, tolerance, step):
+    frame_length = len(window)
+    n_lags = 2 * tolerance + 1
+    coarse_lags = np.arange(0, n_lags, step)
+    prev = pad_front - hop
+    for k in range(n_frames):
+        nominal = pad_front - hop + int(round(k * analysis_hop))
+        if k == 0 or tolerance == 0:
+            position = nominal
+        else:
+            template = padded[prev + hop:prev + hop + frame_length]
+            low = nominal - tolerance
+            # 各候选位置的帧能量（用于归一化互相关）
+            energy = np.sqrt(squares[low + frame_length:low + frame_length + n_lags] - squares[low:low + n_lags] + 1e-9)
+            region = padded[low:low + frame_length + 2 * tolerance]
+            coarse = np.correlate(region[::step], template[::step], mode="valid")[:len(coarse_lags)]
+            best = int(coarse_lags[np.argmax(coarse / energy[coarse_lags])])
+            fine_low = max(0, best - step + 1)
+            fine_high = min(n_lags - 1, best + step - 1)
+            fine = np.correlate(region[fine_low:fine_high + frame_length], template, mode="valid")
+            position = low + fine_low + int(np.argmax(fine / energy[fine_low:fine_high + 1]))
+        out[k * hop:k * hop + frame_length] += padded[position:position + frame_length] * window
+        prev = position
+
+
+def _wsola_loops(padded, squares, out, window, n_frames, hop, analysis_hop, pad_front, tolerance, step):
+    """与 _wsola_numpy 等价的显式循环版本（供 numba 编译）"""
+    frame_length = len(window)
+    n_lags = 2 * tolerance + 1
+    prev = pad_front - hop
+    for k in range(n_frames):
+        nominal = pad_front - hop + int(round(k * analysis_hop))
+        position = nominal
+        if k > 0 and tolerance > 0:
+            template_start = prev + hop
+            low = nominal - tolerance
+            best_lag = 0
+            best = -1e30
+            for lag in range(0, n_lags, step):
+                corr = 0.0
+                for i in range(0, frame_length, step):
+                    corr += padded[low + lag + i] * padded[template_start + i]
+                score = corr / math.sqrt(squares[low + lag + frame_length] - squares[low + lag] + 1e-9)
+                if score > best:
+                    best = score
+                    best_lag = lag
+            fine_low = max(0, best_lag - step + 1)
+            fine_high = min(n_lags - 1, best_lag + step - 1)
+            best = -1e30
+            for lag in range(fine_low, fine_high + 1):
+                corr = 0.0
+                for i in range(frame_length):
+                    corr += padded[low + lag + i] * padded[template_start + i]
+                score = corr / math.sqrt(squares[low + lag + frame_length] - squares[low + lag] + 1e-9)
+                if score > best:
+                    best = score
+                    position = low + lag
+        base = k * hop
+        for i in range(frame_length):
+            out[base + i] += padded[position + i] * window[i]
+        prev = position
+
+
+if NUMBA_AVAILABLE:
+    _wsola_nb = njit(cache=True, nogil=True, fastmath=True)(_wsola_loops)
+
+
+def time_stretch(
+    audio: np.ndarray,
+    speed: float,
+    sample_rate: int = 24000,
+    frame_ms: float = 30.0,
+    tolerance_ms: float = 8.0,
+    use_numba: bool = True
+) -> np.ndarray:
+    """
+    WSOLA 变速（保持音高），输出长度为 round(len(audio) / speed)
+
+    Args:
+        audio: 单声道音频
+        speed: 速度系数（>1 加速，<1 减速）
+        sample_rate: 采样率
+        frame_ms: 分析帧长（毫秒）
+        tolerance_ms: 分析帧位置的搜索容差（毫秒）
+        use_numba: 是否使用 numba 内核（未安装时自动回退）
+
+    Returns:
+        变速后的 float32 音频
+    """
+    if speed <= 0:
+        raise ValueError(f"Invalid speed factor: {speed}")
+    if speed < MIN_SPEED or speed > MAX_SPEED:
+        raise ValueError(
+            f"Speed factor {speed} is out of range [{MIN_SPEED}, {MAX_SPEED}]. "
+            f"This indicates a calculation error in duration alignment."
+        )
+
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=0)
+    if speed == 1.0 or len(audio) == 0:
+        return audio.copy()
+
+    frame_length = max(4, int(sample_rate * frame_ms / 1000) // 2 * 2)
+    hop = frame_length // 2
+    tolerance = max(0, int(sample_rate * tolerance_ms / 1000))
+    out_length, n_frames, padded_length, analysis_hop = _layout(len(audio), speed, frame_length, tolerance)
+
+    pad_front = hop + tolerance
+    padded = np.zeros(padded_length, dtype=np.float32)
+    padded[pad_front:pad_front + len(audio)] = audio
+    out = np.zeros(n_frames * hop + frame_length, dtype=np.float32)
+    window = _hann(frame_length)
+    squares = np.concatenate(([0.0], np.cumsum(np.square(padded, dtype=np.float64))))
+    step = max(1, min(SEARCH_DECIMATION, tolerance))
+
+    kernel = _wsola_nb if use_numba and NUMBA_AVAILABLE else _wsola_numpy
+    kernel(padded, squares, out, window, n_frames, hop, analysis_hop, pad_front, tolerance, step)
+    return out[hop:hop + out_length]
+
+
+class TimeStretcher:
+    """
+    批量变速：常驻线程池 + WSOLA 内核
+    一个批次的句子并行处理，单句失败不影响其他句子
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 24000,
+        max_workers: int = 0,
+        frame_ms: float = 30.0,
+        tolerance_ms: float = 8.0,
+        use_numba: bool = True,
+        pool=None
+    ):
+        """
+        Args:
+            sample_rate: 默认采样率
+            max_workers: 线程池大小，0表示按CPU核数自动确定（最多8个）；指定 pool 时忽略
+            frame_ms / tolerance_ms: WSOLA 参数
+            use_numba: 是否使用 numba 内核
+            pool: 共享的执行器线程池（ExecutorPool），None 时使用自有线程池
+        """
+        self.sample_rate = sample_rate
+        self.pool = pool
+        self.max_workers = pool.max_workers if pool is not None else (max_workers or max(1, min(8, os.cpu_count() or 1)))
+        self.frame_ms = frame_ms
+        self.tolerance_ms = tolerance_ms
+        self.use_numba = use_numba and NUMBA_AVAILABLE
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        logger.info(
+            f"TimeStretcher 初始化: 线程数={self.max_workers}, 帧长={frame_ms}ms, 容差={tolerance_ms}ms, "
+            f"内核={'numba' if self.use_numba else 'numpy'}"
+        )
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self.pool is not None:
+            return self.pool.executor
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="time_stretch")
+        return self._executor
+
+    def stretch(self, audio: np.ndarray, speed: float, sample_rate: Optional[int] = None) -> np.ndarray:
+        """同步变速单段音频"""
+        return time_stretch(
+            audio, speed, sample_rate or self.sample_rate,
+            frame_ms=self.frame_ms, tolerance_ms=self.tolerance_ms, use_numba=self.use_numba
+        )
+
+    async def stretch_batch(
+        self,
+        items: Sequence[Tuple[np.ndarray, float]],
+        sample_rate: Optional[int] = None
+    ) -> List[object]:
+        """
+        并行变速一批音频
+
+        Args:
+            items: [(audio, speed), ...]
+            sample_rate: 采样率
+
+        Returns:
+            与 items 等长的列表，元素为变速后的音频，失败时为对应的异常对象
+        """
+        if not items:
+            return []
+        if self.pool is not None:
+            futures = [self.pool.run(self.stretch, audio, speed, sample_rate) for audio, speed in items]
+        else:
+            loop = asyncio.get_running_loop()
+            futures = [
+                loop.run_in_executor(self.executor, self.stretch, audio, speed, sample_rate)
+                for audio, speed in items
+            ]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    def close(self):
+        # 共享线程池由 ExecutorRegistry 关闭
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# 全局单例
+_time_stretcher: Optional[TimeStretcher] = None
+
+def get_time_stretcher() -> TimeStretcher:
+    """获取全局变速引擎单例"""
+    global _time_stretcher
+    if _time_stretcher is None:
+        from config import get_config
+        from utils.executors import POOL_DSP, get_executors
+        config = get_config()
+        # 变速在共享的 CPU 数值处理线程池中执行
+        _time_stretcher = TimeStretcher(
+            sample_rate=config.tts.target_sample_rate,
+            frame_ms=config.tts.time_stretch_frame_ms,
+            tolerance_ms=config.tts.time_stretch_tolerance_ms,
+            use_numba=config.tts.mix_use_numba,
+            pool=get_executors().get(POOL_DSP)
+        )
+    return _time_stretcher
+
@@ -1,18 +1,147 @@
 import os
-import soundfile as sf
 import numpy as np
 import logging
 from contextlib import ExitStack
-from tempfile import NamedTemporaryFile
-from typing import List, Any
+from dataclasses import dataclass
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from typing import List, Any, Optional, Tuple, Dict
 from pathlib import Path
 import asyncio
 
-from utils.ffmpeg_utils import cut_video_track, cut_video_with_audio, cut_video_with_subtitles_and_audio
+from utils.ffmpeg_utils import encode_video_range, render_video_with_audio, concat_copy_with_audio
+from utils.media_probe import MediaProbe, probe_media
 from utils.subtitle_utils import generate_subtitles_for_segment
+from utils.executors import POOL_DSP, POOL_IO, run_in_pool
 
 logger = logging.getLogger(__name__)
 
+# 起止时间与关键帧的对齐容差（秒），约半帧
+KEYFRAME_TOLERANCE = 0.02
+
+# ffprobe 的 H.264 profile 名称 -> libx264 profile（首尾 GOP 按源视频参数重编码后才能与源 GOP 拼接）
+_X264_PROFILES = {
+    "constrained baseline": "baseline",
+    "baseline": "baseline",
+    "main": "main",
+    "high": "high",
+    "high 10": "high10",
+    "high 4:2:2": "high422",
+    "high 4:4:4 predictive": "high444",
+}
+
+
+@dataclass
+class SegmentCutPlan:
+    """
+    片段截取方案
+    - copy: 起止均与关键帧对齐，整段流复制
+    - smart: 中间完整 GOP 流复制，首尾不完整 GOP 重编码（仅限 libx264 可按源参数重编码的 H.264 源）
+    - encode: 整段重编码（需要烧录字幕、无关键帧信息、区间内没有完整 GOP 或源视频不支持 smart）
+    """
+    mode: str
+    start: float
+    end: float
+    copy_start: float = 0.0      # 流复制区间起点（关键帧 pts）
+    copy_end: float = 0.0        # 流复制区间终点（关键帧 pts）
+    copy_end_dts: float = 0.0    # 终点关键帧的 dts（concat outpoint 按 dts 比较）
+
+    @property
+    def head_duration(self) -> float:
+        return max(0.0, self.copy_start - self.start) if self.mode == "smart" else 0.0
+
+    @property
+    def tail_duration(self) -> float:
+        return max(0.0, self.end - self.copy_end) if self.mode == "smart" else 0.0
+
+
+def plan_segment_cut(
+    keyframes: Optional[List[Tuple[float, float]]],
+    start: float,
+    end: float,
+    burn_subtitles: bool = False,
+    tolerance: float = KEYFRAME_TOLERANCE,
+    smart_cut: bool = True
+) -> SegmentCutPlan:
+    """
+    根据关键帧 (pts, dts) 列表确定截取方案
+
+    Args:
+        smart_cut: 首尾不完整 GOP 能否重编码后与源 GOP 拼接；否则未对齐的区间整段重编码
+    """
+    if burn_subtitles or not keyframes:
+        return SegmentCutPlan("encode", start, end)
+
+    first = next((k for k in keyframes if k[0] >= start - tolerance), None)
+    last = next((k for k in reversed(keyframes) if k[0] <= end + tolerance), None)
+    if first is None or last is None or last[0] - first[0] <= tolerance:
+        # 区间内没有完整 GOP，重编码整段的开销不高于拼接
+        return SegmentCutPlan("encode", start, end)
+
+    aligned = abs(first[0] - start) <= tolerance and abs(last[0] - end) <= tolerance
+    if not aligned and not smart_cut:
+        return SegmentCutPlan("encode", start, end)
+    return SegmentCutPlan(
+        "copy" if aligned else "smart",
+        start, end,
+        copy_start=first[0],
+        copy_end=last[0],
+        copy_end_dts=last[1]
+    )
+
+
+def edge_encode_params(probe: Optional[MediaProbe]) -> Optional[Dict[str, str]]:
+    """
+    首尾不完整 GOP 的重编码参数（与源视频的 profile/level/像素格式一致）
+
+    Returns:
+        encode_video_range 的参数；源视频不是 H.264 或 profile 无对应的 libx264 profile 时返回 None（不能 smart 拼接）
+    """
+    if probe is None or probe.video_codec != "h264":
+        return None
+    profile = _X264_PROFILES.get(probe.video_profile.lower())
+    if profile is None:
+        return None
+    params = {"profile": profile, "pix_fmt": probe.pix_fmt or "yuv420p"}
+    if probe.video_level > 0:
+        params["level"] = f"{probe.video_level / 10:g}"
+    return params
+
+
+# 视频探测结果缓存：(路径, mtime, size) -> MediaProbe
+_probe_cache: Dict[Tuple[str, float, int], MediaProbe] = {}
+_PROBE_CACHE_SIZE = 16
+
+async def get_video_probe(video_path: str) -> Optional[MediaProbe]:
+    """获取视频探测结果（关键帧、编码参数，按文件缓存），探测失败时返回 None（退化为重编码）"""
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return None
+    key = (os.path.abspath(video_path), stat.st_mtime, stat.st_size)
+    probe = _probe_cache.get(key)
+    if probe is None:
+        try:
+            probe = await probe_media(video_path)
+        except Exception as e:
+            logger.warning(f"视频探测失败，片段将整段重编码: {video_path}, 错误: {e}")
+            return None
+        if len(_probe_cache) >= _PROBE_CACHE_SIZE:
+            _probe_cache.pop(next(iter(_probe_cache)))
+        _probe_cache[key] = probe
+    return probe
+
+def _concat_entry(path: str, inpoint: Optional[float] = None, outpoint: Optional[float] = None,
+                  duration: Optional[float] = None) -> str:
+    escaped = path.replace("'", "'\\''")
+    lines = [f"file '{escaped}'"]
+    if inpoint is not None:
+        lines.append(f"inpoint {inpoint:.6f}")
+    if outpoint is not None:
+        lines.append(f"outpoint {outpoint:.6f}")
+    if duration is not None:
+        lines.append(f"duration {duration:.6f}")
+    return "\n".join(lines) + "\n"
+
 async def add_video_segment(
     video_path: str,
     start_time: float,
@@ -24,12 +153,16 @@ async def add_video_segment(
     target_language: str,
     sample_rate: int,
     video_width: int,
-    video_height: int
-):
+    video_height: int,
+    probe: Optional[MediaProbe] = None
+) -> str:
     """
     从原视频里截取 [start_time, start_time + duration] 的视频段(无声)，
-    与合成音频合并。
-    若 generate_subtitle=True, 则生成 .ass 字幕并在 ffmpeg 工具中进行"烧制"。
+    与合成音频合并。音频以 f32le 经 stdin 直接送入 ffmpeg，不落盘。
+    若 generate_subtitle=True, 则生成 .ass 字幕并在同一次 ffmpeg 调用中"烧制"。
+    
+    起止与关键帧对齐时整段流复制；否则中间完整 GOP 流复制、仅重编码首尾不完整 GOP
+    （源视频为 H.264 时按源 profile/level/像素格式重编码，其他编码整段重编码）。
     
     Args:
         video_path: 视频文件路径
@@ -43,6 +176,10 @@ async def add_video_segment(
         sample_rate: 采样率
         video_width: 视频宽度
         video_height: 视频高度
+        probe: 视频探测结果（关键帧、编码参数），None 时按文件探测并缓存
+        
+    Returns:
+        实际使用的截取方案（copy / smart / encode）
     """
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"add_video_segment: 视频文件不存在: {video_path}")
@@ -51,48 +188,65 @@ async def add_video_segment(
     if duration <= 0:
         raise ValueError("add_video_segment: 无效时长 <=0")
 
-    with ExitStack() as stack:
-        temp_video = stack.enter_context(NamedTemporaryFile(suffix='.mp4'))
-        temp_audio = stack.enter_context(NamedTemporaryFile(suffix='.wav'))
+    end_time = start_time + duration
+    if probe is None and not generate_subtitle:
+        probe = await get_video_probe(video_path)
+    edge_params = edge_encode_params(probe)
+    plan = plan_segment_cut(
+        probe.keyframes if probe is not None else None, start_time, end_time,
+        burn_subtitles=generate_subtitle, smart_cut=edge_params is not None
+    )
 
-        end_time = start_time + duration
+    with ExitStack() as stack:
+        if plan.mode == "encode":
+            subtitles_path = None
+            if generate_subtitle:
+                temp_ass = stack.enter_context(NamedTemporaryFile(suffix='.ass'))
+                # 调用生成字幕的函数 - 异步生成
+                await run_in_pool(
+                    POOL_DSP,
+                    generate_subtitles_for_segment,
+                    sentences,
+                    start_time * 1000,   # 开始时间（毫秒）
+                    temp_ass.name,
+                    target_language,
+                    video_width,
+                    video_height
+                )
+                subtitles_path = temp_ass.name
+            await render_video_with_audio(
+                video_path, start_time, duration, audio_data, sample_rate, output_path, subtitles_path
+            )
+            return plan.mode
 
-        # 1) 截取视频 (无音轨)
-        await cut_video_track(
-            input_path=video_path,
-            output_path=temp_video.name,
-            start=start_time,
-            end=end_time
-        )
+        temp_dir = Path(stack.enter_context(TemporaryDirectory(prefix="segment_")))
+        source = os.path.abspath(video_path)
+        entries = []
+        edge_jobs = []
+        if plan.head_duration > KEYFRAME_TOLERANCE:
+            head_path = str(temp_dir / "head.mp4")
+            edge_jobs.append(encode_video_range(source, head_path, start_time, plan.head_duration, **edge_params))
+            entries.append(_concat_entry(head_path))
+        # outpoint 按 dts 比较：取终点关键帧的 dts，排除其后按解码顺序混入的帧；duration 保证后续时间戳连续
+        entries.append(_concat_entry(
+            source,
+            inpoint=plan.copy_start,
+            outpoint=plan.copy_end_dts,
+            duration=plan.copy_end - plan.copy_start
+        ))
+        if plan.tail_duration > KEYFRAME_TOLERANCE:
+            tail_path = str(temp_dir / "tail.mp4")
+            edge_jobs.append(encode_video_range(source, tail_path, plan.copy_end, plan.tail_duration, **edge_params))
+            entries.append(_concat_entry(tail_path))
 
-        # 2) 写合成音频到临时文件 - 异步写入
-        await asyncio.to_thread(sf.write, temp_audio.name, audio_data, sample_rate)
-
-        # 3) 如果需要字幕，则构建 .ass 并用 ffmpeg "烧"进去
-        if generate_subtitle:
-            temp_ass = stack.enter_context(NamedTemporaryFile(suffix='.ass'))
-            # 调用生成字幕的函数 - 异步生成
-            await asyncio.to_thread(
-                generate_subtitles_for_segment,
-                sentences,
-                start_time * 1000,   # 开始时间（毫秒）
-                temp_ass.name,
-                target_language,
-                video_width,
-                video_height
-            )
+        if edge_jobs:
+            await asyncio.gather(*edge_jobs)
+        list_path = temp_dir / "concat.txt"
+        await run_in_pool(POOL_IO, list_path.write_text, "".join(entries), "utf-8")
 
-            # 生成带字幕的视频
-            await cut_video_with_subtitles_and_audio(
-                input_video_path=temp_video.name,
-                input_audio_path=temp_audio.name,
-                subtitles_path=temp_ass.name,
-                output_path=output_path
-            )
-        else:
-            # 不加字幕，仅合并音频
-            await cut_video_with_audio(
-                input_video_path=temp_video.name,
-                input_audio_path=temp_audio.name,
-                output_path=output_path
-            )
\ No newline at end of file
+        await concat_copy_with_audio(str(list_path), duration, audio_data, sample_rate, output_path)
+        logger.debug(
+            f"add_video_segment: {plan.mode} [{start_time:.3f}, {end_time:.3f}] "
+            f"复制区间 [{plan.copy_start:.3f}, {plan.copy_end:.3f}]"
+        )
+        return plan.mode
@@ -0,0 +1,256 @@
+"""
+增量 WebVTT 字幕轨 - 按批次追加，不烧录进视频（流式路径不再因字幕重编码）
+- 字幕块由对齐后的句子时间生成（与 ASS 烧录共用 build_subtitle_cues），落在任务时间轴上
+- 外挂字幕文件（subtitles.vtt）只追加写入：头部写一次，之后每批次只追加新字幕块
+- 可选 HLS 字幕演绎：时间轴按固定时长切窗，窗口被批次完全覆盖后写出 WebVTT 片段并追加到字幕播放列表
+- 跨窗口的字幕块在两个片段中重复出现（播放器按时间去重）；新字幕块不早于已写出窗口的末尾
+- 每次写出后同步保存续写状态（subtitles.state.json），引擎重启后 restore 以追加方式继续，不重写已有字幕
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from utils.hls_playlist import HLSSegment, MediaPlaylistWriter
+from utils.subtitle_utils import build_subtitle_cues
+from utils.executors import POOL_IO, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_NAME = "subtitles.vtt"
+SUBTITLE_PLAYLIST = "subtitles.m3u8"
+STATE_NAME = "subtitles.state.json"
+# 相邻字幕块的最小间距（毫秒），与 build_subtitle_cues 一致
+_MIN_GAP_MS = 40
+
+
+def format_vtt_timestamp(ms: float) -> str:
+    """毫秒 -> WebVTT 时间戳 HH:MM:SS.mmm"""
+    ms = max(0, int(round(ms)))
+    hours, rest = divmod(ms, 3600_000)
+    minutes, rest = divmod(rest, 60_000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+def _escape_cue_text(text: str) -> str:
+    """WebVTT 字幕正文转义（& < > 与 --> 不能原样出现）"""
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return text.replace("-->", "--&gt;")
+
+
+def _render_cue(cue: Dict[str, Any]) -> str:
+    return f"{format_vtt_timestamp(cue['start'])} --> {format_vtt_timestamp(cue['end'])}\n{_escape_cue_text(cue['text'])}\n\n"
+
+
+class WebVTTSubtitleTrack:
+    """
+    单个任务的增量字幕轨
+    append 按批次顺序调用（由混音会话锁串行化）
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        output_dir: Union[str, Path],
+        target_language: str = "zh",
+        segment_seconds: float = 6.0,
+        hls: bool = False,
+        mpegts_offset: int = 0
+    ):
+        """
+        Args:
+            task_id: 任务ID
+            output_dir: 输出目录（外挂字幕、字幕播放列表及片段）
+            target_language: 字幕语言（拆行规则与播放列表 LANGUAGE）
+            segment_seconds: HLS 字幕片段时长（秒）
+            hls: 是否输出 HLS 字幕演绎
+            mpegts_offset: 时间轴零点对应的媒体时间（90kHz，X-TIMESTAMP-MAP 的 MPEGTS）
+        """
+        self.task_id = task_id
+        self.output_dir = Path(output_dir)
+        self.target_language = target_language
+        self.segment_seconds = segment_seconds
+        self.mpegts_offset = mpegts_offset
+        self.writer = MediaPlaylistWriter(
+            self.output_dir / SUBTITLE_PLAYLIST, segment_seconds, playlist_type="EVENT", version=3
+        ) if hls else None
+        self.cue_count = 0
+        self._cues: List[Dict[str, Any]] = []  # 尚未完全写出到 HLS 片段的字幕块
+        self._last_end = 0  # 最后一个字幕块的结束时间（毫秒）
+        self._covered = 0.0  # 已处理批次覆盖到的时间轴位置（秒）
+        self._windows = 0  # 已写出的 HLS 字幕片段数
+        self._opened = False
+        self.finalized = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def sidecar_path(self) -> Path:
+        return self.output_dir / SIDECAR_NAME
+
+    @property
+    def playlist_path(self) -> Optional[Path]:
+        return self.writer.path if self.writer is not None else None
+
+    @property
+    def state_path(self) -> Path:
+        return self.output_dir / STATE_NAME
+
+    @classmethod
+    def restore(cls, task_id: str, output_dir: Union[str, Path]) -> Optional["WebVTTSubtitleTrack"]:
+        """
+        从输出目录中的续写状态恢复字幕轨（同步文件操作，应在线程池中调用）
+        外挂字幕与字幕播放列表保持原有内容，之后的批次继续追加
+
+        Returns:
+            恢复的字幕轨；没有续写状态或外挂字幕已不存在时返回 None
+        """
+        output_dir = Path(output_dir)
+        state_path = output_dir / STATE_NAME
+        if not state_path.exists() or not (output_dir / SIDECAR_NAME).exists():
+            return None
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        track = cls(
+            task_id, output_dir, state["target_language"], state["segment_seconds"],
+            hls=state["hls"], mpegts_offset=state["mpegts_offset"]
+        )
+        track.cue_count = state["cue_count"]
+        track._cues = state["cues"]
+        track._last_end = state["last_end"]
+        track._covered = state["covered"]
+        track._windows = state["windows"]
+        track.finalized = state["finalized"]
+        if track.writer is not None:
+            track.writer.resume([HLSSegment.from_dict(s) for s in state["segments"]], ended=track.finalized)
+        track._opened = True
+        logger.info(f"[{task_id}] 字幕轨已恢复: {track.cue_count} 条字幕, {track._windows} 个字幕片段")
+        return track
+
+    async def open(self) -> None:
+        """写入外挂字幕与字幕播放列表的头部（首次追加时自动调用；需要先被引用时可提前调用）"""
+        async with self._lock:
+            if not self._opened:
+                await run_in_pool(POOL_IO, self._open)
+
+    async def append(self, sentences: List[Any], start_time: float, end_time: float) -> List[str]:
+        """
+        追加一个批次的字幕
+
+        Args:
+            sentences: 批次句子（已对齐，adjusted_start 为任务时间轴上的毫秒）
+            start_time: 批次在时间轴上的起点（秒）
+            end_time: 批次在时间轴上的终点（秒），此前的字幕已全部确定
+
+        Returns:
+            新写出的文件路径（外挂字幕与新 HLS 字幕片段）
+        """
+        async with self._lock:
+            # 已写出窗口之内不再追加字幕块，顺延到窗口末尾
+            floor = max(self._last_end + _MIN_GAP_MS if self.cue_count else 0,
+                        self._windows * self.segment_seconds * 1000)
+            cues = []
+            for cue in build_subtitle_cues(sentences, 0, self.target_language):
+                if cue["start"] < floor:
+                    cue["start"] = floor
+                if cue["end"] <= cue["start"]:
+                    continue
+                cues.append(cue)
+                floor = cue["end"] + _MIN_GAP_MS
+            if cues:
+                self._last_end = cues[-1]["end"]
+                self.cue_count += len(cues)
+                self._cues.extend(cues)
+            self._covered = max(self._covered, end_time)
+            files = []
+            if cues or not self._opened:
+                await run_in_pool(POOL_IO, self._append_sidecar, cues)
+                files.append(str(self.sidecar_path))
+            if self.writer is not None:
+                files.extend(await run_in_pool(POOL_IO, self._write_windows, False))
+            await run_in_pool(POOL_IO, self._save_state)
+            logger.debug(
+                f"[{self.task_id}] 字幕轨追加 {len(cues)} 条（批次 {start_time:.2f}s-{end_time:.2f}s），"
+                f"共 {self.cue_count} 条"
+            )
+            return files
+
+    async def finalize(self) -> List[str]:
+        """写出剩余窗口（最后一个片段按实际时长）并结束字幕播放列表（重复调用直接返回）"""
+        async with self._lock:
+            if self.finalized:
+                return []
+            files = []
+            if not self._opened:
+                await run_in_pool(POOL_IO, self._append_sidecar, [])
+                files.append(str(self.sidecar_path))
+            if self.writer is not None:
+                files.extend(await run_in_pool(POOL_IO, self._write_windows, True))
+                await run_in_pool(POOL_IO, self.writer.end)
+            self.finalized = True
+            await run_in_pool(POOL_IO, self._save_state)
+            logger.info(f"[{self.task_id}] 字幕轨完成: {self.cue_count} 条字幕, {self.sidecar_path}")
+            return files
+
+    def _open(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 已有外挂字幕（如重启后未能恢复续写状态）时只追加，不清空已写出的字幕
+        if not self.sidecar_path.exists() or self.sidecar_path.stat().st_size == 0:
+            self.sidecar_path.write_text("WEBVTT\n\n", encoding="utf-8")
+        if self.writer is not None:
+            self.writer.open()
+        self._opened = True
+
+    def _save_state(self) -> None:
+        """原子写入续写状态（字幕块计数、窗口进度、未写完窗口的字幕块、已写出的字幕片段）"""
+        state = {
+            "target_language": self.target_language,
+            "segment_seconds": self.segment_seconds,
+            "hls": self.writer is not None,
+            "mpegts_offset": self.mpegts_offset,
+            "cue_count": self.cue_count,
+            "cues": self._cues,
+            "last_end": self._last_end,
+            "covered": self._covered,
+            "windows": self._windows,
+            "finalized": self.finalized,
+            "segments": [s.to_dict() for s in self.writer.segments] if self.writer is not None else [],
+        }
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.state_path)
+
+    def _append_sidecar(self, cues: List[Dict[str, Any]]) -> None:
+        if not self._opened:
+            self._open()
+        if cues:
+            with open(self.sidecar_path, "a", encoding="utf-8") as f:
+                f.write("".join(_render_cue(cue) for cue in cues))
+
+    def _write_windows(self, final: bool) -> List[str]:
+        """写出已被批次完全覆盖的字幕窗口（final 时写出到覆盖终点为止的全部窗口）"""
+        window_ms = self.segment_seconds * 1000
+        covered_ms = self._covered * 1000
+        if final:
+            covered_ms = max(covered_ms, self._last_end)
+            count = math.ceil(covered_ms / window_ms - 1e-9)
+        else:
+            count = int(covered_ms // window_ms)
+        segments, files = [], []
+        header = f"WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:{self.mpegts_offset},LOCAL:00:00:00.000\n\n"
+        for index in range(self._windows, count):
+            start, end = index * window_ms, min((index + 1) * window_ms, covered_ms)
+            if end <= start:
+                break
+            name = f"subtitles_{index:05d}.vtt"
+            body = "".join(_render_cue(cue) for cue in self._cues if cue["start"] < end and cue["end"] > start)
+            (self.output_dir / name).write_text(header + body, encoding="utf-8")
+            segments.append(HLSSegment(uri=name, duration=(end - start) / 1000))
+            files.append(str(self.output_dir / name))
+            self._windows = index + 1
+        if segments:
+            self._cues = [cue for cue in self._cues if cue["end"] > self._windows * window_ms]
+            self.writer.append(segments)
+        return files